@@ -1,10 +1,11 @@
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from models import User
+from services.user_cache import user_cache, USER_PRINCIPAL_PROJECTION
+from services.password_hasher import password_hasher
 import os
 from motor.motor_asyncio import AsyncIOMotorClient
 
@@ -13,7 +14,7 @@ SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-change-this-in-produc
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = password_hasher.context
 security = HTTPBearer()
 
 # Database connection - will be initialized from server
@@ -36,14 +37,26 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password without blocking the event loop (bcrypt runs in the hasher pool)."""
+    return await password_hasher.verify(plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password without blocking the event loop (bcrypt runs in the hasher pool)."""
+    return await password_hasher.hash(password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
     to_encode = data.copy()
+    now = datetime.now(timezone.utc)
     if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+        expire = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    # iat also keys the authenticated-user cache
+    to_encode.update({"exp": expire, "iat": now})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -77,7 +90,13 @@ async def get_current_user_email(credentials: HTTPAuthorizationCredentials = Dep
 
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
-    """Get current user from JWT token and return User object."""
+    """
+    Get current user from JWT token and return User object.
+    
+    Users are cached per (email, token iat) for a short TTL (see
+    services.user_cache) and loaded with USER_PRINCIPAL_PROJECTION, so
+    fields outside it keep their model defaults.
+    """
     if db is None:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -94,9 +113,15 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    issued_at = payload.get("iat")
+    user = user_cache.get(email, issued_at)
+    if user is not None:
+        return user
+    
     # Get user from database
+    generation = user_cache.generation
     users_collection = db.users
-    user_doc = await users_collection.find_one({"email": email})
+    user_doc = await users_collection.find_one({"email": email}, USER_PRINCIPAL_PROJECTION)
     if not user_doc:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -109,4 +134,6 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     if isinstance(user_doc.get('updated_at'), str):
         user_doc['updated_at'] = datetime.fromisoformat(user_doc['updated_at'])
     
-    return User(**user_doc)
+    user = User(**user_doc)
+    user_cache.set(email, issued_at, user, generation)
+    return user
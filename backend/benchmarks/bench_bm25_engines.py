@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+BM25 scoring engine benchmark
+
+Compares query throughput of the dict-based postings engine
+(services.lexical_index.score_postings) and the vectorized CSR engine
+(services.sparse_bm25.SparseBM25Matrix) on synthetic corpora with a Zipfian
+vocabulary.
+
+Usage:
+    python benchmarks/bench_bm25_engines.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.lexical_index import score_postings  # noqa: E402
+from services.sparse_bm25 import SparseBM25Matrix  # noqa: E402
+
+VOCAB_SIZE = 50000
+TERMS_PER_CHUNK = 60
+QUERY_TERMS = 4
+
+
+def build_corpus(num_chunks: int, rng):
+    """Generate COO triples (term, chunk, tf) for a synthetic corpus"""
+    # Zipf-distributed term ids, clipped to the vocabulary
+    terms = rng.zipf(1.2, size=num_chunks * TERMS_PER_CHUNK) % VOCAB_SIZE
+    chunks = np.repeat(np.arange(num_chunks), TERMS_PER_CHUNK)
+
+    # Collapse duplicate (term, chunk) pairs into term frequencies
+    keys = chunks.astype(np.int64) * VOCAB_SIZE + terms
+    unique_keys, tfs = np.unique(keys, return_counts=True)
+    cols = unique_keys // VOCAB_SIZE
+    rows = unique_keys % VOCAB_SIZE
+    doc_lengths = np.full(num_chunks, TERMS_PER_CHUNK)
+    return rows, cols, tfs, doc_lengths
+
+
+def build_postings(rows, cols, tfs, doc_lengths, doc_ids):
+    """Build the term -> [(chunk_id, tf, doc_length)] layout of the postings engine"""
+    postings = {}
+    for row, col, tf in zip(rows.tolist(), cols.tolist(), tfs.tolist()):
+        postings.setdefault(f"t{row}", []).append((doc_ids[col], tf, int(doc_lengths[col])))
+    return postings
+
+
+def make_queries(num_queries: int, rng):
+    # Mix of frequent and rare terms, like real questions
+    return [
+        [f"t{t}" for t in rng.zipf(1.1, size=QUERY_TERMS) % VOCAB_SIZE]
+        for _ in range(num_queries)
+    ]
+
+
+def bench(label: str, fn, queries):
+    start = time.perf_counter()
+    for query in queries:
+        fn(query)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<10} {len(queries) / elapsed:>10.1f} queries/s  {elapsed / len(queries) * 1000:>8.3f} ms/query")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--postings-max", type=int, default=100000,
+                        help="Skip the postings engine above this corpus size (memory)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    queries = make_queries(args.queries, rng)
+
+    for size in args.sizes:
+        rows, cols, tfs, doc_lengths = build_corpus(size, rng)
+        doc_ids = [f"c{i}" for i in range(size)]
+        print(f"\n{size:,} chunks, {len(tfs):,} postings")
+
+        start = time.perf_counter()
+        term_ids = {f"t{i}": i for i in range(VOCAB_SIZE)}
+        matrix = SparseBM25Matrix.from_coo(term_ids, rows, cols, tfs, doc_lengths, doc_ids)
+        print(f"  sparse build {time.perf_counter() - start:.2f}s, {matrix.nbytes / 1e6:.1f} MB")
+        bench("sparse", lambda q: matrix.search(q, args.top_k), queries)
+
+        if size <= args.postings_max:
+            postings = build_postings(rows, cols, tfs, doc_lengths, doc_ids)
+            avg_doc_length = float(doc_lengths.mean())
+            bench(
+                "postings",
+                lambda q: score_postings(
+                    {term: postings[term] for term in q if term in postings},
+                    size, avg_doc_length, args.top_k
+                ),
+                queries
+            )
+        else:
+            print("  postings   skipped (use --postings-max to include)")
+
+
+if __name__ == "__main__":
+    main()
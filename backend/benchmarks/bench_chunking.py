@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Chunking throughput benchmark: decode round-trip chunker vs. single-pass chunker
+
+Generates paragraph text of the given sizes and reports MB/s for:
+
+    legacy    previous ChunkingService algorithm (encode, slice tokens, decode
+              every window; paragraphs encoded one by one)
+    list      ChunkingService.chunk_text / chunk_by_paragraphs
+    stream    ChunkingService.iter_token_chunks / iter_paragraph_chunks,
+              consumed without keeping the chunks
+
+Usage:
+    python benchmarks/bench_chunking.py --sizes 1,10,100
+    python benchmarks/bench_chunking.py --sizes 1,10 --legacy-max-mb 10
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.chunking_service import ChunkingService  # noqa: E402
+
+WORDS = (
+    "the chatbot answers questions about orders shipping returns refunds warranty account billing "
+    "invoice subscription plan upgrade support ticket response time delivery tracking number café "
+    "naïve résumé 日本語 テキスト données — “quoted” 2024 42 3.14"
+).split()
+
+
+def make_text(size_bytes: int, seed: int = 7) -> str:
+    """Paragraphs of 5-400 words (a few oversized ones) until `size_bytes` of UTF-8"""
+    rng = random.Random(seed)
+    paragraphs = []
+    size = 0
+    while size < size_bytes:
+        count = rng.randint(5, 400) if rng.random() > 0.02 else rng.randint(1500, 4000)
+        paragraph = " ".join(rng.choice(WORDS) for _ in range(count))
+        paragraphs.append(paragraph)
+        size += len(paragraph.encode("utf-8")) + 2
+    return "\n\n".join(paragraphs)
+
+
+class LegacyChunker:
+    """The chunking algorithm ChunkingService used before the single-pass rewrite"""
+
+    def __init__(self, tokenizer, chunk_size: int, chunk_overlap: int):
+        self.tokenizer = tokenizer
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def chunk_text(self, text: str) -> list:
+        tokens = self.tokenizer.encode(text)
+        chunks = []
+        start = 0
+        while start < len(tokens):
+            end = min(start + self.chunk_size, len(tokens))
+            chunks.append({"text": self.tokenizer.decode(tokens[start:end]), "token_count": end - start})
+            if end >= len(tokens):
+                break
+            start = end - self.chunk_overlap
+        return chunks
+
+    def chunk_by_paragraphs(self, text: str) -> list:
+        chunks = []
+        current = []
+        current_tokens = 0
+        for para in (p.strip() for p in text.split("\n\n")):
+            if not para:
+                continue
+            para_tokens = len(self.tokenizer.encode(para))
+            if para_tokens > self.chunk_size:
+                if current:
+                    chunks.append({"text": "\n\n".join(current), "token_count": current_tokens})
+                    current, current_tokens = [], 0
+                chunks.extend(self.chunk_text(para))
+            elif current_tokens + para_tokens <= self.chunk_size:
+                current.append(para)
+                current_tokens += para_tokens
+            else:
+                chunks.append({"text": "\n\n".join(current), "token_count": current_tokens})
+                current, current_tokens = [para], para_tokens
+        if current:
+            chunks.append({"text": "\n\n".join(current), "token_count": current_tokens})
+        return chunks
+
+
+def timed(fn) -> tuple:
+    started = time.perf_counter()
+    count = fn()
+    return time.perf_counter() - started, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1,10,100", help="Comma-separated text sizes in MB")
+    parser.add_argument("--chunk-size", type=int, default=600, help="Chunk size in tokens")
+    parser.add_argument("--overlap", type=int, default=100, help="Chunk overlap in tokens")
+    parser.add_argument("--encoding", default="cl100k_base", help="tiktoken encoding")
+    parser.add_argument("--legacy-max-mb", type=float, default=100, help="Skip the legacy chunker above this size")
+    args = parser.parse_args()
+
+    chunker = ChunkingService(chunk_size=args.chunk_size, chunk_overlap=args.overlap, encoding_name=args.encoding)
+    legacy = LegacyChunker(chunker.tokenizer, args.chunk_size, args.overlap)
+    print(f"encode threads: {chunker.encode_threads}\n")
+
+    print(f"{'size':>7} {'mode':<10} {'impl':<7} {'seconds':>9} {'MB/s':>8} {'chunks':>9}")
+    for size_mb in (float(s) for s in args.sizes.split(",")):
+        text = make_text(int(size_mb * 1024 * 1024))
+        runs = [
+            ("tokens", "legacy", lambda: len(legacy.chunk_text(text))),
+            ("tokens", "list", lambda: len(chunker.chunk_text(text))),
+            ("tokens", "stream", lambda: sum(1 for _ in chunker.iter_token_chunks(text))),
+            ("paragraph", "legacy", lambda: len(legacy.chunk_by_paragraphs(text))),
+            ("paragraph", "list", lambda: len(chunker.chunk_by_paragraphs(text))),
+            ("paragraph", "stream", lambda: sum(1 for _ in chunker.iter_paragraph_chunks(text))),
+        ]
+        for mode, impl, fn in runs:
+            if impl == "legacy" and size_mb > args.legacy_max_mb:
+                continue
+            seconds, count = timed(fn)
+            print(f"{size_mb:>5.0f}MB {mode:<10} {impl:<7} {seconds:>9.2f} {size_mb / seconds:>8.2f} {count:>9}")
+
+
+if __name__ == "__main__":
+    main()
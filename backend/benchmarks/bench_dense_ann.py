@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Dense retrieval benchmark: IVF approximate search vs brute force
+
+Builds services.dense_index.IVFIndex on synthetic clustered embeddings and
+reports recall@k against ExactIndex together with per-query latency for a
+range of nprobe values.
+
+Usage:
+    python benchmarks/bench_dense_ann.py --sizes 10000 100000 --dim 384
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.dense_index import ExactIndex, IVFIndex  # noqa: E402
+
+
+def make_vectors(n: int, dim: int, rng, topics: int = 200):
+    """Embeddings drawn around topic centres, like chunks of real documents"""
+    centres = rng.standard_normal((topics, dim)).astype(np.float32)
+    labels = rng.integers(0, topics, size=n)
+    noise = rng.standard_normal((n, dim)).astype(np.float32) * 1.5
+    return centres[labels] + noise, centres
+
+
+def timed(fn, queries):
+    start = time.perf_counter()
+    results = [fn(query) for query in queries]
+    return results, (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+
+    for size in args.sizes:
+        vectors, centres = make_vectors(size, args.dim, rng)
+        ids = [f"c{i}" for i in range(size)]
+        queries = centres[rng.integers(0, len(centres), size=args.queries)] + \
+            rng.standard_normal((args.queries, args.dim)).astype(np.float32) * 1.5
+
+        exact = ExactIndex(vectors, ids)
+        start = time.perf_counter()
+        ivf = IVFIndex(vectors, ids)
+        build = time.perf_counter() - start
+
+        truth, exact_ms = timed(lambda q: exact.search(q, args.top_k), queries)
+        truth_sets = [{chunk_id for chunk_id, _ in result} for result in truth]
+
+        print(f"\n{size:,} vectors x {args.dim} dims, nlist={ivf.nlist}, build {build:.2f}s")
+        print(f"  brute force        {exact_ms:8.3f} ms/query  recall@{args.top_k} 1.000")
+
+        for nprobe in args.nprobe:
+            results, ivf_ms = timed(lambda q: ivf.search(q, args.top_k, nprobe=nprobe), queries)
+            recall = np.mean([
+                len({chunk_id for chunk_id, _ in result} & expected) / args.top_k
+                for result, expected in zip(results, truth_sets)
+            ])
+            print(f"  ivf nprobe={nprobe:<4}   {ivf_ms:8.3f} ms/query  recall@{args.top_k} {recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
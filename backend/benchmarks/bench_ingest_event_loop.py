@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Ingestion vs. chat latency benchmark: parsing on the event loop vs. a process pool
+
+Simulates chat requests (a few milliseconds of awaited I/O each) at a fixed
+rate while several large spreadsheet uploads are parsed and chunked
+concurrently, and reports chat latency percentiles for:
+
+    inline  DocumentProcessor + ChunkingService called on the event loop
+    pool    services.parsing_service.ParsingService (process pool)
+
+Usage:
+    python benchmarks/bench_ingest_event_loop.py --uploads 4 --rows 50000
+    python benchmarks/bench_ingest_event_loop.py --no-chunk   # parsing only (no tokenizer download)
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import openpyxl
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.document_processor import DocumentProcessor  # noqa: E402
+from services.parsing_service import ParsingService  # noqa: E402
+
+
+def make_xlsx(rows: int, cols: int = 8) -> bytes:
+    """Spreadsheet with text and numeric cells"""
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    for r in range(rows):
+        sheet.append([f"item {r} field {c} lorem ipsum" if c % 2 else r * c for c in range(cols)])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+async def chat_probe(latencies: list, stop: asyncio.Event, interval_ms: float, io_ms: float):
+    """Issue a simulated chat request every interval and record its latency"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(io_ms / 1000)
+        latencies.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(interval_ms / 1000)
+
+
+async def ingest_inline(content: bytes, chunker):
+    text = DocumentProcessor.process_file("upload.xlsx", content)
+    if chunker is not None:
+        chunker.chunk_by_paragraphs(text, {"source_id": "bench"})
+
+
+async def ingest_pool(service: ParsingService, tenant: str, content: bytes, chunk: bool):
+    text = await service.parse_file(tenant, "upload.xlsx", content)
+    if chunk:
+        await service.chunk_text(tenant, text, {"source_id": "bench"})
+
+
+async def run(mode: str, documents: list, args) -> dict:
+    latencies: list = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(chat_probe(latencies, stop, args.interval_ms, args.io_ms))
+
+    started = time.perf_counter()
+    if mode == "inline":
+        chunker = None
+        if not args.no_chunk:
+            from services.chunking_service import ChunkingService
+            chunker = ChunkingService()
+        await asyncio.gather(*(ingest_inline(doc, chunker) for doc in documents))
+    else:
+        service = ParsingService(max_workers=args.workers, per_tenant_limit=args.workers)
+        await asyncio.gather(*(
+            ingest_pool(service, f"tenant-{i % 2}", doc, not args.no_chunk) for i, doc in enumerate(documents)
+        ))
+        service.shutdown()
+    ingest_seconds = time.perf_counter() - started
+
+    stop.set()
+    await probe
+    values = np.array(latencies)
+    return {
+        "mode": mode,
+        "ingest_s": ingest_seconds,
+        "requests": len(values),
+        "p50": float(np.percentile(values, 50)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max())
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=4, help="Concurrent uploads")
+    parser.add_argument("--rows", type=int, default=30000, help="Spreadsheet rows per upload")
+    parser.add_argument("--workers", type=int, default=2, help="Parser worker processes")
+    parser.add_argument("--interval-ms", type=float, default=5, help="Gap between simulated chat requests")
+    parser.add_argument("--io-ms", type=float, default=5, help="Awaited I/O per simulated chat request")
+    parser.add_argument("--no-chunk", action="store_true", help="Parse only (skip tokenization/chunking)")
+    args = parser.parse_args()
+
+    print(f"Generating {args.uploads} spreadsheets with {args.rows} rows...")
+    documents = [make_xlsx(args.rows) for _ in range(args.uploads)]
+    print(f"Upload size: {DocumentProcessor.format_size(len(documents[0]))} each\n")
+
+    print(f"{'mode':<8} {'ingest s':>9} {'requests':>9} {'p50 ms':>8} {'p99 ms':>9} {'max ms':>9}")
+    for mode in ("inline", "pool"):
+        r = asyncio.run(run(mode, documents, args))
+        print(f"{r['mode']:<8} {r['ingest_s']:>9.2f} {r['requests']:>9} {r['p50']:>8.2f} {r['p99']:>9.2f} {r['max']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
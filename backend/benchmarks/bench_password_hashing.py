@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Login storm benchmark: bcrypt on the event loop vs. the password hasher pool
+
+Fires concurrent password verifications (a login storm) while a probe
+measures event-loop lag: the probe sleeps for a fixed interval and records
+how late it wakes up. Reports login throughput and lag percentiles for:
+
+    inline  passlib verify called directly in the coroutine (blocks the loop)
+    pool    services.password_hasher.PasswordHasher (bounded thread pool)
+
+Usage:
+    python benchmarks/bench_password_hashing.py --logins 40 --concurrency 20
+    python benchmarks/bench_password_hashing.py --rounds 10 --workers 4
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+from passlib.context import CryptContext
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.password_hasher import PasswordHasher  # noqa: E402
+
+
+async def lag_probe(lags: list, stop: asyncio.Event, interval_ms: float):
+    """Record how late the loop wakes a coroutine sleeping for `interval_ms`"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval_ms / 1000)
+        lags.append(max(0.0, (time.perf_counter() - started) * 1000 - interval_ms))
+
+
+async def run(mode: str, context: CryptContext, hashed: str, args) -> dict:
+    hasher = PasswordHasher(context, max_workers=args.workers)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def login():
+        async with semaphore:
+            if mode == "inline":
+                ok = context.verify("correct horse", hashed)
+            else:
+                ok = await hasher.verify("correct horse", hashed)
+            assert ok
+
+    lags: list = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(lag_probe(lags, stop, args.interval_ms))
+    await asyncio.sleep(0.05)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(args.logins)))
+    seconds = time.perf_counter() - started
+
+    stop.set()
+    await probe
+    hasher.shutdown()
+    values = np.array(lags) if lags else np.zeros(1)
+    return {
+        "mode": mode,
+        "logins_per_s": args.logins / seconds,
+        "probes": len(lags),
+        "p50": float(np.percentile(values, 50)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(values.max())
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=40, help="Password verifications in the storm")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent login requests")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="Hasher pool threads")
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost factor")
+    parser.add_argument("--interval-ms", type=float, default=5, help="Lag probe sleep interval")
+    args = parser.parse_args()
+
+    context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=args.rounds)
+    hashed = context.hash("correct horse")
+    print(f"bcrypt rounds={args.rounds}, cpus={os.cpu_count()}, pool workers={args.workers}\n")
+
+    print(f"{'mode':<8} {'logins/s':>9} {'probes':>7} {'lag p50 ms':>11} {'lag p99 ms':>11} {'lag max ms':>11}")
+    for mode in ("inline", "pool"):
+        r = asyncio.run(run(mode, context, hashed, args))
+        print(f"{r['mode']:<8} {r['logins_per_s']:>9.1f} {r['probes']:>7} {r['p50']:>11.2f} {r['p99']:>11.2f} {r['max']:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Security middleware overhead benchmark: BaseHTTPMiddleware stack vs. pure ASGI
+
+Calls a minimal FastAPI app directly through ASGI (no network, no server)
+and reports the per-request time of:
+
+    bare      the app without security middleware
+    legacy    the previous stack of four BaseHTTPMiddleware subclasses
+              (security headers, rate limit, input validation, API-key
+              protection) with seven patterns searched per value
+    asgi      middleware.security.SecurityMiddleware
+
+Both stacks use the same in-memory rate limiter, so the difference is the
+middleware plumbing and the pattern matching.
+
+Usage:
+    python benchmarks/bench_security_middleware.py --requests 20000
+    python benchmarks/bench_security_middleware.py --query-params 10 --headers 20
+"""
+import argparse
+import asyncio
+import os
+import re
+import sys
+import time
+
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from middleware.security import SUSPICIOUS_PATTERNS, CONTENT_SECURITY_POLICY, SecurityMiddleware  # noqa: E402
+from services.rate_limiter import rate_limiter  # noqa: E402
+
+LIMITS = dict(requests_per_minute=10 ** 9, requests_per_hour=10 ** 9)
+
+
+class LegacySecurityHeadersMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+        response.headers['X-Content-Type-Options'] = 'nosniff'
+        response.headers['X-Frame-Options'] = 'DENY'
+        response.headers['X-XSS-Protection'] = '1; mode=block'
+        response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
+        response.headers['Referrer-Policy'] = 'strict-origin-when-cross-origin'
+        response.headers['Permissions-Policy'] = 'geolocation=(), microphone=(), camera=()'
+        response.headers['Content-Security-Policy'] = CONTENT_SECURITY_POLICY
+        return response
+
+
+class LegacyRateLimitMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app, requests_per_minute: int, requests_per_hour: int):
+        super().__init__(app)
+        self.limits = ((requests_per_minute, 60), (requests_per_hour, 3600))
+
+    async def dispatch(self, request: Request, call_next):
+        forwarded = request.headers.get("X-Forwarded-For")
+        client_ip = forwarded.split(",")[0].strip() if forwarded else request.client.host
+        decision = await rate_limiter.check(client_ip, self.limits)
+        if not decision["allowed"]:
+            return JSONResponse(status_code=status.HTTP_429_TOO_MANY_REQUESTS, content={"detail": decision["message"]})
+        response = await call_next(request)
+        response.headers['X-RateLimit-Limit'] = str(decision["limit"])
+        response.headers['X-RateLimit-Remaining'] = str(decision["remaining"])
+        return response
+
+
+class LegacyInputValidationMiddleware(BaseHTTPMiddleware):
+    def check_suspicious_content(self, text: str) -> bool:
+        text_lower = text.lower()
+        for pattern in SUSPICIOUS_PATTERNS:
+            if re.search(pattern, text_lower, re.IGNORECASE):
+                return True
+        return False
+
+    async def dispatch(self, request: Request, call_next):
+        for key, value in request.query_params.items():
+            if self.check_suspicious_content(str(value)):
+                return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"detail": "Invalid input detected"})
+        for key, value in request.headers.items():
+            if key.lower() not in ['authorization', 'cookie', 'content-type', 'accept']:
+                if self.check_suspicious_content(str(value)):
+                    return JSONResponse(status_code=status.HTTP_400_BAD_REQUEST, content={"detail": "Invalid request headers"})
+        return await call_next(request)
+
+
+class LegacyAPIKeyProtectionMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        return await call_next(request)
+
+
+def make_app(stack: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api/chatbots")
+    async def list_chatbots():
+        return {"chatbots": [{"id": "bench", "name": "Bench bot"}]}
+
+    if stack == "legacy":
+        app.add_middleware(LegacySecurityHeadersMiddleware)
+        app.add_middleware(LegacyRateLimitMiddleware, **LIMITS)
+        app.add_middleware(LegacyInputValidationMiddleware)
+        app.add_middleware(LegacyAPIKeyProtectionMiddleware)
+    elif stack == "asgi":
+        app.add_middleware(SecurityMiddleware, **LIMITS)
+    return app
+
+
+def make_scope(query_params: int, headers: int) -> dict:
+    query = "&".join(f"param{i}=value-{i}-lorem-ipsum" for i in range(query_params))
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/api/chatbots",
+        "raw_path": b"/api/chatbots",
+        "root_path": "",
+        "query_string": query.encode(),
+        "headers": [(b"host", b"localhost"), (b"authorization", b"Bearer abc.def.ghi")] + [
+            (f"x-header-{i}".encode(), f"header value {i} Mozilla/5.0 (X11; Linux x86_64)".encode())
+            for i in range(headers)
+        ],
+        "client": ("10.0.0.1", 50000),
+        "server": ("localhost", 8000),
+    }
+
+
+async def run(app, scope: dict, requests: int) -> float:
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            assert message["status"] == 200, message
+
+    for _ in range(200):
+        await app(dict(scope), receive, send)
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=10000, help="Requests per stack")
+    parser.add_argument("--query-params", type=int, default=3, help="Query parameters per request")
+    parser.add_argument("--headers", type=int, default=10, help="Extra headers per request")
+    args = parser.parse_args()
+
+    scope = make_scope(args.query_params, args.headers)
+    results = {stack: asyncio.run(run(make_app(stack), scope, args.requests)) for stack in ("bare", "legacy", "asgi")}
+
+    print(f"{'stack':<8} {'us/request':>11} {'overhead us':>12}")
+    for stack, micros in results.items():
+        print(f"{stack:<8} {micros:>11.1f} {micros - results['bare']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
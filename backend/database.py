@@ -0,0 +1,164 @@
+"""
+Shared MongoDB client
+
+Every router and service gets its database handle from here, so the whole
+process uses a single AsyncIOMotorClient and therefore a single connection
+pool per MongoDB host. Pool sizing is configured through the environment:
+
+    MONGO_MAX_POOL_SIZE    (default 100)
+    MONGO_MIN_POOL_SIZE    (default 10)   connections kept warm
+    MONGO_MAX_IDLE_TIME_MS (default 60000)
+
+The client is created on first use (server.py does this at import time,
+before the routers are initialized) and closed on shutdown.
+"""
+import os
+import threading
+import logging
+from typing import Any, Dict, Optional
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[AsyncIOMotorClient] = None
+_client_lock = threading.Lock()
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Collects connection pool utilization from pymongo pool events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pools: Dict[str, Dict[str, int]] = {}
+
+    def _pool(self, address) -> Dict[str, int]:
+        key = f"{address[0]}:{address[1]}"
+        pool = self.pools.get(key)
+        if pool is None:
+            pool = self.pools[key] = {
+                "open_connections": 0,
+                "checked_out": 0,
+                "max_checked_out": 0,
+                "connections_created": 0,
+                "connections_closed": 0,
+                "checkouts": 0,
+                "checkout_failures": 0,
+                "pool_clears": 0
+            }
+        return pool
+
+    def pool_created(self, event):
+        with self._lock:
+            self._pool(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._pool(event.address)["pool_clears"] += 1
+
+    def pool_closed(self, event):
+        with self._lock:
+            self.pools.pop(f"{event.address[0]}:{event.address[1]}", None)
+
+    def connection_created(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["open_connections"] += 1
+            pool["connections_created"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["open_connections"] = max(0, pool["open_connections"] - 1)
+            pool["connections_closed"] += 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self._pool(event.address)["checkout_failures"] += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["checkouts"] += 1
+            pool["checked_out"] += 1
+            pool["max_checked_out"] = max(pool["max_checked_out"], pool["checked_out"])
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            pool = self._pool(event.address)
+            pool["checked_out"] = max(0, pool["checked_out"] - 1)
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {address: dict(pool) for address, pool in self.pools.items()}
+
+
+pool_metrics = PoolMetricsListener()
+
+
+def get_pool_options() -> Dict[str, int]:
+    """Pool settings from the environment"""
+    return {
+        "maxPoolSize": int(os.environ.get('MONGO_MAX_POOL_SIZE', '100')),
+        "minPoolSize": int(os.environ.get('MONGO_MIN_POOL_SIZE', '10')),
+        "maxIdleTimeMS": int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '60000'))
+    }
+
+
+def get_client() -> AsyncIOMotorClient:
+    """Get the process-wide MongoDB client (created on first call)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+                options = get_pool_options()
+                _client = AsyncIOMotorClient(mongo_url, event_listeners=[pool_metrics], **options)
+                logger.info(f"MongoDB client created (pool: {options})")
+    return _client
+
+
+def get_database(name: str = None) -> AsyncIOMotorDatabase:
+    """
+    Get a database handle on the shared client
+
+    Args:
+        name: Database name (default: DB_NAME)
+    """
+    return get_client()[name or os.environ.get('DB_NAME', 'chatbase_db')]
+
+
+def get_rag_database() -> AsyncIOMotorDatabase:
+    """Get the database holding retrieval data (chunks, postings, embeddings)"""
+    return get_client()[os.environ.get('MONGO_DB_NAME', 'botsmith')]
+
+
+def close_client():
+    """Close the shared client (application shutdown)"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+            logger.info("MongoDB client closed")
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Connection pool configuration and utilization per MongoDB host"""
+    options = get_pool_options()
+    pools = pool_metrics.snapshot()
+    for pool in pools.values():
+        pool["utilization"] = round(pool["checked_out"] / options["maxPoolSize"] * 100, 2) if options["maxPoolSize"] else 0
+    return {
+        "config": options,
+        "pools": pools
+    }
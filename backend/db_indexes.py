@@ -0,0 +1,323 @@
+"""
+Declarative MongoDB index registry
+
+Indexes for every hot query shape (filter + sort) used by the routers and
+services are declared here and created once at startup by
+`ensure_indexes()`. `report_indexes()` compares the declared indexes with
+the ones that exist and uses `$indexStats` to flag indexes that have not
+served any operation since the server started.
+
+CLI:
+    python db_indexes.py            # report missing / unused / undeclared indexes
+    python db_indexes.py --apply    # create missing indexes, then report
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel, UpdateOne
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Cached embeddings expire this long after their last use (embedding_cache.last_used)
+EMBEDDING_CACHE_TTL_SECONDS = int(os.environ.get('EMBEDDING_CACHE_TTL_DAYS', '30')) * 24 * 3600
+
+# Application database (DB_NAME): collection -> list of (keys, options)
+APP_INDEXES: Dict[str, List[Tuple[List[Tuple[str, int]], Dict[str, Any]]]] = {
+    "users": [
+        ([("id", ASCENDING)], {}),
+        ([("email", ASCENDING)], {}),
+    ],
+    "chatbots": [
+        ([("id", ASCENDING)], {}),
+        ([("user_id", ASCENDING)], {}),
+    ],
+    "conversations": [
+        ([("id", ASCENDING)], {}),
+        # Unique: ConversationResolver creates sessions with an upsert (duplicate
+        # sessions from before are renamed, see dedupe_conversation_sessions)
+        ([("chatbot_id", ASCENDING), ("session_id", ASCENDING)], {"unique": True}),
+        ([("chatbot_id", ASCENDING), ("updated_at", DESCENDING)], {}),
+        ([("chatbot_id", ASCENDING), ("created_at", DESCENDING)], {}),
+        ([("user_id", ASCENDING)], {}),
+    ],
+    "messages": [
+        ([("conversation_id", ASCENDING), ("timestamp", ASCENDING)], {}),
+        ([("chatbot_id", ASCENDING), ("timestamp", DESCENDING)], {}),
+        ([("chatbot_id", ASCENDING), ("role", ASCENDING), ("timestamp", ASCENDING)], {}),
+        ([("user_id", ASCENDING)], {}),
+    ],
+    "sources": [
+        ([("id", ASCENDING)], {}),
+        ([("chatbot_id", ASCENDING), ("status", ASCENDING)], {}),
+        ([("user_id", ASCENDING), ("type", ASCENDING)], {}),
+    ],
+    "subscriptions": [
+        ([("user_id", ASCENDING)], {}),
+    ],
+    "subscription_history": [
+        ([("user_id", ASCENDING), ("timestamp", DESCENDING)], {}),
+    ],
+    "plans": [
+        ([("id", ASCENDING)], {}),
+        ([("name", ASCENDING)], {}),
+    ],
+    "integrations": [
+        ([("id", ASCENDING)], {}),
+        ([("chatbot_id", ASCENDING), ("integration_type", ASCENDING), ("enabled", ASCENDING)], {}),
+        ([("integration_type", ASCENDING), ("enabled", ASCENDING)], {}),
+    ],
+    "integration_logs": [
+        ([("chatbot_id", ASCENDING), ("timestamp", DESCENDING)], {}),
+    ],
+    "msteams_webhooks": [
+        ([("chatbot_id", ASCENDING)], {}),
+    ],
+    "leads": [
+        ([("id", ASCENDING)], {}),
+        ([("user_id", ASCENDING), ("status", ASCENDING)], {}),
+    ],
+    "conversation_ratings": [
+        ([("conversation_id", ASCENDING)], {}),
+        ([("chatbot_id", ASCENDING)], {}),
+    ],
+    "lemon_squeezy_subscriptions": [
+        ([("lemon_squeezy_subscription_id", ASCENDING)], {}),
+        ([("user_id", ASCENDING), ("status", ASCENDING)], {}),
+    ],
+    "notifications": [
+        ([("user_id", ASCENDING), ("read", ASCENDING), ("created_at", DESCENDING)], {}),
+    ],
+    "notification_preferences": [
+        ([("user_id", ASCENDING)], {}),
+    ],
+    # Shared rate limit counters (RATE_LIMIT_BACKEND=mongo); TTL removes idle keys
+    "rate_limits": [
+        ([("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ],
+    "push_subscriptions": [
+        ([("user_id", ASCENDING)], {}),
+    ],
+    "system_logs": [
+        ([("timestamp", DESCENDING)], {}),
+        ([("level", ASCENDING)], {}),
+    ],
+    "answer_cache": [
+        ([("chatbot_id", ASCENDING), ("context_fingerprint", ASCENDING), ("config_fingerprint", ASCENDING)], {}),
+    ],
+}
+
+# Retrieval database (MONGO_DB_NAME)
+RAG_INDEXES: Dict[str, List[Tuple[List[Tuple[str, int]], Dict[str, Any]]]] = {
+    "document_chunks": [
+        ([("chatbot_id", ASCENDING)], {}),
+        ([("source_id", ASCENDING)], {}),
+    ],
+    "chunk_postings": [
+        ([("chatbot_id", ASCENDING), ("term", ASCENDING)], {}),
+        ([("chatbot_id", ASCENDING), ("source_id", ASCENDING)], {}),
+    ],
+    "chunk_index_stats": [
+        ([("chatbot_id", ASCENDING)], {"unique": True}),
+    ],
+    "embedding_cache": [
+        ([("last_used", ASCENDING)], {"expireAfterSeconds": EMBEDDING_CACHE_TTL_SECONDS}),
+    ],
+}
+
+
+async def dedupe_conversation_sessions(collection: AsyncIOMotorCollection) -> int:
+    """
+    Rename duplicate (chatbot_id, session_id) conversations
+
+    Sessions created concurrently before the unique index existed can have
+    several conversations. The oldest one keeps the session (later turns
+    continue there); the others get `session_id` "<session_id>#dup-<id>",
+    so no conversation or message is lost.
+
+    Returns:
+        Number of conversations renamed
+    """
+    pipeline = [
+        {"$sort": {"created_at": ASCENDING}},
+        {"$group": {
+            "_id": {"chatbot_id": "$chatbot_id", "session_id": "$session_id"},
+            "ids": {"$push": "$_id"},
+            "conversation_ids": {"$push": "$id"},
+            "count": {"$sum": 1}
+        }},
+        {"$match": {"count": {"$gt": 1}}}
+    ]
+    ops = []
+    async for group in collection.aggregate(pipeline, allowDiskUse=True):
+        session_id = group["_id"].get("session_id")
+        for _id, conversation_id in zip(group["ids"][1:], group["conversation_ids"][1:]):
+            ops.append(UpdateOne(
+                {"_id": _id},
+                {"$set": {"session_id": f"{session_id}#dup-{conversation_id or _id}"}}
+            ))
+    if ops:
+        await collection.bulk_write(ops, ordered=False)
+        logger.warning(f"Renamed {len(ops)} duplicate sessions in {collection.name}")
+    return len(ops)
+
+
+# Steps making existing data satisfy a collection's unique indexes, run when a build hits duplicates
+UNIQUE_DEDUPE_STEPS: Dict[str, Callable[[AsyncIOMotorCollection], Awaitable[int]]] = {
+    "conversations": dedupe_conversation_sessions,
+}
+
+
+def _key_signature(keys) -> Tuple:
+    """Comparable form of an index key pattern"""
+    return tuple(
+        (field, int(direction) if isinstance(direction, (int, float)) else direction)
+        for field, direction in keys
+    )
+
+
+async def _create_unique_index(collection: AsyncIOMotorCollection, keys, options: Dict[str, Any]) -> str:
+    """Create a unique index, de-duplicating existing data once if the build hits duplicates"""
+    try:
+        return await collection.create_index(keys, **options)
+    except OperationFailure as e:
+        dedupe = UNIQUE_DEDUPE_STEPS.get(collection.name)
+        if e.code != 11000 or dedupe is None:
+            raise
+    await dedupe(collection)
+    return await collection.create_index(keys, **options)
+
+
+async def _apply_registry(db: AsyncIOMotorDatabase, registry: Dict) -> Dict[str, Any]:
+    created = {}
+    for collection_name, specs in registry.items():
+        collection = db[collection_name]
+        names = []
+        errors = []
+        
+        # Unique indexes are built on their own: duplicates in existing data
+        # must not keep the collection's other indexes from being created
+        models = [IndexModel(keys, **options) for keys, options in specs if not options.get("unique")]
+        if models:
+            try:
+                names.extend(await collection.create_indexes(models))
+            except Exception as e:
+                logger.error(f"Failed to create indexes on {db.name}.{collection_name}: {str(e)}")
+                errors.append(str(e))
+        
+        for keys, options in specs:
+            if not options.get("unique"):
+                continue
+            try:
+                names.append(await _create_unique_index(collection, keys, options))
+            except Exception as e:
+                fields = ", ".join(field for field, _ in keys)
+                logger.error(
+                    f"Failed to create unique index ({fields}) on {db.name}.{collection_name}: {str(e)}. "
+                    f"Remove or rename the documents sharing the same ({fields}) and restart "
+                    f"(or run `python db_indexes.py --apply`)"
+                )
+                errors.append(str(e))
+        
+        created[collection_name] = {"indexes": names, "error": "; ".join(errors)} if errors else names
+    return created
+
+
+async def ensure_indexes(app_db: AsyncIOMotorDatabase, rag_db: AsyncIOMotorDatabase) -> Dict[str, Any]:
+    """
+    Create every declared index (no-op for indexes that already exist)
+
+    Args:
+        app_db: Application database
+        rag_db: Retrieval database
+
+    Returns:
+        Index names per collection (with the errors, if some could not be built)
+    """
+    result = {
+        app_db.name: await _apply_registry(app_db, APP_INDEXES),
+        rag_db.name: await _apply_registry(rag_db, RAG_INDEXES)
+    }
+    logger.info("Database indexes ensured")
+    return result
+
+
+async def _report_registry(db: AsyncIOMotorDatabase, registry: Dict) -> Dict[str, Any]:
+    report = {}
+    collection_names = set(await db.list_collection_names()) | set(registry.keys())
+
+    for collection_name in sorted(collection_names):
+        collection = db[collection_name]
+        declared = {_key_signature(keys) for keys, _ in registry.get(collection_name, [])}
+
+        existing = {}
+        try:
+            async for index in collection.list_indexes():
+                existing[index["name"]] = _key_signature(index["key"].items())
+        except Exception:
+            existing = {}
+
+        usage = {}
+        try:
+            async for stat in collection.aggregate([{"$indexStats": {}}]):
+                usage[stat["name"]] = int(stat.get("accesses", {}).get("ops", 0))
+        except Exception as e:
+            logger.warning(f"$indexStats unavailable for {db.name}.{collection_name}: {str(e)}")
+
+        existing_signatures = set(existing.values())
+        entry = {
+            "missing": [list(map(list, signature)) for signature in declared - existing_signatures],
+            "unused": sorted(
+                name for name in existing
+                if name != "_id_" and name in usage and usage[name] == 0
+            ),
+            "undeclared": sorted(
+                name for name, signature in existing.items()
+                if name != "_id_" and signature not in declared
+            ),
+            "ops": usage
+        }
+        if entry["missing"] or entry["unused"] or entry["undeclared"] or collection_name in registry:
+            report[collection_name] = entry
+
+    return report
+
+
+async def report_indexes(app_db: AsyncIOMotorDatabase, rag_db: AsyncIOMotorDatabase) -> Dict[str, Any]:
+    """
+    Report missing, unused and undeclared indexes
+
+    `unused` lists indexes with zero `$indexStats` operations since the
+    mongod process started; `undeclared` lists indexes that exist but are not
+    in the registry (candidates for dropping).
+    """
+    return {
+        app_db.name: await _report_registry(app_db, APP_INDEXES),
+        rag_db.name: await _report_registry(rag_db, RAG_INDEXES)
+    }
+
+
+async def _main(apply: bool):
+    from database import get_database, get_rag_database, close_client
+
+    app_db, rag_db = get_database(), get_rag_database()
+    if apply:
+        await ensure_indexes(app_db, rag_db)
+    print(json.dumps(await report_indexes(app_db, rag_db), indent=2))
+    close_client()
+
+
+if __name__ == "__main__":
+    import argparse
+    from pathlib import Path
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).parent / '.env')
+
+    parser = argparse.ArgumentParser(description="Report (and optionally create) MongoDB indexes")
+    parser.add_argument("--apply", action="store_true", help="Create missing indexes before reporting")
+    args = parser.parse_args()
+    asyncio.run(_main(args.apply))
@@ -1,9 +1,7 @@
 """Security middleware package"""
 from .security import (
-    SecurityHeadersMiddleware,
-    RateLimitMiddleware,
-    InputValidationMiddleware,
-    APIKeyProtectionMiddleware,
+    SecurityMiddleware,
+    check_suspicious_content,
     sanitize_input,
     validate_email,
     validate_url,
@@ -11,10 +9,8 @@ from .security import (
 )
 
 __all__ = [
-    'SecurityHeadersMiddleware',
-    'RateLimitMiddleware',
-    'InputValidationMiddleware',
-    'APIKeyProtectionMiddleware',
+    'SecurityMiddleware',
+    'check_suspicious_content',
     'sanitize_input',
     'validate_email',
     'validate_url',
@@ -2,20 +2,16 @@
 Security Middleware for BotSmith API
 Implements rate limiting, security headers, and request validation
 """
-from fastapi import Request, HTTPException, status
+from urllib.parse import parse_qsl
+from fastapi import status
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
-from datetime import datetime, timedelta
-from collections import defaultdict
-from typing import Dict, Tuple
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from services.rate_limiter import rate_limiter
 import logging
 import re
 
 logger = logging.getLogger(__name__)
 
-# Rate limiting storage (in-memory - use Redis in production)
-rate_limit_storage: Dict[str, list] = defaultdict(list)
-
 # Security patterns to block
 SUSPICIOUS_PATTERNS = [
     r'<script[^>]*>.*?</script>',  # XSS attempts
@@ -27,172 +23,168 @@ SUSPICIOUS_PATTERNS = [
     r'0x[0-9a-f]+',  # Hex encoded attacks
 ]
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    """Add security headers to all responses"""
-    
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        
-        # Security headers
-        response.headers['X-Content-Type-Options'] = 'nosniff'
-        response.headers['X-Frame-Options'] = 'DENY'
-        response.headers['X-XSS-Protection'] = '1; mode=block'
-        response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
-        response.headers['Referrer-Policy'] = 'strict-origin-when-cross-origin'
-        response.headers['Permissions-Policy'] = 'geolocation=(), microphone=(), camera=()'
-        
-        # Content Security Policy
-        # Allow CDN resources for Swagger UI documentation
-        csp = (
-            "default-src 'self'; "
-            "script-src 'self' 'unsafe-inline' 'unsafe-eval' https://cdn.jsdelivr.net; "
-            "style-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net; "
-            "img-src 'self' data: https:; "
-            "font-src 'self' data: https://cdn.jsdelivr.net; "
-            "connect-src 'self' https: wss:; "
-            "frame-ancestors 'none';"
-        )
-        response.headers['Content-Security-Policy'] = csp
-        
-        return response
+# All patterns in one alternation, compiled once and matched against lowercased
+# text. The lookahead (first characters of the patterns above) skips positions
+# where no pattern can start without trying every alternative.
+SUSPICIOUS_REGEX = re.compile(
+    '(?=[<jeo.0uisdca])(?:' + '|'.join(f'(?:{pattern})' for pattern in SUSPICIOUS_PATTERNS) + ')'
+)
+
+# Headers that are not checked for suspicious content
+UNCHECKED_HEADERS = frozenset([b'authorization', b'cookie', b'content-type', b'accept'])
+
+# Paths that are not rate limited (health checks)
+RATE_LIMIT_EXEMPT_PATHS = frozenset(["/", "/health", "/api/", "/api/health"])
+
+# Content Security Policy
+# Allow CDN resources for Swagger UI documentation
+CONTENT_SECURITY_POLICY = (
+    "default-src 'self'; "
+    "script-src 'self' 'unsafe-inline' 'unsafe-eval' https://cdn.jsdelivr.net; "
+    "style-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net; "
+    "img-src 'self' data: https:; "
+    "font-src 'self' data: https://cdn.jsdelivr.net; "
+    "connect-src 'self' https: wss:; "
+    "frame-ancestors 'none';"
+)
+
+# Security headers added to every response, encoded once
+SECURITY_HEADERS = [
+    (name.lower().encode('latin-1'), value.encode('latin-1'))
+    for name, value in [
+        ('X-Content-Type-Options', 'nosniff'),
+        ('X-Frame-Options', 'DENY'),
+        ('X-XSS-Protection', '1; mode=block'),
+        ('Strict-Transport-Security', 'max-age=31536000; includeSubDomains'),
+        ('Referrer-Policy', 'strict-origin-when-cross-origin'),
+        ('Permissions-Policy', 'geolocation=(), microphone=(), camera=()'),
+        ('Content-Security-Policy', CONTENT_SECURITY_POLICY),
+    ]
+]
 
+# Response headers set by this middleware (existing values are replaced)
+MANAGED_HEADERS = frozenset(
+    [name for name, _ in SECURITY_HEADERS] + [b'x-ratelimit-limit', b'x-ratelimit-remaining']
+)
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Rate limiting middleware to prevent API abuse"""
+
+def check_suspicious_content(text: str) -> bool:
+    """Check if text contains suspicious patterns"""
+    return SUSPICIOUS_REGEX.search(text.lower()) is not None
+
+
+class SecurityMiddleware:
+    """
+    Pure-ASGI security layer for HTTP requests
     
-    def __init__(self, app, requests_per_minute: int = 60, requests_per_hour: int = 1000):
-        super().__init__(app)
-        self.requests_per_minute = requests_per_minute
-        self.requests_per_hour = requests_per_hour
+    In one pass per request it:
+    - rejects suspicious query parameters and headers (400)
+    - rate limits per client IP (429, see services.rate_limiter; set
+      RATE_LIMIT_BACKEND=mongo so limits hold across uvicorn workers)
+    - adds the security and rate limit headers to the response
     
-    def get_client_ip(self, request: Request) -> str:
-        """Get client IP from request"""
-        forwarded = request.headers.get("X-Forwarded-For")
-        if forwarded:
-            return forwarded.split(",")[0].strip()
-        return request.client.host if request.client else "unknown"
+    Unlike BaseHTTPMiddleware it does not wrap the request in an extra task
+    or re-stream the response body: headers are added to the
+    `http.response.start` message as it is sent. WebSocket and lifespan
+    scopes pass through untouched.
+    """
     
-    def is_rate_limited(self, client_ip: str) -> Tuple[bool, str]:
-        """Check if client is rate limited"""
-        now = datetime.now()
-        
-        # Clean old entries
-        rate_limit_storage[client_ip] = [
-            timestamp for timestamp in rate_limit_storage[client_ip]
-            if now - timestamp < timedelta(hours=1)
-        ]
-        
-        requests = rate_limit_storage[client_ip]
-        
-        # Check per-minute limit
-        minute_ago = now - timedelta(minutes=1)
-        recent_requests = [ts for ts in requests if ts > minute_ago]
-        if len(recent_requests) >= self.requests_per_minute:
-            return True, f"Rate limit exceeded: {self.requests_per_minute} requests per minute"
+    def __init__(self, app: ASGIApp, requests_per_minute: int = 60, requests_per_hour: int = 1000):
+        self.app = app
+        self.requests_per_minute = requests_per_minute
+        self.requests_per_hour = requests_per_hour
+        self.limits = ((requests_per_minute, 60), (requests_per_hour, 3600))
+    
+    @staticmethod
+    def get_client_ip(scope: Scope) -> str:
+        """Get client IP from X-Forwarded-For or the connection"""
+        for name, value in scope["headers"]:
+            if name == b'x-forwarded-for':
+                return value.decode('latin-1').split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+    
+    @staticmethod
+    def validate_input(scope: Scope):
+        """Bad-request response for suspicious query parameters or headers, else None"""
+        query_string = scope.get("query_string", b"")
+        if query_string:
+            for key, value in parse_qsl(query_string.decode('latin-1'), keep_blank_values=True):
+                if check_suspicious_content(value):
+                    logger.warning(f"Suspicious content in query param: {key}={value}")
+                    return JSONResponse(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        content={
+                            "detail": "Invalid input detected",
+                            "error": "security_violation"
+                        }
+                    )
         
-        # Check per-hour limit
-        if len(requests) >= self.requests_per_hour:
-            return True, f"Rate limit exceeded: {self.requests_per_hour} requests per hour"
+        for name, value in scope["headers"]:
+            if name not in UNCHECKED_HEADERS and check_suspicious_content(value.decode('latin-1')):
+                logger.warning(f"Suspicious content in header: {name.decode('latin-1')}")
+                return JSONResponse(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    content={
+                        "detail": "Invalid request headers",
+                        "error": "security_violation"
+                    }
+                )
+        return None
+    
+    @staticmethod
+    def add_headers(send: Send, extra_headers=()) -> Send:
+        """Wrap `send` to add the security (and rate limit) headers to the response"""
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                headers = [
+                    header for header in message.get("headers", [])
+                    if header[0].lower() not in MANAGED_HEADERS
+                ]
+                headers.extend(SECURITY_HEADERS)
+                headers.extend(extra_headers)
+                message["headers"] = headers
+            await send(message)
+        return send_with_headers
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        rejection = self.validate_input(scope)
+        if rejection is not None:
+            await rejection(scope, receive, self.add_headers(send))
+            return
         
-        return False, ""
-    
-    async def dispatch(self, request: Request, call_next):
         # Skip rate limiting for health checks
-        if request.url.path in ["/", "/health", "/api/", "/api/health"]:
-            return await call_next(request)
+        if scope["path"] in RATE_LIMIT_EXEMPT_PATHS:
+            await self.app(scope, receive, self.add_headers(send))
+            return
         
-        client_ip = self.get_client_ip(request)
-        is_limited, message = self.is_rate_limited(client_ip)
+        client_ip = self.get_client_ip(scope)
+        decision = await rate_limiter.check(client_ip, self.limits)
         
-        if is_limited:
+        if not decision["allowed"]:
             logger.warning(f"Rate limit exceeded for IP: {client_ip}")
-            return JSONResponse(
+            response = JSONResponse(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 content={
-                    "detail": message,
+                    "detail": decision["message"],
                     "error": "rate_limit_exceeded",
-                    "retry_after": "60 seconds"
-                }
+                    "retry_after": f"{decision['retry_after']} seconds"
+                },
+                headers={"Retry-After": str(decision["retry_after"])}
             )
-        
-        # Record this request
-        rate_limit_storage[client_ip].append(datetime.now())
-        
-        response = await call_next(request)
+            await response(scope, receive, self.add_headers(send))
+            return
         
         # Add rate limit headers
-        response.headers['X-RateLimit-Limit'] = str(self.requests_per_minute)
-        response.headers['X-RateLimit-Remaining'] = str(
-            self.requests_per_minute - len([
-                ts for ts in rate_limit_storage[client_ip]
-                if datetime.now() - ts < timedelta(minutes=1)
-            ])
+        rate_limit_headers = (
+            (b'x-ratelimit-limit', str(decision["limit"]).encode('latin-1')),
+            (b'x-ratelimit-remaining', str(decision["remaining"]).encode('latin-1')),
         )
-        
-        return response
-
-
-class InputValidationMiddleware(BaseHTTPMiddleware):
-    """Validate inputs to prevent injection attacks"""
-    
-    def check_suspicious_content(self, text: str) -> bool:
-        """Check if text contains suspicious patterns"""
-        text_lower = text.lower()
-        for pattern in SUSPICIOUS_PATTERNS:
-            if re.search(pattern, text_lower, re.IGNORECASE):
-                return True
-        return False
-    
-    async def dispatch(self, request: Request, call_next):
-        # Check URL parameters
-        for key, value in request.query_params.items():
-            if self.check_suspicious_content(str(value)):
-                logger.warning(f"Suspicious content in query param: {key}={value}")
-                return JSONResponse(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    content={
-                        "detail": "Invalid input detected",
-                        "error": "security_violation"
-                    }
-                )
-        
-        # Check headers for suspicious content
-        for key, value in request.headers.items():
-            if key.lower() not in ['authorization', 'cookie', 'content-type', 'accept']:
-                if self.check_suspicious_content(str(value)):
-                    logger.warning(f"Suspicious content in header: {key}")
-                    return JSONResponse(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        content={
-                            "detail": "Invalid request headers",
-                            "error": "security_violation"
-                        }
-                    )
-        
-        return await call_next(request)
-
-
-class APIKeyProtectionMiddleware(BaseHTTPMiddleware):
-    """Protect against API key exposure"""
-    
-    SENSITIVE_PATTERNS = [
-        r'sk-[a-zA-Z0-9]{20,}',  # OpenAI keys
-        r'key_[a-zA-Z0-9]{20,}',  # Generic API keys
-        r'AIza[a-zA-Z0-9_-]{35}',  # Google API keys
-        r'AKIA[a-zA-Z0-9]{16}',  # AWS keys
-        r'gh[pousr]_[a-zA-Z0-9]{36}',  # GitHub tokens
-    ]
-    
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        
-        # Check response body for exposed keys (only for JSON responses)
-        if response.headers.get('content-type', '').startswith('application/json'):
-            # Note: In production, you'd want to use streaming response
-            # This is a simplified version for demonstration
-            pass
-        
-        return response
+        await self.app(scope, receive, self.add_headers(send, rate_limit_headers))
 
 
 def sanitize_input(text: str) -> str:
@@ -533,6 +533,15 @@ class Chatbot(BaseModel):
     # Webhooks
     webhook_url: Optional[str] = None
     webhook_events: List[str] = []
+    
+    # Retrieval Settings (None = server default)
+    retrieval_mode: Optional[Literal["lexical", "dense", "hybrid"]] = None
+    fusion_method: Optional[Literal["rrf", "weighted"]] = None
+    lexical_weight: Optional[float] = None
+    
+    # Answer Cache (opt-in): reuse answers to near-duplicate questions
+    answer_cache_enabled: bool = False
+    answer_cache_threshold: Optional[float] = None  # None = server default
 
 
 class ChatbotCreate(BaseModel):
@@ -573,6 +582,11 @@ class ChatbotUpdate(BaseModel):
     messages_per_hour: Optional[int] = None
     webhook_url: Optional[str] = None
     webhook_events: Optional[List[str]] = None
+    retrieval_mode: Optional[Literal["lexical", "dense", "hybrid"]] = None
+    fusion_method: Optional[Literal["rrf", "weighted"]] = None
+    lexical_weight: Optional[float] = Field(default=None, ge=0.0, le=1.0)
+    answer_cache_enabled: Optional[bool] = None
+    answer_cache_threshold: Optional[float] = Field(default=None, ge=0.0, le=1.0)
 
 
 class ChatbotResponse(BaseModel):
@@ -603,6 +617,11 @@ class ChatbotResponse(BaseModel):
     widget_theme: str = "auto"
     widget_size: str = "medium"
     auto_expand: bool = False
+    retrieval_mode: Optional[str] = None
+    fusion_method: Optional[str] = None
+    lexical_weight: Optional[float] = None
+    answer_cache_enabled: bool = False
+    answer_cache_threshold: Optional[float] = None
 
 
 # Source Models
@@ -627,6 +646,7 @@ class Source(BaseModel):
     file_path: Optional[str] = None
     file_type: Optional[str] = None
     file_size: Optional[int] = None
+    content_hash: Optional[str] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     status: Literal["processing", "completed", "failed"] = "processing"
     error_message: Optional[str] = None
@@ -675,6 +695,7 @@ class MessageRecord(BaseModel):
     content: str
     timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     session_id: Optional[str] = None
+    from_cache: bool = False  # Assistant answer served from the answer cache
 
 
 # Alias for compatibility
@@ -772,6 +793,14 @@ class TopQuestionsAnalytics(BaseModel):
     total_unique_questions: int
 
 
+class AnswerCacheAnalytics(BaseModel):
+    """Answer cache usage response"""
+    chatbot_id: str
+    total_responses: int
+    cached_responses: int
+    cache_hit_rate: float
+
+
 class SatisfactionAnalytics(BaseModel):
     """Satisfaction ratings analytics response"""
     chatbot_id: str
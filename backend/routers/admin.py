@@ -11,6 +11,22 @@ import psutil
 import os
 from uuid import uuid4
 import logging
+from database import get_pool_stats, get_rag_database
+from db_indexes import report_indexes
+from services.cache_service import cache_service
+from services.index_cache import index_cache
+from services.retrieval_cache import retrieval_cache
+from services.embedding_cache import embedding_cache
+from services.answer_cache import answer_cache
+from services.counter_aggregator import counter_aggregator
+from services.message_writer import message_writer
+from services.conversation_resolver import conversation_resolver
+from services.parsing_service import parsing_service
+from services.website_crawler import website_crawler
+from services.upload_spooler import upload_spooler
+from services.rate_limiter import rate_limiter
+from services.user_cache import user_cache
+from services.password_hasher import password_hasher
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 db_instance = None
@@ -722,6 +738,7 @@ async def delete_user(user_id: str):
         
         # Delete the user from users collection
         user_result = await users_collection.delete_one({"id": user_id})
+        user_cache.invalidate_user(user_id)
         
         if user_result.deleted_count == 0:
             raise HTTPException(status_code=404, detail=f"User {user_id} not found")
@@ -915,6 +932,9 @@ async def bulk_chatbot_operations(operation: BulkOperation):
         
         if operation.operation == "delete":
             result = await chatbots_collection.delete_many({"id": {"$in": operation.ids}})
+            # Drop every cached chatbot document rather than one key per id
+            cache_service.invalidate_prefix("chatbot:")
+            cache_service.invalidate_prefix("public_chatbot:")
             return {
                 "success": True,
                 "operation": "delete",
@@ -2195,6 +2215,76 @@ async def get_system_health():
         }
 
 
+@router.get("/system/caches")
+async def get_cache_stats():
+    """Get hit/miss statistics of the in-process caches"""
+    return {
+        "cache_service": cache_service.get_stats(),
+        "retrieval_cache": retrieval_cache.get_stats(),
+        "index_cache": index_cache.get_stats(),
+        "embedding_cache": embedding_cache.get_stats(),
+        "answer_cache": answer_cache.get_stats(),
+        "conversation_resolver": conversation_resolver.get_stats(),
+        "user_cache": user_cache.get_stats()
+    }
+
+
+@router.get("/system/db-pool")
+async def get_db_pool_stats():
+    """Get MongoDB connection pool configuration and utilization"""
+    return get_pool_stats()
+
+
+@router.get("/system/counters")
+async def get_counter_stats():
+    """Get write-behind counter aggregator statistics (pending deltas, flushes)"""
+    return counter_aggregator.get_stats()
+
+
+@router.get("/system/message-writer")
+async def get_message_writer_stats():
+    """Get batched message writer statistics (queue depth, flush latency)"""
+    return message_writer.get_stats()
+
+
+@router.get("/system/parsers")
+async def get_parser_stats():
+    """Get document parser pool statistics (jobs, timeouts, pool restarts)"""
+    return parsing_service.get_stats()
+
+
+@router.get("/system/uploads")
+async def get_upload_stats():
+    """Get upload spooler statistics (active, spooled, rejected)"""
+    return upload_spooler.get_stats()
+
+
+@router.get("/system/crawler")
+async def get_crawler_stats():
+    """Get website crawler statistics (pages fetched, 304s, ingested)"""
+    return website_crawler.get_stats()
+
+
+@router.get("/system/rate-limits")
+async def get_rate_limit_stats():
+    """Get rate limiter statistics (checks, rejections, tracked keys)"""
+    return rate_limiter.get_stats()
+
+
+@router.get("/system/password-hasher")
+async def get_password_hasher_stats():
+    """Get bcrypt hasher pool statistics (active, waiting, avg ms)"""
+    return password_hasher.get_stats()
+
+
+@router.get("/system/indexes")
+async def get_index_report():
+    """Report missing, unused ($indexStats) and undeclared MongoDB indexes"""
+    if db_instance is None:
+        raise HTTPException(status_code=500, detail="Database not initialized")
+    return await report_indexes(db_instance, get_rag_database())
+
+
 @router.get("/system/activity")
 async def get_real_time_activity():
     """Get real-time system activity"""
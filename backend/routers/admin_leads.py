@@ -4,15 +4,13 @@ from datetime import datetime, timezone
 import csv
 import io
 import uuid
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
+from database import get_client
 from models import Lead, LeadCreate, LeadResponse
 
 router = APIRouter()
 
 # MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = AsyncIOMotorClient(MONGO_URL)
+client = get_client()
 db = client.chatbase_db
 
 
@@ -6,7 +6,7 @@ Handles system-wide settings management
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel, Field
 from typing import Optional, Dict, Any, List
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import get_client
 from datetime import datetime
 import logging
 import os
@@ -15,11 +15,10 @@ router = APIRouter()
 logger = logging.getLogger(__name__)
 
 # MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
 DB_NAME = os.environ.get('DB_NAME', 'chatbase_db')
 
 def get_database():
-    client = AsyncIOMotorClient(MONGO_URL)
+    client = get_client()
     return client[DB_NAME]
 
 # ========================================
@@ -7,7 +7,9 @@ from models import (
     User, AdminUserUpdate, PasswordReset, LoginHistory, LoginHistoryResponse,
     ActivityLog, ActivityLogResponse, BulkUserOperation
 )
-from passlib.context import CryptContext
+from services.user_cache import user_cache
+from services.password_hasher import password_hasher
+from services.plan_service import plan_service
 import logging
 import uuid
 import json
@@ -16,7 +18,6 @@ import csv
 
 router = APIRouter(prefix="/admin/users", tags=["admin-users"])
 db_instance = None
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 logger = logging.getLogger(__name__)
 
@@ -249,10 +250,15 @@ async def update_user(user_id: str, update_data: AdminUserUpdate):
             {'id': user_id},
             {'$set': update_doc}
         )
+        user_cache.invalidate_user(user_id)
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="User not found")
         
+        # Custom limits are precomputed on the subscription for quota reservation
+        if any(field.startswith("custom_max_") for field in update_doc):
+            await plan_service.refresh_effective_limits(user_id)
+        
         # Log activity
         await log_activity(
             user_id="admin",
@@ -299,6 +305,7 @@ async def delete_user(user_id: str):
         
         # Delete user
         result = await users_collection.delete_one({'id': user_id})
+        user_cache.invalidate_user(user_id)
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="User not found")
@@ -333,7 +340,7 @@ async def reset_user_password(user_id: str, password_data: PasswordReset):
         users_collection = db_instance['users']
         
         # Hash new password
-        hashed_password = pwd_context.hash(password_data.new_password)
+        hashed_password = await password_hasher.hash(password_data.new_password)
         
         result = await users_collection.update_one(
             {'id': user_id},
@@ -342,6 +349,7 @@ async def reset_user_password(user_id: str, password_data: PasswordReset):
                 'updated_at': datetime.now(timezone.utc)
             }}
         )
+        user_cache.invalidate_user(user_id)
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="User not found")
@@ -559,6 +567,7 @@ async def bulk_user_operation(operation: BulkUserOperation):
                     'updated_at': datetime.now(timezone.utc)
                 }}
             )
+            user_cache.invalidate_users(operation.user_ids)
             results["processed"] = result.modified_count
             
             # Log activity
@@ -580,6 +589,7 @@ async def bulk_user_operation(operation: BulkUserOperation):
                     'updated_at': datetime.now(timezone.utc)
                 }}
             )
+            user_cache.invalidate_users(operation.user_ids)
             results["processed"] = result.modified_count
             
             # Log activity
@@ -598,6 +608,7 @@ async def bulk_user_operation(operation: BulkUserOperation):
                 {'id': {'$in': operation.user_ids}},
                 {'$addToSet': {'tags': {'$each': operation.tags}}}
             )
+            user_cache.invalidate_users(operation.user_ids)
             results["processed"] = result.modified_count
         
         elif operation.operation == "export":
@@ -682,6 +693,7 @@ async def add_user_note(user_id: str, note: dict):
                 'updated_at': datetime.now(timezone.utc)
             }}
         )
+        user_cache.invalidate_user(user_id)
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="User not found")
@@ -727,7 +739,7 @@ async def create_user(user_data: dict):
         
         # Create user
         user_id = str(uuid.uuid4())
-        hashed_password = pwd_context.hash(password)
+        hashed_password = await password_hasher.hash(password)
         
         new_user = {
             'id': user_id,
@@ -931,6 +943,7 @@ async def suspend_user(user_id: str, suspension_data: dict):
             {'id': user_id},
             {'$set': update_doc}
         )
+        user_cache.invalidate_user(user_id)
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="User not found")
@@ -977,6 +990,7 @@ async def unsuspend_user(user_id: str):
                 'updated_at': datetime.now(timezone.utc)
             }}
         )
+        user_cache.invalidate_user(user_id)
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="User not found")
@@ -1021,6 +1035,7 @@ async def ban_user(user_id: str, ban_data: dict):
                 'updated_at': datetime.now(timezone.utc)
             }}
         )
+        user_cache.invalidate_user(user_id)
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="User not found")
@@ -1063,6 +1078,7 @@ async def unban_user(user_id: str):
                 'updated_at': datetime.now(timezone.utc)
             }}
         )
+        user_cache.invalidate_user(user_id)
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="User not found")
@@ -1104,6 +1120,7 @@ async def verify_user_email(user_id: str):
                 'updated_at': datetime.now(timezone.utc)
             }}
         )
+        user_cache.invalidate_user(user_id)
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="User not found")
@@ -1726,6 +1743,7 @@ async def ultimate_update_user(user_id: str, update_data: Dict[str, Any]):
             {"id": user_id},
             {"$set": update_doc}
         )
+        user_cache.invalidate_user(user_id)
         
         if result.modified_count > 0 or result.matched_count > 0:
             # CRITICAL FIX: Update subscription plan_id if changed
@@ -1764,6 +1782,10 @@ async def ultimate_update_user(user_id: str, update_data: Dict[str, Any]):
                     await subscriptions_collection.insert_one(new_subscription)
                     logger.info(f"Created new subscription with plan_id {update_data['plan_id']} for user {user_id}")
             
+            # Custom limits are precomputed on the subscription for quota reservation
+            if "custom_limits" in update_data:
+                await plan_service.refresh_effective_limits(user_id)
+            
             # Log activity
             await log_activity(
                 user_id=user_id,
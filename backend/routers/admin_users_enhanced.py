@@ -9,6 +9,7 @@ from models import (
     UserNote, ImpersonationSession, ImpersonationRequest
 )
 from passlib.context import CryptContext
+from services.user_cache import user_cache
 import logging
 import json
 from collections import defaultdict
@@ -736,6 +737,7 @@ async def update_user_lifecycle(user_id: str, lifecycle_data: dict):
             {'id': user_id},
             {'$set': update_doc}
         )
+        user_cache.invalidate_user(user_id)
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="User not found")
@@ -1061,6 +1063,7 @@ async def add_user_note(user_id: str, note_data: dict):
             {'id': user_id},
             {'$push': {'internal_notes': note.model_dump()}}
         )
+        user_cache.invalidate_user(user_id)
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="User not found")
@@ -1126,6 +1129,7 @@ async def execute_bulk_operation(operation: BulkUserOperation, background_tasks:
                 {'id': {'$in': operation.user_ids}},
                 {'$addToSet': {'tags': tag}}
             )
+            user_cache.invalidate_users(operation.user_ids)
             return {"success": True, "message": f"Tag added to {result.modified_count} users"}
         
         elif operation.operation == "remove_tag":
@@ -1134,6 +1138,7 @@ async def execute_bulk_operation(operation: BulkUserOperation, background_tasks:
                 {'id': {'$in': operation.user_ids}},
                 {'$pull': {'tags': tag}}
             )
+            user_cache.invalidate_users(operation.user_ids)
             return {"success": True, "message": f"Tag removed from {result.modified_count} users"}
         
         elif operation.operation == "add_segment":
@@ -1142,6 +1147,7 @@ async def execute_bulk_operation(operation: BulkUserOperation, background_tasks:
                 {'id': {'$in': operation.user_ids}},
                 {'$addToSet': {'segments': segment}}
             )
+            user_cache.invalidate_users(operation.user_ids)
             return {"success": True, "message": f"Segment added to {result.modified_count} users"}
         
         elif operation.operation == "send_email":
@@ -1163,6 +1169,7 @@ async def execute_bulk_operation(operation: BulkUserOperation, background_tasks:
                 {'id': {'$in': operation.user_ids}},
                 {'$set': {'role': new_role}}
             )
+            user_cache.invalidate_users(operation.user_ids)
             return {"success": True, "message": f"Role updated for {result.modified_count} users"}
         
         elif operation.operation == "change_status":
@@ -1171,6 +1178,7 @@ async def execute_bulk_operation(operation: BulkUserOperation, background_tasks:
                 {'id': {'$in': operation.user_ids}},
                 {'$set': {'status': new_status}}
             )
+            user_cache.invalidate_users(operation.user_ids)
             return {"success": True, "message": f"Status updated for {result.modified_count} users"}
         
         elif operation.operation == "delete":
@@ -1247,6 +1255,7 @@ async def delete_user_data(user_id: str):
         
         # Delete user
         await users_collection.delete_one({'id': user_id})
+        user_cache.invalidate_user(user_id)
         
     except Exception as e:
         logger.error(f"Error deleting user data for {user_id}: {str(e)}")
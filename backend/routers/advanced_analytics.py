@@ -3,11 +3,12 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import Optional
 from datetime import datetime, timedelta, timezone
 from collections import Counter
-import re
 from models import (
     TrendAnalytics, TrendDataPoint, TopQuestionsAnalytics, TopQuestion,
-    SatisfactionAnalytics, PerformanceMetrics, RatingCreate, RatingResponse
+    SatisfactionAnalytics, PerformanceMetrics, RatingCreate, RatingResponse,
+    AnswerCacheAnalytics
 )
+from services.answer_cache import normalize_question
 
 router = APIRouter(prefix="/analytics", tags=["advanced-analytics"])
 db_instance = None
@@ -109,10 +110,8 @@ async def get_top_questions(
     # Extract and normalize questions
     questions = []
     for msg in messages:
-        content = msg.get("content", "").strip().lower()
-        # Remove punctuation and extra spaces
-        content = re.sub(r'[^\w\s]', '', content)
-        content = re.sub(r'\s+', ' ', content)
+        # Lowercase, remove punctuation and extra spaces
+        content = normalize_question(msg.get("content", ""))
         if content:
             questions.append(content)
     
@@ -139,6 +138,27 @@ async def get_top_questions(
     )
 
 
+@router.get("/answer-cache/{chatbot_id}", response_model=AnswerCacheAnalytics)
+async def get_answer_cache_analytics(chatbot_id: str):
+    """Get how many responses were served from the answer cache"""
+    total_responses = await db_instance.messages.count_documents({
+        "chatbot_id": chatbot_id,
+        "role": "assistant"
+    })
+    cached_responses = await db_instance.messages.count_documents({
+        "chatbot_id": chatbot_id,
+        "role": "assistant",
+        "from_cache": True
+    })
+    
+    return AnswerCacheAnalytics(
+        chatbot_id=chatbot_id,
+        total_responses=total_responses,
+        cached_responses=cached_responses,
+        cache_hit_rate=round((cached_responses / total_responses) * 100, 2) if total_responses > 0 else 0.0
+    )
+
+
 @router.get("/satisfaction/{chatbot_id}", response_model=SatisfactionAnalytics)
 async def get_satisfaction_analytics(chatbot_id: str):
     """Get satisfaction ratings analytics"""
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from models import UserCreate, UserLogin, UserResponse, Token, User
-from auth import get_password_hash, verify_password, create_access_token, get_current_user_email
+from auth import get_password_hash_async, verify_password_async, create_access_token, get_current_user_email
+from services.user_cache import user_cache
 from datetime import datetime, timezone
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
@@ -31,7 +32,7 @@ async def register(user_data: UserCreate):
     user_dict.pop('password')
     user = User(
         **user_dict,
-        password_hash=get_password_hash(user_data.password)
+        password_hash=await get_password_hash_async(user_data.password)
     )
     
     # Store in database
@@ -88,9 +89,10 @@ async def login(user_data: UserLogin):
                     {"email": user_data.email},
                     {"$set": {"status": "active", "suspension_until": None, "suspension_reason": None}}
                 )
+                user_cache.invalidate_email(user_data.email)
     
     # Verify password
-    if not verify_password(user_data.password, user_doc['password_hash']):
+    if not await verify_password_async(user_data.password, user_doc['password_hash']):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
@@ -106,6 +108,7 @@ async def login(user_data: UserLogin):
             "$inc": {"login_count": 1}
         }
     )
+    user_cache.invalidate_email(user_data.email)
     
     # Create access token
     access_token = create_access_token(data={"sub": user_doc['email']})
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from typing import List
+from typing import Any, Awaitable, Callable, Dict, List
 from datetime import datetime, timezone
 from models import (
     ChatRequest, ChatResponse, Conversation, Message,
@@ -11,6 +12,11 @@ from services.rag_service import RAGService
 from services.plan_service import plan_service
 from services.notification_service import NotificationService
 from services.cache_service import cache_service
+from services.answer_cache import answer_cache
+from services.counter_aggregator import counter_aggregator
+from services.message_writer import message_writer
+from services.conversation_resolver import conversation_resolver
+import json
 import logging
 import asyncio
 
@@ -32,162 +38,196 @@ def init_router(db: AsyncIOMotorDatabase):
     notification_service = NotificationService(db)
 
 
+# A reply counts as two messages (user + assistant) against the owner's quota
+MESSAGES_PER_REPLY = 2
+
+FALLBACK_RESPONSE = "I'm sorry, I'm having trouble processing your request right now. Please try again later."
+
+
+async def _prepare_chat(chat_request: ChatRequest) -> Dict[str, Any]:
+    """
+    Validate the chatbot and limits, resolve the conversation, save the user
+    message and retrieve RAG context (shared by the blocking and streaming endpoints)
+    """
+    # OPTIMIZATION 0: Get chatbot from cache; concurrent misses share one database read
+    chatbot = await cache_service.get_or_load(
+        f"chatbot:{chat_request.chatbot_id}",
+        lambda: db_instance.chatbots.find_one({"id": chat_request.chatbot_id}),
+        ttl_seconds=300
+    )
+    
+    if not chatbot:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chatbot not found"
+        )
+    
+    if chatbot.get("status") != "active":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Chatbot is not active"
+        )
+    
+    # Check and reserve message quota for chatbot owner (one atomic round trip)
+    user_id = chatbot.get("user_id")
+    reservation = await plan_service.reserve_usage(user_id, "messages", MESSAGES_PER_REPLY)
+    if not reservation.get("reserved"):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Monthly message limit reached. Please upgrade your plan to continue."
+        )
+    
+    try:
+        return await _prepare_conversation(chat_request, chatbot, user_id)
+    except Exception:
+        await plan_service.release_usage(user_id, "messages", MESSAGES_PER_REPLY)
+        raise
+
+
+async def _prepare_conversation(chat_request: ChatRequest, chatbot: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+    """Resolve the conversation, save the user message and retrieve RAG context"""
+    # OPTIMIZATION 1: Cached session lookup, or a single upsert for new sessions
+    new_conversation = Conversation(
+        chatbot_id=chat_request.chatbot_id,
+        session_id=chat_request.session_id,
+        user_name=chat_request.user_name,
+        user_email=chat_request.user_email
+    )
+    conversation_id, is_new_conversation = await conversation_resolver.resolve(
+        chat_request.chatbot_id,
+        chat_request.session_id,
+        new_conversation.model_dump()
+    )
+    
+    if is_new_conversation:
+        # Send notification for new conversation (non-blocking)
+        asyncio.create_task(
+            notification_service.create_notification(
+                user_id=user_id,
+                notification_type="new_conversation",
+                title="New Conversation Started",
+                message=f"A new conversation was started with your chatbot '{chatbot.get('name', 'Unknown')}'",
+                priority="medium",
+                metadata={
+                    "chatbot_id": chat_request.chatbot_id,
+                    "chatbot_name": chatbot.get("name"),
+                    "conversation_id": conversation_id,
+                    "user_name": chat_request.user_name,
+                    "user_email": chat_request.user_email
+                },
+                action_url=f"/chatbot-builder/{chat_request.chatbot_id}?tab=analytics"
+            )
+        )
+    
+    # OPTIMIZATION 2: Parallel save user message and RAG retrieval
+    user_message = Message(
+        conversation_id=conversation_id,
+        chatbot_id=chat_request.chatbot_id,
+        role="user",
+        content=chat_request.message
+    )
+    
+    save_message_task = message_writer.write(user_message.model_dump(), wait=True)
+    rag_task = rag_service.retrieve_relevant_context(
+        query=chat_request.message,
+        chatbot_id=chat_request.chatbot_id,
+        top_k=2,  # Reduced from 3 to 2 to save 10-20% tokens per message
+        min_similarity=0.5,  # Increased from 0.7 for better balance
+        retrieval_mode=chatbot.get("retrieval_mode"),
+        fusion_method=chatbot.get("fusion_method"),
+        lexical_weight=chatbot.get("lexical_weight")
+    )
+    
+    # Wait for both operations
+    _, rag_result = await asyncio.gather(save_message_task, rag_task)
+    
+    logger.info(f"RAG retrieved {rag_result.get('num_sources', 0)} sources in parallel")
+    
+    # OPTIMIZATION 3: Serve near-duplicate questions from the answer cache (opt-in)
+    cached_answer = await answer_cache.lookup(chatbot, chat_request.message, rag_result)
+    
+    return {
+        "chatbot": chatbot,
+        "conversation_id": conversation_id,
+        "is_new_conversation": is_new_conversation,
+        "user_id": user_id,
+        "rag_result": rag_result,
+        "context": rag_result.get("context") if rag_result.get("has_context") else None,
+        "citation_footer": rag_result.get("citation_footer"),
+        "cached_answer": cached_answer
+    }
+
+
+async def _save_reply(chat_request: ChatRequest, prepared: Dict[str, Any], ai_response: str):
+    """Save the assistant message and update conversation and chatbot counters"""
+    # OPTIMIZATION 4: Buffer counter updates instead of one $inc per document per message
+    assistant_message = Message(
+        conversation_id=prepared["conversation_id"],
+        chatbot_id=chat_request.chatbot_id,
+        role="assistant",
+        content=ai_response,
+        from_cache=prepared["cached_answer"] is not None
+    )
+    
+    # Subscription usage was already reserved in _prepare_chat
+    counter_aggregator.increment(
+        "conversations",
+        prepared["conversation_id"],
+        {"messages_count": 2},
+        set_fields={"updated_at": datetime.now(timezone.utc)}
+    )
+    counter_aggregator.increment(
+        "chatbots",
+        chat_request.chatbot_id,
+        {
+            "messages_count": 2,
+            "conversations_count": 1 if prepared["is_new_conversation"] else 0
+        }
+    )
+    
+    await message_writer.write(assistant_message.model_dump())
+
+
 @router.post("", response_model=ChatResponse)
 async def send_message(chat_request: ChatRequest):
     """Send a message to a chatbot (public endpoint) - OPTIMIZED"""
     try:
-        # OPTIMIZATION 0: Try to get chatbot from cache first
-        cache_key = f"chatbot:{chat_request.chatbot_id}"
-        chatbot = cache_service.get(cache_key)
-        
-        if not chatbot:
-            # Cache miss - fetch from database
-            chatbot = await db_instance.chatbots.find_one({"id": chat_request.chatbot_id})
-            if chatbot:
-                # Cache for 5 minutes
-                cache_service.set(cache_key, chatbot, ttl_seconds=300)
+        prepared = await _prepare_chat(chat_request)
+        chatbot = prepared["chatbot"]
+        cached_answer = prepared["cached_answer"]
         
-        # OPTIMIZATION 1: Parallel fetch of conversation (chatbot already fetched/cached)
-        conversation = await db_instance.conversations.find_one({
-            "chatbot_id": chat_request.chatbot_id,
-            "session_id": chat_request.session_id
-        })
-        
-        if not chatbot:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Chatbot not found"
-            )
-        
-        if chatbot.get("status") != "active":
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Chatbot is not active"
-            )
-        
-        # Check message limit for chatbot owner
-        user_id = chatbot.get("user_id")
-        limit_check = await plan_service.check_limit(user_id, "messages")
-        if limit_check["reached"]:
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail="Monthly message limit reached. Please upgrade your plan to continue."
-            )
-        
-        # Create conversation if needed
-        is_new_conversation = False
-        if not conversation:
-            is_new_conversation = True
-            conversation = Conversation(
-                chatbot_id=chat_request.chatbot_id,
-                session_id=chat_request.session_id,
-                user_name=chat_request.user_name,
-                user_email=chat_request.user_email
-            )
-            await db_instance.conversations.insert_one(conversation.model_dump())
-            
-            # Send notification for new conversation (non-blocking)
-            asyncio.create_task(
-                notification_service.create_notification(
-                    user_id=user_id,
-                    notification_type="new_conversation",
-                    title="New Conversation Started",
-                    message=f"A new conversation was started with your chatbot '{chatbot.get('name', 'Unknown')}'",
-                    priority="medium",
-                    metadata={
-                        "chatbot_id": chat_request.chatbot_id,
-                        "chatbot_name": chatbot.get("name"),
-                        "conversation_id": conversation.id,
-                        "user_name": chat_request.user_name,
-                        "user_email": chat_request.user_email
-                    },
-                    action_url=f"/chatbot-builder/{chat_request.chatbot_id}?tab=analytics"
-                )
-            )
+        if cached_answer:
+            ai_response = cached_answer["answer"]
         else:
-            conversation = Conversation(**conversation)
-        
-        # OPTIMIZATION 2: Parallel save user message and RAG retrieval
-        user_message = Message(
-            conversation_id=conversation.id,
-            chatbot_id=chat_request.chatbot_id,
-            role="user",
-            content=chat_request.message
-        )
-        
-        save_message_task = db_instance.messages.insert_one(user_message.model_dump())
-        rag_task = rag_service.retrieve_relevant_context(
-            query=chat_request.message,
-            chatbot_id=chat_request.chatbot_id,
-            top_k=2,  # Reduced from 3 to 2 to save 10-20% tokens per message
-            min_similarity=0.5  # Increased from 0.7 for better balance
-        )
-        
-        # Wait for both operations
-        _, rag_result = await asyncio.gather(save_message_task, rag_task)
-        
-        context = rag_result.get("context") if rag_result.get("has_context") else None
-        citation_footer = rag_result.get("citation_footer")
-        
-        logger.info(f"RAG retrieved {rag_result.get('num_sources', 0)} sources in parallel")
-        
-        # Generate AI response with RAG context
-        try:
-            ai_response, citations = await chat_service.generate_response(
-                message=chat_request.message,
-                session_id=chat_request.session_id,
-                system_message=chatbot.get("instructions", "You are a helpful assistant."),
-                model=chatbot.get("model", "gpt-4o-mini"),
-                provider=chatbot.get("provider", "openai"),
-                context=context,
-                citation_footer=citation_footer
-            )
-            
-            # Citations removed - users don't need to see source references
-            # The AI still uses the knowledge base context, but citations are hidden
+            # Generate AI response with RAG context
+            try:
+                ai_response, citations = await chat_service.generate_response(
+                    message=chat_request.message,
+                    session_id=chat_request.session_id,
+                    system_message=chatbot.get("instructions", "You are a helpful assistant."),
+                    model=chatbot.get("model", "gpt-4o-mini"),
+                    provider=chatbot.get("provider", "openai"),
+                    context=prepared["context"],
+                    citation_footer=prepared["citation_footer"]
+                )
                 
-        except Exception as e:
-            logger.error(f"AI response error: {str(e)}")
-            ai_response = "I'm sorry, I'm having trouble processing your request right now. Please try again later."
-        
-        # OPTIMIZATION 3: Parallel save assistant message and update stats
-        assistant_message = Message(
-            conversation_id=conversation.id,
-            chatbot_id=chat_request.chatbot_id,
-            role="assistant",
-            content=ai_response
-        )
-        
-        save_assistant_task = db_instance.messages.insert_one(assistant_message.model_dump())
-        update_conversation_task = db_instance.conversations.update_one(
-            {"id": conversation.id},
-            {
-                "$set": {"updated_at": datetime.now(timezone.utc)},
-                "$inc": {"messages_count": 2}
-            }
-        )
-        update_chatbot_task = db_instance.chatbots.update_one(
-            {"id": chat_request.chatbot_id},
-            {
-                "$inc": {
-                    "messages_count": 2,
-                    "conversations_count": 1 if is_new_conversation else 0
-                }
-            }
-        )
-        increment_usage_task = plan_service.increment_usage(user_id, "messages", amount=2)
+                # Citations removed - users don't need to see source references
+                # The AI still uses the knowledge base context, but citations are hidden
+                
+                asyncio.create_task(
+                    answer_cache.store(chatbot, chat_request.message, prepared["rag_result"], ai_response, prepared["citation_footer"])
+                )
+                    
+            except Exception as e:
+                logger.error(f"AI response error: {str(e)}")
+                ai_response = FALLBACK_RESPONSE
+                await plan_service.release_usage(prepared["user_id"], "messages", MESSAGES_PER_REPLY)
         
-        # Execute all updates in parallel
-        await asyncio.gather(
-            save_assistant_task,
-            update_conversation_task,
-            update_chatbot_task,
-            increment_usage_task
-        )
+        await _save_reply(chat_request, prepared, ai_response)
         
         return ChatResponse(
             message=ai_response,
-            conversation_id=conversation.id,
+            conversation_id=prepared["conversation_id"],
             session_id=chat_request.session_id
         )
         
@@ -201,6 +241,129 @@ async def send_message(chat_request: ChatRequest):
         )
 
 
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_reply(
+    chat_service: ChatService,
+    prepared: Dict[str, Any],
+    message: str,
+    session_id: str,
+    save_reply: Callable[[str], Awaitable[None]],
+    release_quota: Callable[[], Awaitable[None]]
+) -> StreamingResponse:
+    """
+    Stream a prepared chat reply as Server-Sent Events (shared by the
+    authenticated and public chat endpoints)
+    
+    Events: `start` (conversation/session ids), `token` ({"text"}) for each
+    fragment, then `done` ({"message"}) with the full reply, or `error`
+    ({"message", "detail"}) if generation failed, with whatever was sent.
+    
+    Args:
+        chat_service: Chat service used to stream the LLM reply
+        prepared: Result of the endpoint's prepare step (chatbot, context, cached answer)
+        message: User message
+        session_id: Session identifier
+        save_reply: Persists the (possibly partial) assistant reply
+        release_quota: Gives back the reserved message quota
+    """
+    chatbot = prepared["chatbot"]
+    cached_answer = prepared["cached_answer"]
+    
+    async def event_stream():
+        parts: List[str] = []
+        completed = False
+        failed = False
+        yield sse_event("start", {
+            "conversation_id": prepared["conversation_id"],
+            "session_id": session_id,
+            "from_cache": cached_answer is not None
+        })
+        
+        try:
+            if cached_answer:
+                parts.append(cached_answer["answer"])
+                yield sse_event("token", {"text": cached_answer["answer"]})
+            else:
+                try:
+                    async for token in chat_service.stream_response(
+                        message=message,
+                        session_id=session_id,
+                        system_message=chatbot.get("instructions", "You are a helpful assistant."),
+                        model=chatbot.get("model", "gpt-4o-mini"),
+                        provider=chatbot.get("provider", "openai"),
+                        context=prepared["context"]
+                    ):
+                        parts.append(token)
+                        yield sse_event("token", {"text": token})
+                except Exception as e:
+                    logger.error(f"AI response stream error for chatbot {chatbot.get('id')}: {str(e)}")
+                    failed = True
+                    if not parts:
+                        asyncio.create_task(release_quota())
+                        parts.append(FALLBACK_RESPONSE)
+                        yield sse_event("token", {"text": FALLBACK_RESPONSE})
+            completed = True
+        finally:
+            # Runs on completion and on client disconnect (generator cancelled);
+            # persistence is scheduled as a task so cancellation cannot interrupt it
+            ai_response = "".join(parts)
+            if ai_response:
+                asyncio.create_task(save_reply(ai_response))
+                # Truncated or fallback replies must never be served to later askers
+                if completed and not failed and not cached_answer:
+                    asyncio.create_task(
+                        answer_cache.store(chatbot, message, prepared["rag_result"], ai_response, prepared["citation_footer"])
+                    )
+            else:
+                # Disconnected before the first token - nothing was delivered
+                asyncio.create_task(release_quota())
+        
+        if failed:
+            yield sse_event("error", {"message": "".join(parts), "detail": "Failed to generate the reply"})
+        else:
+            yield sse_event("done", {"message": "".join(parts)})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/stream")
+async def send_message_stream(chat_request: ChatRequest):
+    """
+    Send a message to a chatbot and stream the reply as Server-Sent Events
+    
+    See `stream_reply` for the events. If the client disconnects, the
+    upstream LLM stream is closed and the partial reply is saved.
+    """
+    try:
+        # Validation errors surface as regular HTTP errors before the stream starts
+        prepared = await _prepare_chat(chat_request)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in chat stream: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to process message"
+        )
+    
+    return stream_reply(
+        chat_service,
+        prepared,
+        chat_request.message,
+        chat_request.session_id,
+        save_reply=lambda ai_response: _save_reply(chat_request, prepared, ai_response),
+        release_quota=lambda: plan_service.release_usage(prepared["user_id"], "messages", MESSAGES_PER_REPLY)
+    )
+
+
 @router.get("/conversations/{chatbot_id}", response_model=List[ConversationResponse])
 async def get_conversations(chatbot_id: str):
     """Get all conversations for a chatbot"""
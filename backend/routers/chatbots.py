@@ -8,6 +8,9 @@ from models import (
 from auth import get_current_user, User
 from services.plan_service import plan_service
 from services.cache_service import cache_service
+from services.answer_cache import answer_cache, config_fingerprint
+from services.counter_aggregator import counter_aggregator
+from services.conversation_resolver import conversation_resolver
 import logging
 import os
 import uuid
@@ -91,6 +94,9 @@ async def get_chatbots(current_user: User = Depends(get_current_user)):
                 {"chatbot_id": chatbot["id"]}
             )
             chatbot["conversations_count"] = conversations_count
+            
+            # Include message counts not yet flushed by the counter aggregator
+            counter_aggregator.merge_pending("chatbots", chatbot)
         
         return [ChatbotResponse(**chatbot) for chatbot in chatbots]
     except Exception as e:
@@ -129,6 +135,9 @@ async def get_chatbot(
         )
         chatbot["conversations_count"] = conversations_count
         
+        # Include message counts not yet flushed by the counter aggregator
+        counter_aggregator.merge_pending("chatbots", chatbot)
+        
         return ChatbotResponse(**chatbot)
     except HTTPException:
         raise
@@ -180,6 +189,10 @@ async def update_chatbot(
             # Invalidate cache for this chatbot
             cache_service.delete(f"chatbot:{chatbot_id}")
             cache_service.delete(f"public_chatbot:{chatbot_id}")
+            
+            # Cached answers are stale once instructions or model settings change
+            if config_fingerprint({**chatbot, **update_data}) != config_fingerprint(chatbot):
+                await answer_cache.invalidate(chatbot_id)
         
         # Fetch updated chatbot
         updated_chatbot = await db_instance.chatbots.find_one({"id": chatbot_id})
@@ -263,6 +276,10 @@ async def delete_chatbot(
         await db_instance.sources.delete_many({"chatbot_id": chatbot_id})
         await db_instance.conversations.delete_many({"chatbot_id": chatbot_id})
         await db_instance.messages.delete_many({"chatbot_id": chatbot_id})
+        cache_service.delete(f"chatbot:{chatbot_id}")
+        cache_service.delete(f"public_chatbot:{chatbot_id}")
+        await answer_cache.invalidate(chatbot_id)
+        conversation_resolver.forget_chatbot(chatbot_id)
         
         # Decrement usage count
         await plan_service.decrement_usage(current_user.id, "chatbots")
@@ -339,7 +356,8 @@ async def upload_branding_image(
         )
         
         # Clear cache
-        cache_service.delete(f"chatbot_{chatbot_id}")
+        cache_service.delete(f"chatbot:{chatbot_id}")
+        cache_service.delete(f"public_chatbot:{chatbot_id}")
         
         logger.info(f"Successfully uploaded {image_type} for chatbot {chatbot_id}")
         
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, BackgroundTasks, Request
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import get_client
+from services.vector_store import VectorStore
 from datetime import datetime
 import logging
 import uuid
@@ -8,6 +9,9 @@ from typing import Dict, Any
 
 from services.discord_service import DiscordService
 from services.chat_service import ChatService
+from services.counter_aggregator import counter_aggregator
+from services.message_writer import message_writer
+from services.conversation_resolver import conversation_resolver
 from services.discord_bot_manager import discord_bot_manager
 from models import DiscordWebhookSetup
 
@@ -16,11 +20,13 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/discord", tags=["discord"])
 
 # MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
 DB_NAME = os.environ.get('DB_NAME', 'chatbase_db')
-client = AsyncIOMotorClient(MONGO_URL)
+client = get_client()
 db = client[DB_NAME]
 
+# Shared vector store (uses the process-wide client)
+vector_store = VectorStore()
+
 # Chat service
 chat_service = ChatService()
 
@@ -79,13 +85,13 @@ async def process_discord_message(
             logger.error(f"Chatbot not found: {chatbot_id}")
             return
         
-        # ✅ CHECK MESSAGE LIMIT BEFORE PROCESSING
+        # ✅ CHECK AND RESERVE MESSAGE QUOTA BEFORE PROCESSING (one atomic round trip)
         owner_user_id = chatbot.get('user_id')
         if owner_user_id:
             from services.plan_service import plan_service
-            limit_check = await plan_service.check_limit(owner_user_id, "messages")
+            limit_check = await plan_service.reserve_usage(owner_user_id, "messages", 2)
             
-            if limit_check.get("reached"):
+            if not limit_check.get("reserved"):
                 # Send limit exceeded message to user
                 limit_message = (
                     f"⚠️ **Message Limit Reached**\n\n"
@@ -103,35 +109,28 @@ async def process_discord_message(
         # Create session ID based on channel and user
         session_id = f"discord_{channel_id}_{user_id}"
         
-        # Get or create conversation
-        conversation = await db.conversations.find_one({
+        # Get or create conversation (cached per session; new sessions are one upsert)
+        conversation_id, _ = await conversation_resolver.resolve(chatbot_id, session_id, {
+            "id": str(uuid.uuid4()),
             "chatbot_id": chatbot_id,
-            "session_id": session_id
-        })
-        
-        if not conversation:
-            conversation = {
-                "id": str(uuid.uuid4()),
-                "chatbot_id": chatbot_id,
-                "session_id": session_id,
-                "user_name": user_name,
-                "user_email": f"discord_{user_id}",
-                "created_at": datetime.now(),
-                "updated_at": datetime.now(),
-                "status": "active",
-                "platform": "discord",
-                "metadata": {
-                    "channel_id": channel_id,
-                    "guild_id": guild_id,
-                    "user_id": user_id
-                }
+            "session_id": session_id,
+            "user_name": user_name,
+            "user_email": f"discord_{user_id}",
+            "created_at": datetime.now(),
+            "updated_at": datetime.now(),
+            "status": "active",
+            "platform": "discord",
+            "metadata": {
+                "channel_id": channel_id,
+                "guild_id": guild_id,
+                "user_id": user_id
             }
-            await db.conversations.insert_one(conversation)
+        })
         
         # Save user message
         user_message = {
             "id": str(uuid.uuid4()),
-            "conversation_id": conversation["id"],
+            "conversation_id": conversation_id,
             "chatbot_id": chatbot_id,
             "role": "user",
             "content": message_content,
@@ -143,16 +142,14 @@ async def process_discord_message(
                 "user_id": user_id
             }
         }
-        await db.messages.insert_one(user_message)
+        await message_writer.write(user_message)
         
         # Get knowledge base context
         context = ""
         try:
-            from services.vector_store import VectorStore
-            vector_store = VectorStore(db)
-            relevant_chunks = await vector_store.search(chatbot_id, message_content, top_k=2)
+            relevant_chunks = await vector_store.search(chatbot_id=chatbot_id, query=message_content, top_k=2)
             if relevant_chunks:
-                context = "\n\n".join([chunk["content"] for chunk in relevant_chunks])
+                context = "\n\n".join([chunk["text"] for chunk in relevant_chunks])
         except Exception as e:
             logger.warning(f"Error fetching context: {str(e)}")
         
@@ -176,11 +173,13 @@ async def process_discord_message(
         except Exception as e:
             logger.error(f"Error generating AI response: {str(e)}")
             response_text = "I apologize, but I encountered an error processing your message."
+            if owner_user_id:
+                await plan_service.release_usage(owner_user_id, "messages", 2)
         
         # Save assistant message
         assistant_message = {
             "id": str(uuid.uuid4()),
-            "conversation_id": conversation["id"],
+            "conversation_id": conversation_id,
             "chatbot_id": chatbot_id,
             "role": "assistant",
             "content": response_text,
@@ -190,26 +189,16 @@ async def process_discord_message(
                 "channel_id": channel_id
             }
         }
-        await db.messages.insert_one(assistant_message)
+        await message_writer.write(assistant_message)
         
         # Update conversation
         await db.conversations.update_one(
-            {"id": conversation["id"]},
+            {"id": conversation_id},
             {"$set": {"updated_at": datetime.now()}}
         )
         
         # Update chatbot message count
-        await db.chatbots.update_one(
-            {"id": chatbot_id},
-            {"$inc": {"messages_count": 2}}  # User + Assistant
-        )
-        
-        # Update subscription usage (2 messages: user + assistant)
-        try:
-            from services.plan_service import plan_service
-            await plan_service.increment_usage(chatbot["user_id"], "messages", 2)
-        except Exception as e:
-            logger.warning(f"Failed to update subscription usage: {str(e)}")
+        counter_aggregator.increment("chatbots", chatbot_id, {"messages_count": 2})
         
         # Send response back to Discord
         result = await discord_service.send_message(
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends
 from typing import List
 from datetime import datetime, timezone
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import get_client
 import os
 from models import (
     Integration, IntegrationCreate, IntegrationUpdate, IntegrationResponse,
@@ -13,9 +13,8 @@ import httpx
 router = APIRouter(prefix="/integrations", tags=["integrations"])
 
 # MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
 DB_NAME = os.environ.get('DB_NAME', 'chatbase_db')
-client = AsyncIOMotorClient(MONGO_URL)
+client = get_client()
 db = client[DB_NAME]
 
 
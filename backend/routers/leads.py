@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends
 from typing import List, Optional
 from datetime import datetime, timezone
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import get_client
 import os
 import uuid
 from models import User, Lead, LeadResponse, LeadCreate, LeadUpdate, LeadStatsResponse
@@ -11,9 +11,8 @@ from auth import get_current_user
 router = APIRouter()
 
 # MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
 DB_NAME = os.environ.get('DB_NAME', 'chatbase_db')
-client = AsyncIOMotorClient(MONGO_URL)
+client = get_client()
 db = client[DB_NAME]
 leads_collection = db.leads
 
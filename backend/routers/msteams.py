@@ -5,13 +5,16 @@ Handles MS Teams webhook messages and bot operations
 from fastapi import APIRouter, HTTPException, Request, BackgroundTasks, Depends
 from typing import Dict, Any
 from datetime import datetime, timezone
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import get_client
 import os
 import logging
 
 from models import MSTeamsMessage, MSTeamsWebhookSetup
 from services.msteams_service import MSTeamsService
 from services.chat_service import ChatService
+from services.counter_aggregator import counter_aggregator
+from services.message_writer import message_writer
+from services.conversation_resolver import conversation_resolver
 from services.vector_store import VectorStore
 from auth import get_current_user
 
@@ -19,11 +22,13 @@ router = APIRouter(prefix="/msteams", tags=["msteams"])
 logger = logging.getLogger(__name__)
 
 # MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
 DB_NAME = os.environ.get('DB_NAME', 'chatbase_db')
-client = AsyncIOMotorClient(MONGO_URL)
+client = get_client()
 db = client[DB_NAME]
 
+# Shared vector store (uses the process-wide client)
+vector_store = VectorStore()
+
 
 async def process_msteams_message(
     chatbot_id: str,
@@ -62,13 +67,13 @@ async def process_msteams_message(
         # Create MS Teams service
         teams_service = MSTeamsService(app_id, app_password)
         
-        # ✅ CHECK MESSAGE LIMIT BEFORE PROCESSING
+        # ✅ CHECK AND RESERVE MESSAGE QUOTA BEFORE PROCESSING (one atomic round trip)
         owner_user_id = chatbot.get('user_id')
         if owner_user_id:
             from services.plan_service import plan_service
-            limit_check = await plan_service.check_limit(owner_user_id, "messages")
+            limit_check = await plan_service.reserve_usage(owner_user_id, "messages", 2)
             
-            if limit_check.get("reached"):
+            if not limit_check.get("reserved"):
                 # Send limit exceeded message to user
                 limit_message = (
                     f"⚠️ **Message Limit Reached**\n\n"
@@ -88,41 +93,38 @@ async def process_msteams_message(
         # Generate session ID
         session_id = f"msteams_{conversation_id}_{user_id}"
         
-        # Check if conversation exists
-        conversation = await db.conversations.find_one({
+        # Get or create conversation (cached per session; new sessions are one upsert)
+        await conversation_resolver.resolve(chatbot_id, session_id, {
+            "id": session_id,
             "chatbot_id": chatbot_id,
-            "session_id": session_id
+            "session_id": session_id,
+            "user_name": user_name,
+            "user_email": f"{user_id}@msteams.com",
+            "status": "active",
+            "created_at": datetime.now(timezone.utc),
+            "updated_at": datetime.now(timezone.utc),
+            "message_count": 0
         })
         
-        if not conversation:
-            # Create new conversation
-            conversation = {
-                "id": session_id,
-                "chatbot_id": chatbot_id,
-                "session_id": session_id,
-                "user_name": user_name,
-                "user_email": f"{user_id}@msteams.com",
-                "status": "active",
-                "created_at": datetime.now(timezone.utc),
-                "updated_at": datetime.now(timezone.utc),
-                "message_count": 0
-            }
-            await db.conversations.insert_one(conversation)
-        
         # Get knowledge base context
-        vector_store = VectorStore()
-        context = await vector_store.search(chatbot_id, message_text, limit=3)
-        context_text = "\n\n".join([doc.get("content", "") for doc in context])
+        context = await vector_store.search(chatbot_id=chatbot_id, query=message_text, top_k=3)
+        context_text = "\n\n".join([doc.get("text", "") for doc in context])
         
         # Generate AI response
         chat_service = ChatService()
-        ai_response = await chat_service.generate_response(
-            chatbot_id=chatbot_id,
-            user_message=message_text,
-            session_id=session_id,
-            context=context_text,
-            user_name=user_name
-        )
+        try:
+            ai_response = await chat_service.generate_response(
+                chatbot_id=chatbot_id,
+                user_message=message_text,
+                session_id=session_id,
+                context=context_text,
+                user_name=user_name
+            )
+        except Exception:
+            # No reply was produced - give back the reserved quota
+            if owner_user_id:
+                await plan_service.release_usage(owner_user_id, "messages", 2)
+            raise
         
         # Save messages to database
         user_message = {
@@ -139,28 +141,19 @@ async def process_msteams_message(
             "timestamp": datetime.now(timezone.utc)
         }
         
-        await db.messages.insert_many([user_message, assistant_message])
+        await message_writer.write_many([user_message, assistant_message])
         
         # Update conversation
-        await db.conversations.update_one(
-            {"session_id": session_id},
-            {
-                "$set": {"updated_at": datetime.now(timezone.utc)},
-                "$inc": {"message_count": 2}
-            }
+        counter_aggregator.increment(
+            "conversations",
+            session_id,
+            {"message_count": 2},
+            set_fields={"updated_at": datetime.now(timezone.utc)},
+            id_field="session_id"
         )
         
         # Update chatbot message count
-        await db.chatbots.update_one(
-            {"id": chatbot_id},
-            {"$inc": {"messages_count": 2}}
-        )
-        
-        # Update subscription usage (2 messages: user + assistant)
-        from services.plan_service import increment_usage
-        user = await db.users.find_one({"id": chatbot.get("user_id")})
-        if user:
-            await increment_usage(user["id"], "messages", 2)
+        counter_aggregator.increment("chatbots", chatbot_id, {"messages_count": 2})
         
         # Send response back to MS Teams
         activity_id = activity.get("id")
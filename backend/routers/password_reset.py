@@ -4,8 +4,7 @@ from datetime import datetime, timedelta
 from typing import Optional
 import secrets
 import hashlib
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
+from database import get_client
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,8 +12,7 @@ load_dotenv()
 router = APIRouter(prefix="/auth", tags=["password-reset"])
 
 # MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = AsyncIOMotorClient(MONGO_URL)
+client = get_client()
 db = client['chatbase_db']
 users_collection = db['users']
 reset_tokens_collection = db['password_reset_tokens']
@@ -11,12 +11,11 @@ router = APIRouter(prefix="/admin/payment-settings", tags=["Admin Payment Settin
 logger = logging.getLogger(__name__)
 
 # MongoDB collection
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import get_client
 
-mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
 db_name = os.environ.get('DB_NAME', 'chatbase_db')
 
-client = AsyncIOMotorClient(mongo_url)
+client = get_client()
 db = client[db_name]
 payment_settings_collection = db['payment_settings']
 
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException, Response
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from typing import List
+from typing import Any, Dict, List
 from datetime import datetime, timezone
 from models import (
     PublicChatbotInfo, PublicChatRequest, ChatResponse,
@@ -9,6 +9,12 @@ from models import (
 from services.chat_service import ChatService
 from services.rag_service import RAGService
 from services.cache_service import cache_service
+from services.answer_cache import answer_cache
+from services.plan_service import plan_service
+from services.counter_aggregator import counter_aggregator
+from services.message_writer import message_writer
+from services.conversation_resolver import conversation_resolver
+from routers.chat import stream_reply
 import json
 import logging
 import asyncio
@@ -17,25 +23,28 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/public", tags=["public-chat"])
 db_instance = None
+chat_service = None
 rag_service = None
 
 def init_router(db: AsyncIOMotorDatabase):
     """Initialize router with database instance"""
-    global db_instance, rag_service
+    global db_instance, chat_service, rag_service
     db_instance = db
+    chat_service = ChatService()
     rag_service = RAGService()
 
 @router.get("/chatbot/{chatbot_id}", response_model=PublicChatbotInfo)
 async def get_public_chatbot(chatbot_id: str):
     """Get public chatbot information (no authentication required) - CACHED"""
-    # Try cache first
-    cache_key = f"public_chatbot:{chatbot_id}"
-    cached_info = cache_service.get(cache_key)
-    
-    if cached_info:
-        return cached_info
-    
-    # Cache miss - fetch from database
+    # Cached for 5 minutes; concurrent misses share one database read
+    return await cache_service.get_or_load(
+        f"public_chatbot:{chatbot_id}",
+        lambda: _load_public_chatbot(chatbot_id),
+        ttl_seconds=300
+    )
+
+
+async def _load_public_chatbot(chatbot_id: str) -> PublicChatbotInfo:
     chatbot = await db_instance.chatbots.find_one({"id": chatbot_id})
     if not chatbot:
         raise HTTPException(status_code=404, detail="Chatbot not found")
@@ -60,24 +69,26 @@ async def get_public_chatbot(chatbot_id: str):
         auto_expand=chatbot.get("auto_expand", False)
     )
     
-    # Cache for 5 minutes
-    cache_service.set(cache_key, info, ttl_seconds=300)
-    
     return info
 
 
-@router.post("/chat/{chatbot_id}", response_model=ChatResponse)
-async def public_chat(chatbot_id: str, request: PublicChatRequest):
-    """Send a message to a public chatbot (no authentication required) - OPTIMIZED"""
-    # Try to get chatbot from cache first
-    cache_key = f"chatbot:{chatbot_id}"
-    chatbot = cache_service.get(cache_key)
-    
-    if not chatbot:
-        # Cache miss - fetch from database
-        chatbot = await db_instance.chatbots.find_one({"id": chatbot_id})
-        if chatbot:
-            cache_service.set(cache_key, chatbot, ttl_seconds=300)
+# A reply counts as two messages (user + assistant) against the owner's quota
+MESSAGES_PER_REPLY = 2
+
+FALLBACK_RESPONSE = "I'm sorry, I'm having trouble processing your request right now. Please try again later."
+
+
+async def _prepare_public_chat(chatbot_id: str, request: PublicChatRequest) -> Dict[str, Any]:
+    """
+    Validate the chatbot and limits, resolve the conversation, save the user
+    message and retrieve RAG context (shared by the blocking and streaming endpoints)
+    """
+    # Get chatbot from cache; concurrent misses share one database read
+    chatbot = await cache_service.get_or_load(
+        f"chatbot:{chatbot_id}",
+        lambda: db_instance.chatbots.find_one({"id": chatbot_id}),
+        ttl_seconds=300
+    )
     
     if not chatbot:
         raise HTTPException(status_code=404, detail="Chatbot not found")
@@ -85,46 +96,51 @@ async def public_chat(chatbot_id: str, request: PublicChatRequest):
     if not chatbot.get("public_access", False):
         raise HTTPException(status_code=403, detail="This chatbot is not publicly accessible")
     
-    # ✅ CHECK MESSAGE LIMIT BEFORE PROCESSING
+    # ✅ CHECK AND RESERVE MESSAGE QUOTA BEFORE PROCESSING (one atomic round trip)
     user_id = chatbot.get("user_id")
     if user_id:
-        from services.plan_service import plan_service
-        limit_check = await plan_service.check_limit(user_id, "messages")
+        reservation = await plan_service.reserve_usage(user_id, "messages", MESSAGES_PER_REPLY)
         
-        if limit_check.get("reached"):
+        if not reservation.get("reserved"):
             # Return error response with limit information
             raise HTTPException(
                 status_code=429,
                 detail={
-                    "message": f"This chatbot has reached its message limit ({limit_check['current']}/{limit_check['max']} messages used this month). Please contact the chatbot owner to upgrade their plan.",
-                    "current": limit_check['current'],
-                    "max": limit_check['max'],
+                    "message": f"This chatbot has reached its message limit ({reservation['current']}/{reservation['max']} messages used this month). Please contact the chatbot owner to upgrade their plan.",
+                    "current": reservation['current'],
+                    "max": reservation['max'],
                     "limit_reached": True
                 }
             )
     
-    # Find or create conversation
-    conversation = await db_instance.conversations.find_one({
+    try:
+        return await _prepare_public_conversation(chatbot_id, request, chatbot)
+    except Exception:
+        await _release_quota(chatbot)
+        raise
+
+
+async def _release_quota(chatbot: Dict[str, Any]):
+    """Give back the message quota reserved for a reply that was not delivered"""
+    if chatbot.get("user_id"):
+        await plan_service.release_usage(chatbot["user_id"], "messages", MESSAGES_PER_REPLY)
+
+
+async def _prepare_public_conversation(chatbot_id: str, request: PublicChatRequest, chatbot: Dict[str, Any]) -> Dict[str, Any]:
+    """Resolve the conversation, save the user message and retrieve RAG context"""
+    # Cached session lookup, or a single upsert for new sessions
+    conversation_id, _ = await conversation_resolver.resolve(chatbot_id, request.session_id, {
+        "id": str(__import__("uuid").uuid4()),
         "chatbot_id": chatbot_id,
-        "session_id": request.session_id
+        "session_id": request.session_id,
+        "user_name": request.user_name,
+        "user_email": request.user_email,
+        "status": "active",
+        "messages_count": 0,
+        "created_at": datetime.now(timezone.utc),
+        "updated_at": datetime.now(timezone.utc)
     })
     
-    if not conversation:
-        conversation = {
-            "id": str(__import__("uuid").uuid4()),
-            "chatbot_id": chatbot_id,
-            "session_id": request.session_id,
-            "user_name": request.user_name,
-            "user_email": request.user_email,
-            "status": "active",
-            "messages_count": 0,
-            "created_at": datetime.now(timezone.utc),
-            "updated_at": datetime.now(timezone.utc)
-        }
-        await db_instance.conversations.insert_one(conversation)
-    
-    conversation_id = conversation["id"]
-    
     # OPTIMIZATION: Parallel save user message and RAG retrieval
     user_message = {
         "id": str(__import__("uuid").uuid4()),
@@ -136,77 +152,66 @@ async def public_chat(chatbot_id: str, request: PublicChatRequest):
         "timestamp": datetime.now(timezone.utc)  # Keep for backwards compatibility
     }
     
-    save_message_task = db_instance.messages.insert_one(user_message)
+    save_message_task = message_writer.write(user_message, wait=True)
     rag_task = rag_service.retrieve_relevant_context(
         query=request.message,
         chatbot_id=chatbot_id,
         top_k=2,  # Reduced from 3 to 2 to save 10-20% tokens per message
-        min_similarity=0.5  # Adjusted for better balance
+        min_similarity=0.5,  # Adjusted for better balance
+        retrieval_mode=chatbot.get("retrieval_mode"),
+        fusion_method=chatbot.get("fusion_method"),
+        lexical_weight=chatbot.get("lexical_weight")
     )
     
     # Wait for both operations
     _, rag_result = await asyncio.gather(save_message_task, rag_task)
     
-    context = rag_result.get("context") if rag_result.get("has_context") else None
-    citation_footer = rag_result.get("citation_footer")
+    # OPTIMIZATION: Serve near-duplicate questions from the answer cache (opt-in)
+    cached_answer = await answer_cache.lookup(chatbot, request.message, rag_result)
     
-    # Get AI response
-    chat_service = ChatService()
-    try:
-        ai_response, citations = await chat_service.generate_response(
-            message=request.message,
-            session_id=request.session_id,
-            system_message=chatbot.get("instructions", "You are a helpful assistant."),
-            model=chatbot.get("model", "gpt-4o-mini"),
-            provider=chatbot.get("provider", "openai"),
-            context=context,
-            citation_footer=citation_footer
-        )
-        
-        # Citations removed - widget users don't need to see source references
-        # The AI still uses the knowledge base context, but citations are hidden
-            
-    except Exception as e:
-        logger.error(f"AI response error in public chat: {str(e)}")
-        ai_response = "I'm sorry, I'm having trouble processing your request right now. Please try again later."
+    return {
+        "chatbot": chatbot,
+        "conversation_id": conversation_id,
+        "rag_result": rag_result,
+        "context": rag_result.get("context") if rag_result.get("has_context") else None,
+        "citation_footer": rag_result.get("citation_footer"),
+        "cached_answer": cached_answer
+    }
+
+
+async def _save_public_reply(chatbot_id: str, request: PublicChatRequest, prepared: Dict[str, Any], ai_response: str):
+    """Save the assistant message, update counters and send the webhook"""
+    chatbot = prepared["chatbot"]
+    conversation_id = prepared["conversation_id"]
     
-    # OPTIMIZATION: Parallel save AI message and update conversation
     ai_message = {
         "id": str(__import__("uuid").uuid4()),
         "conversation_id": conversation_id,
         "chatbot_id": chatbot_id,
         "role": "assistant",
         "content": ai_response,
+        "from_cache": prepared["cached_answer"] is not None,
         "created_at": datetime.now(timezone.utc),
         "timestamp": datetime.now(timezone.utc)  # Keep for backwards compatibility
     }
     
-    save_ai_message_task = db_instance.messages.insert_one(ai_message)
-    update_conversation_task = db_instance.conversations.update_one(
-        {"id": conversation_id},
-        {
-            "$set": {"updated_at": datetime.now(timezone.utc)},
-            "$inc": {"messages_count": 2}
-        }
-    )
-    
-    # Execute both in parallel
-    await asyncio.gather(save_ai_message_task, update_conversation_task)
+    await message_writer.write(ai_message)
     
-    # Update chatbot counts
-    await db_instance.chatbots.update_one(
-        {"id": chatbot_id},
-        {
-            "$inc": {"messages_count": 2},
-            "$set": {"updated_at": datetime.now(timezone.utc)}
-        }
+    # OPTIMIZATION: Conversation and chatbot counters are aggregated and flushed in bulk
+    counter_aggregator.increment(
+        "conversations",
+        conversation_id,
+        {"messages_count": 2},
+        set_fields={"updated_at": datetime.now(timezone.utc)}
+    )
+    counter_aggregator.increment(
+        "chatbots",
+        chatbot_id,
+        {"messages_count": 2},
+        set_fields={"updated_at": datetime.now(timezone.utc)}
     )
     
-    # Update user's subscription usage for message count tracking
-    user_id = chatbot.get("user_id")
-    if user_id:
-        from services.plan_service import plan_service
-        await plan_service.increment_usage(user_id, "messages", 2)
+    # Subscription usage was reserved in _prepare_public_chat
     
     # Send webhook notification if enabled
     if chatbot.get("webhook_enabled") and chatbot.get("webhook_url"):
@@ -217,14 +222,71 @@ async def public_chat(chatbot_id: str, request: PublicChatRequest):
             user_message=request.message,
             ai_response=ai_response
         )
+
+
+@router.post("/chat/{chatbot_id}", response_model=ChatResponse)
+async def public_chat(chatbot_id: str, request: PublicChatRequest):
+    """Send a message to a public chatbot (no authentication required) - OPTIMIZED"""
+    prepared = await _prepare_public_chat(chatbot_id, request)
+    chatbot = prepared["chatbot"]
+    cached_answer = prepared["cached_answer"]
+    
+    if cached_answer:
+        ai_response = cached_answer["answer"]
+    else:
+        # Get AI response
+        try:
+            ai_response, citations = await chat_service.generate_response(
+                message=request.message,
+                session_id=request.session_id,
+                system_message=chatbot.get("instructions", "You are a helpful assistant."),
+                model=chatbot.get("model", "gpt-4o-mini"),
+                provider=chatbot.get("provider", "openai"),
+                context=prepared["context"],
+                citation_footer=prepared["citation_footer"]
+            )
+            
+            # Citations removed - widget users don't need to see source references
+            # The AI still uses the knowledge base context, but citations are hidden
+            
+            asyncio.create_task(
+                answer_cache.store(chatbot, request.message, prepared["rag_result"], ai_response, prepared["citation_footer"])
+            )
+                
+        except Exception as e:
+            logger.error(f"AI response error in public chat: {str(e)}")
+            ai_response = FALLBACK_RESPONSE
+            await _release_quota(chatbot)
+    
+    await _save_public_reply(chatbot_id, request, prepared, ai_response)
     
     return ChatResponse(
         message=ai_response,
-        conversation_id=conversation_id,
+        conversation_id=prepared["conversation_id"],
         session_id=request.session_id
     )
 
 
+@router.post("/chat/{chatbot_id}/stream")
+async def public_chat_stream(chatbot_id: str, request: PublicChatRequest):
+    """
+    Send a message to a public chatbot and stream the reply as Server-Sent Events
+    
+    Same event format as POST /chat/stream. If the widget disconnects, the
+    upstream LLM stream is closed and the partial reply is saved.
+    """
+    prepared = await _prepare_public_chat(chatbot_id, request)
+    
+    return stream_reply(
+        chat_service,
+        prepared,
+        request.message,
+        request.session_id,
+        save_reply=lambda ai_response: _save_public_reply(chatbot_id, request, prepared, ai_response),
+        release_quota=lambda: _release_quota(prepared["chatbot"])
+    )
+
+
 @router.get("/embed/{chatbot_id}")
 async def get_embed_code(chatbot_id: str, theme: str = "light", position: str = "bottom-right"):
     """Get embed code for integrating chatbot into websites"""
@@ -1,13 +1,17 @@
 from fastapi import APIRouter, HTTPException, Request, BackgroundTasks
 from typing import Optional
 from datetime import datetime, timezone
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import get_client
+from services.vector_store import VectorStore
 import os
 import logging
 import uuid
 import hashlib
 from services.slack_service import SlackService
 from services.chat_service import ChatService
+from services.counter_aggregator import counter_aggregator
+from services.message_writer import message_writer
+from services.conversation_resolver import conversation_resolver
 from models import SlackWebhookSetup, SlackMessage
 
 logger = logging.getLogger(__name__)
@@ -15,11 +19,13 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/slack", tags=["slack"])
 
 # MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
 DB_NAME = os.environ.get('DB_NAME', 'chatbase_db')
-client = AsyncIOMotorClient(MONGO_URL)
+client = get_client()
 db = client[DB_NAME]
 
+# Shared vector store (uses the process-wide client)
+vector_store = VectorStore()
+
 # Store active Slack services per chatbot
 slack_services = {}
 
@@ -71,13 +77,13 @@ async def process_slack_message(
         
         slack_service = get_slack_service(bot_token)
         
-        # ✅ CHECK MESSAGE LIMIT BEFORE PROCESSING
+        # ✅ CHECK AND RESERVE MESSAGE QUOTA BEFORE PROCESSING (one atomic round trip)
         owner_user_id = chatbot.get('user_id')
         if owner_user_id:
             from services.plan_service import plan_service
-            limit_check = await plan_service.check_limit(owner_user_id, "messages")
+            limit_check = await plan_service.reserve_usage(owner_user_id, "messages", 2)
             
-            if limit_check.get("reached"):
+            if not limit_check.get("reserved"):
                 # Send limit exceeded message to user
                 limit_message = (
                     f"⚠️ *Message Limit Reached*\n\n"
@@ -96,30 +102,20 @@ async def process_slack_message(
         # Generate session ID based on channel and user
         session_id = f"slack_{channel}_{user_id}"
         
-        # Get or create conversation
-        conversation = await db.conversations.find_one({
+        # Get or create conversation (cached per session; new sessions are one upsert)
+        conversation_id, _ = await conversation_resolver.resolve(chatbot_id, session_id, {
+            "id": str(uuid.uuid4()),
             "chatbot_id": chatbot_id,
-            "session_id": session_id
+            "session_id": session_id,
+            "user_name": user_name,
+            "user_email": f"slack_{user_id}",
+            "status": "active",
+            "created_at": datetime.now(timezone.utc),
+            "updated_at": datetime.now(timezone.utc),
+            "message_count": 0,
+            "platform": "slack"
         })
         
-        if not conversation:
-            conversation_id = str(uuid.uuid4())
-            conversation = {
-                "id": conversation_id,
-                "chatbot_id": chatbot_id,
-                "session_id": session_id,
-                "user_name": user_name,
-                "user_email": f"slack_{user_id}",
-                "status": "active",
-                "created_at": datetime.now(timezone.utc),
-                "updated_at": datetime.now(timezone.utc),
-                "message_count": 0,
-                "platform": "slack"
-            }
-            await db.conversations.insert_one(conversation)
-        else:
-            conversation_id = conversation['id']
-        
         # Save user message
         user_message = {
             "id": str(uuid.uuid4()),
@@ -128,7 +124,7 @@ async def process_slack_message(
             "content": message_text,
             "timestamp": datetime.now(timezone.utc)
         }
-        await db.messages.insert_one(user_message)
+        await message_writer.write(user_message)
         
         # Get knowledge base context
         sources = await db.sources.find({
@@ -138,8 +134,6 @@ async def process_slack_message(
         
         context = ""
         if sources:
-            from services.vector_store import VectorStore
-            vector_store = VectorStore()
             relevant_chunks = await vector_store.search(
                 chatbot_id=chatbot_id,
                 query=message_text,
@@ -155,14 +149,20 @@ async def process_slack_message(
         system_message = chatbot.get('system_message', 'You are a helpful AI assistant.')
         
         # Pass context to generate_response
-        ai_response_tuple = await chat_service.generate_response(
-            message=message_text,
-            session_id=session_id,
-            system_message=system_message,
-            model=chatbot.get('model', 'gpt-4o-mini'),
-            provider=chatbot.get('provider', 'openai'),
-            context=context
-        )
+        try:
+            ai_response_tuple = await chat_service.generate_response(
+                message=message_text,
+                session_id=session_id,
+                system_message=system_message,
+                model=chatbot.get('model', 'gpt-4o-mini'),
+                provider=chatbot.get('provider', 'openai'),
+                context=context
+            )
+        except Exception:
+            # No reply was produced - give back the reserved quota
+            if owner_user_id:
+                await plan_service.release_usage(owner_user_id, "messages", 2)
+            raise
         
         # Unpack the response tuple (message, citation_footer)
         ai_response = ai_response_tuple[0] if isinstance(ai_response_tuple, tuple) else ai_response_tuple
@@ -175,28 +175,18 @@ async def process_slack_message(
             "content": ai_response,
             "timestamp": datetime.now(timezone.utc)
         }
-        await db.messages.insert_one(assistant_message)
+        await message_writer.write(assistant_message)
         
         # Update conversation
-        await db.conversations.update_one(
-            {"id": conversation_id},
-            {
-                "$set": {"updated_at": datetime.now(timezone.utc)},
-                "$inc": {"message_count": 2}
-            }
+        counter_aggregator.increment(
+            "conversations",
+            conversation_id,
+            {"message_count": 2},
+            set_fields={"updated_at": datetime.now(timezone.utc)}
         )
         
         # Update chatbot message count
-        await db.chatbots.update_one(
-            {"id": chatbot_id},
-            {"$inc": {"messages_count": 2}}
-        )
-        
-        # Update subscription usage (increment message count by 2 for user + assistant)
-        user_id_owner = chatbot.get('user_id')
-        if user_id_owner:
-            from services.plan_service import plan_service
-            await plan_service.increment_usage(user_id_owner, "messages", 2)
+        counter_aggregator.increment("chatbots", chatbot_id, {"messages_count": 2})
         
         # Send response back to Slack (in thread if applicable)
         result = await slack_service.send_message(
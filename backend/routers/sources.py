@@ -1,15 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, Form, Request
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
 from typing import List, Optional
 from datetime import datetime, timezone
 from models import Source, SourceCreate, SourceResponse
 from auth import get_current_user, get_current_user, User
 from services.document_processor import DocumentProcessor
-from services.website_scraper import WebsiteScraper
+from services.parsing_service import parsing_service
+from services.upload_spooler import upload_spooler, SpooledUpload, UploadTooLarge, InvalidUpload
+from services.website_crawler import website_crawler
 from services.rag_service import RAGService
 from services.plan_service import plan_service
 import logging
 import asyncio
+import hashlib
 
 logger = logging.getLogger(__name__)
 
@@ -49,8 +53,10 @@ async def get_sources(
         # Verify ownership
         await verify_chatbot_ownership(chatbot_id, current_user.id)
         
+        # Page text and crawl state are not part of the response
         sources = await db_instance.sources.find(
-            {"chatbot_id": chatbot_id}
+            {"chatbot_id": chatbot_id},
+            {"_id": 0, "content": 0, "crawl_state": 0}
         ).to_list(length=None)
         
         return [SourceResponse(**source) for source in sources]
@@ -64,10 +70,112 @@ async def get_sources(
         )
 
 
-@router.post("/chatbot/{chatbot_id}/file", response_model=SourceResponse, status_code=status.HTTP_201_CREATED)
+def source_status(rag_result: dict) -> dict:
+    """Source fields recording how indexing ended"""
+    if rag_result.get("success"):
+        return {"status": "completed", "error_message": None}
+    return {"status": "failed", "error_message": rag_result.get("error") or "Indexing failed"}
+
+
+async def process_uploaded_file(source: dict, chatbot: dict, upload: SpooledUpload, user_id: str, refresh: bool = False):
+    """
+    Parse a spooled upload and index it (background task)
+    
+    With `refresh`, the source's stored chunks are diffed by content hash
+    and only changed chunks are re-indexed.
+    """
+    chatbot_id = source["chatbot_id"]
+    try:
+        # Parse in a worker process that reads the spooled file itself
+        content = await parsing_service.parse_path(user_id, upload.filename, upload.path)
+        
+        await db_instance.sources.update_one({"id": source["id"]}, {"$set": {"content": content}})
+        
+        # Process with RAG (chunking + embeddings + vector storage)
+        logger.info(f"Processing document with RAG for source {source['id']}")
+        ingest = rag_service.refresh_document if refresh else rag_service.process_document
+        rag_result = await ingest(
+            text=content,
+            chatbot_id=chatbot_id,
+            source_id=source["id"],
+            source_type="file",
+            filename=upload.filename,
+            use_paragraph_chunking=True,
+            retrieval_mode=chatbot.get("retrieval_mode"),
+            tenant_id=user_id
+        )
+        
+        if rag_result.get("success"):
+            logger.info(f"RAG processing successful: {rag_result.get('chunks_created')} chunks created")
+        else:
+            logger.error(f"RAG processing failed: {rag_result.get('error')}")
+        
+        # The source stays claimed ("processing") until indexing is done
+        await db_instance.sources.update_one(
+            {"id": source["id"]},
+            {"$set": source_status(rag_result)}
+        )
+        
+        # Update chatbot last_trained timestamp
+        await db_instance.chatbots.update_one(
+            {"id": chatbot_id},
+            {"$set": {"last_trained": datetime.now(timezone.utc)}}
+        )
+    except Exception as e:
+        logger.error(f"Error processing file: {str(e)}")
+        await db_instance.sources.update_one(
+            {"id": source["id"]},
+            {"$set": {
+                "status": "failed",
+                "error_message": str(e)
+            }}
+        )
+    finally:
+        upload.cleanup()
+
+
+async def spool_upload(request: Request) -> SpooledUpload:
+    """Stream the request's file to disk, mapping spooler errors to HTTP errors"""
+    try:
+        return await upload_spooler.spool(request, "file")
+    except UploadTooLarge:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File size exceeds maximum allowed size of {DocumentProcessor.format_size(upload_spooler.max_bytes)}"
+        )
+    except InvalidUpload as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
+# The body is streamed by the handler itself, so the file field is only declared for the docs
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"]
+                }
+            }
+        }
+    }
+}
+
+
+@router.post(
+    "/chatbot/{chatbot_id}/file",
+    response_model=SourceResponse,
+    status_code=status.HTTP_201_CREATED,
+    openapi_extra=UPLOAD_OPENAPI
+)
 async def upload_file_source(
     chatbot_id: str,
-    file: UploadFile = File(...),
+    request: Request,
     current_user: User = Depends(get_current_user)
 ):
     """Upload a file as a training source (max 100MB)"""
@@ -86,80 +194,33 @@ async def upload_file_source(
             )
         
         # Verify ownership
-        await verify_chatbot_ownership(chatbot_id, current_user.id)
+        chatbot = await verify_chatbot_ownership(chatbot_id, current_user.id)
         
-        # Read file content
-        file_content = await file.read()
-        file_size = len(file_content)
+        # OPTIMIZATION: Stream the upload to a temp file (size limit enforced while
+        # streaming, hash computed incrementally) instead of reading it into memory
+        upload = await spool_upload(request)
         
-        # Check file size limit (100MB)
-        MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB in bytes
-        if file_size > MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail=f"File size exceeds maximum allowed size of 100MB. Current size: {DocumentProcessor.format_size(file_size)}"
+        try:
+            # Create source entry
+            source = Source(
+                chatbot_id=chatbot_id,
+                type="file",
+                name=upload.filename,
+                file_size=upload.size,
+                content_hash=upload.sha256,
+                status="processing"
             )
-        
-        # Create source entry
-        source = Source(
-            chatbot_id=chatbot_id,
-            type="file",
-            name=file.filename,
-            size=DocumentProcessor.format_size(file_size),
-            status="processing"
-        )
-        
-        await db_instance.sources.insert_one(source.model_dump())
-        
-        # Increment usage count
-        await plan_service.increment_usage(current_user.id, "file_uploads")
+            
+            await db_instance.sources.insert_one(source.model_dump())
+            
+            # Increment usage count
+            await plan_service.increment_usage(current_user.id, "file_uploads")
+        except Exception:
+            upload.cleanup()
+            raise
         
         # Process file in background
-        async def process_file():
-            try:
-                content = DocumentProcessor.process_file(file.filename, file_content)
-                
-                await db_instance.sources.update_one(
-                    {"id": source.id},
-                    {"$set": {
-                        "content": content,
-                        "status": "completed"
-                    }}
-                )
-                
-                # Process with RAG (chunking + embeddings + vector storage)
-                logger.info(f"Processing document with RAG for source {source.id}")
-                rag_result = await rag_service.process_document(
-                    text=content,
-                    chatbot_id=chatbot_id,
-                    source_id=source.id,
-                    source_type="file",
-                    filename=file.filename,
-                    use_paragraph_chunking=True
-                )
-                
-                if rag_result.get("success"):
-                    logger.info(f"RAG processing successful: {rag_result.get('chunks_created')} chunks created")
-                else:
-                    logger.error(f"RAG processing failed: {rag_result.get('error')}")
-                
-                # Update chatbot last_trained timestamp
-                await db_instance.chatbots.update_one(
-                    {"id": chatbot_id},
-                    {"$set": {"last_trained": datetime.now(timezone.utc)}}
-                )
-            except Exception as e:
-                logger.error(f"Error processing file: {str(e)}")
-                await db_instance.sources.update_one(
-                    {"id": source.id},
-                    {"$set": {
-                        "status": "failed",
-                        "error_message": str(e)
-                    }}
-                )
-        
-        # Start background task
-        asyncio.create_task(process_file())
+        asyncio.create_task(process_uploaded_file(source.model_dump(), chatbot, upload, current_user.id))
         
         return SourceResponse(**source.model_dump())
     except HTTPException:
@@ -172,6 +233,87 @@ async def upload_file_source(
         )
 
 
+def _page_key(url: str) -> str:
+    """Stable key separating the chunks of one crawled page from the others"""
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+
+
+async def crawl_website(source: dict, chatbot: dict, user_id: str):
+    """
+    Crawl a website source and ingest its pages as they arrive
+    
+    Re-crawls pass the stored crawl state, so unchanged pages are skipped
+    (conditional GETs and content hashes) and only the chunks of changed or
+    removed pages are re-indexed.
+    """
+    source_id = source["id"]
+    chatbot_id = source["chatbot_id"]
+    first_page = {}
+    
+    async def ingest_page(page: dict):
+        if page["url"] == source["url"] or not first_page:
+            first_page["text"] = page["text"]
+        # Changed pages are diffed by chunk hash so only their edited chunks are re-indexed
+        rag_result = await rag_service.refresh_document(
+            text=page["text"],
+            chatbot_id=chatbot_id,
+            source_id=source_id,
+            source_type="website",
+            filename=page["url"],
+            use_paragraph_chunking=True,
+            retrieval_mode=chatbot.get("retrieval_mode"),
+            tenant_id=user_id,
+            document_key=_page_key(page["url"])
+        )
+        if not rag_result.get("success"):
+            raise Exception(rag_result.get("error"))
+        logger.info(
+            f"RAG processing successful for {page['url']}: {rag_result.get('chunks_added')} chunks added, "
+            f"{rag_result.get('chunks_removed')} removed, {rag_result.get('chunks_unchanged')} unchanged"
+        )
+    
+    try:
+        result = await website_crawler.crawl(
+            source["url"],
+            ingest_page,
+            previous=source.get("crawl_state")
+        )
+        
+        for url in result["removed"]:
+            await rag_service.delete_document(chatbot_id, source_id, url)
+        
+        stats = result["stats"]
+        if not any(page.get("content_hash") for page in result["pages"]):
+            raise Exception("No content extracted from website")
+        
+        update = {
+            "status": "completed",
+            "error_message": None,
+            "crawl_state": result["pages"],
+            "pages_count": len(result["pages"]),
+            "last_crawled": datetime.now(timezone.utc)
+        }
+        if "text" in first_page:
+            update["content"] = first_page["text"]
+        await db_instance.sources.update_one({"id": source_id}, {"$set": update})
+        
+        # Update chatbot last_trained timestamp
+        if stats["ingested"] or stats["removed"]:
+            await db_instance.chatbots.update_one(
+                {"id": chatbot_id},
+                {"$set": {"last_trained": datetime.now(timezone.utc)}}
+            )
+    except Exception as e:
+        logger.error(f"Error crawling website: {str(e)}")
+        await db_instance.sources.update_one(
+            {"id": source_id},
+            {"$set": {
+                "status": "failed",
+                "error_message": str(e)
+            }}
+        )
+
+
 @router.post("/chatbot/{chatbot_id}/website", response_model=SourceResponse, status_code=status.HTTP_201_CREATED)
 async def add_website_source(
     chatbot_id: str,
@@ -194,7 +336,7 @@ async def add_website_source(
             )
         
         # Verify ownership
-        await verify_chatbot_ownership(chatbot_id, current_user.id)
+        chatbot = await verify_chatbot_ownership(chatbot_id, current_user.id)
         
         # Create source entry
         source = Source(
@@ -210,52 +352,8 @@ async def add_website_source(
         # Increment usage count
         await plan_service.increment_usage(current_user.id, "website_sources")
         
-        # Scrape website in background
-        async def scrape_website():
-            try:
-                content = WebsiteScraper.scrape_url(url)
-                
-                await db_instance.sources.update_one(
-                    {"id": source.id},
-                    {"$set": {
-                        "content": content,
-                        "status": "completed"
-                    }}
-                )
-                
-                # Process with RAG
-                logger.info(f"Processing website with RAG for source {source.id}")
-                rag_result = await rag_service.process_document(
-                    text=content,
-                    chatbot_id=chatbot_id,
-                    source_id=source.id,
-                    source_type="website",
-                    filename=url,
-                    use_paragraph_chunking=True
-                )
-                
-                if rag_result.get("success"):
-                    logger.info(f"RAG processing successful: {rag_result.get('chunks_created')} chunks created")
-                else:
-                    logger.error(f"RAG processing failed: {rag_result.get('error')}")
-                
-                # Update chatbot last_trained timestamp
-                await db_instance.chatbots.update_one(
-                    {"id": chatbot_id},
-                    {"$set": {"last_trained": datetime.now(timezone.utc)}}
-                )
-            except Exception as e:
-                logger.error(f"Error scraping website: {str(e)}")
-                await db_instance.sources.update_one(
-                    {"id": source.id},
-                    {"$set": {
-                        "status": "failed",
-                        "error_message": str(e)
-                    }}
-                )
-        
-        # Start background task
-        asyncio.create_task(scrape_website())
+        # Crawl website in background
+        asyncio.create_task(crawl_website(source.model_dump(), chatbot, current_user.id))
         
         return SourceResponse(**source.model_dump())
     except HTTPException:
@@ -268,6 +366,49 @@ async def add_website_source(
         )
 
 
+@router.post("/{source_id}/recrawl", response_model=SourceResponse)
+async def recrawl_website_source(
+    source_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Re-crawl a website source, re-indexing only pages that changed"""
+    try:
+        source = await db_instance.sources.find_one({"id": source_id}, {"_id": 0, "content": 0})
+        if not source or source.get("type") != "website":
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Website source not found"
+            )
+        
+        # Verify ownership through chatbot
+        chatbot = await verify_chatbot_ownership(source["chatbot_id"], current_user.id)
+        
+        # Claim the source atomically so concurrent requests start a single crawl
+        source = await db_instance.sources.find_one_and_update(
+            {"id": source_id, "status": {"$ne": "processing"}},
+            {"$set": {"status": "processing"}},
+            projection={"_id": 0, "content": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if not source:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Website is already being crawled"
+            )
+        
+        asyncio.create_task(crawl_website(source, chatbot, current_user.id))
+        
+        return SourceResponse(**source)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error re-crawling website: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to re-crawl website"
+        )
+
+
 @router.post("/chatbot/{chatbot_id}/text", response_model=SourceResponse, status_code=status.HTTP_201_CREATED)
 async def add_text_source(
     chatbot_id: str,
@@ -291,7 +432,7 @@ async def add_text_source(
             )
         
         # Verify ownership
-        await verify_chatbot_ownership(chatbot_id, current_user.id)
+        chatbot = await verify_chatbot_ownership(chatbot_id, current_user.id)
         
         # Create source entry
         source = Source(
@@ -317,7 +458,9 @@ async def add_text_source(
                     source_id=source.id,
                     source_type="text",
                     filename=name,
-                    use_paragraph_chunking=True
+                    use_paragraph_chunking=True,
+                    retrieval_mode=chatbot.get("retrieval_mode"),
+                    tenant_id=current_user.id
                 )
                 
                 if rag_result.get("success"):
@@ -347,6 +490,149 @@ async def add_text_source(
         )
 
 
+async def get_owned_source(source_id: str, source_type: str, user_id: str):
+    """Get a source of the given type owned by the user, with its chatbot"""
+    source = await db_instance.sources.find_one({"id": source_id}, {"_id": 0, "content": 0, "crawl_state": 0})
+    if not source or source.get("type") != source_type:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Source not found"
+        )
+    
+    # Verify ownership through chatbot
+    chatbot = await verify_chatbot_ownership(source["chatbot_id"], user_id)
+    
+    if source.get("status") == "processing":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Source is still being processed"
+        )
+    return source, chatbot
+
+
+@router.put("/{source_id}/file", response_model=SourceResponse, openapi_extra=UPLOAD_OPENAPI)
+async def replace_file_source(
+    source_id: str,
+    request: Request,
+    current_user: User = Depends(get_current_user)
+):
+    """Upload a new version of a file source; only changed chunks are re-indexed"""
+    try:
+        source, chatbot = await get_owned_source(source_id, "file", current_user.id)
+        upload = await spool_upload(request)
+        
+        # Same bytes as the stored version: nothing to re-index
+        if upload.sha256 == source.get("content_hash") and source.get("status") == "completed":
+            upload.cleanup()
+            return SourceResponse(**source)
+        
+        update = {
+            "name": upload.filename,
+            "file_size": upload.size,
+            "content_hash": upload.sha256,
+            "status": "processing",
+            "error_message": None
+        }
+        # Claim the source atomically so concurrent uploads don't both re-index it
+        claimed = await db_instance.sources.find_one_and_update(
+            {"id": source_id, "status": {"$ne": "processing"}},
+            {"$set": update},
+            projection={"_id": 1}
+        )
+        if not claimed:
+            upload.cleanup()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Source is still being processed"
+            )
+        source.update(update)
+        
+        asyncio.create_task(process_uploaded_file(source, chatbot, upload, current_user.id, refresh=True))
+        
+        return SourceResponse(**source)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error replacing file: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to replace file"
+        )
+
+
+@router.put("/{source_id}/text", response_model=SourceResponse)
+async def update_text_source(
+    source_id: str,
+    content: str = Form(...),
+    name: Optional[str] = Form(None),
+    current_user: User = Depends(get_current_user)
+):
+    """Update a text source; only changed chunks are re-indexed"""
+    try:
+        source, chatbot = await get_owned_source(source_id, "text", current_user.id)
+        
+        update = {"content": content, "status": "processing", "error_message": None}
+        if name:
+            update["name"] = name
+        # Claim the source atomically so concurrent edits don't diff the same chunks twice
+        claimed = await db_instance.sources.find_one_and_update(
+            {"id": source_id, "status": {"$ne": "processing"}},
+            {"$set": update},
+            projection={"_id": 1}
+        )
+        if not claimed:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Source is still being processed"
+            )
+        source.update(update)
+        
+        async def refresh_text():
+            try:
+                rag_result = await rag_service.refresh_document(
+                    text=content,
+                    chatbot_id=source["chatbot_id"],
+                    source_id=source_id,
+                    source_type="text",
+                    filename=source["name"],
+                    use_paragraph_chunking=True,
+                    retrieval_mode=chatbot.get("retrieval_mode"),
+                    tenant_id=current_user.id
+                )
+                
+                if rag_result.get("success"):
+                    logger.info(
+                        f"RAG refresh successful: {rag_result.get('chunks_added')} chunks added, "
+                        f"{rag_result.get('chunks_removed')} removed"
+                    )
+                    if rag_result.get("chunks_added") or rag_result.get("chunks_removed"):
+                        await db_instance.chatbots.update_one(
+                            {"id": source["chatbot_id"]},
+                            {"$set": {"last_trained": datetime.now(timezone.utc)}}
+                        )
+                else:
+                    logger.error(f"RAG refresh failed: {rag_result.get('error')}")
+            except Exception as e:
+                logger.error(f"Error in RAG refresh for text: {str(e)}")
+                rag_result = {"success": False, "error": str(e)}
+            
+            # Release the claim
+            await db_instance.sources.update_one({"id": source_id}, {"$set": source_status(rag_result)})
+        
+        # Start background task
+        asyncio.create_task(refresh_text())
+        
+        return SourceResponse(**source)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error updating text: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to update text"
+        )
+
+
 @router.delete("/{source_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_source(
     source_id: str,
@@ -5,15 +5,13 @@ from datetime import datetime, timedelta
 import uuid
 import secrets
 import hashlib
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
+from database import get_client
 from bson import ObjectId
 
 router = APIRouter()
 
 # MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = AsyncIOMotorClient(MONGO_URL)
+client = get_client()
 db = client['chatbase_db']
 
 # Models
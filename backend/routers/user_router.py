@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, status, Depends
 from models import UserResponse, UserUpdate, PasswordChange, User
-from auth import get_current_user, verify_password, get_password_hash
+from auth import get_current_user, verify_password_async, get_password_hash_async
+from services.user_cache import user_cache
 from datetime import datetime, timezone
 
 router = APIRouter(prefix="/user", tags=["User Management"])
@@ -63,6 +64,7 @@ async def update_profile(user_update: UserUpdate, current_user: User = Depends(g
         {"email": email},
         {"$set": update_data}
     )
+    user_cache.invalidate_email(email)
     
     if result.modified_count == 0:
         raise HTTPException(
@@ -111,14 +113,14 @@ async def change_password(password_data: PasswordChange, current_user: User = De
     # For demo/mock users, skip password verification
     if email != "demo-user-123@botsmith.com":
         # Verify current password for real users
-        if not verify_password(password_data.current_password, user_doc['password_hash']):
+        if not await verify_password_async(password_data.current_password, user_doc['password_hash']):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Current password is incorrect"
             )
     
     # Update password
-    new_password_hash = get_password_hash(password_data.new_password)
+    new_password_hash = await get_password_hash_async(password_data.new_password)
     await users_collection.update_one(
         {"email": email},
         {"$set": {
@@ -126,6 +128,7 @@ async def change_password(password_data: PasswordChange, current_user: User = De
             "updated_at": datetime.now(timezone.utc).isoformat()
         }}
     )
+    user_cache.invalidate_email(email)
     
     return {"message": "Password changed successfully"}
 
@@ -158,6 +161,7 @@ async def delete_account(current_user: User = Depends(get_current_user)):
         
         # Finally, delete user
         result = await users_collection.delete_one({"email": email})
+        user_cache.invalidate_email(email)
         
         if result.deleted_count == 0:
             raise HTTPException(
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, HTTPException, Request, BackgroundTasks, Depends
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import get_client
 from datetime import datetime, timezone
 import os
 import logging
@@ -9,15 +9,17 @@ from typing import Dict, Any
 
 from services.whatsapp_service import WhatsAppService
 from services.chat_service import ChatService
+from services.counter_aggregator import counter_aggregator
+from services.message_writer import message_writer
+from services.conversation_resolver import conversation_resolver
 from services.rag_service import RAGService
 from auth import get_current_user
 
 router = APIRouter(prefix="/whatsapp", tags=["whatsapp"])
 
 # MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
 DB_NAME = os.environ.get('DB_NAME', 'chatbase_db')
-client = AsyncIOMotorClient(MONGO_URL)
+client = get_client()
 db = client[DB_NAME]
 
 logger = logging.getLogger(__name__)
@@ -184,13 +186,13 @@ async def process_whatsapp_message(chatbot_id: str, message: Dict[str, Any], val
         
         whatsapp_service = WhatsAppService(access_token, phone_number_id)
         
-        # ✅ CHECK MESSAGE LIMIT BEFORE PROCESSING
+        # ✅ CHECK AND RESERVE MESSAGE QUOTA BEFORE PROCESSING (one atomic round trip)
         owner_user_id = chatbot.get('user_id')
         if owner_user_id:
             from services.plan_service import plan_service
-            limit_check = await plan_service.check_limit(owner_user_id, "messages")
+            limit_check = await plan_service.reserve_usage(owner_user_id, "messages", 2)
             
-            if limit_check.get("reached"):
+            if not limit_check.get("reserved"):
                 # Send limit exceeded message to user
                 limit_message = (
                     f"⚠️ *Message Limit Reached*\n\n"
@@ -205,30 +207,21 @@ async def process_whatsapp_message(chatbot_id: str, message: Dict[str, Any], val
         # Generate session ID from phone number and chatbot
         session_id = f"whatsapp_{chatbot_id}_{from_number}"
         
-        # Get or create conversation
-        conversation = await db.conversations.find_one({
+        # Get or create conversation (cached per session; new sessions are one upsert)
+        conversation_id, created = await conversation_resolver.resolve(chatbot_id, session_id, {
+            "id": f"conv_{chatbot_id}_{from_number}_{int(datetime.now(timezone.utc).timestamp())}",
             "chatbot_id": chatbot_id,
-            "session_id": session_id
+            "session_id": session_id,
+            "user_name": from_number,
+            "user_email": f"{from_number}@whatsapp.user",
+            "status": "active",
+            "created_at": datetime.now(timezone.utc),
+            "updated_at": datetime.now(timezone.utc),
+            "message_count": 0,
+            "platform": "whatsapp"
         })
-        
-        if not conversation:
-            # Create new conversation
-            conversation = {
-                "id": f"conv_{chatbot_id}_{from_number}_{int(datetime.now(timezone.utc).timestamp())}",
-                "chatbot_id": chatbot_id,
-                "session_id": session_id,
-                "user_name": from_number,
-                "user_email": f"{from_number}@whatsapp.user",
-                "status": "active",
-                "created_at": datetime.now(timezone.utc),
-                "updated_at": datetime.now(timezone.utc),
-                "message_count": 0,
-                "platform": "whatsapp"
-            }
-            await db.conversations.insert_one(conversation)
-            logger.info(f"Created new WhatsApp conversation: {conversation['id']}")
-        
-        conversation_id = conversation["id"]
+        if created:
+            logger.info(f"Created new WhatsApp conversation: {conversation_id}")
         
         # Save user message
         user_message = {
@@ -244,7 +237,7 @@ async def process_whatsapp_message(chatbot_id: str, message: Dict[str, Any], val
                 "from_number": from_number
             }
         }
-        await db.messages.insert_one(user_message)
+        await message_writer.write(user_message)
         
         # Get conversation history (last 10 messages)
         history = await db.messages.find({
@@ -276,15 +269,21 @@ async def process_whatsapp_message(chatbot_id: str, message: Dict[str, Any], val
         
         # Generate AI response
         chat_service = ChatService()
-        ai_response, citations = await chat_service.generate_response(
-            message=text_body,
-            session_id=session_id,
-            system_message=chatbot.get("instructions", "You are a helpful assistant."),
-            model=chatbot.get("model", "gpt-4o-mini"),
-            provider=chatbot.get("provider", "openai"),
-            context=context,
-            citation_footer=citation_footer
-        )
+        try:
+            ai_response, citations = await chat_service.generate_response(
+                message=text_body,
+                session_id=session_id,
+                system_message=chatbot.get("instructions", "You are a helpful assistant."),
+                model=chatbot.get("model", "gpt-4o-mini"),
+                provider=chatbot.get("provider", "openai"),
+                context=context,
+                citation_footer=citation_footer
+            )
+        except Exception:
+            # No reply was produced - give back the reserved quota
+            if owner_user_id:
+                await plan_service.release_usage(owner_user_id, "messages", 2)
+            raise
         
         # Save assistant message
         assistant_message = {
@@ -296,7 +295,7 @@ async def process_whatsapp_message(chatbot_id: str, message: Dict[str, Any], val
             "timestamp": datetime.now(timezone.utc),
             "platform": "whatsapp"
         }
-        await db.messages.insert_one(assistant_message)
+        await message_writer.write(assistant_message)
         
         # Send response via WhatsApp
         send_result = await whatsapp_service.send_message(from_number, ai_response)
@@ -310,21 +309,17 @@ async def process_whatsapp_message(chatbot_id: str, message: Dict[str, Any], val
             logger.error(f"❌ Failed to send WhatsApp response: {send_result.get('error')}")
         
         # Update conversation stats
-        await db.conversations.update_one(
-            {"id": conversation_id},
-            {
-                "$set": {"updated_at": datetime.now(timezone.utc)},
-                "$inc": {"message_count": 2}  # User + Assistant
-            }
+        counter_aggregator.increment(
+            "conversations",
+            conversation_id,
+            {"message_count": 2},
+            set_fields={"updated_at": datetime.now(timezone.utc)}
         )
         
         # Update chatbot usage (for subscription tracking)
         user = await db.users.find_one({"id": chatbot["user_id"]})
         if user and user.get("subscription"):
-            await db.users.update_one(
-                {"id": chatbot["user_id"]},
-                {"$inc": {"subscription.messages_this_month": 2}}
-            )
+            counter_aggregator.increment("users", chatbot["user_id"], {"subscription.messages_this_month": 2})
         
         # Log integration event
         from routers.integrations import log_integration_event
@@ -1,10 +1,17 @@
 from fastapi import FastAPI, APIRouter, WebSocket, WebSocketDisconnect, Depends
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+# Load environment before importing routers: they obtain the shared MongoDB
+# client (and its pool settings) at import time
+load_dotenv(ROOT_DIR / '.env')
+
+from database import get_client, get_rag_database, close_client
+from db_indexes import ensure_indexes
 from routers import auth_router, user_router, chatbots, sources, chat, analytics, plans, advanced_analytics, public_chat, lemonsqueezy, admin, admin_users, admin_users_enhanced, admin_chatbots, notifications, integrations, password_reset, telegram, slack, discord, msteams, instagram, admin_leads, leads, tech_management, whatsapp, messenger, payment_settings, admin_settings
 import auth
 from services.plan_service import plan_service
@@ -12,20 +19,11 @@ from typing import Dict
 import json
 
 # Import security middleware
-from middleware.security import (
-    SecurityHeadersMiddleware,
-    RateLimitMiddleware,
-    InputValidationMiddleware,
-    APIKeyProtectionMiddleware
-)
-
+from middleware.security import SecurityMiddleware
 
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# MongoDB connection (single process-wide client and connection pool)
+client = get_client()
 db = client[os.environ['DB_NAME']]
 
 # Initialize auth module with database
@@ -138,17 +136,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Security headers middleware
-app.add_middleware(SecurityHeadersMiddleware)
-
-# Rate limiting middleware (200 requests/min, 5000 requests/hour)
-app.add_middleware(RateLimitMiddleware, requests_per_minute=200, requests_per_hour=5000)
-
-# Input validation middleware
-app.add_middleware(InputValidationMiddleware)
-
-# API key protection middleware
-app.add_middleware(APIKeyProtectionMiddleware)
+# Security middleware (pure ASGI): input validation, rate limiting
+# (200 requests/min, 5000 requests/hour) and security headers
+app.add_middleware(SecurityMiddleware, requests_per_minute=200, requests_per_hour=5000)
 
 # Configure logging
 logging.basicConfig(
@@ -159,7 +149,13 @@ logger = logging.getLogger(__name__)
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize plans and Discord bots on startup"""
+    """Initialize indexes, plans and Discord bots on startup"""
+    # Create declared indexes once instead of on every write path
+    try:
+        await ensure_indexes(db, get_rag_database())
+    except Exception as e:
+        logger.error(f"Failed to ensure database indexes: {str(e)}")
+    
     logger.info("Initializing plans...")
     await plan_service.initialize_plans()
     logger.info("Plans initialized successfully")
@@ -168,7 +164,7 @@ async def startup_event():
     try:
         logger.info("Checking for existing users...")
         from datetime import datetime, timezone
-        from auth import get_password_hash
+        from auth import get_password_hash_async
         from models import User
         
         users_collection = db.users
@@ -180,7 +176,7 @@ async def startup_event():
                 id="admin-001",
                 name="Admin User",
                 email="admin@botsmith.com",
-                password_hash=get_password_hash("admin123"),
+                password_hash=await get_password_hash_async("admin123"),
                 role="admin",
                 status="active",
                 created_at=datetime.now(timezone.utc),
@@ -227,7 +223,39 @@ async def shutdown_db_client():
     except Exception as e:
         logger.warning(f"Error stopping Discord bots: {str(e)}")
     
-    client.close()
+    # Write queued messages and buffered chatbot/conversation counters before the client closes
+    try:
+        from services.message_writer import message_writer
+        await message_writer.stop()
+    except Exception as e:
+        logger.warning(f"Error flushing queued messages: {str(e)}")
+    
+    try:
+        from services.counter_aggregator import counter_aggregator
+        await counter_aggregator.stop()
+    except Exception as e:
+        logger.warning(f"Error flushing counters: {str(e)}")
+    
+    try:
+        from services.password_hasher import password_hasher
+        password_hasher.shutdown()
+    except Exception as e:
+        logger.warning(f"Error stopping password hasher threads: {str(e)}")
+    
+    # Stop document parser worker processes
+    try:
+        from services.parsing_service import parsing_service
+        parsing_service.shutdown()
+    except Exception as e:
+        logger.warning(f"Error stopping parser workers: {str(e)}")
+    
+    try:
+        from services.website_crawler import website_crawler
+        await website_crawler.close()
+    except Exception as e:
+        logger.warning(f"Error closing crawler client: {str(e)}")
+    
+    close_client()
 
 
 # WebSocket endpoint for real-time notifications
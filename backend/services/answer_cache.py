@@ -0,0 +1,190 @@
+import re
+import hashlib
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+from database import get_database
+from .embedding_service import HashingEmbedder
+
+logger = logging.getLogger(__name__)
+
+# Chatbot settings that change the generated answer
+_CONFIG_FIELDS = ("instructions", "system_message", "model", "provider", "temperature", "max_tokens")
+
+DEFAULT_SIMILARITY_THRESHOLD = 0.92
+
+
+def normalize_question(text: str) -> str:
+    """
+    Normalize a user question (shared with the top-questions analytics)
+
+    Lowercases, removes punctuation and collapses whitespace.
+    """
+    content = text.strip().lower()
+    content = re.sub(r'[^\w\s]', '', content)
+    content = re.sub(r'\s+', ' ', content)
+    return content
+
+
+def context_fingerprint(rag_result: Dict) -> str:
+    """Fingerprint of the retrieved context (the chunks an answer was grounded on)"""
+    chunk_ids = sorted(
+        str(match.get("metadata", {}).get("chunk_id"))
+        for match in rag_result.get("matches", [])
+    )
+    return hashlib.sha256("|".join(chunk_ids).encode("utf-8")).hexdigest()
+
+
+def config_fingerprint(chatbot: Dict) -> str:
+    """Fingerprint of the chatbot settings that affect generated answers"""
+    config = "|".join(str(chatbot.get(field)) for field in _CONFIG_FIELDS)
+    return hashlib.sha256(config.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """
+    Opt-in per-chatbot cache of generated answers
+
+    An answer is reused when a new question for the same chatbot retrieves
+    exactly the same context (same chunks), the chatbot's instructions and
+    model are unchanged, and the normalized question is similar enough to
+    the cached one (cosine similarity of hashed character/word features).
+    Entries are dropped when the chatbot's sources or settings change.
+    """
+
+    def __init__(self, max_candidates: int = 50):
+        """
+        Initialize answer cache
+
+        Args:
+            max_candidates: Cached answers compared per lookup
+        """
+        self.collection = get_database()['answer_cache']
+
+        self.max_candidates = max_candidates
+        self.embedder = HashingEmbedder(dimensions=256)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def is_enabled(chatbot: Dict) -> bool:
+        return bool(chatbot.get("answer_cache_enabled"))
+
+    def _similarity(self, question: str, cached_question: str) -> float:
+        if question == cached_question:
+            return 1.0
+        a = self.embedder.embed(question)
+        b = self.embedder.embed(cached_question)
+        return sum(x * y for x, y in zip(a, b))
+
+    async def lookup(self, chatbot: Dict, question: str, rag_result: Dict) -> Optional[Dict]:
+        """
+        Find a cached answer for a question
+
+        Args:
+            chatbot: Chatbot document
+            question: Raw user question
+            rag_result: Result of RAGService.retrieve_relevant_context
+
+        Returns:
+            Cached entry ({"answer", "citation_footer", "similarity"}) or None
+        """
+        if not self.is_enabled(chatbot):
+            return None
+
+        try:
+            normalized = normalize_question(question)
+            if not normalized:
+                return None
+
+            threshold = chatbot.get("answer_cache_threshold") or DEFAULT_SIMILARITY_THRESHOLD
+            candidates = await self.collection.find(
+                {
+                    "chatbot_id": chatbot["id"],
+                    "context_fingerprint": context_fingerprint(rag_result),
+                    "config_fingerprint": config_fingerprint(chatbot)
+                },
+                {"_id": 1, "question": 1, "answer": 1, "citation_footer": 1}
+            ).sort("hits", -1).limit(self.max_candidates).to_list(length=self.max_candidates)
+
+            best, best_similarity = None, 0.0
+            for candidate in candidates:
+                similarity = self._similarity(normalized, candidate["question"])
+                if similarity > best_similarity:
+                    best, best_similarity = candidate, similarity
+
+            if best is None or best_similarity < threshold:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            await self.collection.update_one(
+                {"_id": best["_id"]},
+                {"$inc": {"hits": 1}, "$set": {"last_hit_at": datetime.now(timezone.utc)}}
+            )
+            return {
+                "answer": best["answer"],
+                "citation_footer": best.get("citation_footer"),
+                "similarity": round(best_similarity, 4)
+            }
+
+        except Exception as e:
+            logger.error(f"Answer cache lookup failed: {str(e)}")
+            return None
+
+    async def store(self, chatbot: Dict, question: str, rag_result: Dict, answer: str, citation_footer: Optional[str] = None):
+        """Cache a generated answer (no-op unless enabled for the chatbot)"""
+        if not self.is_enabled(chatbot):
+            return
+
+        try:
+            normalized = normalize_question(question)
+            if not normalized:
+                return
+
+            await self.collection.update_one(
+                {
+                    "chatbot_id": chatbot["id"],
+                    "context_fingerprint": context_fingerprint(rag_result),
+                    "config_fingerprint": config_fingerprint(chatbot),
+                    "question": normalized
+                },
+                {
+                    "$set": {
+                        "answer": answer,
+                        "citation_footer": citation_footer,
+                        "updated_at": datetime.now(timezone.utc)
+                    },
+                    "$setOnInsert": {"hits": 0, "created_at": datetime.now(timezone.utc)}
+                },
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Failed to cache answer: {str(e)}")
+
+    async def invalidate(self, chatbot_id: str) -> int:
+        """Drop all cached answers of a chatbot (sources or settings changed)"""
+        try:
+            result = await self.collection.delete_many({"chatbot_id": chatbot_id})
+            if result.deleted_count:
+                logger.info(f"Invalidated {result.deleted_count} cached answers for chatbot {chatbot_id}")
+            return result.deleted_count
+        except Exception as e:
+            logger.error(f"Failed to invalidate answer cache: {str(e)}")
+            return 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        total_requests = self.hits + self.misses
+        hit_rate = (self.hits / total_requests * 100) if total_requests > 0 else 0
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(hit_rate, 2),
+            "total_requests": total_requests
+        }
+
+
+# Global answer cache instance
+answer_cache = AnswerCache()
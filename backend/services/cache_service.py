@@ -1,28 +1,120 @@
-from typing import Dict, Any, Optional
-from datetime import datetime, timedelta
+import os
+import sys
+import time
+import random
+import asyncio
 import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+_SCALARS = (int, float, bool, type(None))
+# Marks a cache miss (None can be a cached value)
+_MISSING = object()
+
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """
+    Approximate memory footprint of a cached value in bytes
+
+    Walks dicts, sequences and pydantic models (a few levels deep) so large
+    nested strings, e.g. data-URL logos in chatbot documents, are counted.
+    """
+    if isinstance(value, _SCALARS):
+        return 24
+    if isinstance(value, (str, bytes, bytearray)):
+        return sys.getsizeof(value)
+    if _depth >= 6:
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_size(item, _depth + 1) for item in value)
+    if hasattr(value, "__dict__"):
+        return sys.getsizeof(value) + estimate_size(vars(value), _depth + 1)
+    return sys.getsizeof(value)
+
 
 class CacheService:
     """
-    Simple in-memory cache service with TTL (Time To Live)
+    In-memory LRU cache with TTL (Time To Live)
     Used for caching frequently accessed data like chatbot settings
+    
+    - Bounded by entry count and an estimated byte budget; least recently
+      used entries are evicted first
+    - Expiries use time.monotonic and TTLs are jittered (shortened by up to
+      `ttl_jitter`) so entries written together do not expire together
+    - `get_or_load` coalesces concurrent misses of a key into one load
+      (single-flight), so an expiring hot key causes one database read
+      instead of one per waiting request
+    - `invalidate_prefix` drops a whole namespace (e.g. "chatbot:")
     """
     
-    def __init__(self, default_ttl_seconds: int = 300):
+    def __init__(
+        self,
+        default_ttl_seconds: int = 300,
+        max_entries: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_jitter: float = 0.1
+    ):
         """
         Initialize cache service
         
         Args:
             default_ttl_seconds: Default time to live for cache entries (5 minutes)
+            max_entries: Maximum number of entries
+            max_bytes: Budget for the estimated size of all cached values
+            ttl_jitter: Fraction by which TTLs are randomly shortened (0 disables)
         """
-        self._cache: Dict[str, Dict[str, Any]] = {}
+        # key -> (value, expires_at (monotonic), size)
+        self._cache: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # Bumped by every delete/invalidation; loads started earlier are not cached
+        self._generation = 0
         self.default_ttl = default_ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_jitter = ttl_jitter
+        self.bytes = 0
+        
         self.hits = 0
         self.misses = 0
-        logger.info(f"Cache service initialized with {default_ttl_seconds}s TTL")
+        self.evictions = 0
+        self.expirations = 0
+        self.loads = 0
+        self.load_errors = 0
+        self.coalesced = 0
+        self.load_ms_total = 0.0
+        self.load_ms_max = 0.0
+        logger.info(
+            f"Cache service initialized with {default_ttl_seconds}s TTL "
+            f"(max_entries: {max_entries}, max_bytes: {max_bytes})"
+        )
+    
+    def _remove(self, key: str):
+        entry = self._cache.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+    
+    def _lookup(self, key: str) -> Any:
+        entry = self._cache.get(key)
+        if entry is None:
+            self.misses += 1
+            return _MISSING
+        
+        # Check if expired
+        if time.monotonic() >= entry[1]:
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return _MISSING
+        
+        self._cache.move_to_end(key)
+        self.hits += 1
+        return entry[0]
     
     def get(self, key: str) -> Optional[Any]:
         """
@@ -30,24 +122,12 @@ class CacheService:
         
         Args:
             key: Cache key
-            
+        
         Returns:
             Cached value or None if not found or expired
         """
-        if key not in self._cache:
-            self.misses += 1
-            return None
-        
-        entry = self._cache[key]
-        
-        # Check if expired
-        if datetime.now() > entry["expires_at"]:
-            del self._cache[key]
-            self.misses += 1
-            return None
-        
-        self.hits += 1
-        return entry["value"]
+        value = self._lookup(key)
+        return None if value is _MISSING else value
     
     def set(self, key: str, value: Any, ttl_seconds: Optional[int] = None):
         """
@@ -59,36 +139,132 @@ class CacheService:
             ttl_seconds: Optional custom TTL (uses default if not provided)
         """
         ttl = ttl_seconds if ttl_seconds is not None else self.default_ttl
-        expires_at = datetime.now() + timedelta(seconds=ttl)
+        if self.ttl_jitter:
+            ttl *= 1 - random.random() * self.ttl_jitter
         
-        self._cache[key] = {
-            "value": value,
-            "expires_at": expires_at,
-            "created_at": datetime.now()
-        }
+        size = estimate_size(value)
+        self._remove(key)
+        if size > self.max_bytes:
+            logger.warning(f"Not caching {key}: {size} bytes exceeds the cache budget")
+            return
+        
+        self._cache[key] = (value, time.monotonic() + ttl, size)
+        self.bytes += size
+        
+        while len(self._cache) > self.max_entries or self.bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._cache.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+    
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl_seconds: Optional[int] = None,
+        cache_none: bool = False
+    ) -> Any:
+        """
+        Get value from cache, loading it on a miss
+        
+        Concurrent misses of the same key share one `loader` call. The load
+        is shielded, so a cancelled caller does not cancel it for the others.
+        Exceptions from `loader` are raised to every waiting caller and are
+        not cached.
+        
+        Args:
+            key: Cache key
+            loader: Coroutine function producing the value (e.g. a database read)
+            ttl_seconds: Optional custom TTL (uses default if not provided)
+            cache_none: Also cache a None result (e.g. "not found")
+        
+        Returns:
+            Cached or loaded value
+        """
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value
+        
+        task = self._inflight.get(key)
+        if task is None:
+            # The generation is taken now: the task may only start after an invalidation
+            task = asyncio.ensure_future(self._load(key, loader, ttl_seconds, cache_none, self._generation))
+            # Retrieve the exception even if every caller was cancelled
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+    
+    async def _load(
+        self,
+        key: str,
+        loader,
+        ttl_seconds: Optional[int],
+        cache_none: bool,
+        generation: int
+    ) -> Any:
+        started = time.perf_counter()
+        try:
+            value = await loader()
+        except BaseException:
+            self.load_errors += 1
+            raise
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.loads += 1
+            self.load_ms_total += elapsed_ms
+            self.load_ms_max = max(self.load_ms_max, elapsed_ms)
+        
+        # Not cached if the key was invalidated while loading
+        if (value is not None or cache_none) and generation == self._generation:
+            self.set(key, value, ttl_seconds)
+        return value
     
     def delete(self, key: str):
         """Delete a key from cache"""
-        if key in self._cache:
-            del self._cache[key]
+        self._generation += 1
+        self._remove(key)
+        # Later callers must not join a load that started before the delete
+        self._inflight.pop(key, None)
+    
+    def invalidate_prefix(self, prefix: str) -> int:
+        """
+        Delete every key starting with `prefix` (a namespace such as "chatbot:")
+        
+        Returns:
+            Number of entries removed
+        """
+        self._generation += 1
+        keys = [key for key in self._cache if key.startswith(prefix)]
+        for key in keys:
+            self._remove(key)
+        for key in [key for key in self._inflight if key.startswith(prefix)]:
+            del self._inflight[key]
+        return len(keys)
     
     def clear(self):
         """Clear all cache entries"""
+        self._generation += 1
         self._cache.clear()
+        self._inflight.clear()
+        self.bytes = 0
         self.hits = 0
         self.misses = 0
         logger.info("Cache cleared")
     
     def clear_expired(self):
         """Remove all expired entries"""
-        now = datetime.now()
+        now = time.monotonic()
         expired_keys = [
             key for key, entry in self._cache.items()
-            if now > entry["expires_at"]
+            if now >= entry[1]
         ]
         
         for key in expired_keys:
-            del self._cache[key]
+            self._remove(key)
+        self.expirations += len(expired_keys)
         
         if expired_keys:
             logger.info(f"Cleared {len(expired_keys)} expired cache entries")
@@ -100,12 +276,28 @@ class CacheService:
         
         return {
             "size": len(self._cache),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
             "hits": self.hits,
             "misses": self.misses,
             "hit_rate": round(hit_rate, 2),
-            "total_requests": total_requests
+            "total_requests": total_requests,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "loads": self.loads,
+            "load_errors": self.load_errors,
+            "coalesced": self.coalesced,
+            "loads_in_flight": len(self._inflight),
+            "avg_load_ms": round(self.load_ms_total / self.loads, 2) if self.loads else 0,
+            "max_load_ms": round(self.load_ms_max, 2)
         }
 
 
 # Global cache instance
-cache_service = CacheService(default_ttl_seconds=300)  # 5 minutes default TTL
+cache_service = CacheService(
+    default_ttl_seconds=300,  # 5 minutes default TTL
+    max_entries=int(os.environ.get('CACHE_MAX_ENTRIES', '10000')),
+    max_bytes=int(os.environ.get('CACHE_MAX_MB', '64')) * 1024 * 1024,
+    ttl_jitter=float(os.environ.get('CACHE_TTL_JITTER', '0.1'))
+)
@@ -1,5 +1,6 @@
 from emergentintegrations.llm.chat import LlmChat, UserMessage
-from typing import List, Dict, Optional, Tuple
+from openai import AsyncOpenAI
+from typing import AsyncIterator, List, Dict, Optional, Tuple
 import logging
 import os
 from dotenv import load_dotenv
@@ -15,6 +16,21 @@ class ChatService:
         self.api_key = os.environ.get('EMERGENT_LLM_KEY')
         if not self.api_key:
             raise Exception("EMERGENT_LLM_KEY not found in environment variables")
+        # Token streaming talks to an OpenAI-compatible endpoint directly; the
+        # Emergent key only works through emergentintegrations, so streaming
+        # needs its own key (and optionally a proxy base URL)
+        self.stream_api_key = os.environ.get('OPENAI_API_KEY')
+        self.stream_base_url = os.environ.get('OPENAI_BASE_URL') or None
+        self._stream_client = None
+    
+    @staticmethod
+    def _build_system_message(system_message: str, context: Optional[str] = None) -> str:
+        """Enhance system message with RAG context if available"""
+        enhanced_system = system_message
+        if context:
+            enhanced_system += f"\n\nRelevant Knowledge Base Context:\n{context}"
+            enhanced_system += "\n\nImportant: Use the provided context to answer the question accurately and naturally. Integrate the information seamlessly without explicitly mentioning sources or reference numbers."
+        return enhanced_system
     
     async def generate_response(
         self,
@@ -43,10 +59,7 @@ class ChatService:
         """
         try:
             # Enhance system message with RAG context if available
-            enhanced_system = system_message
-            if context:
-                enhanced_system += f"\n\nRelevant Knowledge Base Context:\n{context}"
-                enhanced_system += "\n\nImportant: Use the provided context to answer the question accurately and naturally. Integrate the information seamlessly without explicitly mentioning sources or reference numbers."
+            enhanced_system = self._build_system_message(system_message, context)
             
             # Initialize chat
             chat = LlmChat(
@@ -71,6 +84,73 @@ class ChatService:
             logger.error(f"Error generating response: {str(e)}")
             raise Exception(f"Failed to generate response: {str(e)}")
     
+    async def stream_response(
+        self,
+        message: str,
+        session_id: str,
+        system_message: str,
+        model: str = "gpt-4o-mini",
+        provider: str = "openai",
+        context: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream an AI response token by token
+        
+        OpenAI models are streamed from the chat completions API when
+        OPENAI_API_KEY is set (OPENAI_BASE_URL points it at a compatible
+        proxy). Streamed replies are stateless: only the system message and
+        the user message are sent. Other providers, or a missing
+        OPENAI_API_KEY, fall back to generate_response (with its session
+        continuity) and yield the whole answer as a single chunk. Closing the
+        generator (e.g. the client disconnected) closes the upstream stream.
+        
+        Args:
+            message: User message
+            session_id: Session identifier for conversation continuity
+            system_message: System instructions for the AI
+            model: Model name
+            provider: Provider name (openai, anthropic, gemini)
+            context: Additional context from RAG (pre-formatted with citations)
+            
+        Yields:
+            Response text fragments in order
+        """
+        if provider != "openai" or not self.stream_api_key:
+            response, _ = await self.generate_response(
+                message=message,
+                session_id=session_id,
+                system_message=system_message,
+                model=model,
+                provider=provider,
+                context=context
+            )
+            yield response
+            return
+        
+        if self._stream_client is None:
+            self._stream_client = AsyncOpenAI(api_key=self.stream_api_key, base_url=self.stream_base_url)
+        
+        try:
+            stream = await self._stream_client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": self._build_system_message(system_message, context)},
+                    {"role": "user", "content": message}
+                ],
+                stream=True
+            )
+        except Exception as e:
+            logger.error(f"Error starting response stream: {str(e)}")
+            raise Exception(f"Failed to generate response: {str(e)}")
+        
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Cancels the upstream request when the consumer stops early
+            await stream.close()
+    
     @staticmethod
     def get_available_models() -> Dict[str, List[str]]:
         """Get list of available models by provider"""
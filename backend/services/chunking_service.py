@@ -1,39 +1,249 @@
+import os
 import tiktoken
 import logging
-from typing import List, Dict
+from typing import Dict, Iterable, Iterator, List, Tuple
 
 logger = logging.getLogger(__name__)
 
+# UTF-8 continuation bytes; every other byte starts a character
+_CONTINUATION_BYTES = bytes(range(0x80, 0xC0))
+
+# Inputs are encoded in batches of roughly this many characters
+ENCODE_BATCH_CHARS = 1024 * 1024
+# Plain-token chunking cuts the text into segments of about this size
+SEGMENT_CHARS = 64 * 1024
+# Below this, batches are encoded on the calling thread
+THREADED_ENCODE_MIN_CHARS = 256 * 1024
+
+
+def iter_sections(text: str, max_chars: int) -> Iterator[str]:
+    """
+    Split text into consecutive sections of at most about `max_chars`
+
+    Sections end at a paragraph break where possible (then a line break,
+    then a space), so they can be chunked independently.
+    """
+    start = 0
+    length = len(text)
+    while start < length:
+        end = start + max_chars
+        if end >= length:
+            yield text[start:]
+            return
+        for separator in ("\n\n", "\n", " "):
+            cut = text.rfind(separator, start + max_chars // 2, end)
+            if cut != -1:
+                end = cut + len(separator)
+                break
+        yield text[start:end]
+        start = end
+
+
+def _iter_paragraphs(text: str) -> Iterator[str]:
+    """Non-empty, stripped paragraphs ("\\n\\n"-separated) without splitting the whole text at once"""
+    start = 0
+    while True:
+        end = text.find("\n\n", start)
+        paragraph = text[start:] if end == -1 else text[start:end]
+        paragraph = paragraph.strip()
+        if paragraph:
+            yield paragraph
+        if end == -1:
+            return
+        start = end + 2
+
+
+def _batches(items: Iterable[str], max_chars: int) -> Iterator[List[str]]:
+    batch: List[str] = []
+    size = 0
+    for item in items:
+        batch.append(item)
+        size += len(item)
+        if size >= max_chars:
+            yield batch
+            batch = []
+            size = 0
+    if batch:
+        yield batch
+
 
 class ChunkingService:
-    """Service for intelligently chunking text documents"""
+    """
+    Service for intelligently chunking text documents
     
-    def __init__(self, chunk_size: int = 800, chunk_overlap: int = 150):
+    Chunking is single-pass: every piece of text is encoded exactly once
+    (large inputs in threaded batches), paragraphs are packed by their
+    token counts and token windows are cut out of the original text by
+    character offsets instead of decoding each window. The `iter_*`
+    generators yield chunks as they are produced so huge documents never
+    materialize all their tokens at once.
+    """
+    
+    def __init__(self, chunk_size: int = 800, chunk_overlap: int = 150, encoding_name: str = "cl100k_base"):
         """
         Initialize chunking service
         
         Args:
             chunk_size: Target size for each chunk in tokens (default 800)
             chunk_overlap: Number of tokens to overlap between chunks (default 150)
+            encoding_name: tiktoken encoding (cl100k_base for GPT-3.5/4)
         """
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        self.encode_threads = int(os.environ.get('CHUNKING_ENCODE_THREADS', str(min(4, os.cpu_count() or 1))))
         
-        # Initialize tokenizer (using cl100k_base encoding for GPT-3.5/4)
+        # Initialize tokenizer
         try:
-            self.tokenizer = tiktoken.get_encoding("cl100k_base")
+            self.tokenizer = tiktoken.get_encoding(encoding_name)
         except Exception as e:
             logger.error(f"Error loading tokenizer: {str(e)}")
             raise
     
     def count_tokens(self, text: str) -> int:
         """Count number of tokens in text"""
-        return len(self.tokenizer.encode(text))
+        return len(self.tokenizer.encode_ordinary(text))
+    
+    def _encode_batch(self, texts: List[str]) -> List[List[int]]:
+        """Encode several texts; large batches use tiktoken's threaded batch encoder"""
+        if self.encode_threads > 1 and len(texts) > 1 and sum(len(text) for text in texts) >= THREADED_ENCODE_MIN_CHARS:
+            return self.tokenizer.encode_ordinary_batch(texts, num_threads=self.encode_threads)
+        return [self.tokenizer.encode_ordinary(text) for text in texts]
+    
+    def _char_count(self, tokens: List[int]) -> int:
+        """Number of characters whose first byte lies in `tokens`"""
+        return len(self.tokenizer.decode_bytes(tokens).translate(None, _CONTINUATION_BYTES))
+    
+    def _token_windows(
+        self,
+        pieces: Iterable[Tuple[str, List[int]]],
+        metadata: Dict = None,
+        start_index: int = 0
+    ) -> Iterator[Dict]:
+        """
+        Cut overlapping token windows from consecutive (text, tokens) pieces
+        
+        Window text is sliced from the original text by character offsets,
+        so no window is decoded (and no character is split in two).
+        """
+        size = self.chunk_size
+        step = max(1, self.chunk_size - self.chunk_overlap)
+        buffer_tokens: List[int] = []
+        buffer_text = ""
+        token_pos = 0
+        char_pos = 0
+        consumed_tokens = 0
+        chunk_index = start_index
+        
+        def window(end: int) -> Dict:
+            chars = self._char_count(buffer_tokens[token_pos:token_pos + end])
+            chunk = {
+                "text": buffer_text[char_pos:char_pos + chars],
+                "chunk_index": chunk_index,
+                "start_token": consumed_tokens,
+                "end_token": consumed_tokens + end,
+                "token_count": end
+            }
+            if metadata:
+                chunk.update(metadata)
+            return chunk
+        
+        for text, tokens in pieces:
+            # Drop what earlier windows consumed, then append the new piece
+            buffer_tokens = buffer_tokens[token_pos:] + tokens
+            buffer_text = buffer_text[char_pos:] + text
+            token_pos = char_pos = 0
+            
+            while len(buffer_tokens) - token_pos > size:
+                yield window(size)
+                chunk_index += 1
+                char_pos += self._char_count(buffer_tokens[token_pos:token_pos + step])
+                token_pos += step
+                consumed_tokens += step
+        
+        remaining = len(buffer_tokens) - token_pos
+        if remaining > 0:
+            yield window(remaining)
+    
+    def iter_token_chunks(self, text: str, metadata: Dict = None, start_index: int = 0) -> Iterator[Dict]:
+        """
+        Yield overlapping fixed-size token chunks of text
+        
+        Args:
+            text: Text to chunk
+            metadata: Optional metadata to attach to each chunk (filename, page, etc.)
+            start_index: chunk_index of the first chunk
+        """
+        if not text or not text.strip():
+            return
+        
+        def pieces():
+            # Segments end at whitespace; each is encoded once, batches in parallel
+            for batch in _batches(iter_sections(text, SEGMENT_CHARS), ENCODE_BATCH_CHARS):
+                yield from zip(batch, self._encode_batch(batch))
+        
+        yield from self._token_windows(pieces(), metadata, start_index)
+    
+    def iter_paragraph_chunks(self, text: str, metadata: Dict = None, start_index: int = 0) -> Iterator[Dict]:
+        """
+        Yield chunks that pack whole paragraphs up to the token limit
+        
+        Paragraphs longer than the limit are split into token windows
+        (with start_token/end_token relative to the paragraph).
+        
+        Args:
+            text: Text to chunk
+            metadata: Optional metadata
+            start_index: chunk_index of the first chunk
+        """
+        chunk_index = start_index
+        current_chunk: List[str] = []
+        current_tokens = 0
+        
+        def packed() -> Dict:
+            return {
+                "text": '\n\n'.join(current_chunk),
+                "chunk_index": chunk_index,
+                "token_count": current_tokens,
+                **(metadata or {})
+            }
+        
+        for batch in _batches(_iter_paragraphs(text), ENCODE_BATCH_CHARS):
+            for para, tokens in zip(batch, self._encode_batch(batch)):
+                para_tokens = len(tokens)
+                
+                # If single paragraph exceeds chunk size, split it
+                if para_tokens > self.chunk_size:
+                    if current_chunk:
+                        yield packed()
+                        chunk_index += 1
+                        current_chunk = []
+                        current_tokens = 0
+                    
+                    for chunk in self._token_windows([(para, tokens)], metadata, chunk_index):
+                        yield chunk
+                        chunk_index += 1
+                
+                # Add paragraph to current chunk
+                elif current_tokens + para_tokens <= self.chunk_size:
+                    current_chunk.append(para)
+                    current_tokens += para_tokens
+                
+                # Start new chunk with current paragraph
+                else:
+                    yield packed()
+                    chunk_index += 1
+                    current_chunk = [para]
+                    current_tokens = para_tokens
+        
+        # Add final chunk
+        if current_chunk:
+            yield packed()
     
     def chunk_text(
-        self, 
-        text: str, 
-        metadata: Dict = None
+        self,
+        text: str,
+        metadata: Dict = None,
+        start_index: int = 0
     ) -> List[Dict]:
         """
         Split text into overlapping chunks with metadata
@@ -41,7 +251,8 @@ class ChunkingService:
         Args:
             text: Text to chunk
             metadata: Optional metadata to attach to each chunk (filename, page, etc.)
-            
+            start_index: chunk_index of the first chunk
+        
         Returns:
             List of chunk dictionaries with text and metadata
         """
@@ -50,60 +261,19 @@ class ChunkingService:
                 logger.warning("Empty text provided for chunking")
                 return []
             
-            # Encode text to tokens
-            tokens = self.tokenizer.encode(text)
-            total_tokens = len(tokens)
-            
-            logger.info(f"Chunking text with {total_tokens} tokens (chunk_size={self.chunk_size}, overlap={self.chunk_overlap})")
-            
-            chunks = []
-            start_idx = 0
-            chunk_num = 0
-            
-            while start_idx < total_tokens:
-                # Calculate end index for this chunk
-                end_idx = min(start_idx + self.chunk_size, total_tokens)
-                
-                # Extract chunk tokens
-                chunk_tokens = tokens[start_idx:end_idx]
-                
-                # Decode back to text
-                chunk_text = self.tokenizer.decode(chunk_tokens)
-                
-                # Create chunk with metadata
-                chunk = {
-                    "text": chunk_text,
-                    "chunk_index": chunk_num,
-                    "start_token": start_idx,
-                    "end_token": end_idx,
-                    "token_count": len(chunk_tokens)
-                }
-                
-                # Add provided metadata
-                if metadata:
-                    chunk.update(metadata)
-                
-                chunks.append(chunk)
-                
-                # Move to next chunk with overlap
-                start_idx = end_idx - self.chunk_overlap
-                chunk_num += 1
-                
-                # Prevent infinite loop on last chunk
-                if end_idx >= total_tokens:
-                    break
-            
-            logger.info(f"Created {len(chunks)} chunks from text")
+            chunks = list(self.iter_token_chunks(text, metadata, start_index))
+            logger.info(f"Created {len(chunks)} chunks from text (chunk_size={self.chunk_size}, overlap={self.chunk_overlap})")
             return chunks
-            
+        
         except Exception as e:
             logger.error(f"Error chunking text: {str(e)}")
             raise Exception(f"Failed to chunk text: {str(e)}")
     
     def chunk_by_paragraphs(
-        self, 
-        text: str, 
-        metadata: Dict = None
+        self,
+        text: str,
+        metadata: Dict = None,
+        start_index: int = 0
     ) -> List[Dict]:
         """
         Chunk text by paragraphs while respecting token limits
@@ -112,82 +282,20 @@ class ChunkingService:
         Args:
             text: Text to chunk
             metadata: Optional metadata
-            
+            start_index: chunk_index of the first chunk
+        
         Returns:
             List of chunk dictionaries
         """
         try:
-            # Split into paragraphs
-            paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
-            
-            chunks = []
-            current_chunk = []
-            current_tokens = 0
-            chunk_num = 0
-            
-            for para in paragraphs:
-                para_tokens = self.count_tokens(para)
-                
-                # If single paragraph exceeds chunk size, split it
-                if para_tokens > self.chunk_size:
-                    # Save current chunk if any
-                    if current_chunk:
-                        chunk_text = '\n\n'.join(current_chunk)
-                        chunks.append({
-                            "text": chunk_text,
-                            "chunk_index": chunk_num,
-                            "token_count": current_tokens,
-                            **(metadata or {})
-                        })
-                        chunk_num += 1
-                        current_chunk = []
-                        current_tokens = 0
-                    
-                    # Split large paragraph using token-based chunking
-                    para_chunks = self.chunk_text(para, metadata)
-                    for pc in para_chunks:
-                        pc["chunk_index"] = chunk_num
-                        chunks.append(pc)
-                        chunk_num += 1
-                
-                # Add paragraph to current chunk
-                elif current_tokens + para_tokens <= self.chunk_size:
-                    current_chunk.append(para)
-                    current_tokens += para_tokens
-                
-                # Start new chunk
-                else:
-                    # Save current chunk
-                    chunk_text = '\n\n'.join(current_chunk)
-                    chunks.append({
-                        "text": chunk_text,
-                        "chunk_index": chunk_num,
-                        "token_count": current_tokens,
-                        **(metadata or {})
-                    })
-                    chunk_num += 1
-                    
-                    # Start new chunk with current paragraph
-                    current_chunk = [para]
-                    current_tokens = para_tokens
-            
-            # Add final chunk
-            if current_chunk:
-                chunk_text = '\n\n'.join(current_chunk)
-                chunks.append({
-                    "text": chunk_text,
-                    "chunk_index": chunk_num,
-                    "token_count": current_tokens,
-                    **(metadata or {})
-                })
-            
+            chunks = list(self.iter_paragraph_chunks(text, metadata, start_index))
             logger.info(f"Created {len(chunks)} paragraph-based chunks")
             return chunks
-            
+        
         except Exception as e:
             logger.error(f"Error in paragraph chunking: {str(e)}")
             # Fallback to regular chunking
-            return self.chunk_text(text, metadata)
+            return self.chunk_text(text, metadata, start_index)
     
     def get_stats(self, chunks: List[Dict]) -> Dict:
         """Get statistics about chunks"""
@@ -0,0 +1,127 @@
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from database import get_database
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationResolver:
+    """
+    Resolves (chatbot_id, session_id) to a conversation id
+
+    A new session is created with a single upsert (`$setOnInsert`) against
+    the unique (chatbot_id, session_id) index, so a double-submitted first
+    message cannot create two conversations. Resolved ids are kept in an
+    LRU, so later turns of the same session need no database round trip.
+    Entries expire after `ttl_seconds` to bound staleness when another
+    worker deletes a conversation.
+    """
+
+    def __init__(self, max_entries: int = 50000, ttl_seconds: int = 3600):
+        """
+        Initialize conversation resolver
+
+        Args:
+            max_entries: Maximum number of cached sessions
+            ttl_seconds: Lifetime of a cached session
+        """
+        self.collection = get_database()['conversations']
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[str, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+
+    def _recall(self, key: Tuple[str, str]) -> Optional[str]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        conversation_id, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return conversation_id
+
+    def _remember(self, key: Tuple[str, str], conversation_id: str):
+        self._cache[key] = (conversation_id, time.monotonic() + self.ttl_seconds)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    async def resolve(self, chatbot_id: str, session_id: str, new_conversation: Dict[str, Any]) -> Tuple[str, bool]:
+        """
+        Get the conversation of a session, creating it if needed
+
+        Args:
+            chatbot_id: Chatbot ID
+            session_id: Session ID
+            new_conversation: Document to insert if the session has no
+                conversation yet (must contain "id")
+
+        Returns:
+            (conversation_id, created)
+        """
+        key = (chatbot_id, session_id)
+        conversation_id = self._recall(key)
+        if conversation_id is not None:
+            self.hits += 1
+            return conversation_id, False
+
+        self.misses += 1
+        on_insert = {
+            k: v for k, v in new_conversation.items()
+            if k not in ("chatbot_id", "session_id")
+        }
+        try:
+            conversation = await self._upsert(chatbot_id, session_id, on_insert)
+        except DuplicateKeyError:
+            # A concurrent upsert for the same session won the insert; read its document
+            conversation = await self._upsert(chatbot_id, session_id, on_insert)
+
+        conversation_id = conversation["id"]
+        created = conversation_id == new_conversation["id"]
+        if created:
+            self.created += 1
+        self._remember(key, conversation_id)
+        return conversation_id, created
+
+    async def _upsert(self, chatbot_id: str, session_id: str, on_insert: Dict[str, Any]) -> Dict:
+        return await self.collection.find_one_and_update(
+            {"chatbot_id": chatbot_id, "session_id": session_id},
+            {"$setOnInsert": on_insert},
+            projection={"_id": 0, "id": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    def forget_chatbot(self, chatbot_id: str):
+        """Drop cached sessions of a chatbot (its conversations were deleted)"""
+        for key in [key for key in self._cache if key[0] == chatbot_id]:
+            del self._cache[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get resolver statistics"""
+        total_requests = self.hits + self.misses
+        hit_rate = (self.hits / total_requests * 100) if total_requests > 0 else 0
+
+        return {
+            "size": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(hit_rate, 2),
+            "conversations_created": self.created
+        }
+
+
+# Global conversation resolver
+conversation_resolver = ConversationResolver(
+    max_entries=int(os.environ.get('CONVERSATION_CACHE_SIZE', '50000')),
+    ttl_seconds=int(os.environ.get('CONVERSATION_CACHE_TTL', '3600'))
+)
@@ -0,0 +1,228 @@
+import os
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Tuple
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from database import get_database
+
+logger = logging.getLogger(__name__)
+
+# (collection, id field, id value)
+CounterKey = Tuple[str, str, str]
+
+
+class CounterAggregator:
+    """
+    Write-behind aggregation of display counters
+
+    Chat turns increment `messages_count` on the chatbot and conversation
+    documents. Instead of one `$inc` per turn, increments are buffered per
+    (collection, document, field) and written with one `bulk_write` per
+    collection every `flush_interval_ms`, or as soon as `max_pending_ops`
+    increments are buffered. Pending deltas are flushed on shutdown and can
+    be merged into documents read before they are flushed.
+
+    Only counters whose exact value is not enforced belong here. Quota
+    counters (`subscriptions.usage.*`) stay on PlanService.reserve_usage,
+    which checks and increments atomically.
+    """
+
+    def __init__(self, flush_interval_ms: int = 500, max_pending_ops: int = 1000):
+        """
+        Initialize counter aggregator
+
+        Args:
+            flush_interval_ms: Maximum time an increment stays buffered
+            max_pending_ops: Buffered increments that trigger an early flush
+        """
+        self.db = get_database()
+        self.flush_interval_ms = flush_interval_ms
+        self.max_pending_ops = max_pending_ops
+
+        self._increments: Dict[CounterKey, Dict[str, int]] = {}
+        self._sets: Dict[CounterKey, Dict[str, Any]] = {}
+        # Deltas swapped out of the buffer whose bulk_write has not completed yet
+        self._in_flight: Dict[CounterKey, Dict[str, int]] = {}
+        self._pending_ops = 0
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+        self.flushes = 0
+        self.documents_written = 0
+        self.ops_aggregated = 0
+        self.flush_failures = 0
+
+    def increment(
+        self,
+        collection: str,
+        doc_id: str,
+        fields: Dict[str, int],
+        set_fields: Optional[Dict[str, Any]] = None,
+        id_field: str = "id"
+    ):
+        """
+        Buffer counter increments for a document
+
+        Args:
+            collection: Collection name in the application database
+            doc_id: Value of `id_field` identifying the document
+            fields: Field -> delta to `$inc`
+            set_fields: Fields to `$set` with the flush (last write wins, e.g. updated_at)
+            id_field: Field used to match the document
+        """
+        key = (collection, id_field, doc_id)
+        deltas = self._increments.setdefault(key, {})
+        for field, amount in fields.items():
+            if amount:
+                deltas[field] = deltas.get(field, 0) + amount
+        if set_fields:
+            self._sets.setdefault(key, {}).update(set_fields)
+
+        self._pending_ops += 1
+        self.ops_aggregated += 1
+        self._ensure_started()
+        if self._pending_ops >= self.max_pending_ops and self._wakeup is not None:
+            self._wakeup.set()
+
+    def pending(self, collection: str, doc_id: str, id_field: str = "id") -> Dict[str, int]:
+        """Buffered (not yet written) deltas for a document"""
+        key = (collection, id_field, doc_id)
+        deltas = dict(self._in_flight.get(key, {}))
+        for field, delta in self._increments.get(key, {}).items():
+            deltas[field] = deltas.get(field, 0) + delta
+        return deltas
+
+    def merge_pending(self, collection: str, doc: Dict, id_field: str = "id") -> Dict:
+        """Add buffered deltas to a document read from the database (in place)"""
+        if doc and id_field in doc:
+            for field, delta in self.pending(collection, doc[id_field], id_field).items():
+                # Dotted fields are not merged; only top-level counters are read back
+                if "." not in field:
+                    doc[field] = (doc.get(field) or 0) + delta
+        return doc
+
+    def _ensure_started(self):
+        if self._stopping:
+            return
+        if self._task is None or self._task.done():
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """
+        Write all buffered increments
+
+        Returns:
+            Number of documents updated
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            if not self._increments and not self._sets:
+                return 0
+
+            # Swap the buffers so increments made during the write go to the next flush
+            increments, self._increments = self._increments, {}
+            sets, self._sets = self._sets, {}
+            self._in_flight = increments
+            self._pending_ops = 0
+
+            operations: Dict[str, list] = {}
+            keys: Dict[str, list] = {}
+            for key in set(increments) | set(sets):
+                collection, id_field, doc_id = key
+                update = {}
+                if increments.get(key):
+                    update["$inc"] = increments[key]
+                if sets.get(key):
+                    update["$set"] = sets[key]
+                if update:
+                    operations.setdefault(collection, []).append(UpdateOne({id_field: doc_id}, update))
+                    keys.setdefault(collection, []).append(key)
+
+            # Keys whose write is not confirmed yet; put back on failure or cancellation
+            unwritten = set(self._in_flight) | set(sets)
+            written = 0
+            try:
+                for collection, ops in operations.items():
+                    try:
+                        await self.db[collection].bulk_write(ops, ordered=False)
+                        failed = set()
+                    except BulkWriteError as e:
+                        # Unordered: every op not listed in writeErrors was applied
+                        failed = {error["index"] for error in e.details.get("writeErrors", [])}
+                        self.flush_failures += 1
+                        logger.error(f"Counter flush to {collection} failed for {len(failed)} of {len(ops)} documents")
+                    except Exception as e:
+                        self.flush_failures += 1
+                        logger.error(f"Counter flush to {collection} failed: {str(e)}")
+                        continue
+
+                    for i, key in enumerate(keys[collection]):
+                        if i not in failed:
+                            unwritten.discard(key)
+                            self._in_flight.pop(key, None)
+                    written += len(ops) - len(failed)
+            finally:
+                # Put the deltas back so they are retried with the next flush
+                for key in unwritten:
+                    for field, delta in self._in_flight.pop(key, {}).items():
+                        deltas = self._increments.setdefault(key, {})
+                        deltas[field] = deltas.get(field, 0) + delta
+                    if key in sets:
+                        self._sets.setdefault(key, {}).update(
+                            {f: v for f, v in sets[key].items() if f not in self._sets.get(key, {})}
+                        )
+                self._in_flight = {}
+
+            self.flushes += 1
+            self.documents_written += written
+            return written
+
+    async def stop(self):
+        """Stop the background flusher and write everything still buffered (shutdown)"""
+        self._stopping = True
+        if self._task is not None:
+            # Let a running flush finish; cancelling it mid-write would race the final flush
+            self._wakeup.set()
+            try:
+                await self._task
+            except Exception as e:
+                logger.error(f"Counter flusher failed: {str(e)}")
+            self._task = None
+        await self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get aggregator statistics"""
+        return {
+            "pending_documents": len(self._increments),
+            "pending_ops": self._pending_ops,
+            "ops_aggregated": self.ops_aggregated,
+            "flushes": self.flushes,
+            "documents_written": self.documents_written,
+            "flush_failures": self.flush_failures
+        }
+
+
+# Global counter aggregator
+counter_aggregator = CounterAggregator(
+    flush_interval_ms=int(os.environ.get('COUNTER_FLUSH_INTERVAL_MS', '500')),
+    max_pending_ops=int(os.environ.get('COUNTER_FLUSH_MAX_OPS', '1000'))
+)
@@ -0,0 +1,182 @@
+import logging
+import math
+from typing import List, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Below this many vectors an exact scan is as fast as probing an ANN index
+EXACT_SEARCH_THRESHOLD = 4096
+
+
+def is_available() -> bool:
+    """Whether dense retrieval can be used (numpy installed)"""
+    return np is not None
+
+
+def normalize_rows(vectors):
+    """L2-normalize each row so inner product equals cosine similarity"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores, top_k: int):
+    """Indices of the top_k scores, sorted descending"""
+    if len(scores) > top_k:
+        candidates = np.argpartition(scores, -top_k)[-top_k:]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class ExactIndex:
+    """Brute-force cosine similarity search over a dense matrix"""
+
+    def __init__(self, vectors, ids: Sequence[str]):
+        self.vectors = normalize_rows(vectors)
+        self.ids = list(ids)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.vectors.nbytes)
+
+    def search(self, query, top_k: int) -> List[Tuple[str, float]]:
+        if not self.ids or top_k <= 0:
+            return []
+        scores = self.vectors @ normalize_rows(query)[0]
+        return [(self.ids[i], float(scores[i])) for i in _top_k(scores, top_k)]
+
+
+class StreamingExactSearch:
+    """
+    Exact cosine top-k over vectors arriving in batches
+
+    Only the best `top_k` candidates are kept between batches, so a corpus
+    can be scanned without holding all of its vectors in memory.
+    """
+
+    def __init__(self, query, top_k: int):
+        self.query = normalize_rows(query)[0]
+        self.top_k = top_k
+        self.ids: List[str] = []
+        self.scores = np.empty(0, dtype=np.float32)
+        self.scanned = 0
+
+    def add(self, vectors, ids: Sequence[str]):
+        if not len(ids) or self.top_k <= 0:
+            return
+        scores = np.concatenate((self.scores, normalize_rows(vectors) @ self.query))
+        ids = self.ids + list(ids)
+        keep = _top_k(scores, self.top_k)
+        self.scores = scores[keep]
+        self.ids = [ids[i] for i in keep]
+        self.scanned += len(vectors)
+
+    def results(self) -> List[Tuple[str, float]]:
+        return [(chunk_id, float(score)) for chunk_id, score in zip(self.ids, self.scores)]
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest neighbour index (CPU, numpy only)
+
+    Vectors are clustered with spherical k-means into `nlist` cells; each cell
+    keeps its member vectors contiguously. A query is compared against the
+    centroids and only the `nprobe` closest cells are scanned exactly.
+    """
+
+    def __init__(
+        self,
+        vectors,
+        ids: Sequence[str],
+        nlist: int = None,
+        nprobe: int = 8,
+        train_iterations: int = 10,
+        seed: int = 0
+    ):
+        """
+        Build the index
+
+        Args:
+            vectors: Matrix of shape (n, dim)
+            ids: Chunk id of each row
+            nlist: Number of cells (default: sqrt(n))
+            nprobe: Number of cells scanned per query
+            train_iterations: k-means iterations
+            seed: Random seed for centroid initialization
+        """
+        vectors = normalize_rows(vectors)
+        n = len(vectors)
+        self.nlist = max(1, min(nlist or int(math.sqrt(n)), n))
+        self.nprobe = nprobe
+
+        rng = np.random.default_rng(seed)
+        self.centroids = self._train(vectors, rng, train_iterations)
+        assignments = self._assign(vectors)
+
+        # Store cells contiguously: order rows by cell
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=self.nlist)
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+        self.vectors = vectors[order]
+        self.ids = [ids[i] for i in order]
+
+    def _train(self, vectors, rng, iterations: int):
+        """Spherical k-means on a sample of the vectors"""
+        sample_size = min(len(vectors), self.nlist * 64)
+        sample = vectors[rng.choice(len(vectors), size=sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, size=self.nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            empty = np.bincount(assignments, minlength=self.nlist) == 0
+            # Re-seed empty cells with random sample points
+            sums[empty] = sample[rng.choice(sample_size, size=int(empty.sum()))]
+            centroids = normalize_rows(sums)
+
+        return centroids
+
+    def _assign(self, vectors, batch_size: int = 65536):
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), batch_size):
+            batch = vectors[start:start + batch_size]
+            assignments[start:start + batch_size] = np.argmax(batch @ self.centroids.T, axis=1)
+        return assignments
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.vectors.nbytes + self.centroids.nbytes)
+
+    def search(self, query, top_k: int, nprobe: int = None) -> List[Tuple[str, float]]:
+        if not self.ids or top_k <= 0:
+            return []
+
+        query = normalize_rows(query)[0]
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        cells = _top_k(self.centroids @ query, nprobe)
+
+        rows = np.concatenate([
+            np.arange(self.offsets[cell], self.offsets[cell + 1]) for cell in cells
+        ])
+        if not len(rows):
+            return []
+
+        scores = self.vectors[rows] @ query
+        return [(self.ids[rows[i]], float(scores[i])) for i in _top_k(scores, top_k)]
+
+
+def build_index(vectors, ids: Sequence[str], nprobe: int = 8):
+    """Build an exact index for small corpora and an IVF index otherwise"""
+    if len(ids) < EXACT_SEARCH_THRESHOLD:
+        return ExactIndex(vectors, ids)
+    return IVFIndex(vectors, ids, nprobe=nprobe)
@@ -3,7 +3,8 @@ from discord.ext import commands
 import asyncio
 import logging
 from typing import Dict, Optional
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import get_client
+from services.conversation_resolver import conversation_resolver
 import os
 import uuid
 from datetime import datetime
@@ -17,9 +18,8 @@ class DiscordBotManager:
     def __init__(self):
         self.bots: Dict[str, commands.Bot] = {}
         self.bot_tasks: Dict[str, asyncio.Task] = {}
-        self.mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
         self.db_name = os.environ.get('DB_NAME', 'chatbase_db')
-        self.client = AsyncIOMotorClient(self.mongo_url)
+        self.client = get_client()
         self.db = self.client[self.db_name]
     
     async def start_bot(self, chatbot_id: str, bot_token: str):
@@ -115,35 +115,28 @@ class DiscordBotManager:
             # Create session ID
             session_id = f"discord_{channel_id}_{user_id}"
             
-            # Get or create conversation
-            conversation = await bot.db.conversations.find_one({
+            # Get or create conversation (cached per session; new sessions are one upsert)
+            conversation_id, _ = await conversation_resolver.resolve(chatbot_id, session_id, {
+                "id": str(uuid.uuid4()),
                 "chatbot_id": chatbot_id,
-                "session_id": session_id
-            })
-            
-            if not conversation:
-                conversation = {
-                    "id": str(uuid.uuid4()),
-                    "chatbot_id": chatbot_id,
-                    "session_id": session_id,
-                    "user_name": user_name,
-                    "user_email": f"discord_{user_id}",
-                    "created_at": datetime.now(),
-                    "updated_at": datetime.now(),
-                    "status": "active",
-                    "platform": "discord",
-                    "metadata": {
-                        "channel_id": channel_id,
-                        "guild_id": guild_id,
-                        "user_id": user_id
-                    }
+                "session_id": session_id,
+                "user_name": user_name,
+                "user_email": f"discord_{user_id}",
+                "created_at": datetime.now(),
+                "updated_at": datetime.now(),
+                "status": "active",
+                "platform": "discord",
+                "metadata": {
+                    "channel_id": channel_id,
+                    "guild_id": guild_id,
+                    "user_id": user_id
                 }
-                await bot.db.conversations.insert_one(conversation)
+            })
             
             # Save user message
             user_message = {
                 "id": str(uuid.uuid4()),
-                "conversation_id": conversation["id"],
+                "conversation_id": conversation_id,
                 "chatbot_id": chatbot_id,
                 "role": "user",
                 "content": message_content,
@@ -155,7 +148,8 @@ class DiscordBotManager:
                     "user_id": user_id
                 }
             }
-            await bot.db.messages.insert_one(user_message)
+            from services.message_writer import message_writer
+            await message_writer.write(user_message)
             
             # Get chatbot configuration
             chatbot = await bot.db.chatbots.find_one({"id": chatbot_id})
@@ -163,6 +157,19 @@ class DiscordBotManager:
                 logger.error(f"Chatbot not found: {chatbot_id}")
                 return
             
+            # Check and reserve message quota (user + assistant) in one round trip
+            from services.plan_service import plan_service
+            owner_user_id = chatbot.get("user_id")
+            if owner_user_id:
+                limit_check = await plan_service.reserve_usage(owner_user_id, "messages", 2)
+                if not limit_check.get("reserved"):
+                    await message.reply(
+                        f"⚠️ Message limit reached ({limit_check['current']}/{limit_check['max']} messages this month). "
+                        f"The owner needs to upgrade their plan to continue using this bot."
+                    )
+                    logger.warning(f"Message limit reached for user {owner_user_id}")
+                    return
+            
             # Get knowledge base context
             context = ""
             try:
@@ -199,11 +206,13 @@ class DiscordBotManager:
             except Exception as e:
                 logger.error(f"Error generating AI response: {str(e)}")
                 response_text = "I apologize, but I encountered an error processing your message."
+                if owner_user_id:
+                    await plan_service.release_usage(owner_user_id, "messages", 2)
             
             # Save assistant message
             assistant_message = {
                 "id": str(uuid.uuid4()),
-                "conversation_id": conversation["id"],
+                "conversation_id": conversation_id,
                 "chatbot_id": chatbot_id,
                 "role": "assistant",
                 "content": response_text,
@@ -213,26 +222,17 @@ class DiscordBotManager:
                     "channel_id": channel_id
                 }
             }
-            await bot.db.messages.insert_one(assistant_message)
+            await message_writer.write(assistant_message)
             
             # Update conversation
             await bot.db.conversations.update_one(
-                {"id": conversation["id"]},
+                {"id": conversation_id},
                 {"$set": {"updated_at": datetime.now()}}
             )
             
             # Update chatbot message count
-            await bot.db.chatbots.update_one(
-                {"id": chatbot_id},
-                {"$inc": {"messages_count": 2}}
-            )
-            
-            # Update subscription usage
-            try:
-                from services.plan_service import plan_service
-                await plan_service.increment_usage(chatbot["user_id"], "messages", 2)
-            except Exception as e:
-                logger.warning(f"Failed to update subscription usage: {str(e)}")
+            from services.counter_aggregator import counter_aggregator
+            counter_aggregator.increment("chatbots", chatbot_id, {"messages_count": 2})
             
             # Send response back to Discord (reply to original message)
             await message.reply(response_text)
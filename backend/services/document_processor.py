@@ -1,22 +1,41 @@
 import io
+import mmap
 from pypdf import PdfReader
 from docx import Document
 import openpyxl
-from typing import Optional
+from typing import Optional, Union
 import logging
 
 logger = logging.getLogger(__name__)
 
+# File content: raw bytes, or the path of a file on disk (spooled uploads)
+FileSource = Union[bytes, str]
+
+
+def _as_file(source: FileSource):
+    """File object or path accepted by pypdf, python-docx and openpyxl"""
+    return io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
+
+def _decode_text(source: FileSource) -> str:
+    """Decode a text file; files on disk are memory-mapped instead of read into a buffer"""
+    if isinstance(source, (bytes, bytearray)):
+        return source.decode('utf-8', errors='ignore')
+    with open(source, 'rb') as f:
+        if f.seek(0, io.SEEK_END) == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return str(mapped, 'utf-8', errors='ignore')
+
 
 class DocumentProcessor:
     """Process various document types and extract text content"""
     
     @staticmethod
-    def process_pdf(file_content: bytes) -> str:
+    def process_pdf(file_content: FileSource) -> str:
         """Extract text from PDF file"""
         try:
-            pdf_file = io.BytesIO(file_content)
-            reader = PdfReader(pdf_file)
+            reader = PdfReader(_as_file(file_content))
             text = ""
             for page in reader.pages:
                 text += page.extract_text() + "\n"
@@ -26,11 +45,10 @@ class DocumentProcessor:
             raise Exception(f"Failed to process PDF: {str(e)}")
     
     @staticmethod
-    def process_docx(file_content: bytes) -> str:
+    def process_docx(file_content: FileSource) -> str:
         """Extract text from DOCX file"""
         try:
-            doc_file = io.BytesIO(file_content)
-            doc = Document(doc_file)
+            doc = Document(_as_file(file_content))
             text = ""
             for paragraph in doc.paragraphs:
                 text += paragraph.text + "\n"
@@ -40,20 +58,19 @@ class DocumentProcessor:
             raise Exception(f"Failed to process DOCX: {str(e)}")
     
     @staticmethod
-    def process_txt(file_content: bytes) -> str:
+    def process_txt(file_content: FileSource) -> str:
         """Extract text from TXT file"""
         try:
-            return file_content.decode('utf-8', errors='ignore').strip()
+            return _decode_text(file_content).strip()
         except Exception as e:
             logger.error(f"Error processing TXT: {str(e)}")
             raise Exception(f"Failed to process TXT: {str(e)}")
     
     @staticmethod
-    def process_xlsx(file_content: bytes) -> str:
+    def process_xlsx(file_content: FileSource) -> str:
         """Extract text from XLSX file"""
         try:
-            xlsx_file = io.BytesIO(file_content)
-            workbook = openpyxl.load_workbook(xlsx_file)
+            workbook = openpyxl.load_workbook(_as_file(file_content))
             text = ""
             
             for sheet in workbook.worksheets:
@@ -69,17 +86,17 @@ class DocumentProcessor:
             raise Exception(f"Failed to process XLSX: {str(e)}")
     
     @staticmethod
-    def process_csv(file_content: bytes) -> str:
+    def process_csv(file_content: FileSource) -> str:
         """Extract text from CSV file"""
         try:
-            return file_content.decode('utf-8', errors='ignore').strip()
+            return _decode_text(file_content).strip()
         except Exception as e:
             logger.error(f"Error processing CSV: {str(e)}")
             raise Exception(f"Failed to process CSV: {str(e)}")
     
     @staticmethod
-    def process_file(filename: str, file_content: bytes) -> str:
-        """Process file based on extension"""
+    def process_file(filename: str, file_content: FileSource) -> str:
+        """Process file (bytes or path on disk) based on extension"""
         extension = filename.lower().split('.')[-1]
         
         processors = {
@@ -0,0 +1,309 @@
+import os
+import asyncio
+import hashlib
+import logging
+from itertools import count
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from database import get_rag_database
+from db_indexes import EMBEDDING_CACHE_TTL_SECONDS
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Normalize chunk text for hashing (collapse whitespace)"""
+    return " ".join(text.split())
+
+
+def content_key(text: str, model: str) -> str:
+    """Content address of an embedding: sha256 of model name + normalized text"""
+    return hashlib.sha256(f"{model}\n{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingBatcher:
+    """
+    Batching scheduler for embedding requests
+
+    Texts submitted by concurrent ingest jobs (across chatbots) are queued
+    per model and coalesced into full batches; a partial batch waits at most
+    `max_wait_ms` for more texts. Up to `max_concurrency` batches are in
+    flight at once.
+
+    A batch mixes texts of several submitters (chatbots, ingest jobs). If it
+    fails, each submitter's texts are retried as a batch of their own, so a
+    bad text or a provider error for one tenant fails only that tenant's job.
+    """
+
+    def __init__(self, batch_size: int = 100, max_wait_ms: int = 20, max_concurrency: int = 4):
+        self.batch_size = batch_size
+        self.max_wait_ms = max_wait_ms
+        self.max_concurrency = max_concurrency
+        # model -> [(text, future, embedder, submission id)]
+        self._pending: Dict[str, List[Tuple[str, asyncio.Future, Any, int]]] = {}
+        self._submissions = count()
+        self._workers: Dict[str, asyncio.Task] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.batches_sent = 0
+        self.texts_embedded = 0
+        self.failed_batches = 0
+        self.split_retries = 0
+
+    async def submit(self, embedder, texts: List[str]) -> List[List[float]]:
+        """
+        Queue texts for embedding and wait for their vectors
+
+        Args:
+            embedder: Embedder exposing `model` and `generate_embeddings_batch`
+            texts: Non-empty texts to embed
+
+        Returns:
+            One embedding per text, in order
+        """
+        if not texts:
+            return []
+
+        loop = asyncio.get_running_loop()
+        pending = self._pending.setdefault(embedder.model, [])
+        submission = next(self._submissions)
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            pending.append((text, future, embedder, submission))
+            futures.append(future)
+
+        worker = self._workers.get(embedder.model)
+        if worker is None or worker.done():
+            self._workers[embedder.model] = asyncio.create_task(self._run(embedder.model))
+
+        return list(await asyncio.gather(*futures))
+
+    async def _run(self, model: str):
+        """Drain the queue for a model in full batches"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        pending = self._pending[model]
+        while pending:
+            # Give other ingest jobs a chance to fill a partial batch
+            if len(pending) < self.batch_size:
+                await asyncio.sleep(self.max_wait_ms / 1000)
+
+            batch = pending[:self.batch_size]
+            del pending[:self.batch_size]
+
+            await self._semaphore.acquire()
+            asyncio.create_task(self._send(batch))
+
+    async def _embed(self, batch: List[Tuple[str, asyncio.Future, Any, int]]):
+        embedder = batch[0][2]
+        vectors = await embedder.generate_embeddings_batch([text for text, _, _, _ in batch])
+        if len(vectors) != len(batch):
+            raise Exception(f"Embedder returned {len(vectors)} vectors for {len(batch)} texts")
+
+        self.batches_sent += 1
+        self.texts_embedded += len(batch)
+        for (_, future, _, _), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    def _fail(self, batch: List[Tuple[str, asyncio.Future, Any, int]], error: Exception):
+        self.failed_batches += 1
+        logger.error(f"Embedding batch failed: {str(error)}")
+        for _, future, _, _ in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future, Any, int]]):
+        try:
+            await self._embed(batch)
+        except Exception as e:
+            submissions: Dict[int, List] = {}
+            for entry in batch:
+                submissions.setdefault(entry[3], []).append(entry)
+
+            if len(submissions) == 1:
+                self._fail(batch, e)
+                return
+
+            # Retry each submitter on its own (one at a time, within this batch's slot)
+            logger.warning(f"Embedding batch failed ({str(e)}); retrying {len(submissions)} submitters separately")
+            self.split_retries += 1
+            for entries in submissions.values():
+                try:
+                    await self._embed(entries)
+                except Exception as retry_error:
+                    self._fail(entries, retry_error)
+        finally:
+            self._semaphore.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "queued": sum(len(pending) for pending in self._pending.values()),
+            "batches_sent": self.batches_sent,
+            "texts_embedded": self.texts_embedded,
+            "failed_batches": self.failed_batches,
+            "split_retries": self.split_retries
+        }
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache
+
+    Embeddings are keyed by sha256(model + normalized chunk text) and stored
+    in the `embedding_cache` MongoDB collection behind an in-memory LRU, so
+    re-uploading a document or re-scraping a website does not re-embed
+    identical chunks. Misses are embedded through the EmbeddingBatcher.
+
+    Stored embeddings expire EMBEDDING_CACHE_TTL_DAYS after their last use
+    (TTL index on `last_used`); store hits refresh `last_used` at most once
+    per tenth of that period, so hits do not turn into a write each.
+    """
+
+    def __init__(self, max_memory_entries: int = 20000, batcher: EmbeddingBatcher = None):
+        """
+        Initialize embedding cache
+
+        Args:
+            max_memory_entries: Size of the in-memory LRU front
+            batcher: Scheduler used to embed cache misses
+        """
+        self.collection = get_rag_database()['embedding_cache']
+
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.max_memory_entries = max_memory_entries
+        self.batcher = batcher or EmbeddingBatcher()
+        self.refresh_after = timedelta(seconds=EMBEDDING_CACHE_TTL_SECONDS / 10)
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, vector: List[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _recall(self, key: str) -> Optional[List[float]]:
+        vector = self._memory.get(key)
+        if vector is not None:
+            self._memory.move_to_end(key)
+        return vector
+
+    async def embed_texts(self, texts: List[str], embedder) -> List[List[float]]:
+        """
+        Embed texts, serving identical content from the cache
+
+        Args:
+            texts: Texts to embed (e.g. chunk texts of a document)
+            embedder: Embedder exposing `model` and `generate_embeddings_batch`
+
+        Returns:
+            One embedding per text, in order (empty list for blank texts)
+        """
+        keys = [content_key(text, embedder.model) if text.strip() else None for text in texts]
+        found: Dict[str, List[float]] = {}
+
+        # 1. In-memory LRU
+        for key in keys:
+            if key and key not in found:
+                vector = self._recall(key)
+                if vector is not None:
+                    found[key] = vector
+                    self.memory_hits += 1
+
+        # 2. MongoDB
+        lookup = list({key for key in keys if key and key not in found})
+        if lookup:
+            now = datetime.now(timezone.utc)
+            refresh = []
+            try:
+                async for doc in self.collection.find({"_id": {"$in": lookup}}, {"embedding": 1, "last_used": 1}):
+                    found[doc["_id"]] = doc["embedding"]
+                    self._remember(doc["_id"], doc["embedding"])
+                    self.store_hits += 1
+                    last_used = doc.get("last_used")
+                    if last_used is None or last_used.replace(tzinfo=timezone.utc) < now - self.refresh_after:
+                        refresh.append(doc["_id"])
+                if refresh:
+                    await self.collection.update_many({"_id": {"$in": refresh}}, {"$set": {"last_used": now}})
+            except Exception as e:
+                logger.warning(f"Embedding cache lookup failed: {str(e)}")
+
+        # 3. Embed what is left (deduplicated) through the batcher
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key and key not in found and key not in missing:
+                missing[key] = text
+
+        if missing:
+            self.misses += len(missing)
+            vectors = await self.batcher.submit(embedder, list(missing.values()))
+            now = datetime.now(timezone.utc)
+            new_docs = []
+            for key, vector in zip(missing.keys(), vectors):
+                found[key] = vector
+                self._remember(key, vector)
+                new_docs.append({
+                    "_id": key,
+                    "model": embedder.model,
+                    "embedding": vector,
+                    "created_at": now,
+                    "last_used": now
+                })
+            await self._store(new_docs)
+
+        return [found[key] if key else [] for key in keys]
+
+    async def embed_query(self, text: str, embedder) -> List[float]:
+        """Embed a query, using only the in-memory LRU (no extra round trip)"""
+        key = content_key(text, embedder.model)
+        vector = self._recall(key)
+        if vector is not None:
+            self.memory_hits += 1
+            return vector
+
+        self.misses += 1
+        vector = await embedder.generate_embedding(text)
+        if vector:
+            self._remember(key, vector)
+        return vector
+
+    async def _store(self, docs: List[Dict]):
+        if not docs:
+            return
+        try:
+            await self.collection.insert_many(docs, ordered=False)
+        except BulkWriteError:
+            # Another ingest stored the same content concurrently
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to persist embeddings to cache: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        hits = self.memory_hits + self.store_hits
+        total_requests = hits + self.misses
+        hit_rate = (hits / total_requests * 100) if total_requests > 0 else 0
+
+        return {
+            "memory_size": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "hit_rate": round(hit_rate, 2),
+            "batcher": self.batcher.get_stats()
+        }
+
+
+# Global embedding cache shared by every RAGService instance in the process
+embedding_cache = EmbeddingCache(
+    batcher=EmbeddingBatcher(
+        batch_size=int(os.environ.get('EMBEDDING_BATCH_SIZE', '100')),
+        max_wait_ms=int(os.environ.get('EMBEDDING_BATCH_WAIT_MS', '20')),
+        max_concurrency=int(os.environ.get('EMBEDDING_MAX_CONCURRENCY', '4'))
+    )
+)
@@ -1,8 +1,12 @@
 import os
+import math
+import asyncio
+import zlib
 import logging
 from typing import List
 from openai import AsyncOpenAI
 from dotenv import load_dotenv
+from .lexical_index import tokenize
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -19,6 +23,7 @@ class EmbeddingService:
         # Initialize OpenAI client with Emergent LLM key
         self.client = AsyncOpenAI(api_key=self.api_key)
         self.model = "text-embedding-3-small"  # 1536 dimensions, cost-effective
+        self.max_concurrency = int(os.environ.get('EMBEDDING_MAX_CONCURRENCY', '4'))
         
     async def generate_embedding(self, text: str) -> List[float]:
         """
@@ -72,20 +77,25 @@ class EmbeddingService:
             
             # Generate embeddings in batch (OpenAI supports up to 2048 texts)
             batch_size = 100  # Process in smaller batches for safety
-            all_embeddings = []
+            batches = [valid_texts[i:i + batch_size] for i in range(0, len(valid_texts), batch_size)]
             
-            for i in range(0, len(valid_texts), batch_size):
-                batch = valid_texts[i:i + batch_size]
-                
-                response = await self.client.embeddings.create(
-                    model=self.model,
-                    input=batch
-                )
-                
+            # OPTIMIZATION: Send batches concurrently, bounded by the semaphore
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            
+            async def embed_batch(number: int, batch: List[str]) -> List[List[float]]:
+                async with semaphore:
+                    response = await self.client.embeddings.create(
+                        model=self.model,
+                        input=batch
+                    )
                 batch_embeddings = [data.embedding for data in response.data]
-                all_embeddings.extend(batch_embeddings)
-                
-                logger.info(f"Generated {len(batch_embeddings)} embeddings (batch {i//batch_size + 1})")
+                logger.info(f"Generated {len(batch_embeddings)} embeddings (batch {number})")
+                return batch_embeddings
+            
+            results = await asyncio.gather(*[
+                embed_batch(number, batch) for number, batch in enumerate(batches, start=1)
+            ])
+            all_embeddings = [embedding for batch_embeddings in results for embedding in batch_embeddings]
             
             return all_embeddings
             
@@ -101,3 +111,70 @@ class EmbeddingService:
             "max_tokens": 8191,
             "cost_per_1k_tokens": 0.00002  # $0.02 per 1M tokens
         }
+
+
+class HashingEmbedder:
+    """
+    Deterministic local embedder based on feature hashing
+    
+    Hashes word unigrams, bigrams and character trigrams into a fixed number
+    of signed buckets and L2-normalizes the result. Needs no network or model
+    download, so it is used for offline development and tests and as a cheap
+    fallback when no embedding API key is configured.
+    """
+    
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+        self.model = f"hashing-{dimensions}"
+    
+    def _features(self, text: str) -> List[str]:
+        words = tokenize(text)
+        features = list(words)
+        features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+        for word in words:
+            padded = f"#{word}#"
+            features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        return features
+    
+    def embed(self, text: str) -> List[float]:
+        """Embed a single text synchronously"""
+        vector = [0.0] * self.dimensions
+        for feature in self._features(text):
+            digest = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if digest & 0x80000000 else -1.0
+            vector[digest % self.dimensions] += sign
+        
+        norm = math.sqrt(sum(value * value for value in vector))
+        if norm == 0:
+            return vector
+        return [value / norm for value in vector]
+    
+    async def generate_embedding(self, text: str) -> List[float]:
+        """Generate embedding for a single text"""
+        return self.embed(text)
+    
+    async def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for multiple texts (one per input, in order)"""
+        return [self.embed(text) for text in texts]
+    
+    def get_model_info(self) -> dict:
+        """Get information about the embedding model"""
+        return {
+            "model": self.model,
+            "dimensions": self.dimensions,
+            "max_tokens": None,
+            "cost_per_1k_tokens": 0.0
+        }
+
+
+def get_embedder():
+    """
+    Create the configured embedder
+    
+    RAG_EMBEDDER selects the implementation: "openai" (EmbeddingService) or
+    "hashing" (HashingEmbedder). Defaults to openai when an API key is set.
+    """
+    name = os.environ.get('RAG_EMBEDDER') or ("openai" if os.environ.get('EMERGENT_LLM_KEY') else "hashing")
+    if name == "hashing":
+        return HashingEmbedder(int(os.environ.get('RAG_HASHING_DIMENSIONS', '384')))
+    return EmbeddingService()
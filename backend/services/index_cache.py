@@ -0,0 +1,459 @@
+import asyncio
+import logging
+import os
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from .lexical_index import score_postings
+from . import sparse_bm25
+from . import dense_index
+
+logger = logging.getLogger(__name__)
+
+# Rough per-entry overheads used to estimate the resident size of an index
+_POSTING_OVERHEAD_BYTES = 120
+_CHUNK_OVERHEAD_BYTES = 400
+
+
+class _Rebuilt:
+    """
+    A structure derived from a ChatbotIndex (CSR matrix, ANN index), rebuilt off the event loop
+
+    Building is O(corpus) and is needed again after every mutation, e.g. after
+    each page of a streaming crawl. `get` snapshots the index on the loop (list
+    copies of its dicts), builds in a worker thread and serves the previous
+    structure while a rebuild runs; only a query with nothing to serve waits.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.value = None
+        self.version: Optional[int] = None
+        self.params = None
+        self.builds = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def get(self, version: int, params, snapshot: Callable[[], Callable[[], Any]]) -> Optional[Any]:
+        """
+        Get the structure for `params`, starting a rebuild if it is older than `version`
+
+        Args:
+            version: Current index version
+            params: Build parameters; a structure built with others is not served
+            snapshot: Called on the loop; returns the build function to run in a thread
+
+        Returns:
+            The structure (possibly one version behind while rebuilding), or None
+        """
+        if self._task is None and (self.version, self.params) != (version, params):
+            self._task = asyncio.ensure_future(self._build(version, params, snapshot()))
+
+        if self._task is not None and (self.value is None or self.params != params):
+            await asyncio.shield(self._task)
+
+        return self.value if self.params == params else None
+
+    async def _build(self, version: int, params, build: Callable[[], Any]):
+        started = time.perf_counter()
+        try:
+            value = await asyncio.to_thread(build)
+        except Exception as e:
+            logger.error(f"Error building {self.name}: {str(e)}")
+            return
+        finally:
+            self._task = None
+
+        self.value, self.version, self.params = value, version, params
+        self.builds += 1
+        logger.debug(f"Built {self.name} in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+
+class ChatbotIndex:
+    """
+    Resident retrieval index for a single chatbot
+
+    Holds the postings (term -> chunk id -> tf), chunk lengths, optional
+    chunk embeddings and the chunk payloads needed to build search results,
+    so a query can be answered without touching MongoDB.
+    """
+
+    def __init__(self, chatbot_id: str):
+        self.chatbot_id = chatbot_id
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.chunks: Dict[str, Dict] = {}
+        self.source_chunks: Dict[str, Set[str]] = {}
+        self.term_freqs: Dict[str, Dict[str, int]] = {}
+        self.total_length = 0
+        self.embeddings: Dict[str, Any] = {}
+        # Bumped by every mutation; derived structures are rebuilt when behind
+        self.version = 0
+        self._matrix = _Rebuilt("sparse BM25 matrix")
+        self._dense = _Rebuilt("dense index")
+        self.size_bytes = sys.getsizeof(self)
+        self.loaded_at = time.monotonic()
+
+    @property
+    def doc_count(self) -> int:
+        return len(self.doc_lengths)
+
+    def add_chunk(self, chunk: Dict, term_freqs: Dict[str, int], doc_length: int):
+        """
+        Add a chunk to the index (no-op if the chunk is already present)
+
+        Args:
+            chunk: Chunk document (chunk_id, source_id, text and metadata)
+            term_freqs: Term frequencies of the chunk text
+            doc_length: Chunk length in terms
+        """
+        chunk_id = chunk["chunk_id"]
+        if chunk_id in self.doc_lengths:
+            return
+
+        self.version += 1
+        for term, tf in term_freqs.items():
+            self.postings.setdefault(term, {})[chunk_id] = tf
+
+        self.doc_lengths[chunk_id] = doc_length
+        self.term_freqs[chunk_id] = term_freqs
+        self.total_length += doc_length
+        self.chunks[chunk_id] = {
+            "chunk_id": chunk_id,
+            "text": chunk["text"],
+            "source_id": chunk.get("source_id"),
+            "source_type": chunk.get("source_type"),
+            "chunk_index": chunk.get("chunk_index", 0),
+            "token_count": chunk.get("token_count", 0),
+            "filename": chunk.get("filename")
+        }
+        self.source_chunks.setdefault(chunk.get("source_id"), set()).add(chunk_id)
+        self.size_bytes += (
+            _CHUNK_OVERHEAD_BYTES
+            + len(chunk["text"])
+            + len(term_freqs) * _POSTING_OVERHEAD_BYTES
+        )
+
+        embedding = chunk.get("embedding")
+        if embedding and dense_index.is_available():
+            vector = dense_index.np.asarray(embedding, dtype=dense_index.np.float32)
+            self.embeddings[chunk_id] = vector
+            self.size_bytes += vector.nbytes
+
+    def remove_source(self, source_id: str) -> int:
+        """
+        Remove every chunk of a source from the index
+
+        Returns:
+            Number of chunks removed
+        """
+        removed = self.remove_chunks(list(self.source_chunks.get(source_id, ())))
+        self.source_chunks.pop(source_id, None)
+        return removed
+
+    def remove_chunks(self, chunk_ids: List[str]) -> int:
+        """
+        Remove chunks from the index
+
+        Returns:
+            Number of chunks removed
+        """
+        chunk_ids = [chunk_id for chunk_id in chunk_ids if chunk_id in self.doc_lengths]
+        if chunk_ids:
+            self.version += 1
+        for chunk_id in chunk_ids:
+            term_freqs = self.term_freqs.pop(chunk_id, {})
+            for term in term_freqs:
+                term_postings = self.postings.get(term)
+                if term_postings is not None:
+                    term_postings.pop(chunk_id, None)
+                    if not term_postings:
+                        del self.postings[term]
+
+            self.total_length -= self.doc_lengths.pop(chunk_id, 0)
+            vector = self.embeddings.pop(chunk_id, None)
+            if vector is not None:
+                self.size_bytes -= vector.nbytes
+            chunk = self.chunks.pop(chunk_id, None)
+            if chunk is not None:
+                source_chunk_ids = self.source_chunks.get(chunk.get("source_id"))
+                if source_chunk_ids is not None:
+                    source_chunk_ids.discard(chunk_id)
+                    if not source_chunk_ids:
+                        del self.source_chunks[chunk.get("source_id")]
+            self.size_bytes -= (
+                _CHUNK_OVERHEAD_BYTES
+                + (len(chunk["text"]) if chunk else 0)
+                + len(term_freqs) * _POSTING_OVERHEAD_BYTES
+            )
+        return len(chunk_ids)
+
+    def _sparse_snapshot(self) -> Callable[[], "sparse_bm25.SparseBM25Matrix"]:
+        # Chunk term frequency dicts are never mutated, so list copies suffice
+        # (term_freqs and doc_lengths are filled and emptied in the same order)
+        term_freqs = list(self.term_freqs.items())
+        doc_lengths = list(self.doc_lengths.values())
+        return lambda: sparse_bm25.SparseBM25Matrix.from_term_freqs(term_freqs, doc_lengths)
+
+    async def search(self, terms: List[str], top_k: int, engine: str = "postings") -> List[Tuple[Dict, float]]:
+        """
+        Score the resident corpus with BM25
+
+        With the sparse engine the CSR matrix is (re)built in a worker thread.
+        While a rebuild runs the previous matrix is served, so chunks added
+        since are missed and removed chunks are skipped until it completes.
+
+        Args:
+            terms: Query terms
+            top_k: Number of results to return
+            engine: "postings" (dict merge) or "sparse" (vectorized CSR matrix)
+
+        Returns:
+            List of (chunk payload, score) sorted by score descending
+        """
+        if not self.doc_count:
+            return []
+
+        if engine == "sparse" and sparse_bm25.is_available():
+            matrix = await self._matrix.get(self.version, None, self._sparse_snapshot)
+            if matrix is not None:
+                ranked = matrix.search(terms, top_k)
+                return [(self.chunks[chunk_id], score) for chunk_id, score in ranked if chunk_id in self.chunks]
+
+        doc_lengths = self.doc_lengths
+        postings = {
+            term: [(chunk_id, tf, doc_lengths[chunk_id]) for chunk_id, tf in self.postings[term].items()]
+            for term in terms
+            if term in self.postings
+        }
+        if not postings:
+            return []
+
+        ranked = score_postings(postings, self.doc_count, self.total_length / self.doc_count, top_k)
+        return [(self.chunks[chunk_id], score) for chunk_id, score in ranked]
+
+    def _dense_snapshot(self, dim: int, nprobe: int) -> Callable[[], Any]:
+        # Embedding arrays are never mutated, so a list copy suffices
+        embeddings = list(self.embeddings.items())
+
+        def build():
+            matching = [(chunk_id, vector) for chunk_id, vector in embeddings if len(vector) == dim]
+            if not matching:
+                return None
+            vectors = dense_index.np.stack([vector for _, vector in matching])
+            return dense_index.build_index(vectors, [chunk_id for chunk_id, _ in matching], nprobe=nprobe)
+
+        return build
+
+    async def dense_search(self, query_embedding: List[float], top_k: int, nprobe: int = 8) -> List[Tuple[Dict, float]]:
+        """
+        Nearest-neighbour search over the chunk embeddings
+
+        Uses an exact scan for small corpora and an IVF index otherwise. Only
+        embeddings with the query's dimensionality are searched. The index is
+        (re)built in a worker thread and, like the sparse matrix, the previous
+        one is served while a rebuild runs.
+
+        Args:
+            query_embedding: Query vector
+            top_k: Number of results to return
+            nprobe: IVF cells scanned per query
+
+        Returns:
+            List of (chunk payload, cosine similarity) sorted descending
+        """
+        if not self.embeddings or not dense_index.is_available():
+            return []
+
+        dim = len(query_embedding)
+        index = await self._dense.get(self.version, (dim, nprobe), lambda: self._dense_snapshot(dim, nprobe))
+        if index is None:
+            return []
+
+        ranked = index.search(query_embedding, top_k)
+        return [(self.chunks[chunk_id], score) for chunk_id, score in ranked if chunk_id in self.chunks]
+
+
+class IndexCache:
+    """
+    Memory-bounded LRU cache of per-chatbot retrieval indexes
+
+    Indexes are loaded lazily on the first query for a chatbot and patched in
+    place when chunks are added or sources deleted, so steady-state retrieval
+    never goes back to MongoDB. Eviction is least-recently-used by estimated
+    byte size. Invalidation is process-local; entries older than
+    `max_age_seconds` are reloaded so changes made by other workers are picked
+    up eventually.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, max_age_seconds: int = 300):
+        """
+        Initialize index cache
+
+        Args:
+            max_bytes: Memory budget for all resident indexes
+            max_age_seconds: Reload an index after this many seconds
+        """
+        self._indexes: "OrderedDict[str, ChatbotIndex]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._generations: Dict[str, int] = {}
+        self._oversized_ids: Set[str] = set()
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.evictions = 0
+        self.oversized = 0
+        logger.info(f"Index cache initialized with {max_bytes // (1024 * 1024)}MB budget")
+
+    def get(self, chatbot_id: str) -> Optional[ChatbotIndex]:
+        """Get a resident index (marks it as recently used)"""
+        index = self._indexes.get(chatbot_id)
+        if index is None:
+            return None
+
+        if time.monotonic() - index.loaded_at > self.max_age_seconds:
+            self.invalidate(chatbot_id)
+            return None
+
+        self._indexes.move_to_end(chatbot_id)
+        return index
+
+    async def get_or_load(
+        self,
+        chatbot_id: str,
+        loader: Callable[[str], Awaitable[Optional[ChatbotIndex]]]
+    ) -> Optional[ChatbotIndex]:
+        """
+        Get a resident index, loading it with `loader` on a miss
+
+        Concurrent misses for the same chatbot share a single load. Returns
+        None when the index could not be loaded or does not fit the budget.
+        """
+        index = self.get(chatbot_id)
+        if index is not None:
+            self.hits += 1
+            return index
+
+        # Known not to fit: let the caller fall back without reloading
+        if chatbot_id in self._oversized_ids:
+            return None
+
+        self.misses += 1
+        lock = self._locks.setdefault(chatbot_id, asyncio.Lock())
+        async with lock:
+            index = self.get(chatbot_id)
+            if index is not None:
+                return index
+
+            generation = self._generations.get(chatbot_id, 0)
+            index = await loader(chatbot_id)
+            self.loads += 1
+
+            if index is None:
+                return None
+
+            # A mutation raced with the load; serve the result but don't keep it
+            if self._generations.get(chatbot_id, 0) != generation:
+                return index
+
+            self._store(chatbot_id, index)
+            return index
+
+    def _store(self, chatbot_id: str, index: ChatbotIndex):
+        """Insert an index and evict least-recently-used ones over budget"""
+        if index.size_bytes > self.max_bytes:
+            self.oversized += 1
+            self._oversized_ids.add(chatbot_id)
+            logger.info(f"Index for chatbot {chatbot_id} ({index.size_bytes} bytes) exceeds cache budget")
+            return
+
+        self._indexes[chatbot_id] = index
+        self.current_bytes += index.size_bytes
+        self._evict()
+
+    def _evict(self):
+        while self.current_bytes > self.max_bytes and self._indexes:
+            evicted_id, evicted = self._indexes.popitem(last=False)
+            self.current_bytes -= evicted.size_bytes
+            self.evictions += 1
+            logger.info(f"Evicted index for chatbot {evicted_id} from cache")
+
+    def _patch(self, chatbot_id: str, mutate: Callable[[ChatbotIndex], Any]):
+        """Apply an in-place mutation to a resident index, keeping size accounting"""
+        self._generations[chatbot_id] = self._generations.get(chatbot_id, 0) + 1
+        self._oversized_ids.discard(chatbot_id)
+        index = self._indexes.get(chatbot_id)
+        if index is None:
+            return
+
+        size_before = index.size_bytes
+        mutate(index)
+        self.current_bytes += index.size_bytes - size_before
+        self._evict()
+
+    def add_chunks(self, chatbot_id: str, chunks: List[Tuple[Dict, Dict[str, int], int]]):
+        """
+        Patch a resident index with newly stored chunks
+
+        Args:
+            chatbot_id: Chatbot identifier
+            chunks: List of (chunk document, term frequencies, doc length)
+        """
+        def mutate(index: ChatbotIndex):
+            for chunk, term_freqs, doc_length in chunks:
+                index.add_chunk(chunk, term_freqs, doc_length)
+
+        self._patch(chatbot_id, mutate)
+
+    def remove_source(self, chatbot_id: str, source_id: str):
+        """Patch a resident index after a source was deleted"""
+        self._patch(chatbot_id, lambda index: index.remove_source(source_id))
+
+    def remove_chunks(self, chatbot_id: str, chunk_ids: List[str]):
+        """Patch a resident index after individual chunks were deleted"""
+        self._patch(chatbot_id, lambda index: index.remove_chunks(chunk_ids))
+
+    def version(self, chatbot_id: str) -> int:
+        """Monotonic index version of a chatbot, bumped on every chunk change"""
+        return self._generations.get(chatbot_id, 0)
+
+    def invalidate(self, chatbot_id: str):
+        """Drop the resident index for a chatbot"""
+        self._generations[chatbot_id] = self._generations.get(chatbot_id, 0) + 1
+        self._oversized_ids.discard(chatbot_id)
+        index = self._indexes.pop(chatbot_id, None)
+        if index is not None:
+            self.current_bytes -= index.size_bytes
+
+    def clear(self):
+        """Drop all resident indexes"""
+        for chatbot_id in list(self._indexes.keys()):
+            self.invalidate(chatbot_id)
+        logger.info("Index cache cleared")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        total_requests = self.hits + self.misses
+        hit_rate = (self.hits / total_requests * 100) if total_requests > 0 else 0
+
+        return {
+            "size": len(self._indexes),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(hit_rate, 2),
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "oversized": self.oversized
+        }
+
+
+# Global index cache shared by every VectorStore instance in the process
+index_cache = IndexCache(
+    max_bytes=int(os.environ.get('RAG_INDEX_CACHE_MB', '256')) * 1024 * 1024,
+    max_age_seconds=int(os.environ.get('RAG_INDEX_CACHE_MAX_AGE', '300'))
+)
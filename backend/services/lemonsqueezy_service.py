@@ -3,14 +3,13 @@ import httpx
 import logging
 from typing import Optional, Dict, Any
 import os
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import get_client
 
 logger = logging.getLogger(__name__)
 
 # MongoDB connection
-mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
 db_name = os.environ.get('DB_NAME', 'chatbase_db')
-client = AsyncIOMotorClient(mongo_url)
+client = get_client()
 db = client[db_name]
 
 
@@ -0,0 +1,110 @@
+import re
+import math
+import heapq
+from collections import Counter
+from typing import List, Dict, Tuple, Iterable
+
+# BM25 parameters (term frequency saturation and length normalization)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Common stop words excluded from indexing and queries
+STOP_WORDS = frozenset({
+    'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
+    'of', 'with', 'by', 'from', 'as', 'is', 'was', 'are', 'were', 'be',
+    'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did', 'will',
+    'would', 'could', 'should', 'may', 'might', 'can', 'this', 'that',
+    'these', 'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they'
+})
+
+_PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into index terms
+
+    Lowercases, strips punctuation and drops stop words and terms of two
+    characters or less. The same function is used for chunks and queries so
+    both sides of the index agree on what a term is.
+
+    Args:
+        text: Text to tokenize
+
+    Returns:
+        List of terms in document order (with repetitions)
+    """
+    if not text:
+        return []
+    words = _PUNCTUATION.sub(' ', text.lower()).split()
+    return [word for word in words if len(word) > 2 and word not in STOP_WORDS]
+
+
+def term_frequencies(text: str) -> Tuple[Dict[str, int], int]:
+    """
+    Compute term frequencies and document length for a chunk
+
+    Args:
+        text: Chunk text
+
+    Returns:
+        Tuple of (term -> frequency, document length in terms)
+    """
+    terms = tokenize(text)
+    return dict(Counter(terms)), len(terms)
+
+
+def query_terms(query: str, max_terms: int = 10) -> List[str]:
+    """Unique query terms in order of first appearance"""
+    seen = []
+    for term in tokenize(query):
+        if term not in seen:
+            seen.append(term)
+            if len(seen) >= max_terms:
+                break
+    return seen
+
+
+def bm25_idf(doc_freq: int, doc_count: int) -> float:
+    """BM25 inverse document frequency (always positive variant)"""
+    return math.log(1 + (doc_count - doc_freq + 0.5) / (doc_freq + 0.5))
+
+
+def score_postings(
+    postings: Dict[str, Iterable[Tuple[str, int, int]]],
+    doc_count: int,
+    avg_doc_length: float,
+    top_k: int,
+    k1: float = BM25_K1,
+    b: float = BM25_B
+) -> List[Tuple[str, float]]:
+    """
+    Merge postings lists and score documents with exact BM25
+
+    Args:
+        postings: term -> list of (chunk_id, term frequency, doc length)
+        doc_count: Number of chunks in the corpus
+        avg_doc_length: Average chunk length in terms over the whole corpus
+        top_k: Number of results to return
+        k1: BM25 parameter (term frequency saturation)
+        b: BM25 parameter (length normalization)
+
+    Returns:
+        List of (chunk_id, score) sorted by score descending
+    """
+    scores: Dict[str, float] = {}
+    avg_doc_length = max(avg_doc_length, 1.0)
+
+    for term, term_postings in postings.items():
+        term_postings = list(term_postings)
+        if not term_postings:
+            continue
+
+        idf = bm25_idf(len(term_postings), max(doc_count, len(term_postings)))
+
+        for chunk_id, tf, doc_length in term_postings:
+            numerator = tf * (k1 + 1)
+            denominator = tf + k1 * (1 - b + b * (doc_length / avg_doc_length))
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * numerator / denominator
+
+    return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
@@ -0,0 +1,172 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo.errors import BulkWriteError
+from database import get_database
+
+logger = logging.getLogger(__name__)
+
+
+class MessageWriter:
+    """
+    Batched writer for chat message documents
+
+    Messages are queued and inserted with `insert_many(ordered=False)` once
+    `batch_size` documents are queued or `flush_interval_ms` has passed since
+    the first queued document, so concurrent conversations share one round
+    trip. The queue is bounded: when `max_queue` documents are waiting,
+    `write()` blocks until the writer catches up (back-pressure) instead of
+    growing memory without limit.
+
+    Durability:
+        write(doc, wait=True)   returns after the batch holding the document
+                                is acknowledged by MongoDB (flush before the
+                                response). Errors are raised to the caller.
+        write(doc, wait=False)  returns once the document is queued (flush
+                                after the response). It is written within
+                                `flush_interval_ms`; documents still queued
+                                when the process dies are lost, and write
+                                errors are only logged.
+    Queued documents are flushed on shutdown by `stop()`.
+    """
+
+    def __init__(self, batch_size: int = 200, flush_interval_ms: int = 50, max_queue: int = 10000):
+        """
+        Initialize message writer
+
+        Args:
+            batch_size: Maximum documents per insert_many
+            flush_interval_ms: Maximum time a document waits for its batch to fill
+            max_queue: Queued documents at which write() starts blocking
+        """
+        self.collection = get_database()['messages']
+        self.batch_size = batch_size
+        self.flush_interval_ms = flush_interval_ms
+        self.max_queue = max_queue
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.documents_written = 0
+        self.batches_written = 0
+        self.write_errors = 0
+        self.backpressure_waits = 0
+        self.max_queue_depth = 0
+        self.total_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def write(self, doc: Dict[str, Any], wait: bool = False):
+        """
+        Queue a message document for insertion
+
+        Args:
+            doc: Message document
+            wait: Wait until the document is persisted (see class docstring)
+        """
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future() if wait else None
+
+        if self._queue.full():
+            self.backpressure_waits += 1
+        await self._queue.put((doc, future))
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+
+        if future is not None:
+            await future
+
+    async def write_many(self, docs: List[Dict[str, Any]], wait: bool = False):
+        """Queue several message documents (e.g. the user and assistant message of a turn)"""
+        await asyncio.gather(*(self.write(doc, wait=wait) for doc in docs))
+
+    async def _run(self):
+        while True:
+            first = await self._queue.get()
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval_ms / 1000
+
+            # Collect more documents until the batch is full or the deadline passes
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[Dict[str, Any], Optional[asyncio.Future]]]):
+        started = time.perf_counter()
+        failed_indexes: Dict[int, Exception] = {}
+        try:
+            await self.collection.insert_many([doc for doc, _ in batch], ordered=False)
+        except BulkWriteError as e:
+            # ordered=False: every document except the reported ones was inserted
+            for error in e.details.get("writeErrors", []):
+                failed_indexes[error["index"]] = Exception(error.get("errmsg", "write error"))
+        except Exception as e:
+            failed_indexes = {index: e for index in range(len(batch))}
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.batches_written += 1
+        self.documents_written += len(batch) - len(failed_indexes)
+        self.write_errors += len(failed_indexes)
+        self.total_flush_ms += elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+
+        if failed_indexes:
+            logger.error(f"Failed to write {len(failed_indexes)}/{len(batch)} messages: {next(iter(failed_indexes.values()))}")
+
+        for index, (_, future) in enumerate(batch):
+            if future is not None and not future.done():
+                if index in failed_indexes:
+                    future.set_exception(failed_indexes[index])
+                else:
+                    future.set_result(None)
+
+        for _ in batch:
+            self._queue.task_done()
+
+    async def stop(self):
+        """Write everything still queued and stop the writer (shutdown)"""
+        if self._queue is not None and self._task is not None and not self._task.done():
+            await self._queue.join()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get writer statistics"""
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "max_queue": self.max_queue,
+            "documents_written": self.documents_written,
+            "batches_written": self.batches_written,
+            "avg_batch_size": round(self.documents_written / self.batches_written, 2) if self.batches_written else 0,
+            "avg_flush_ms": round(self.total_flush_ms / self.batches_written, 2) if self.batches_written else 0,
+            "max_flush_ms": round(self.max_flush_ms, 2),
+            "write_errors": self.write_errors,
+            "backpressure_waits": self.backpressure_waits
+        }
+
+
+# Global message writer
+message_writer = MessageWriter(
+    batch_size=int(os.environ.get('MESSAGE_WRITER_BATCH_SIZE', '200')),
+    flush_interval_ms=int(os.environ.get('MESSAGE_WRITER_FLUSH_MS', '50')),
+    max_queue=int(os.environ.get('MESSAGE_WRITER_MAX_QUEUE', '10000'))
+)
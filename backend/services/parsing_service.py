@@ -0,0 +1,229 @@
+import os
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Per-process state of pool workers
+_worker_chunkers: Dict[tuple, Any] = {}
+
+
+def _init_worker(memory_limit_bytes: int):
+    """Pool worker initializer: cap the address space of the worker process"""
+    if memory_limit_bytes:
+        try:
+            import resource
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, memory_limit_bytes))
+        except (ImportError, ValueError, OSError) as e:
+            logger.warning(f"Could not set parser memory limit: {str(e)}")
+
+
+def _parse_file(filename: str, file_content) -> str:
+    from services.document_processor import DocumentProcessor
+    return DocumentProcessor.process_file(filename, file_content)
+
+
+def _chunk_text(
+    text: str,
+    metadata: Optional[Dict],
+    use_paragraph_chunking: bool,
+    chunk_size: int,
+    chunk_overlap: int,
+    start_index: int = 0
+) -> List[Dict]:
+    # The tokenizer is loaded once per worker process
+    key = (chunk_size, chunk_overlap)
+    chunker = _worker_chunkers.get(key)
+    if chunker is None:
+        from services.chunking_service import ChunkingService
+        chunker = _worker_chunkers[key] = ChunkingService(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    if use_paragraph_chunking:
+        return chunker.chunk_by_paragraphs(text, metadata, start_index)
+    return chunker.chunk_text(text, metadata, start_index)
+
+
+class ParsingTimeout(Exception):
+    """A parsing job exceeded its time budget"""
+
+
+class ParsingService:
+    """
+    Runs document parsing and chunking in a process pool
+
+    pypdf, python-docx, openpyxl and the tokenizer are CPU-bound and
+    synchronous; running them on the event loop stalls every in-flight chat
+    request. Jobs are executed in a bounded ProcessPoolExecutor where each
+    worker's address space is capped (`memory_limit_mb`), every job has a
+    time budget (`job_timeout_seconds`) and each tenant may run at most
+    `per_tenant_limit` jobs at once.
+
+    A job that times out or kills its worker takes the pool down with it:
+    the pool is recycled (its processes are terminated) and other jobs that
+    were running on it are retried once on the new pool.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        job_timeout_seconds: float = 300,
+        memory_limit_mb: int = 2048,
+        per_tenant_limit: int = 2
+    ):
+        """
+        Initialize parsing service
+
+        Args:
+            max_workers: Worker processes
+            job_timeout_seconds: Time budget of a single parse/chunk job
+            memory_limit_mb: Address space limit of each worker (0 disables)
+            per_tenant_limit: Concurrent jobs per tenant
+        """
+        self.max_workers = max_workers
+        self.job_timeout_seconds = job_timeout_seconds
+        self.memory_limit_mb = memory_limit_mb
+        self.per_tenant_limit = per_tenant_limit
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._tenant_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._tenant_jobs: Dict[str, int] = {}
+
+        self.jobs_completed = 0
+        self.jobs_failed = 0
+        self.jobs_timed_out = 0
+        self.pool_restarts = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(self.memory_limit_mb * 1024 * 1024,)
+            )
+        return self._executor
+
+    def _recycle_executor(self, executor: ProcessPoolExecutor):
+        """Terminate a pool (e.g. stuck on a job that timed out) so a fresh one is created"""
+        if self._executor is not executor:
+            return
+        self._executor = None
+        self.pool_restarts += 1
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            try:
+                process.terminate()
+            except Exception:
+                pass
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, tenant_id: str, fn, *args):
+        semaphore = self._tenant_semaphores.get(tenant_id)
+        if semaphore is None:
+            semaphore = self._tenant_semaphores[tenant_id] = asyncio.Semaphore(self.per_tenant_limit)
+
+        self._tenant_jobs[tenant_id] = self._tenant_jobs.get(tenant_id, 0) + 1
+        try:
+            async with semaphore:
+                for attempt in range(2):
+                    executor = self._get_executor()
+                    loop = asyncio.get_running_loop()
+                    try:
+                        result = await asyncio.wait_for(
+                            loop.run_in_executor(executor, fn, *args),
+                            timeout=self.job_timeout_seconds
+                        )
+                        self.jobs_completed += 1
+                        return result
+                    except asyncio.TimeoutError:
+                        self.jobs_timed_out += 1
+                        self._recycle_executor(executor)
+                        raise ParsingTimeout(f"Parsing exceeded {self.job_timeout_seconds}s")
+                    except BrokenProcessPool:
+                        # The worker died (memory cap) or the pool was recycled under us
+                        self._recycle_executor(executor)
+                        if attempt == 1:
+                            raise Exception("Parser process crashed (document too large or malformed)")
+                        logger.warning("Parser pool was restarted, retrying job")
+        except Exception:
+            self.jobs_failed += 1
+            raise
+        finally:
+            self._tenant_jobs[tenant_id] -= 1
+            if not self._tenant_jobs[tenant_id]:
+                del self._tenant_jobs[tenant_id]
+                self._tenant_semaphores.pop(tenant_id, None)
+
+    async def parse_file(self, tenant_id: str, filename: str, file_content: bytes) -> str:
+        """
+        Extract text from an uploaded file in a worker process
+
+        Args:
+            tenant_id: Owner of the upload (concurrency is limited per tenant)
+            filename: Original filename (selects the parser)
+            file_content: Raw file bytes
+
+        Returns:
+            Extracted text
+        """
+        return await self._run(tenant_id, _parse_file, filename, file_content)
+
+    async def parse_path(self, tenant_id: str, filename: str, file_path: str) -> str:
+        """
+        Extract text from a file on disk in a worker process
+
+        Only the path crosses the process boundary; the worker reads the
+        file itself, so large uploads are never held in this process.
+
+        Args:
+            tenant_id: Owner of the upload (concurrency is limited per tenant)
+            filename: Original filename (selects the parser)
+            file_path: Path of the spooled upload
+
+        Returns:
+            Extracted text
+        """
+        return await self._run(tenant_id, _parse_file, filename, file_path)
+
+    async def chunk_text(
+        self,
+        tenant_id: str,
+        text: str,
+        metadata: Optional[Dict] = None,
+        use_paragraph_chunking: bool = True,
+        chunk_size: int = 800,
+        chunk_overlap: int = 150,
+        start_index: int = 0
+    ) -> List[Dict]:
+        """Tokenize and chunk text in a worker process (see ChunkingService); chunk indexes start at `start_index`"""
+        return await self._run(
+            tenant_id, _chunk_text, text, metadata, use_paragraph_chunking, chunk_size, chunk_overlap, start_index
+        )
+
+    def shutdown(self):
+        """Stop the worker processes (application shutdown)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get parsing service statistics"""
+        return {
+            "max_workers": self.max_workers,
+            "active_tenants": len(self._tenant_jobs),
+            "jobs_in_progress": sum(self._tenant_jobs.values()),
+            "jobs_completed": self.jobs_completed,
+            "jobs_failed": self.jobs_failed,
+            "jobs_timed_out": self.jobs_timed_out,
+            "pool_restarts": self.pool_restarts
+        }
+
+
+# Global parsing service
+parsing_service = ParsingService(
+    max_workers=int(os.environ.get('PARSER_MAX_WORKERS', '2')),
+    job_timeout_seconds=float(os.environ.get('PARSER_JOB_TIMEOUT_SECONDS', '300')),
+    memory_limit_mb=int(os.environ.get('PARSER_MEMORY_LIMIT_MB', '2048')),
+    per_tenant_limit=int(os.environ.get('PARSER_PER_TENANT_LIMIT', '2'))
+)
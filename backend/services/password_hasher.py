@@ -0,0 +1,103 @@
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordHasher:
+    """
+    Async facade for bcrypt hashing and verification
+
+    A bcrypt hash or check costs 100-300ms of CPU. Called from a route
+    handler it blocks the event loop, and with it every other request on
+    the worker. Here the work runs in a dedicated thread pool (the bcrypt
+    backend releases the GIL while hashing) and at most `max_workers`
+    operations are submitted at a time; further callers wait on a
+    semaphore, so a login storm queues on the event loop instead of
+    piling work into the pool that cancelled requests could not withdraw.
+    """
+
+    def __init__(self, context: CryptContext, max_workers: int = 2):
+        """
+        Initialize password hasher
+
+        Args:
+            context: passlib context (schemes, rounds)
+            max_workers: Concurrent hash/verify operations (threads)
+        """
+        self.context = context
+        self.max_workers = max_workers
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.active = 0
+
+        self.hashes = 0
+        self.verifications = 0
+        self.total_ms = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.total_ms += (time.perf_counter() - started) * 1000
+            self.active -= 1
+            self._semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        """Hash a password"""
+        self.hashes += 1
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        """Verify a plain password against a hashed password"""
+        self.verifications += 1
+        return await self._run(self.context.verify, password, hashed_password)
+
+    def shutdown(self):
+        """Stop the worker threads (application shutdown)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get password hasher statistics"""
+        operations = self.hashes + self.verifications
+        return {
+            "max_workers": self.max_workers,
+            "active": self.active,
+            "waiting": self.waiting,
+            "hashes": self.hashes,
+            "verifications": self.verifications,
+            "avg_ms": round(self.total_ms / operations, 2) if operations else 0
+        }
+
+
+# Global password hasher (bcrypt)
+password_hasher = PasswordHasher(
+    CryptContext(schemes=["bcrypt"], deprecated="auto"),
+    max_workers=int(os.environ.get('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+)
@@ -1,16 +1,28 @@
-from motor.motor_asyncio import AsyncIOMotorClient
+from database import get_client
 from typing import Optional, List
 from datetime import datetime, timedelta
+from pymongo import ReturnDocument
 from models import Plan, PlanLimits
 import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Usage counter on the subscription document for each limit type
+USAGE_FIELDS = {
+    "chatbots": "chatbots_count",
+    "messages": "messages_this_month",
+    "file_uploads": "file_uploads_count",
+    "website_sources": "website_sources_count",
+    "text_sources": "text_sources_count"
+}
 
 class PlanService:
     """Service for managing plans and subscriptions"""
     
     def __init__(self):
-        mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
         db_name = os.environ.get('DB_NAME', 'chatbase_db')
-        self.client = AsyncIOMotorClient(mongo_url)
+        self.client = get_client()
         self.db = self.client[db_name]
         self.plans_collection = self.db.plans
         self.subscriptions_collection = self.db.subscriptions
@@ -155,6 +167,8 @@ class PlanService:
         # Clear existing plans and insert new ones
         await self.plans_collection.delete_many({})
         await self.plans_collection.insert_many(plans_data)
+        # Plan limits may have changed - recompute effective limits on next reservation
+        await self.subscriptions_collection.update_many({}, {"$unset": {"effective_limits": ""}})
         print("✅ Plans initialized successfully")
     
     async def get_all_plans(self) -> List[dict]:
@@ -249,16 +263,10 @@ class PlanService:
         
         return updated_subscription
     
-    async def check_limit(self, user_id: str, limit_type: str) -> dict:
-        """Check if user has reached a specific limit"""
-        subscription = await self.get_user_subscription(user_id)
-        plan = await self.get_plan_by_id(subscription["plan_id"])
-        
-        # Get user's custom limits if they exist
-        user = await self.users_collection.find_one({"id": user_id})
+    @staticmethod
+    def _compute_effective_limits(plan: dict, user: Optional[dict]) -> dict:
+        """Resolve the limits that apply to a user (custom limits override plan limits)"""
         custom_limits = user.get("custom_limits", {}) if user else {}
-        
-        usage = subscription.get("usage", {})
         limits = plan["limits"]
         
         # Apply custom limits (they override plan limits if set)
@@ -269,65 +277,173 @@ class PlanService:
         effective_max_website_sources = custom_limits.get("max_website_sources") if custom_limits else None
         effective_max_text_sources = custom_limits.get("max_text_sources") if custom_limits else None
         
+        custom = {
+            "chatbots": effective_max_chatbots,
+            "messages": effective_max_messages,
+            "file_uploads": effective_max_file_uploads,
+            "website_sources": effective_max_website_sources,
+            "text_sources": effective_max_text_sources
+        }
+        plan_limits = {
+            "chatbots": limits["max_chatbots"],
+            "messages": limits["max_messages_per_month"],
+            "file_uploads": limits["max_file_uploads"],
+            "website_sources": limits["max_website_sources"],
+            "text_sources": limits["max_text_sources"]
+        }
+        
         # Use custom limits if set, otherwise use plan limits
-        max_chatbots = effective_max_chatbots if effective_max_chatbots is not None else limits["max_chatbots"]
-        max_messages = effective_max_messages if effective_max_messages is not None else limits["max_messages_per_month"]
-        max_file_uploads = effective_max_file_uploads if effective_max_file_uploads is not None else limits["max_file_uploads"]
-        max_website_sources = effective_max_website_sources if effective_max_website_sources is not None else limits["max_website_sources"]
-        max_text_sources = effective_max_text_sources if effective_max_text_sources is not None else limits["max_text_sources"]
-        
-        limit_checks = {
-            "chatbots": {
-                "current": usage.get("chatbots_count", 0),
-                "max": max_chatbots,
-                "reached": usage.get("chatbots_count", 0) >= max_chatbots,
-                "custom_limit_applied": effective_max_chatbots is not None
-            },
-            "messages": {
-                "current": usage.get("messages_this_month", 0),
-                "max": max_messages,
-                "reached": usage.get("messages_this_month", 0) >= max_messages,
-                "custom_limit_applied": effective_max_messages is not None
-            },
-            "file_uploads": {
-                "current": usage.get("file_uploads_count", 0),
-                "max": max_file_uploads,
-                "reached": usage.get("file_uploads_count", 0) >= max_file_uploads,
-                "custom_limit_applied": effective_max_file_uploads is not None
-            },
-            "website_sources": {
-                "current": usage.get("website_sources_count", 0),
-                "max": max_website_sources,
-                "reached": usage.get("website_sources_count", 0) >= max_website_sources,
-                "custom_limit_applied": effective_max_website_sources is not None
-            },
-            "text_sources": {
-                "current": usage.get("text_sources_count", 0),
-                "max": max_text_sources,
-                "reached": usage.get("text_sources_count", 0) >= max_text_sources,
-                "custom_limit_applied": effective_max_text_sources is not None
+        return {
+            limit_type: {
+                "max": custom[limit_type] if custom[limit_type] is not None else plan_limits[limit_type],
+                "custom_limit_applied": custom[limit_type] is not None
             }
+            for limit_type in plan_limits
         }
+    
+    async def check_limit(self, user_id: str, limit_type: str) -> dict:
+        """Check if user has reached a specific limit"""
+        subscription = await self.get_user_subscription(user_id)
+        plan = await self.get_plan_by_id(subscription["plan_id"])
+        
+        # Get user's custom limits if they exist
+        user = await self.users_collection.find_one({"id": user_id})
         
-        if limit_type in limit_checks:
-            return limit_checks[limit_type]
+        if limit_type not in USAGE_FIELDS:
+            return {"error": "Invalid limit type"}
+        
+        usage = subscription.get("usage", {})
+        effective = self._compute_effective_limits(plan, user)[limit_type]
+        current = usage.get(USAGE_FIELDS[limit_type], 0)
         
-        return {"error": "Invalid limit type"}
+        return {
+            "current": current,
+            "max": effective["max"],
+            "reached": current >= effective["max"],
+            "custom_limit_applied": effective["custom_limit_applied"]
+        }
     
-    async def increment_usage(self, user_id: str, usage_type: str, amount: int = 1):
-        """Increment usage counter"""
-        field_map = {
-            "chatbots": "usage.chatbots_count",
-            "messages": "usage.messages_this_month",
-            "file_uploads": "usage.file_uploads_count",
-            "website_sources": "usage.website_sources_count",
-            "text_sources": "usage.text_sources_count"
+    async def refresh_effective_limits(self, user_id: str) -> dict:
+        """
+        Recompute and store the effective limits on the user's subscription
+        
+        `reserve_usage` compares usage against `subscription.effective_limits`
+        in a single conditional update. The stored limits carry the plan id
+        they were computed for, so a plan change makes them stale
+        automatically; call this after changing a user's custom limits.
+        
+        Returns:
+            The updated subscription
+        """
+        subscription = await self.get_user_subscription(user_id)
+        plan = await self.get_plan_by_id(subscription["plan_id"])
+        user = await self.users_collection.find_one({"id": user_id})
+        
+        effective_limits = {
+            limit_type: effective["max"]
+            for limit_type, effective in self._compute_effective_limits(plan, user).items()
         }
+        effective_limits["plan_id"] = subscription["plan_id"]
         
-        if usage_type in field_map:
+        subscription = await self.subscriptions_collection.find_one_and_update(
+            {"user_id": user_id},
+            {"$set": {"effective_limits": effective_limits}},
+            return_document=ReturnDocument.AFTER
+        )
+        return subscription
+    
+    async def _try_reserve(self, user_id: str, field: str, limit_type: str, amount: int) -> Optional[dict]:
+        """Increment usage only if the stored effective limit is current and not yet reached"""
+        return await self.subscriptions_collection.find_one_and_update(
+            {
+                "user_id": user_id,
+                "$expr": {
+                    "$and": [
+                        {"$eq": ["$plan_id", "$effective_limits.plan_id"]},
+                        {"$lt": [{"$ifNull": [f"${field}", 0]}, f"$effective_limits.{limit_type}"]}
+                    ]
+                }
+            },
+            {"$inc": {field: amount}},
+            projection={"_id": 0, "usage": 1, "effective_limits": 1},
+            return_document=ReturnDocument.AFTER
+        )
+    
+    async def reserve_usage(self, user_id: str, limit_type: str, amount: int = 1) -> dict:
+        """
+        Atomically check a limit and reserve usage against it
+        
+        The check and the increment are a single conditional
+        findOneAndUpdate, so concurrent requests cannot push usage past the
+        limit and the common path costs one round trip. Release the
+        reservation with `release_usage` if the work it paid for fails.
+        
+        Args:
+            user_id: Owner of the subscription
+            limit_type: One of USAGE_FIELDS (e.g. "messages")
+            amount: Units to reserve
+        
+        Returns:
+            {"reserved", "current", "max", "reached"} - same shape as check_limit
+        """
+        if limit_type not in USAGE_FIELDS:
+            return {"error": "Invalid limit type"}
+        
+        field = f"usage.{USAGE_FIELDS[limit_type]}"
+        
+        subscription = await self._try_reserve(user_id, field, limit_type, amount)
+        if subscription is None:
+            # Either the limit is reached or the stored limits are missing/stale
+            subscription = await self.subscriptions_collection.find_one(
+                {"user_id": user_id},
+                {"_id": 0, "plan_id": 1, "usage": 1, "effective_limits": 1}
+            )
+            effective_limits = (subscription or {}).get("effective_limits") or {}
+            if not subscription or effective_limits.get("plan_id") != subscription.get("plan_id"):
+                await self.refresh_effective_limits(user_id)
+                subscription = await self._try_reserve(user_id, field, limit_type, amount)
+        
+            if subscription is None:
+                subscription = await self.subscriptions_collection.find_one(
+                    {"user_id": user_id},
+                    {"_id": 0, "usage": 1, "effective_limits": 1}
+                )
+                current = subscription.get("usage", {}).get(USAGE_FIELDS[limit_type], 0)
+                return {
+                    "reserved": False,
+                    "current": current,
+                    "max": subscription["effective_limits"][limit_type],
+                    "reached": True
+                }
+        
+        current = subscription.get("usage", {}).get(USAGE_FIELDS[limit_type], 0)
+        return {
+            "reserved": True,
+            "current": current,
+            "max": subscription["effective_limits"][limit_type],
+            "reached": False
+        }
+    
+    async def release_usage(self, user_id: str, limit_type: str, amount: int = 1):
+        """Give back usage reserved with `reserve_usage` (e.g. the LLM call failed)"""
+        if limit_type not in USAGE_FIELDS:
+            return
+        
+        field = f"usage.{USAGE_FIELDS[limit_type]}"
+        try:
+            await self.subscriptions_collection.update_one(
+                {"user_id": user_id, field: {"$gte": amount}},
+                {"$inc": {field: -amount}}
+            )
+        except Exception as e:
+            logger.error(f"Failed to release {limit_type} usage for user {user_id}: {str(e)}")
+    
+    async def increment_usage(self, user_id: str, usage_type: str, amount: int = 1):
+        """Increment usage counter"""
+        if usage_type in USAGE_FIELDS:
             await self.subscriptions_collection.update_one(
                 {"user_id": user_id},
-                {"$inc": {field_map[usage_type]: amount}}
+                {"$inc": {f"usage.{USAGE_FIELDS[usage_type]}": amount}}
             )
     
     async def decrement_usage(self, user_id: str, usage_type: str, amount: int = 1):
@@ -1,15 +1,28 @@
+import os
+import time
+import asyncio
 import logging
-from typing import List, Dict, Optional
-from .chunking_service import ChunkingService
+from typing import List, Dict, Optional, Tuple
+from .chunking_service import ChunkingService, iter_sections
 from .vector_store import VectorStore
+from .embedding_service import get_embedder
+from .embedding_cache import embedding_cache
+from .retrieval_cache import retrieval_cache
+from .answer_cache import answer_cache
+from .parsing_service import parsing_service
+from .rank_fusion import reciprocal_rank_fusion, weighted_score_fusion
 
 logger = logging.getLogger(__name__)
 
 
 class RAGService:
     """
-    Main RAG (Retrieval Augmented Generation) service - Basic version
-    Orchestrates chunking and text-based retrieval (no embeddings)
+    Main RAG (Retrieval Augmented Generation) service
+    Orchestrates chunking and retrieval. Retrieval is text-based (BM25) by
+    default; in "dense" mode chunks are embedded at ingestion and queries are
+    answered by nearest-neighbour search over the embeddings, and in "hybrid"
+    mode both retrievers run concurrently and their results are fused.
+    The mode defaults to RAG_RETRIEVAL_MODE and can be overridden per chatbot.
     """
     
     def __init__(self):
@@ -20,11 +33,34 @@ class RAGService:
         )
         self.vector_store = VectorStore()
         
+        # Documents longer than this are chunked and stored in sections of this size
+        self.ingest_section_chars = int(os.environ.get('RAG_INGEST_SECTION_CHARS', str(2 * 1024 * 1024)))
+        
         # Configuration - OPTIMIZED for speed and token usage
         self.top_k_results = 2  # Reduced from 3 to 2 to save 10-20% tokens per message
         self.similarity_threshold = 0.4  # Increased from 0.3 to 0.4 for better quality
         
-        logger.info("Basic RAG Service initialized successfully (no embeddings) - OPTIMIZED")
+        # Retrieval mode: "lexical" (BM25, no embeddings), "dense" (embeddings + ANN) or "hybrid"
+        self.retrieval_mode = os.environ.get('RAG_RETRIEVAL_MODE', 'lexical')
+        self._embedder = None
+        
+        # Hybrid fusion: "rrf" (reciprocal rank) or "weighted" (normalized scores)
+        self.fusion_method = "rrf"
+        self.lexical_weight = 0.5
+        self.max_fusion_candidates = 20  # Per-retriever candidate list bound
+        
+        logger.info(f"RAG Service initialized successfully (retrieval mode: {self.retrieval_mode})")
+    
+    @property
+    def embedder(self):
+        """Embedder used for dense retrieval (created on first use)"""
+        if self._embedder is None:
+            self._embedder = get_embedder()
+        return self._embedder
+    
+    @property
+    def method(self) -> str:
+        return "basic_rag_no_embeddings" if self.retrieval_mode == "lexical" else f"{self.retrieval_mode}_rag"
     
     async def process_document(
         self,
@@ -33,10 +69,13 @@ class RAGService:
         source_id: str,
         source_type: str,
         filename: str = None,
-        use_paragraph_chunking: bool = True
+        use_paragraph_chunking: bool = True,
+        retrieval_mode: str = None,
+        tenant_id: str = None,
+        document_key: str = None
     ) -> Dict:
         """
-        Process a document: chunk and store (no embeddings in basic RAG)
+        Process a document: chunk, embed (dense mode only) and store
         
         Args:
             text: Document text content
@@ -45,6 +84,10 @@ class RAGService:
             source_type: Type of source (file, website, text)
             filename: Optional filename
             use_paragraph_chunking: Whether to use paragraph-aware chunking
+            retrieval_mode: Chatbot's retrieval mode (embeddings are computed unless "lexical")
+            tenant_id: Owner used to limit concurrent chunking jobs (default: chatbot_id)
+            document_key: Key of this document within a multi-document source
+                (e.g. one page of a crawled website)
             
         Returns:
             Dictionary with processing statistics
@@ -52,20 +95,42 @@ class RAGService:
         try:
             logger.info(f"Processing document for chatbot {chatbot_id}, source {source_id}")
             
-            # Step 1: Chunk the document
-            metadata = {
-                "source_id": source_id,
-                "source_type": source_type
-            }
-            if filename:
-                metadata["filename"] = filename
-            
-            if use_paragraph_chunking:
-                chunks = self.chunking_service.chunk_by_paragraphs(text, metadata)
-            else:
-                chunks = self.chunking_service.chunk_text(text, metadata)
+            # Large documents are chunked, embedded and stored section by section
+            # so only one section's chunks are held in memory at a time
+            chunk_count = 0
+            total_tokens = 0
+            store_result = {}
+            for section in iter_sections(text, self.ingest_section_chars):
+                # Step 1: Chunk the section (chunk indexes continue across sections)
+                chunks = await self._chunk_document(
+                    section, chatbot_id, source_id, source_type, filename, use_paragraph_chunking, tenant_id,
+                    start_index=chunk_count
+                )
+                if not chunks:
+                    continue
+                
+                # Step 2: Embed chunks when dense retrieval is enabled
+                embeddings = None
+                embedding_model = None
+                if self._embeds(retrieval_mode):
+                    embeddings = await self._embed_texts([chunk["text"] for chunk in chunks])
+                    embedding_model = self.embedder.model if embeddings is not None else None
+                
+                # Step 3: Store chunks in MongoDB
+                store_result = await self.vector_store.add_chunks(
+                    chatbot_id=chatbot_id,
+                    chunks=chunks,
+                    embeddings=embeddings,
+                    source_id=source_id,
+                    source_type=source_type,
+                    filename=filename,
+                    embedding_model=embedding_model,
+                    document_key=document_key
+                )
+                chunk_count += len(chunks)
+                total_tokens += sum(chunk.get("token_count", 0) for chunk in chunks)
             
-            if not chunks:
+            if not chunk_count:
                 logger.warning("No chunks created from document")
                 return {
                     "success": False,
@@ -73,73 +138,224 @@ class RAGService:
                     "chunks_created": 0
                 }
             
-            chunk_stats = self.chunking_service.get_stats(chunks)
-            logger.info(f"Created {len(chunks)} chunks: {chunk_stats}")
+            chunk_stats = {
+                "total_chunks": chunk_count,
+                "total_tokens": total_tokens,
+                "avg_tokens_per_chunk": round(total_tokens / chunk_count, 2),
+                "chunk_size_config": self.chunking_service.chunk_size,
+                "overlap_config": self.chunking_service.chunk_overlap
+            }
+            logger.info(f"Created {chunk_count} chunks: {chunk_stats}")
+            
+            # Cached answers may be superseded by the new knowledge
+            await answer_cache.invalidate(chatbot_id)
+            
+            return {
+                "success": True,
+                "chunks_created": chunk_count,
+                "chunks_stored": chunk_count,
+                "total_chunks_in_store": store_result.get("collection_size", 0),
+                "chunk_stats": chunk_stats,
+                "method": self.method
+            }
             
-            # Step 2: Store chunks directly in MongoDB (no embeddings needed)
-            store_result = await self.vector_store.add_chunks(
+        except Exception as e:
+            logger.error(f"Error processing document: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e),
+                "chunks_created": 0
+            }
+    
+    async def refresh_document(
+        self,
+        text: str,
+        chatbot_id: str,
+        source_id: str,
+        source_type: str,
+        filename: str = None,
+        use_paragraph_chunking: bool = True,
+        retrieval_mode: str = None,
+        tenant_id: str = None,
+        document_key: str = None
+    ) -> Dict:
+        """
+        Re-ingest a document incrementally: only chunks whose text changed are stored
+        
+        The document is re-chunked section by section and diffed by chunk
+        content hash against what is stored for the source (or, with `document_key`, for that
+        document within it); new chunks are embedded and inserted, vanished
+        ones deleted. Works for documents that were never ingested too
+        (everything is new).
+        
+        Args:
+            Same as process_document
+            
+        Returns:
+            Dictionary with chunks created, added, removed and unchanged
+        """
+        try:
+            embed = None
+            embedding_model = None
+            if self._embeds(retrieval_mode):
+                embed = self._embed_texts
+                embedding_model = self.embedder.model
+            
+            async def sections():
+                # Chunked section by section like process_document, so only
+                # one section's chunks are held in memory at a time
+                chunk_count = 0
+                for section in iter_sections(text, self.ingest_section_chars):
+                    chunks = await self._chunk_document(
+                        section, chatbot_id, source_id, source_type, filename, use_paragraph_chunking, tenant_id,
+                        start_index=chunk_count
+                    )
+                    chunk_count += len(chunks)
+                    if chunks:
+                        yield chunks
+            
+            result = await self.vector_store.refresh_chunks(
                 chatbot_id=chatbot_id,
-                chunks=chunks,
-                embeddings=None,  # No embeddings in basic RAG
+                sections=sections(),
                 source_id=source_id,
                 source_type=source_type,
-                filename=filename
+                filename=filename,
+                document_key=document_key,
+                embed=embed,
+                embedding_model=embedding_model
             )
             
+            if result["chunks_added"] or result["chunks_removed"]:
+                await answer_cache.invalidate(chatbot_id)
+            
             return {
                 "success": True,
-                "chunks_created": len(chunks),
-                "chunks_stored": store_result.get("chunks_added", 0),
-                "total_chunks_in_store": store_result.get("collection_size", 0),
-                "chunk_stats": chunk_stats,
-                "method": "basic_rag_no_embeddings"
+                "chunks_created": result["chunks_created"],
+                "chunks_added": result["chunks_added"],
+                "chunks_removed": result["chunks_removed"],
+                "chunks_unchanged": result["chunks_unchanged"],
+                "method": self.method
             }
             
         except Exception as e:
-            logger.error(f"Error processing document: {str(e)}")
+            logger.error(f"Error refreshing document: {str(e)}")
             return {
                 "success": False,
                 "error": str(e),
                 "chunks_created": 0
             }
     
+    async def _chunk_document(
+        self,
+        text: str,
+        chatbot_id: str,
+        source_id: str,
+        source_type: str,
+        filename: Optional[str],
+        use_paragraph_chunking: bool,
+        tenant_id: Optional[str],
+        start_index: int = 0
+    ) -> List[Dict]:
+        metadata = {
+            "source_id": source_id,
+            "source_type": source_type
+        }
+        if filename:
+            metadata["filename"] = filename
+        
+        # Tokenizing large documents is CPU-bound - run it in the parser pool
+        return await parsing_service.chunk_text(
+            tenant_id or chatbot_id,
+            text,
+            metadata,
+            use_paragraph_chunking=use_paragraph_chunking,
+            chunk_size=self.chunking_service.chunk_size,
+            chunk_overlap=self.chunking_service.chunk_overlap,
+            start_index=start_index
+        )
+    
+    def _embeds(self, retrieval_mode: Optional[str]) -> bool:
+        """Embeddings are computed unless the chatbot uses lexical retrieval only"""
+        return (retrieval_mode or self.retrieval_mode) != "lexical"
+    
+    async def _embed_texts(self, texts: List[str]) -> Optional[List[List[float]]]:
+        try:
+            # Identical chunks (re-uploads, re-scrapes) are served from the embedding cache
+            return await embedding_cache.embed_texts(texts, self.embedder)
+        except Exception as e:
+            logger.error(f"Embedding failed, storing chunks without embeddings: {str(e)}")
+            return None
+    
     async def retrieve_relevant_context(
         self,
         query: str,
         chatbot_id: str,
         top_k: int = None,
-        min_similarity: float = None
+        min_similarity: float = None,
+        retrieval_mode: str = None,
+        fusion_method: str = None,
+        lexical_weight: float = None
     ) -> Dict:
         """
-        Retrieve relevant context for a query using text-based search
+        Retrieve relevant context for a query
         
         Args:
             query: User query
             chatbot_id: Chatbot identifier
             top_k: Number of results to return (default: 5)
             min_similarity: Minimum similarity threshold (default: 0.3)
+            retrieval_mode: "lexical", "dense" or "hybrid" (default: service mode)
+            fusion_method: Hybrid fusion, "rrf" or "weighted" (default: rrf)
+            lexical_weight: Weight of lexical scores for weighted fusion (0-1)
             
         Returns:
-            Dictionary with context, citations, and metadata
+            Dictionary with context, citations, metadata and per-stage timings (ms);
+            `cache_hit` is set when the result was served from the retrieval cache
         """
         try:
             top_k = top_k or self.top_k_results
             min_similarity = min_similarity or self.similarity_threshold
+            retrieval_mode = retrieval_mode or self.retrieval_mode
+            fusion_method = fusion_method or self.fusion_method
+            lexical_weight = self.lexical_weight if lexical_weight is None else lexical_weight
             
-            logger.info(f"Retrieving context for query (chatbot: {chatbot_id}, top_k: {top_k})")
+            started = time.perf_counter()
             
-            # Search using text-based retrieval (no embeddings needed)
-            matches = await self.vector_store.search(
-                chatbot_id=chatbot_id,
-                query_embedding=None,  # Not used in basic RAG
-                query=query,  # Pass the query text instead
-                top_k=top_k,
-                min_similarity=min_similarity
+            # OPTIMIZATION: Serve repeated questions from the result cache
+            cache_key = retrieval_cache.make_key(
+                chatbot_id, query, self.vector_store.get_index_version(chatbot_id),
+                top_k, min_similarity, retrieval_mode, fusion_method, lexical_weight
             )
+            cached = retrieval_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Retrieval cache hit (chatbot: {chatbot_id})")
+                return {**cached, "cache_hit": True, "timings": {"total_ms": self._elapsed_ms(started)}}
+            
+            logger.info(f"Retrieving context for query (chatbot: {chatbot_id}, top_k: {top_k}, mode: {retrieval_mode})")
+            
+            timings: Dict[str, float] = {}
+            
+            if retrieval_mode == "hybrid":
+                matches = await self._hybrid_search(
+                    query, chatbot_id, top_k, min_similarity,
+                    fusion_method, lexical_weight, timings
+                )
+            elif retrieval_mode == "dense":
+                matches, timings["dense_ms"], timings["embedding_ms"] = await self._timed_dense_search(
+                    query, chatbot_id, top_k, min_similarity
+                )
+            else:
+                matches, timings["lexical_ms"] = await self._timed_lexical_search(
+                    query, chatbot_id, top_k, min_similarity
+                )
+            
+            timings["total_ms"] = self._elapsed_ms(started)
             
             if not matches:
                 logger.info("No relevant context found")
-                return self._empty_context()
+                result = self._empty_context()
+                retrieval_cache.set(cache_key, result)
+                return {**result, "timings": timings}
             
             # Step 3: Format context and citations
             context_parts = []
@@ -168,20 +384,101 @@ class RAGService:
             
             logger.info(f"Retrieved {len(matches)} relevant chunks")
             
-            return {
+            result = {
                 "has_context": True,
                 "context": combined_context,
                 "citations": citations,
                 "citation_footer": citation_footer,
                 "num_sources": len(matches),
                 "avg_similarity": round(sum(m["similarity"] for m in matches) / len(matches), 4),
-                "matches": matches  # Full match data for advanced use
+                "matches": matches,  # Full match data for advanced use
+                "retrieval_mode": retrieval_mode
             }
+            retrieval_cache.set(cache_key, result)
+            
+            return {**result, "timings": timings}
             
         except Exception as e:
             logger.error(f"Error retrieving context: {str(e)}")
             return self._empty_context()
     
+    @staticmethod
+    def _elapsed_ms(started: float) -> float:
+        return round((time.perf_counter() - started) * 1000, 2)
+    
+    async def _timed_lexical_search(
+        self, query: str, chatbot_id: str, top_k: int, min_similarity: float
+    ) -> Tuple[List[Dict], float]:
+        """BM25 search, returns (matches, elapsed ms)"""
+        started = time.perf_counter()
+        matches = await self.vector_store.search(
+            chatbot_id=chatbot_id,
+            query=query,
+            top_k=top_k,
+            min_similarity=min_similarity
+        )
+        return matches, self._elapsed_ms(started)
+    
+    async def _timed_dense_search(
+        self, query: str, chatbot_id: str, top_k: int, min_similarity: float
+    ) -> Tuple[List[Dict], float, float]:
+        """Embed the query and search embeddings, returns (matches, total ms, embedding ms)"""
+        started = time.perf_counter()
+        query_embedding = await embedding_cache.embed_query(query, self.embedder)
+        embedding_ms = self._elapsed_ms(started)
+        
+        matches = await self.vector_store.search(
+            chatbot_id=chatbot_id,
+            query_embedding=query_embedding,
+            top_k=top_k,
+            min_similarity=min_similarity
+        )
+        return matches, self._elapsed_ms(started), embedding_ms
+    
+    async def _hybrid_search(
+        self,
+        query: str,
+        chatbot_id: str,
+        top_k: int,
+        min_similarity: float,
+        fusion_method: str,
+        lexical_weight: float,
+        timings: Dict[str, float]
+    ) -> List[Dict]:
+        """Run lexical and dense retrieval concurrently and fuse the candidates"""
+        candidates = min(max(top_k * 4, 10), self.max_fusion_candidates)
+        
+        lexical_result, dense_result = await asyncio.gather(
+            self._timed_lexical_search(query, chatbot_id, candidates, 0.0),
+            self._timed_dense_search(query, chatbot_id, candidates, 0.0),
+            return_exceptions=True
+        )
+        
+        result_lists = []
+        weights = []
+        if isinstance(lexical_result, Exception):
+            logger.error(f"Lexical retrieval failed in hybrid mode: {str(lexical_result)}")
+        else:
+            result_lists.append(lexical_result[0])
+            weights.append(lexical_weight)
+            timings["lexical_ms"] = lexical_result[1]
+        
+        if isinstance(dense_result, Exception):
+            logger.error(f"Dense retrieval failed in hybrid mode: {str(dense_result)}")
+        else:
+            result_lists.append(dense_result[0])
+            weights.append(1.0 - lexical_weight)
+            timings["dense_ms"], timings["embedding_ms"] = dense_result[1], dense_result[2]
+        
+        started = time.perf_counter()
+        if fusion_method == "weighted":
+            fused = weighted_score_fusion(result_lists, weights)
+        else:
+            fused = reciprocal_rank_fusion(result_lists)
+        timings["fusion_ms"] = self._elapsed_ms(started)
+        
+        return [match for match in fused if match["similarity"] >= min_similarity][:top_k]
+    
     def _build_citation(self, metadata: Dict, similarity: float, source_num: int) -> Dict:
         """Build citation information from metadata"""
         filename = metadata.get("filename", "Unknown source")
@@ -231,12 +528,33 @@ class RAGService:
         """
         try:
             result = await self.vector_store.delete_source(chatbot_id, source_id)
+            await answer_cache.invalidate(chatbot_id)
             logger.info(f"Deleted source {source_id} from chatbot {chatbot_id}")
             return result
         except Exception as e:
             logger.error(f"Error deleting source: {str(e)}")
             return {"success": False, "error": str(e)}
     
+    async def delete_document(self, chatbot_id: str, source_id: str, filename: str) -> Dict:
+        """
+        Delete the data of one document of a source (e.g. a changed or removed page)
+        
+        Args:
+            chatbot_id: Chatbot identifier
+            source_id: Source identifier
+            filename: Filename (page URL) the document was processed with
+            
+        Returns:
+            Deletion result
+        """
+        try:
+            result = await self.vector_store.delete_document(chatbot_id, source_id, filename)
+            await answer_cache.invalidate(chatbot_id)
+            return result
+        except Exception as e:
+            logger.error(f"Error deleting document: {str(e)}")
+            return {"success": False, "error": str(e)}
+    
     async def delete_chatbot_data(self, chatbot_id: str) -> bool:
         """
         Delete all RAG data for a chatbot
@@ -249,6 +567,7 @@ class RAGService:
         """
         try:
             success = await self.vector_store.delete_chatbot_collection(chatbot_id)
+            await answer_cache.invalidate(chatbot_id)
             if success:
                 logger.info(f"Deleted all RAG data for chatbot {chatbot_id}")
             return success
@@ -268,7 +587,7 @@ class RAGService:
                     "chunk_overlap": self.chunking_service.chunk_overlap,
                     "top_k_results": self.top_k_results,
                     "similarity_threshold": self.similarity_threshold,
-                    "method": "basic_rag_no_embeddings"
+                    "method": self.method
                 }
             })
             
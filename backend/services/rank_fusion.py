@@ -0,0 +1,73 @@
+from typing import List, Dict, Sequence
+
+# Standard RRF damping constant (Cormack et al.)
+RRF_K = 60
+
+
+def _match_key(match: Dict):
+    metadata = match.get("metadata", {})
+    return metadata.get("chunk_id") or (metadata.get("source_id"), metadata.get("chunk_index"))
+
+
+def reciprocal_rank_fusion(result_lists: Sequence[List[Dict]], k: int = RRF_K) -> List[Dict]:
+    """
+    Fuse ranked match lists with reciprocal-rank fusion
+
+    Each match contributes 1 / (k + rank) from every list it appears in. The
+    fused score is normalized to 0-1 and stored as the match similarity.
+
+    Args:
+        result_lists: Match lists (as returned by VectorStore.search), best first
+        k: RRF damping constant
+
+    Returns:
+        Fused matches sorted by fused score descending
+    """
+    fused: Dict = {}
+    for matches in result_lists:
+        for rank, match in enumerate(matches, start=1):
+            key = _match_key(match)
+            entry = fused.setdefault(key, {"match": match, "score": 0.0})
+            entry["score"] += 1.0 / (k + rank)
+
+    return _finalize(fused)
+
+
+def weighted_score_fusion(result_lists: Sequence[List[Dict]], weights: Sequence[float]) -> List[Dict]:
+    """
+    Fuse match lists by a weighted sum of min-max normalized similarities
+
+    Args:
+        result_lists: Match lists (as returned by VectorStore.search)
+        weights: Weight of each list
+
+    Returns:
+        Fused matches sorted by fused score descending
+    """
+    fused: Dict = {}
+    for matches, weight in zip(result_lists, weights):
+        if not matches:
+            continue
+        similarities = [match["similarity"] for match in matches]
+        low, high = min(similarities), max(similarities)
+        spread = high - low
+
+        for match in matches:
+            normalized = (match["similarity"] - low) / spread if spread > 0 else 1.0
+            entry = fused.setdefault(_match_key(match), {"match": match, "score": 0.0})
+            entry["score"] += weight * normalized
+
+    return _finalize(fused)
+
+
+def _finalize(fused: Dict) -> List[Dict]:
+    ranked = sorted(fused.values(), key=lambda entry: entry["score"], reverse=True)
+    max_score = ranked[0]["score"] if ranked else 1.0
+
+    results = []
+    for rank, entry in enumerate(ranked, start=1):
+        match = dict(entry["match"])
+        match["similarity"] = round(entry["score"] / max_score, 4) if max_score > 0 else 0
+        match["rank"] = rank
+        results.append(match)
+    return results
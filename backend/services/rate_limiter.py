@@ -0,0 +1,315 @@
+import os
+import math
+import time
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+# (limit, window_seconds) pairs, e.g. ((200, 60), (5000, 3600))
+Limits = Sequence[Tuple[int, int]]
+# Per window: (hits in the current bucket, hits in the previous bucket)
+WindowCounts = List[Tuple[int, int]]
+
+
+class RateLimitBackend(ABC):
+    """
+    Storage for sliding-window counters
+
+    For every key and window length the backend keeps two counters: hits in
+    the current fixed bucket (`now // window`) and hits in the bucket before
+    it. Counters roll over lazily when a key is hit in a new bucket.
+    """
+
+    @abstractmethod
+    async def increment(self, key: str, windows: Sequence[int], now: float) -> WindowCounts:
+        """
+        Count a hit for `key` in every window
+
+        Args:
+            key: Rate-limited identity (e.g. client IP)
+            windows: Window lengths in seconds
+            now: Current time (epoch seconds)
+
+        Returns:
+            (current, previous) bucket counts per window, including this hit
+        """
+
+    @abstractmethod
+    async def decrement(self, key: str, windows: Sequence[int], now: float):
+        """Take back a hit counted at `now` (skipped for buckets that rolled over since)"""
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    Per-process counters
+
+    Keys are kept in last-hit order, so keys idle for two of their longest
+    windows (when both buckets are stale) are evicted from the front on
+    every hit, without scanning the whole table.
+    """
+
+    def __init__(self):
+        # key -> [last_hit, [[bucket, current, previous] per window]]
+        self._counters: "OrderedDict[str, list]" = OrderedDict()
+        self._max_window = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _roll(counter: list, bucket: int):
+        if counter[0] == bucket:
+            return
+        counter[2] = counter[1] if counter[0] == bucket - 1 else 0
+        counter[1] = 0
+        counter[0] = bucket
+
+    def _evict_idle(self, now: float):
+        cutoff = now - 2 * self._max_window
+        while self._counters:
+            key, entry = next(iter(self._counters.items()))
+            if entry[0] >= cutoff:
+                return
+            self._counters.popitem(last=False)
+            self.evictions += 1
+
+    async def increment(self, key: str, windows: Sequence[int], now: float) -> WindowCounts:
+        entry = self._counters.get(key)
+        if entry is None or len(entry[1]) != len(windows):
+            entry = self._counters[key] = [now, [[int(now // window), 0, 0] for window in windows]]
+            self._max_window = max(self._max_window, *windows)
+        else:
+            self._counters.move_to_end(key)
+            entry[0] = now
+
+        counts = []
+        for counter, window in zip(entry[1], windows):
+            self._roll(counter, int(now // window))
+            counter[1] += 1
+            counts.append((counter[1], counter[2]))
+
+        self._evict_idle(now)
+        return counts
+
+    async def decrement(self, key: str, windows: Sequence[int], now: float):
+        entry = self._counters.get(key)
+        if entry is None:
+            return
+        for counter, window in zip(entry[1], windows):
+            if counter[0] == int(now // window) and counter[1] > 0:
+                counter[1] -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "keys": len(self._counters),
+            "evictions": self.evictions
+        }
+
+
+class MongoRateLimitBackend(RateLimitBackend):
+    """
+    Counters shared by all workers, one document per key
+
+    A hit is a single `find_one_and_update` with an update pipeline that
+    rolls the buckets over and increments them atomically, so every worker
+    (and every server) sees the same counts. Documents carry `expires_at`
+    and are removed by a TTL index once the key is idle.
+    """
+
+    def __init__(self, collection_name: str = "rate_limits"):
+        self.collection_name = collection_name
+        self._collection = None
+
+    @property
+    def collection(self):
+        if self._collection is None:
+            from database import get_database
+            self._collection = get_database()[self.collection_name]
+        return self._collection
+
+    @staticmethod
+    def _field(window: int) -> str:
+        return f"w{window}"
+
+    async def increment(self, key: str, windows: Sequence[int], now: float) -> WindowCounts:
+        stage = {"expires_at": datetime.fromtimestamp(now + 2 * max(windows), tz=timezone.utc)}
+        for window in windows:
+            bucket = int(now // window)
+            field = self._field(window)
+            stage[field] = {"$let": {
+                "vars": {"s": {"$ifNull": [f"${field}", {"b": -1, "c": 0, "p": 0}]}},
+                "in": {
+                    "b": bucket,
+                    "c": {"$cond": [{"$eq": ["$$s.b", bucket]}, {"$add": ["$$s.c", 1]}, 1]},
+                    "p": {"$switch": {
+                        "branches": [
+                            {"case": {"$eq": ["$$s.b", bucket]}, "then": "$$s.p"},
+                            {"case": {"$eq": ["$$s.b", bucket - 1]}, "then": "$$s.c"}
+                        ],
+                        "default": 0
+                    }}
+                }
+            }}
+
+        doc = await self.collection.find_one_and_update(
+            {"_id": key},
+            [{"$set": stage}],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return [(doc[self._field(window)]["c"], doc[self._field(window)]["p"]) for window in windows]
+
+    async def decrement(self, key: str, windows: Sequence[int], now: float):
+        query = {"_id": key}
+        update = {}
+        for window in windows:
+            query[f"{self._field(window)}.b"] = int(now // window)
+            update[f"{self._field(window)}.c"] = -1
+        await self.collection.update_one(query, {"$inc": update})
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "mongo",
+            "collection": self.collection_name
+        }
+
+
+class RateLimiter:
+    """
+    Sliding-window-counter rate limiter
+
+    A window's hit count is estimated from two fixed buckets:
+    `previous * (1 - elapsed / window) + current`. Each check costs O(1)
+    time and memory per key and window (a single round trip with the Mongo
+    backend), unlike a log of request timestamps. Rejected hits are taken
+    back, so only allowed requests count towards the limits.
+
+    Backend errors fail open: the request is allowed and the error counted.
+    """
+
+    def __init__(self, backend: RateLimitBackend, clock=time.time):
+        """
+        Initialize rate limiter
+
+        Args:
+            backend: Counter storage (MemoryRateLimitBackend or MongoRateLimitBackend)
+            clock: Time source in epoch seconds
+        """
+        self.backend = backend
+        self.clock = clock
+
+        self.checks = 0
+        self.rejected = 0
+        self.backend_errors = 0
+
+    @staticmethod
+    def _estimate(current: int, previous: int, window: int, elapsed: float) -> float:
+        return previous * (1 - elapsed / window) + current
+
+    @staticmethod
+    def _retry_after(limit: int, current: int, previous: int, window: int, elapsed: float) -> int:
+        """Seconds until one more hit fits in the window"""
+        if current + 1 > limit or not previous:
+            seconds = window - elapsed
+        else:
+            # The previous bucket's weight decays linearly over the window
+            seconds = window * (1 - (limit - current - 1) / previous) - elapsed
+        return max(1, math.ceil(seconds))
+
+    async def check(self, key: str, limits: Limits) -> Dict[str, Any]:
+        """
+        Count a hit for `key` unless it exceeds one of the limits
+
+        Args:
+            key: Rate-limited identity (e.g. client IP)
+            limits: (limit, window_seconds) pairs; the first one is reported in `limit`/`remaining`
+
+        Returns:
+            Dict with allowed, limit, remaining, retry_after (seconds) and message
+        """
+        self.checks += 1
+        now = self.clock()
+        windows = [window for _, window in limits]
+
+        try:
+            counts = await self.backend.increment(key, windows, now)
+        except Exception as e:
+            self.backend_errors += 1
+            logger.error(f"Rate limit backend error: {str(e)}")
+            return {"allowed": True, "limit": limits[0][0], "remaining": limits[0][0], "retry_after": 0, "message": ""}
+
+        result = None
+        for (limit, window), (current, previous) in zip(limits, counts):
+            elapsed = now % window
+            if self._estimate(current, previous, window, elapsed) > limit:
+                result = {
+                    "allowed": False,
+                    "limit": limits[0][0],
+                    "remaining": 0,
+                    "retry_after": self._retry_after(limit, current - 1, previous, window, elapsed),
+                    "message": f"Rate limit exceeded: {limit} requests per {self._describe(window)}"
+                }
+                break
+
+        if result is not None:
+            self.rejected += 1
+            try:
+                await self.backend.decrement(key, windows, now)
+            except Exception as e:
+                self.backend_errors += 1
+                logger.error(f"Rate limit backend error: {str(e)}")
+            return result
+
+        limit, window = limits[0]
+        current, previous = counts[0]
+        estimate = self._estimate(current, previous, window, now % window)
+        return {
+            "allowed": True,
+            "limit": limit,
+            "remaining": max(0, int(limit - estimate)),
+            "retry_after": 0,
+            "message": ""
+        }
+
+    @staticmethod
+    def _describe(window: int) -> str:
+        if window == 60:
+            return "minute"
+        if window == 3600:
+            return "hour"
+        return f"{window} seconds"
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get rate limiter statistics"""
+        return {
+            "checks": self.checks,
+            "rejected": self.rejected,
+            "backend_errors": self.backend_errors,
+            **self.backend.get_stats()
+        }
+
+
+def create_rate_limit_backend(name: Optional[str] = None) -> RateLimitBackend:
+    """
+    Backend by name: "memory" (per process) or "mongo" (shared by all workers)
+
+    Args:
+        name: Backend name (default: RATE_LIMIT_BACKEND, else "memory")
+    """
+    name = (name or os.environ.get('RATE_LIMIT_BACKEND', 'memory')).lower()
+    if name == "mongo":
+        return MongoRateLimitBackend()
+    if name != "memory":
+        logger.warning(f"Unknown rate limit backend '{name}', using memory")
+    return MemoryRateLimitBackend()
+
+
+# Global rate limiter
+rate_limiter = RateLimiter(create_rate_limit_backend())
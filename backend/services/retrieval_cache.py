@@ -0,0 +1,98 @@
+import os
+import re
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a question for cache lookup (case, punctuation, whitespace)"""
+    return " ".join(_PUNCTUATION.sub(" ", query.lower()).split())
+
+
+class RetrievalCache:
+    """
+    TTL + LRU cache of retrieval results for repeated questions
+
+    Keys include the chatbot's index version, which is bumped whenever its
+    chunk set changes, so stale results are never served after an upload or
+    source deletion in this process. The TTL bounds staleness for changes
+    made by other workers.
+    """
+
+    def __init__(self, max_entries: int = 5000, ttl_seconds: int = 300):
+        """
+        Initialize retrieval cache
+
+        Args:
+            max_entries: Maximum number of cached results
+            ttl_seconds: Lifetime of a cached result
+        """
+        self._cache: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        logger.info(f"Retrieval cache initialized (max_entries: {max_entries}, ttl: {ttl_seconds}s)")
+
+    @staticmethod
+    def make_key(chatbot_id: str, query: str, version: int, *params: Hashable) -> Tuple:
+        """Build a cache key from the chatbot, normalized query, index version and retrieval parameters"""
+        return (chatbot_id, normalize_query(query), version) + params
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a cached result if present and not expired"""
+        entry = self._cache.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        value, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._cache[key]
+            self.misses += 1
+            return None
+
+        self._cache.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        """Cache a result, evicting the least recently used entries over the limit"""
+        self._cache[key] = (value, time.monotonic() + self.ttl_seconds)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Clear all cached results"""
+        self._cache.clear()
+        logger.info("Retrieval cache cleared")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        total_requests = self.hits + self.misses
+        hit_rate = (self.hits / total_requests * 100) if total_requests > 0 else 0
+
+        return {
+            "size": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(hit_rate, 2),
+            "total_requests": total_requests,
+            "evictions": self.evictions
+        }
+
+
+# Global retrieval cache shared by every RAGService instance in the process
+retrieval_cache = RetrievalCache(
+    max_entries=int(os.environ.get('RAG_RESULT_CACHE_SIZE', '5000')),
+    ttl_seconds=int(os.environ.get('RAG_RESULT_CACHE_TTL', '300'))
+)
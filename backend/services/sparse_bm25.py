@@ -0,0 +1,177 @@
+import logging
+from itertools import repeat
+from typing import Dict, List, Sequence, Tuple
+from .lexical_index import BM25_K1, BM25_B
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+logger = logging.getLogger(__name__)
+
+
+def is_available() -> bool:
+    """Whether the vectorized engine can be used (numpy installed)"""
+    return np is not None
+
+
+class SparseBM25Matrix:
+    """
+    Vectorized BM25 scoring engine over a CSR term-frequency matrix
+
+    The corpus is stored term-major (one CSR row per term, columns are chunk
+    positions), together with a precomputed length-normalization vector and
+    per-term IDF. Scoring a query gathers the rows of its terms, computes the
+    saturated term weights with vector ops, accumulates them per chunk with
+    `bincount` and selects the top-k with `argpartition`.
+    """
+
+    def __init__(
+        self,
+        term_ids: Dict[str, int],
+        indptr,
+        indices,
+        data,
+        doc_lengths,
+        doc_ids: Sequence[str],
+        k1: float = BM25_K1,
+        b: float = BM25_B
+    ):
+        """
+        Initialize the engine from CSR arrays
+
+        Args:
+            term_ids: term -> row number
+            indptr: Row pointer array (len(term_ids) + 1)
+            indices: Column (chunk position) of each non-zero
+            data: Term frequency of each non-zero
+            doc_lengths: Length in terms of each chunk position
+            doc_ids: Chunk id of each chunk position
+            k1: BM25 parameter (term frequency saturation)
+            b: BM25 parameter (length normalization)
+        """
+        if np is None:
+            raise RuntimeError("numpy is required for the sparse BM25 engine")
+
+        self.term_ids = term_ids
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.data = np.asarray(data, dtype=np.float32)
+        self.doc_ids = list(doc_ids)
+        self.k1 = k1
+
+        doc_lengths = np.asarray(doc_lengths, dtype=np.float32)
+        self.doc_count = len(doc_lengths)
+        avg_doc_length = max(float(doc_lengths.mean()) if self.doc_count else 0.0, 1.0)
+
+        # k1 * (1 - b + b * dl / avgdl), precomputed once per chunk
+        self.doc_norm = (k1 * (1 - b + b * doc_lengths / avg_doc_length)).astype(np.float32)
+
+        # Document frequency of a term is the length of its row
+        doc_freqs = np.diff(self.indptr).astype(np.float32)
+        self.idf = np.log1p((self.doc_count - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+
+    @classmethod
+    def from_coo(
+        cls,
+        term_ids: Dict[str, int],
+        rows,
+        cols,
+        tfs,
+        doc_lengths,
+        doc_ids: Sequence[str]
+    ) -> "SparseBM25Matrix":
+        """Build the CSR layout from (term row, chunk position, tf) triples"""
+        rows = np.asarray(rows, dtype=np.int64)
+        order = np.argsort(rows, kind="stable")
+        counts = np.bincount(rows, minlength=len(term_ids))
+        indptr = np.concatenate(([0], np.cumsum(counts)))
+        return cls(
+            term_ids,
+            indptr,
+            np.asarray(cols)[order],
+            np.asarray(tfs)[order],
+            doc_lengths,
+            doc_ids
+        )
+
+    @classmethod
+    def from_term_freqs(
+        cls,
+        term_freqs: Sequence[Tuple[str, Dict[str, int]]],
+        doc_lengths: Sequence[int]
+    ) -> "SparseBM25Matrix":
+        """
+        Build the engine from per-chunk term frequencies
+
+        Args:
+            term_freqs: (chunk id, term -> term frequency) per chunk
+            doc_lengths: Length in terms of each chunk, in the same order
+        """
+        term_ids: Dict[str, int] = {}
+        rows: List[int] = []
+        cols: List[int] = []
+        tfs: List[int] = []
+        for position, (_, chunk_term_freqs) in enumerate(term_freqs):
+            rows.extend(term_ids.setdefault(term, len(term_ids)) for term in chunk_term_freqs)
+            cols.extend(repeat(position, len(chunk_term_freqs)))
+            tfs.extend(chunk_term_freqs.values())
+
+        return cls.from_coo(
+            term_ids,
+            rows,
+            cols,
+            tfs,
+            doc_lengths,
+            [chunk_id for chunk_id, _ in term_freqs]
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return int(
+            self.indptr.nbytes + self.indices.nbytes + self.data.nbytes
+            + self.doc_norm.nbytes + self.idf.nbytes
+        )
+
+    def search(self, terms: List[str], top_k: int) -> List[Tuple[str, float]]:
+        """
+        Score the corpus for a query
+
+        Args:
+            terms: Query terms
+            top_k: Number of results to return
+
+        Returns:
+            List of (chunk_id, score) sorted by score descending
+        """
+        rows = np.fromiter(
+            (self.term_ids[term] for term in set(terms) if term in self.term_ids),
+            dtype=np.int64
+        )
+        if not len(rows) or top_k <= 0:
+            return []
+
+        # Gather the rows of all query terms into flat arrays
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return []
+
+        offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+        gather = np.arange(total, dtype=np.int64) + offsets
+        cols = self.indices[gather]
+        tfs = self.data[gather]
+        idf = np.repeat(self.idf[rows], lengths)
+
+        weights = idf * tfs * (self.k1 + 1) / (tfs + self.doc_norm[cols])
+        scores = np.bincount(cols, weights=weights, minlength=self.doc_count)
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > top_k:
+            top = np.argpartition(scores[candidates], -top_k)[-top_k:]
+            candidates = candidates[top]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        return [(self.doc_ids[i], float(scores[i])) for i in candidates]
@@ -0,0 +1,198 @@
+import os
+import asyncio
+import hashlib
+import logging
+import tempfile
+from typing import Any, Dict, Optional
+
+from starlette.requests import Request
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ModuleNotFoundError:
+    from multipart.multipart import MultipartParser, parse_options_header
+
+logger = logging.getLogger(__name__)
+
+
+class UploadTooLarge(Exception):
+    """The upload exceeded the size limit"""
+
+
+class InvalidUpload(Exception):
+    """The request is not a multipart upload with the expected file field"""
+
+
+class SpooledUpload:
+    """An uploaded file spooled to disk"""
+
+    def __init__(self, path: str, filename: str, size: int, sha256: str):
+        self.path = path
+        self.filename = filename
+        self.size = size
+        self.sha256 = sha256
+
+    def cleanup(self):
+        """Delete the spooled file"""
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class UploadSpooler:
+    """
+    Streams multipart file uploads to temporary files on disk
+
+    The request body is parsed as it arrives: data of the file field is
+    hashed incrementally and written to a temporary file in `write_buffer`
+    sized blocks, so memory per upload stays bounded no matter how large the
+    file is. The size limit is enforced while streaming - an upload is
+    rejected as soon as it passes `max_bytes` (or immediately if its
+    Content-Length already does), not after it was buffered.
+    """
+
+    def __init__(self, max_bytes: int = 100 * 1024 * 1024, spool_dir: Optional[str] = None, write_buffer: int = 1024 * 1024):
+        """
+        Initialize upload spooler
+
+        Args:
+            max_bytes: Maximum size of the uploaded file
+            spool_dir: Directory for spooled files (default: system temp dir)
+            write_buffer: Bytes buffered in memory between disk writes
+        """
+        self.max_bytes = max_bytes
+        self.spool_dir = spool_dir or None
+        self.write_buffer = write_buffer
+
+        self.active_uploads = 0
+        self.uploads_spooled = 0
+        self.uploads_rejected = 0
+        self.bytes_spooled = 0
+
+    async def spool(self, request: Request, field_name: str = "file") -> SpooledUpload:
+        """
+        Stream the file field of a multipart request to disk
+
+        Args:
+            request: Incoming multipart/form-data request
+            field_name: Form field holding the file
+
+        Returns:
+            SpooledUpload; the caller must `cleanup()` it when done
+
+        Raises:
+            UploadTooLarge: The file exceeds `max_bytes`
+            InvalidUpload: Malformed request or no file in `field_name`
+        """
+        content_type, params = parse_options_header(request.headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or b"boundary" not in params:
+            raise InvalidUpload("Expected a multipart/form-data upload")
+
+        # The body also holds multipart framing; allow some slack over the file limit
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_bytes + 64 * 1024:
+            self.uploads_rejected += 1
+            raise UploadTooLarge(f"Upload exceeds {self.max_bytes} bytes")
+
+        fd, path = tempfile.mkstemp(prefix="upload-", dir=self.spool_dir)
+        spool_file = os.fdopen(fd, "wb")
+        digest = hashlib.sha256()
+        pending = bytearray()
+        state = {"headers": [], "header_field": b"", "header_value": b"", "in_file": False, "filename": None, "size": 0}
+
+        def on_part_begin():
+            state["headers"] = []
+            state["in_file"] = False
+
+        def on_header_field(data: bytes, start: int, end: int):
+            state["header_field"] += data[start:end]
+
+        def on_header_value(data: bytes, start: int, end: int):
+            state["header_value"] += data[start:end]
+
+        def on_header_end():
+            state["headers"].append((state["header_field"].lower(), state["header_value"]))
+            state["header_field"] = b""
+            state["header_value"] = b""
+
+        def on_headers_finished():
+            disposition = dict(state["headers"]).get(b"content-disposition", b"")
+            _, options = parse_options_header(disposition)
+            is_file = options.get(b"name") == field_name.encode() and b"filename" in options
+            if is_file and state["filename"] is None:
+                state["filename"] = options[b"filename"].decode("utf-8", errors="replace")
+                state["in_file"] = True
+
+        def on_part_data(data: bytes, start: int, end: int):
+            if not state["in_file"]:
+                return
+            state["size"] += end - start
+            if state["size"] > self.max_bytes:
+                raise UploadTooLarge(f"Upload exceeds {self.max_bytes} bytes")
+            block = data[start:end]
+            digest.update(block)
+            pending.extend(block)
+
+        def on_part_end():
+            state["in_file"] = False
+
+        parser = MultipartParser(params[b"boundary"], {
+            "on_part_begin": on_part_begin,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+        })
+
+        self.active_uploads += 1
+        try:
+            async for chunk in request.stream():
+                # Feed large chunks in slices so at most one write buffer is held
+                for offset in range(0, len(chunk), self.write_buffer):
+                    parser.write(chunk[offset:offset + self.write_buffer])
+                    if len(pending) >= self.write_buffer:
+                        await asyncio.to_thread(spool_file.write, pending)
+                        pending.clear()
+            parser.finalize()
+            if pending:
+                await asyncio.to_thread(spool_file.write, pending)
+                pending.clear()
+            spool_file.close()
+
+            if state["filename"] is None:
+                raise InvalidUpload(f"No file in form field '{field_name}'")
+        except Exception as e:
+            spool_file.close()
+            os.unlink(path)
+            if isinstance(e, UploadTooLarge):
+                self.uploads_rejected += 1
+                raise
+            if isinstance(e, InvalidUpload):
+                raise
+            raise InvalidUpload(f"Malformed upload: {str(e)}")
+        finally:
+            self.active_uploads -= 1
+
+        self.uploads_spooled += 1
+        self.bytes_spooled += state["size"]
+        return SpooledUpload(path, state["filename"], state["size"], digest.hexdigest())
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get spooler statistics"""
+        return {
+            "active_uploads": self.active_uploads,
+            "uploads_spooled": self.uploads_spooled,
+            "uploads_rejected": self.uploads_rejected,
+            "bytes_spooled": self.bytes_spooled,
+            "max_bytes": self.max_bytes
+        }
+
+
+# Global upload spooler
+upload_spooler = UploadSpooler(
+    max_bytes=int(os.environ.get('UPLOAD_MAX_MB', '100')) * 1024 * 1024,
+    spool_dir=os.environ.get('UPLOAD_SPOOL_DIR')
+)
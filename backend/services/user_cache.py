@@ -0,0 +1,160 @@
+import os
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Fields loaded for the authenticated user (auth.get_current_user). Heavy
+# admin-only fields (notes, tags, custom fields, ...) keep their model
+# defaults on the returned User - read the user document for those.
+USER_PRINCIPAL_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "name": 1,
+    "email": 1,
+    "password_hash": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "role": 1,
+    "status": 1,
+    "suspension_reason": 1,
+    "suspension_until": 1,
+    "phone": 1,
+    "avatar_url": 1,
+    "last_login": 1,
+    "email_verified": 1,
+    "plan_id": 1,
+    "permissions": 1,
+    "custom_limits": 1,
+    "custom_max_chatbots": 1,
+    "custom_max_messages": 1,
+    "custom_max_file_uploads": 1,
+}
+
+
+class UserCache:
+    """
+    TTL + LRU cache of authenticated users keyed by (email, token iat)
+
+    Saves the users lookup and User model construction on every protected
+    request. Admin and account endpoints that change a user call
+    `invalidate_user` / `invalidate_users` / `invalidate_email`, which drop
+    every cached token of that user in this process; the TTL bounds
+    staleness for changes made by other workers.
+
+    A lookup that started before an invalidation is not cached, so a user
+    read just before a suspension cannot outlive it.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: int = 30):
+        """
+        Initialize user cache
+
+        Args:
+            max_entries: Maximum number of cached (email, iat) entries
+            ttl_seconds: Lifetime of a cached user
+        """
+        self._cache: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # Bumped by every invalidation; see `generation` / `set`
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        logger.info(f"User cache initialized (max_entries: {max_entries}, ttl: {ttl_seconds}s)")
+
+    @property
+    def generation(self) -> int:
+        """Read before loading a user from the database and pass to `set`"""
+        return self._generation
+
+    def get(self, email: str, issued_at: Optional[int]) -> Optional[Any]:
+        """Get the cached user for a token if present and not expired"""
+        key = (email, issued_at)
+        entry = self._cache.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        user, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._cache[key]
+            self.misses += 1
+            return None
+
+        self._cache.move_to_end(key)
+        self.hits += 1
+        return user
+
+    def set(self, email: str, issued_at: Optional[int], user: Any, generation: int):
+        """
+        Cache a user loaded from the database
+
+        Args:
+            email: Token subject
+            issued_at: Token `iat` claim
+            user: User model
+            generation: `generation` read before the user was loaded; the
+                user is not cached if it was invalidated in the meantime
+        """
+        if generation != self._generation:
+            return
+        key = (email, issued_at)
+        self._cache[key] = (user, time.monotonic() + self.ttl_seconds)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+            self.evictions += 1
+
+    def _invalidate(self, matches) -> int:
+        self._generation += 1
+        keys = [key for key, (user, _) in self._cache.items() if matches(key[0], user)]
+        for key in keys:
+            del self._cache[key]
+        self.invalidations += 1
+        return len(keys)
+
+    def invalidate_user(self, user_id: str) -> int:
+        """Drop every cached token of a user (by user id)"""
+        return self._invalidate(lambda email, user: user.id == user_id)
+
+    def invalidate_users(self, user_ids: Iterable[str]) -> int:
+        """Drop every cached token of several users (bulk operations)"""
+        user_ids = set(user_ids)
+        return self._invalidate(lambda email, user: user.id in user_ids)
+
+    def invalidate_email(self, email: str) -> int:
+        """Drop every cached token of a user (by email)"""
+        return self._invalidate(lambda cached_email, user: cached_email == email)
+
+    def clear(self):
+        """Clear all cached users"""
+        self._generation += 1
+        self._cache.clear()
+        logger.info("User cache cleared")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        total_requests = self.hits + self.misses
+        hit_rate = (self.hits / total_requests * 100) if total_requests > 0 else 0
+
+        return {
+            "size": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(hit_rate, 2),
+            "total_requests": total_requests,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
+
+
+# Global authenticated-user cache
+user_cache = UserCache(
+    max_entries=int(os.environ.get('USER_CACHE_SIZE', '10000')),
+    ttl_seconds=int(os.environ.get('USER_CACHE_TTL', '30'))
+)
@@ -1,52 +1,65 @@
 import logging
-from typing import List, Dict, Optional
+import hashlib
+from typing import AsyncIterable, Awaitable, Callable, List, Dict, Optional, Tuple
 import os
-from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import TEXT
-import re
+from pymongo import DeleteMany, UpdateOne
+from database import get_client, get_rag_database
 from collections import Counter
-import math
+from .lexical_index import tokenize, term_frequencies, query_terms, score_postings
+from .index_cache import ChatbotIndex, index_cache
+from . import sparse_bm25
+from . import dense_index
 
 logger = logging.getLogger(__name__)
 
 
+def chunk_hash(text: str) -> str:
+    """Content hash identifying a chunk's text across re-ingestions"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
 class VectorStore:
-    """Service for managing document chunks using MongoDB with basic text search"""
+    """
+    Service for managing document chunks using MongoDB with BM25 text search
+
+    Chunks are stored in `document_chunks`. Alongside them a per-chatbot
+    inverted index is maintained in `chunk_postings` (one document per
+    term/chunk pair with the term frequency and chunk length) and
+    `chunk_index_stats` (chunk count and total length per chatbot), so search
+    is a postings-list merge scored with exact BM25 over the whole corpus.
+    
+    Hot chatbots are served from the process-wide `index_cache`, which is
+    patched by add_chunks/refresh_chunks/delete_source so steady-state search
+    stays in memory.
+    """
     
     def __init__(self):
         """Initialize MongoDB connection for chunk storage"""
         try:
-            # Get MongoDB connection string
-            mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-            db_name = os.environ.get('MONGO_DB_NAME', 'botsmith')
-            
-            # Initialize MongoDB client
-            self.client = AsyncIOMotorClient(mongo_url)
-            self.db = self.client[db_name]
+            # Shared process-wide client (one connection pool)
+            self.client = get_client()
+            self.db = get_rag_database()
             self.chunks_collection = self.db['document_chunks']
+            self.postings_collection = self.db['chunk_postings']
+            self.stats_collection = self.db['chunk_index_stats']
             
-            logger.info(f"MongoDB VectorStore initialized with database: {db_name}")
+            # Scoring engine for resident indexes: "postings" or "sparse" (NumPy CSR)
+            self.scoring_engine = os.environ.get('RAG_SCORING_ENGINE', 'postings')
+            if self.scoring_engine == 'sparse' and not sparse_bm25.is_available():
+                logger.warning("RAG_SCORING_ENGINE=sparse requires numpy; using postings engine")
+                self.scoring_engine = 'postings'
+            
+            # IVF cells probed per dense query (recall/latency trade-off)
+            self.ann_nprobe = int(os.environ.get('RAG_ANN_NPROBE', '8'))
+            # Embeddings per batch when scanning a non-resident index from MongoDB
+            self.dense_scan_batch = int(os.environ.get('RAG_DENSE_SCAN_BATCH', '256'))
+            
+            logger.info(f"MongoDB VectorStore initialized with database: {self.db.name}")
             
         except Exception as e:
             logger.error(f"Error initializing MongoDB VectorStore: {str(e)}")
             raise Exception(f"Failed to initialize vector store: {str(e)}")
     
-    async def ensure_text_index(self, chatbot_id: str):
-        """
-        Ensure text index exists for efficient text search
-        
-        Args:
-            chatbot_id: Chatbot identifier
-        """
-        try:
-            # Create text index on 'text' field if it doesn't exist
-            await self.chunks_collection.create_index([("text", TEXT)])
-            await self.chunks_collection.create_index([("chatbot_id", 1)])
-            await self.chunks_collection.create_index([("source_id", 1)])
-            logger.info(f"Text indexes ensured for chatbot {chatbot_id}")
-        except Exception as e:
-            logger.warning(f"Index may already exist: {str(e)}")
-    
     def get_or_create_collection(self, chatbot_id: str):
         """
         Compatibility method - returns collection info
@@ -70,61 +83,72 @@ class VectorStore:
         self,
         chatbot_id: str,
         chunks: List[Dict],
-        embeddings: List[List[float]] = None,  # Kept for compatibility but not used
+        embeddings: List[List[float]] = None,
         source_id: str = None,
         source_type: str = None,
-        filename: str = None
+        filename: str = None,
+        embedding_model: str = None,
+        document_key: str = None
     ) -> Dict:
         """
-        Add document chunks to MongoDB (basic RAG - no embeddings)
+        Add document chunks to MongoDB
         
         Args:
             chatbot_id: Chatbot identifier
             chunks: List of chunk dictionaries with text and metadata
-            embeddings: Not used in basic RAG (kept for compatibility)
+            embeddings: Optional chunk embeddings (one per chunk) for dense retrieval
             source_id: Source document identifier
             source_type: Type of source (file, website, text)
             filename: Optional filename for file sources
+            embedding_model: Name of the model that produced the embeddings
+            document_key: Distinguishes chunk ids of several documents stored
+                under one source (e.g. the pages of a crawled website)
             
         Returns:
             Dictionary with operation statistics
         """
         try:
-            await self.ensure_text_index(chatbot_id)
+            # Backfill the inverted index first if this chatbot has legacy chunks
+            await self._get_index_stats(chatbot_id)
+            
+            if embeddings is not None and len(embeddings) != len(chunks):
+                logger.warning(f"Got {len(embeddings)} embeddings for {len(chunks)} chunks; storing without embeddings")
+                embeddings = None
             
             # Prepare documents for MongoDB
             documents = []
             
+            postings = []
+            indexed = []
+            total_length = 0
+            
             for i, chunk in enumerate(chunks):
                 # Create unique ID for chunk
-                chunk_id = f"{source_id}_chunk_{i}"
-                
-                # Prepare document
-                doc = {
-                    "chunk_id": chunk_id,
-                    "chatbot_id": chatbot_id,
-                    "source_id": source_id,
-                    "source_type": source_type,
-                    "text": chunk["text"],
-                    "chunk_index": chunk.get("chunk_index", i),
-                    "token_count": chunk.get("token_count", 0),
-                    # Add keywords for better retrieval
-                    "keywords": self._extract_keywords(chunk["text"])
-                }
-                
-                if filename:
-                    doc["filename"] = filename
+                chunk_index = chunk.get("chunk_index", i)
+                chunk_id = f"{source_id}_{document_key}_chunk_{chunk_index}" if document_key else f"{source_id}_chunk_{chunk_index}"
+                doc, term_freqs, doc_length = self._build_chunk_document(
+                    chatbot_id, chunk, chunk_id, chunk_index, source_id, source_type, filename,
+                    embeddings[i] if embeddings is not None else None, embedding_model
+                )
+                total_length += doc_length
                 
-                # Add any additional metadata from chunk
-                if "page" in chunk:
-                    doc["page"] = chunk["page"]
+                postings.extend(
+                    self._build_postings(chatbot_id, source_id, chunk_id, term_freqs, doc_length)
+                )
                 
                 documents.append(doc)
+                indexed.append((doc, term_freqs, doc_length))
             
             # Insert into MongoDB
             if documents:
                 result = await self.chunks_collection.insert_many(documents)
                 inserted_count = len(result.inserted_ids)
+                
+                # Update the inverted index and corpus statistics
+                if postings:
+                    await self.postings_collection.insert_many(postings, ordered=False)
+                await self._update_index_stats(chatbot_id, inserted_count, total_length)
+                index_cache.add_chunks(chatbot_id, indexed)
             else:
                 inserted_count = 0
             
@@ -143,6 +167,232 @@ class VectorStore:
             logger.error(f"Error adding chunks to MongoDB: {str(e)}")
             raise Exception(f"Failed to add chunks: {str(e)}")
     
+    def _build_chunk_document(
+        self,
+        chatbot_id: str,
+        chunk: Dict,
+        chunk_id: str,
+        chunk_index: int,
+        source_id: str,
+        source_type: str,
+        filename: Optional[str],
+        embedding: Optional[List[float]],
+        embedding_model: Optional[str]
+    ) -> Tuple[Dict, Dict[str, int], int]:
+        """Build a chunk document; returns (document, term frequencies, doc length)"""
+        term_freqs, doc_length = term_frequencies(chunk["text"])
+        doc = {
+            "chunk_id": chunk_id,
+            "chatbot_id": chatbot_id,
+            "source_id": source_id,
+            "source_type": source_type,
+            "text": chunk["text"],
+            "content_hash": chunk_hash(chunk["text"]),
+            "chunk_index": chunk_index,
+            "token_count": chunk.get("token_count", 0),
+            "doc_length": doc_length,
+            # Add keywords for better retrieval
+            "keywords": self._extract_keywords(chunk["text"])
+        }
+        
+        if filename:
+            doc["filename"] = filename
+        
+        if embedding:
+            doc["embedding"] = embedding
+            doc["embedding_model"] = embedding_model
+        
+        # Add any additional metadata from chunk
+        if "page" in chunk:
+            doc["page"] = chunk["page"]
+        
+        return doc, term_freqs, doc_length
+    
+    async def refresh_chunks(
+        self,
+        chatbot_id: str,
+        sections: AsyncIterable[List[Dict]],
+        source_id: str,
+        source_type: str = None,
+        filename: str = None,
+        document_key: str = None,
+        embed: Optional[Callable[[List[str]], Awaitable[Optional[List[List[float]]]]]] = None,
+        embedding_model: str = None
+    ) -> Dict:
+        """
+        Replace the stored chunks of a source (or of one document of it) by diffing content hashes
+        
+        Stored chunks whose text reappears are kept; only chunks with new
+        text are inserted (and embedded) and only vanished ones are deleted.
+        The new chunks arrive section by section and are written as each
+        section is diffed, so only the stored chunks' hashes and one section
+        are held in memory. Corpus statistics and the resident index are
+        adjusted by the difference.
+        
+        Args:
+            chatbot_id: Chatbot identifier
+            sections: Async iterable of new chunk lists (with text and
+                metadata), in document order
+            source_id: Source identifier
+            source_type: Type of source (file, website, text)
+            filename: Filename stored with the chunks
+            document_key: Document within a multi-document source (see
+                add_chunks); the diff is then limited to the chunks stored
+                with `filename` (e.g. one crawled page) instead of the whole source
+            embed: Optional coroutine embedding a list of texts (new chunks only)
+            embedding_model: Name of the model `embed` uses
+            
+        Returns:
+            Dictionary with chunks created, added, removed and unchanged
+        """
+        try:
+            await self._get_index_stats(chatbot_id)
+            
+            scope = {"chatbot_id": chatbot_id, "source_id": source_id}
+            if document_key:
+                scope["filename"] = filename
+            stored = await self.chunks_collection.find(
+                scope,
+                {"_id": 0, "chunk_id": 1, "content_hash": 1, "doc_length": 1, "chunk_index": 1, "filename": 1}
+            ).to_list(length=None)
+            
+            # Chunks stored before hashes were recorded are hashed from their text
+            unhashed = [chunk["chunk_id"] for chunk in stored if not chunk.get("content_hash")]
+            if unhashed:
+                texts = await self.chunks_collection.find(
+                    {"chatbot_id": chatbot_id, "chunk_id": {"$in": unhashed}},
+                    {"_id": 0, "chunk_id": 1, "text": 1}
+                ).to_list(length=None)
+                hashes = {chunk["chunk_id"]: chunk_hash(chunk.get("text", "")) for chunk in texts}
+                for chunk in stored:
+                    if not chunk.get("content_hash"):
+                        chunk["content_hash"] = hashes.get(chunk["chunk_id"])
+                        chunk["unhashed"] = True
+            
+            stored_by_hash: Dict[str, List[Dict]] = {}
+            for chunk in stored:
+                stored_by_hash.setdefault(chunk["content_hash"], []).append(chunk)
+            
+            prefix = f"{source_id}_{document_key}" if document_key else source_id
+            # Ids of stored chunks stay reserved until the vanished ones are deleted
+            taken_ids = {chunk["chunk_id"] for chunk in stored}
+            kept_ids = set()
+            moved = []
+            created = 0
+            added = 0
+            async for chunks in sections:
+                # Match new chunks to stored ones with the same text
+                new_chunks = []
+                for chunk in chunks:
+                    chunk_index = chunk.get("chunk_index", created)
+                    created += 1
+                    matches = stored_by_hash.get(chunk_hash(chunk["text"]))
+                    if matches:
+                        match = matches.pop()
+                        kept_ids.add(match["chunk_id"])
+                        changes = {}
+                        if match.get("chunk_index") != chunk_index:
+                            changes["chunk_index"] = chunk_index
+                        if filename and match.get("filename") != filename:
+                            changes["filename"] = filename
+                        if match.get("unhashed"):
+                            changes["content_hash"] = match["content_hash"]
+                        if changes:
+                            moved.append((match["chunk_id"], changes))
+                    else:
+                        new_chunks.append((chunk, chunk_index))
+                
+                if new_chunks:
+                    await self._insert_refreshed(
+                        chatbot_id, new_chunks, prefix, taken_ids, source_id, source_type, filename,
+                        embed, embedding_model
+                    )
+                    added += len(new_chunks)
+            
+            removed = [chunk for chunk in stored if chunk["chunk_id"] not in kept_ids]
+            removed_ids = [chunk["chunk_id"] for chunk in removed]
+            
+            chunk_ops = []
+            if removed_ids:
+                chunk_ops.append(DeleteMany({"chatbot_id": chatbot_id, "chunk_id": {"$in": removed_ids}}))
+                await self.postings_collection.delete_many(
+                    {"chatbot_id": chatbot_id, "source_id": source_id, "chunk_id": {"$in": removed_ids}}
+                )
+            # Kept chunks that moved, were renamed or lack a stored hash are updated in place
+            chunk_ops.extend(
+                UpdateOne({"chatbot_id": chatbot_id, "chunk_id": chunk_id}, {"$set": changes})
+                for chunk_id, changes in moved
+            )
+            if chunk_ops:
+                await self.chunks_collection.bulk_write(chunk_ops, ordered=False)
+            if removed:
+                await self._update_index_stats(
+                    chatbot_id, -len(removed), -sum(chunk.get("doc_length", 0) for chunk in removed)
+                )
+                index_cache.remove_chunks(chatbot_id, removed_ids)
+            
+            if added or removed:
+                logger.info(
+                    f"Refreshed source {source_id}: {added} added, "
+                    f"{len(removed)} removed, {len(kept_ids)} unchanged"
+                )
+            
+            return {
+                "success": True,
+                "chunks_created": created,
+                "chunks_added": added,
+                "chunks_removed": len(removed),
+                "chunks_unchanged": len(kept_ids)
+            }
+            
+        except Exception as e:
+            logger.error(f"Error refreshing chunks in MongoDB: {str(e)}")
+            raise Exception(f"Failed to refresh chunks: {str(e)}")
+    
+    async def _insert_refreshed(
+        self,
+        chatbot_id: str,
+        new_chunks: List[Tuple[Dict, int]],
+        prefix: str,
+        taken_ids: set,
+        source_id: str,
+        source_type: Optional[str],
+        filename: Optional[str],
+        embed: Optional[Callable[[List[str]], Awaitable[Optional[List[List[float]]]]]],
+        embedding_model: Optional[str]
+    ):
+        """Embed and insert one section's new chunks during refresh_chunks"""
+        embeddings = None
+        if embed is not None:
+            embeddings = await embed([chunk["text"] for chunk, _ in new_chunks])
+        
+        chunk_docs = []
+        postings = []
+        indexed = []
+        added_length = 0
+        for position, (chunk, chunk_index) in enumerate(new_chunks):
+            # Content-addressed id; repeated text in one document gets a suffix
+            base_id = f"{prefix}_{chunk_hash(chunk['text'])[:16]}"
+            chunk_id, n = base_id, 1
+            while chunk_id in taken_ids:
+                chunk_id, n = f"{base_id}_{n}", n + 1
+            taken_ids.add(chunk_id)
+            
+            doc, term_freqs, doc_length = self._build_chunk_document(
+                chatbot_id, chunk, chunk_id, chunk_index, source_id, source_type, filename,
+                embeddings[position] if embeddings else None, embedding_model
+            )
+            added_length += doc_length
+            chunk_docs.append(doc)
+            postings.extend(self._build_postings(chatbot_id, source_id, chunk_id, term_freqs, doc_length))
+            indexed.append((doc, term_freqs, doc_length))
+        
+        await self.chunks_collection.insert_many(chunk_docs, ordered=False)
+        if postings:
+            await self.postings_collection.insert_many(postings, ordered=False)
+        await self._update_index_stats(chatbot_id, len(chunk_docs), added_length)
+        index_cache.add_chunks(chatbot_id, indexed)
+    
     def _extract_keywords(self, text: str, max_keywords: int = 20) -> List[str]:
         """
         Extract important keywords from text for indexing
@@ -154,86 +404,186 @@ class VectorStore:
         Returns:
             List of keywords
         """
-        # Convert to lowercase and remove special characters
-        text = text.lower()
-        text = re.sub(r'[^\w\s]', ' ', text)
-        
-        # Split into words
-        words = text.split()
-        
-        # Remove common stop words
-        stop_words = {
-            'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for',
-            'of', 'with', 'by', 'from', 'as', 'is', 'was', 'are', 'were', 'be',
-            'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did', 'will',
-            'would', 'could', 'should', 'may', 'might', 'can', 'this', 'that',
-            'these', 'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they'
-        }
-        
-        # Filter out stop words and short words
-        keywords = [word for word in words if word not in stop_words and len(word) > 2]
-        
-        # Get most common keywords
-        word_counts = Counter(keywords)
+        word_counts = Counter(tokenize(text))
         return [word for word, count in word_counts.most_common(max_keywords)]
     
-    def _calculate_bm25_score(self, query_terms: List[str], doc_text: str, 
-                             doc_keywords: List[str], avg_doc_length: float,
-                             k1: float = 1.5, b: float = 0.75) -> float:
+    def _build_postings(
+        self,
+        chatbot_id: str,
+        source_id: str,
+        chunk_id: str,
+        term_freqs: Dict[str, int],
+        doc_length: int
+    ) -> List[Dict]:
+        """Build postings documents (one per term) for a chunk"""
+        return [
+            {
+                "chatbot_id": chatbot_id,
+                "source_id": source_id,
+                "chunk_id": chunk_id,
+                "term": term,
+                "tf": tf,
+                "doc_length": doc_length
+            }
+            for term, tf in term_freqs.items()
+        ]
+    
+    async def _update_index_stats(self, chatbot_id: str, doc_delta: int, length_delta: int):
+        """Adjust corpus statistics (chunk count, total length) for a chatbot"""
+        await self.stats_collection.update_one(
+            {"chatbot_id": chatbot_id},
+            {"$inc": {
+                "doc_count": doc_delta,
+                "total_length": length_delta,
+                "version": 1
+            }},
+            upsert=True
+        )
+    
+    async def rebuild_index(self, chatbot_id: str) -> Dict:
         """
-        Calculate BM25 relevance score for document
+        Rebuild the inverted index and statistics for a chatbot from its chunks
+        
+        Used to backfill chatbots whose chunks were stored before the index
+        existed, or to repair an index that drifted.
         
         Args:
-            query_terms: List of query terms
-            doc_text: Document text
-            doc_keywords: Document keywords
-            avg_doc_length: Average document length in collection
-            k1: BM25 parameter (term frequency saturation)
-            b: BM25 parameter (length normalization)
+            chatbot_id: Chatbot identifier
             
         Returns:
-            BM25 score
+            Dictionary with rebuild statistics
         """
-        doc_length = len(doc_text.split())
-        score = 0.0
+        await self.postings_collection.delete_many({"chatbot_id": chatbot_id})
         
-        # Convert doc text and keywords to lowercase for matching
-        doc_text_lower = doc_text.lower()
-        doc_keywords_lower = [kw.lower() for kw in doc_keywords]
+        doc_count = 0
+        total_length = 0
+        batch = []
+        length_updates = []
         
-        for term in query_terms:
-            term_lower = term.lower()
-            
-            # Count term frequency in document
-            tf = doc_text_lower.count(term_lower)
-            
-            # Boost if term is in keywords
-            if term_lower in doc_keywords_lower:
-                tf += 2
-            
-            if tf > 0:
-                # Simplified BM25 formula (without IDF component for efficiency)
-                numerator = tf * (k1 + 1)
-                denominator = tf + k1 * (1 - b + b * (doc_length / max(avg_doc_length, 1)))
-                score += numerator / denominator
+        cursor = self.chunks_collection.find(
+            {"chatbot_id": chatbot_id},
+            {"_id": 1, "chunk_id": 1, "source_id": 1, "text": 1}
+        )
+        async for chunk in cursor:
+            term_freqs, doc_length = term_frequencies(chunk.get("text", ""))
+            doc_count += 1
+            total_length += doc_length
+            
+            length_updates.append(UpdateOne({"_id": chunk["_id"]}, {"$set": {"doc_length": doc_length}}))
+            batch.extend(
+                self._build_postings(chatbot_id, chunk.get("source_id"), chunk["chunk_id"], term_freqs, doc_length)
+            )
+            
+            if len(batch) >= 5000:
+                await self.postings_collection.insert_many(batch, ordered=False)
+                await self.chunks_collection.bulk_write(length_updates, ordered=False)
+                batch = []
+                length_updates = []
         
-        return score
+        if batch:
+            await self.postings_collection.insert_many(batch, ordered=False)
+        if length_updates:
+            await self.chunks_collection.bulk_write(length_updates, ordered=False)
+        
+        await self.stats_collection.update_one(
+            {"chatbot_id": chatbot_id},
+            {
+                "$set": {"doc_count": doc_count, "total_length": total_length},
+                "$inc": {"version": 1}
+            },
+            upsert=True
+        )
+        
+        index_cache.invalidate(chatbot_id)
+        logger.info(f"Rebuilt inverted index for chatbot {chatbot_id}: {doc_count} chunks")
+        return {"success": True, "doc_count": doc_count, "total_length": total_length}
+    
+    async def _get_index_stats(self, chatbot_id: str) -> Optional[Dict]:
+        """Get corpus statistics, rebuilding the index for legacy chatbots"""
+        stats = await self.stats_collection.find_one({"chatbot_id": chatbot_id})
+        if stats:
+            return stats
+        
+        # Chunks stored before the inverted index existed need a backfill
+        if await self.chunks_collection.find_one({"chatbot_id": chatbot_id}, {"_id": 1}):
+            await self.rebuild_index(chatbot_id)
+            return await self.stats_collection.find_one({"chatbot_id": chatbot_id})
+        
+        return None
+    
+    async def _load_index(self, chatbot_id: str) -> ChatbotIndex:
+        """Load a chatbot's chunks from MongoDB into a resident index"""
+        index = ChatbotIndex(chatbot_id)
+        cursor = self.chunks_collection.find(
+            {"chatbot_id": chatbot_id},
+            {"_id": 0, "keywords": 0}
+        )
+        async for chunk in cursor:
+            term_freqs, doc_length = term_frequencies(chunk.get("text", ""))
+            index.add_chunk(chunk, term_freqs, doc_length)
+        
+        logger.info(f"Loaded index for chatbot {chatbot_id}: {index.doc_count} chunks, {index.size_bytes} bytes")
+        return index
+    
+    async def _search_postings(self, chatbot_id: str, terms: List[str], top_k: int) -> List:
+        """Score chunks from the MongoDB postings collection (index not resident)"""
+        stats = await self._get_index_stats(chatbot_id)
+        if not stats or stats.get("doc_count", 0) <= 0:
+            return []
+        
+        doc_count = stats["doc_count"]
+        avg_doc_length = stats.get("total_length", 0) / doc_count
+        
+        # Fetch the postings lists for all query terms in one indexed query
+        cursor = self.postings_collection.find(
+            {"chatbot_id": chatbot_id, "term": {"$in": terms}},
+            {"_id": 0, "term": 1, "chunk_id": 1, "tf": 1, "doc_length": 1}
+        )
+        postings: Dict[str, List] = {}
+        async for posting in cursor:
+            postings.setdefault(posting["term"], []).append(
+                (posting["chunk_id"], posting["tf"], posting["doc_length"])
+            )
+        
+        if not postings:
+            return []
+        
+        # Exact BM25 (with IDF) over the whole corpus
+        ranked = score_postings(postings, doc_count, avg_doc_length, top_k)
+        
+        # Load only the winning chunks
+        chunk_ids = [chunk_id for chunk_id, _ in ranked]
+        chunk_docs = await self.chunks_collection.find(
+            {"chatbot_id": chatbot_id, "chunk_id": {"$in": chunk_ids}},
+            {"keywords": 0, "embedding": 0}
+        ).to_list(length=len(chunk_ids))
+        chunks_by_id = {chunk["chunk_id"]: chunk for chunk in chunk_docs}
+        
+        return [
+            (chunks_by_id[chunk_id], score)
+            for chunk_id, score in ranked
+            if chunk_id in chunks_by_id
+        ]
     
     async def search(
         self,
         chatbot_id: str,
-        query_embedding: List[float] = None,  # Kept for compatibility but not used
+        query_embedding: List[float] = None,
         query: str = None,
         top_k: int = 5,
         min_similarity: float = 0.0
     ) -> List[Dict]:
         """
-        Search for relevant chunks using text-based search (BM25-like scoring) - OPTIMIZED
+        Search for relevant chunks
+        
+        With `query_embedding` the chunk embeddings are searched (cosine
+        similarity, ANN index for large corpora); otherwise `query` is scored
+        with BM25 over the inverted index.
         
         Args:
             chatbot_id: Chatbot identifier
-            query_embedding: Not used in basic RAG (kept for compatibility)
-            query: Query text (required for basic RAG)
+            query_embedding: Query vector for dense retrieval
+            query: Query text for lexical retrieval
             top_k: Number of results to return
             min_similarity: Minimum similarity threshold (0-1)
             
@@ -241,86 +591,36 @@ class VectorStore:
             List of dictionaries with matched chunks and metadata
         """
         try:
+            if query_embedding is not None:
+                return await self._dense_search(chatbot_id, query_embedding, top_k, min_similarity)
+            
             if not query:
                 logger.warning("No query provided for search")
                 return []
             
-            # Extract query terms first
-            query_terms = self._extract_keywords(query, max_keywords=10)
-            query_terms_lower = [term.lower() for term in query_terms]
-            
-            # OPTIMIZATION: Use MongoDB text search with $regex for initial filtering
-            # This reduces the number of chunks we need to score in Python
-            regex_filters = [{"text": {"$regex": term, "$options": "i"}} for term in query_terms]
-            
-            # Get only chunks that match at least one query term (much faster than loading all)
-            cursor = self.chunks_collection.find({
-                "chatbot_id": chatbot_id,
-                "$or": regex_filters
-            }).limit(top_k * 3)  # Get 3x more for better scoring, but not all chunks
-            
-            matched_chunks = await cursor.to_list(length=top_k * 3)
-            
-            if not matched_chunks:
-                # Fallback: if no matches with keywords, get most recent chunks
-                logger.info(f"No keyword matches for chatbot {chatbot_id}, using recent chunks")
-                cursor = self.chunks_collection.find(
-                    {"chatbot_id": chatbot_id}
-                ).sort("_id", -1).limit(top_k)
-                matched_chunks = await cursor.to_list(length=top_k)
-                
-                if not matched_chunks:
-                    return []
-            
-            # Calculate average document length from matched chunks only
-            avg_doc_length = sum(len(chunk["text"].split()) for chunk in matched_chunks) / len(matched_chunks)
-            
-            # Score matched documents
-            scored_chunks = []
-            for chunk in matched_chunks:
-                score = self._calculate_bm25_score(
-                    query_terms=query_terms,
-                    doc_text=chunk["text"],
-                    doc_keywords=chunk.get("keywords", []),
-                    avg_doc_length=avg_doc_length
-                )
-                
-                if score > 0:
-                    scored_chunks.append({
-                        "chunk": chunk,
-                        "score": score
-                    })
+            terms = query_terms(query, max_terms=10)
+            if not terms:
+                return []
             
-            # Sort by score descending
-            scored_chunks.sort(key=lambda x: x["score"], reverse=True)
+            # Serve from the resident index when it fits the cache budget
+            index = await index_cache.get_or_load(chatbot_id, self._load_index)
+            if index is not None:
+                scored = await index.search(terms, top_k, engine=self.scoring_engine)
+            else:
+                scored = await self._search_postings(chatbot_id, terms, top_k)
             
-            # Take top k results
-            top_chunks = scored_chunks[:top_k]
+            if not scored:
+                logger.info(f"No keyword matches for chatbot {chatbot_id}")
+                return []
             
             # Normalize scores to 0-1 range
-            max_score = top_chunks[0]["score"] if top_chunks else 1.0
-            
-            # Format results
-            matches = []
-            for i, item in enumerate(top_chunks):
-                chunk = item["chunk"]
-                normalized_score = item["score"] / max_score if max_score > 0 else 0
-                
-                # Filter by minimum similarity
-                if normalized_score >= min_similarity:
-                    matches.append({
-                        "text": chunk["text"],
-                        "metadata": {
-                            "source_id": chunk["source_id"],
-                            "source_type": chunk["source_type"],
-                            "chunk_index": chunk["chunk_index"],
-                            "token_count": chunk.get("token_count", 0),
-                            "filename": chunk.get("filename")
-                        },
-                        "similarity": round(normalized_score, 4),
-                        "rank": i + 1
-                    })
+            max_score = scored[0][1]
+            scored = [
+                (chunk, score / max_score if max_score > 0 else 0)
+                for chunk, score in scored
+            ]
             
+            matches = self._format_matches(scored, min_similarity)
             logger.info(f"Found {len(matches)} matches above {min_similarity} similarity for chatbot {chatbot_id}")
             return matches
             
@@ -328,6 +628,91 @@ class VectorStore:
             logger.error(f"Error searching MongoDB: {str(e)}")
             return []
     
+    async def _dense_search(
+        self,
+        chatbot_id: str,
+        query_embedding: List[float],
+        top_k: int,
+        min_similarity: float
+    ) -> List[Dict]:
+        """Nearest-neighbour search over the chatbot's chunk embeddings"""
+        if not dense_index.is_available():
+            logger.warning("Dense retrieval requires numpy")
+            return []
+        
+        index = await index_cache.get_or_load(chatbot_id, self._load_index)
+        if index is not None:
+            scored = await index.dense_search(query_embedding, top_k, nprobe=self.ann_nprobe)
+        else:
+            scored = await self._scan_dense(chatbot_id, query_embedding, top_k)
+        scored = [(chunk, max(0.0, min(1.0, similarity))) for chunk, similarity in scored]
+        
+        matches = self._format_matches(scored, min_similarity)
+        logger.info(f"Found {len(matches)} dense matches above {min_similarity} similarity for chatbot {chatbot_id}")
+        return matches
+    
+    async def _scan_dense(self, chatbot_id: str, query_embedding: List[float], top_k: int) -> List:
+        """Exact nearest-neighbour scan streamed from MongoDB (index not resident)"""
+        dim = len(query_embedding)
+        search = dense_index.StreamingExactSearch(query_embedding, top_k)
+        
+        # Only ids and embeddings are streamed; the best top_k are kept per batch
+        cursor = self.chunks_collection.find(
+            {"chatbot_id": chatbot_id, "embedding": {"$exists": True}},
+            {"_id": 0, "chunk_id": 1, "embedding": 1}
+        ).batch_size(self.dense_scan_batch)
+        ids, vectors = [], []
+        async for chunk in cursor:
+            embedding = chunk.get("embedding")
+            if not embedding or len(embedding) != dim:
+                continue
+            ids.append(chunk["chunk_id"])
+            vectors.append(embedding)
+            if len(ids) >= self.dense_scan_batch:
+                search.add(vectors, ids)
+                ids, vectors = [], []
+        search.add(vectors, ids)
+        
+        ranked = search.results()
+        logger.info(f"Index for chatbot {chatbot_id} is not resident; scanned {search.scanned} embeddings")
+        if not ranked:
+            return []
+        
+        # Load only the winning chunks
+        chunk_ids = [chunk_id for chunk_id, _ in ranked]
+        chunk_docs = await self.chunks_collection.find(
+            {"chatbot_id": chatbot_id, "chunk_id": {"$in": chunk_ids}},
+            {"keywords": 0, "embedding": 0}
+        ).to_list(length=len(chunk_ids))
+        chunks_by_id = {chunk["chunk_id"]: chunk for chunk in chunk_docs}
+        
+        return [
+            (chunks_by_id[chunk_id], score)
+            for chunk_id, score in ranked
+            if chunk_id in chunks_by_id
+        ]
+    
+    def _format_matches(self, scored: List, min_similarity: float) -> List[Dict]:
+        """Format (chunk, similarity) pairs as search results"""
+        matches = []
+        for i, (chunk, similarity) in enumerate(scored):
+            # Filter by minimum similarity
+            if similarity >= min_similarity:
+                matches.append({
+                    "text": chunk["text"],
+                    "metadata": {
+                        "chunk_id": chunk.get("chunk_id"),
+                        "source_id": chunk["source_id"],
+                        "source_type": chunk["source_type"],
+                        "chunk_index": chunk["chunk_index"],
+                        "token_count": chunk.get("token_count", 0),
+                        "filename": chunk.get("filename")
+                    },
+                    "similarity": round(similarity, 4),
+                    "rank": i + 1
+                })
+        return matches
+    
     async def delete_source(self, chatbot_id: str, source_id: str) -> Dict:
         """
         Delete all chunks associated with a source
@@ -340,6 +725,17 @@ class VectorStore:
             Dictionary with deletion statistics
         """
         try:
+            # Collect lengths of the chunks being removed to keep statistics exact
+            removed_length = 0
+            removed_count = 0
+            cursor = self.chunks_collection.find(
+                {"chatbot_id": chatbot_id, "source_id": source_id},
+                {"_id": 0, "doc_length": 1}
+            )
+            async for chunk in cursor:
+                removed_count += 1
+                removed_length += chunk.get("doc_length", 0)
+            
             # Delete all chunks for this source
             result = await self.chunks_collection.delete_many({
                 "chatbot_id": chatbot_id,
@@ -348,6 +744,15 @@ class VectorStore:
             
             deleted_count = result.deleted_count
             
+            # Drop the source's postings and adjust corpus statistics
+            await self.postings_collection.delete_many({
+                "chatbot_id": chatbot_id,
+                "source_id": source_id
+            })
+            if removed_count:
+                await self._update_index_stats(chatbot_id, -removed_count, -removed_length)
+            index_cache.remove_source(chatbot_id, source_id)
+            
             # Get remaining count for this chatbot
             total_count = await self.chunks_collection.count_documents({"chatbot_id": chatbot_id})
             
@@ -363,6 +768,55 @@ class VectorStore:
             logger.error(f"Error deleting source from MongoDB: {str(e)}")
             raise Exception(f"Failed to delete source: {str(e)}")
     
+    async def delete_document(self, chatbot_id: str, source_id: str, filename: str) -> Dict:
+        """
+        Delete the chunks of one document of a source (e.g. a re-crawled page)
+        
+        Args:
+            chatbot_id: Chatbot identifier
+            source_id: Source identifier
+            filename: Filename (page URL) the chunks were stored with
+            
+        Returns:
+            Dictionary with deletion statistics
+        """
+        try:
+            chunk_ids = []
+            removed_length = 0
+            cursor = self.chunks_collection.find(
+                {"chatbot_id": chatbot_id, "source_id": source_id, "filename": filename},
+                {"_id": 0, "chunk_id": 1, "doc_length": 1}
+            )
+            async for chunk in cursor:
+                chunk_ids.append(chunk["chunk_id"])
+                removed_length += chunk.get("doc_length", 0)
+            
+            if not chunk_ids:
+                return {"success": True, "chunks_deleted": 0}
+            
+            result = await self.chunks_collection.delete_many({
+                "chatbot_id": chatbot_id,
+                "chunk_id": {"$in": chunk_ids}
+            })
+            await self.postings_collection.delete_many({
+                "chatbot_id": chatbot_id,
+                "source_id": source_id,
+                "chunk_id": {"$in": chunk_ids}
+            })
+            await self._update_index_stats(chatbot_id, -len(chunk_ids), -removed_length)
+            index_cache.remove_chunks(chatbot_id, chunk_ids)
+            
+            logger.info(f"Deleted {result.deleted_count} chunks of {filename} for source {source_id}")
+            
+            return {
+                "success": True,
+                "chunks_deleted": result.deleted_count
+            }
+            
+        except Exception as e:
+            logger.error(f"Error deleting document from MongoDB: {str(e)}")
+            raise Exception(f"Failed to delete document: {str(e)}")
+    
     async def delete_chatbot_collection(self, chatbot_id: str) -> bool:
         """
         Delete all chunks for a chatbot
@@ -375,6 +829,9 @@ class VectorStore:
         """
         try:
             result = await self.chunks_collection.delete_many({"chatbot_id": chatbot_id})
+            await self.postings_collection.delete_many({"chatbot_id": chatbot_id})
+            await self.stats_collection.delete_one({"chatbot_id": chatbot_id})
+            index_cache.invalidate(chatbot_id)
             logger.info(f"Deleted {result.deleted_count} chunks for chatbot {chatbot_id}")
             return True
             
@@ -382,6 +839,15 @@ class VectorStore:
             logger.error(f"Error deleting chatbot collection: {str(e)}")
             return False
     
+    def get_index_version(self, chatbot_id: str) -> int:
+        """
+        Version of a chatbot's chunk set in this process
+        
+        Bumped by add_chunks, delete_source and index rebuilds; used to key
+        caches derived from retrieval results.
+        """
+        return index_cache.version(chatbot_id)
+    
     async def get_collection_stats(self, chatbot_id: str) -> Dict:
         """Get statistics about a chatbot's chunks"""
         try:
@@ -0,0 +1,399 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urldefrag, urljoin, urlsplit
+from xml.etree import ElementTree
+
+import httpx
+from bs4 import BeautifulSoup
+
+from services.website_scraper import WebsiteScraper
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (compatible; BotSmithCrawler/1.0)"
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+# Links to these are never pages worth ingesting
+SKIPPED_EXTENSIONS = (
+    ".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".ico", ".css", ".js",
+    ".pdf", ".zip", ".gz", ".mp3", ".mp4", ".avi", ".mov", ".woff", ".woff2", ".xml"
+)
+MAX_CHILD_SITEMAPS = 5
+
+
+def _host(url: str) -> str:
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def _normalize(url: str) -> str:
+    """Drop the fragment so anchors on one page are crawled once"""
+    return urldefrag(url.strip())[0]
+
+
+def _content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _extract_page(html: bytes, base_url: str) -> Tuple[str, List[str]]:
+    """Parse a page into (text, absolute links); CPU-bound, runs in a thread"""
+    soup = BeautifulSoup(html, "html.parser")
+    links = []
+    for anchor in soup.find_all("a", href=True):
+        href = anchor["href"].strip()
+        if href and not href.startswith(("mailto:", "tel:", "javascript:", "#")):
+            links.append(_normalize(urljoin(base_url, href)))
+    return WebsiteScraper.extract_text(soup), links
+
+
+def _parse_sitemap(content: bytes) -> Tuple[List[str], List[str]]:
+    """Parse a sitemap into (page URLs, child sitemap URLs)"""
+    root = ElementTree.fromstring(content)
+    locs = [
+        element.text.strip() for element in root.iter()
+        if element.tag.rsplit("}", 1)[-1] == "loc" and element.text
+    ]
+    if root.tag.rsplit("}", 1)[-1] == "sitemapindex":
+        return [], locs
+    return locs, []
+
+
+class _HostGate:
+    """Per-host politeness: at most `concurrency` requests, `delay` seconds apart"""
+
+    def __init__(self, concurrency: int, delay: float):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.delay = delay
+        self._lock = asyncio.Lock()
+        self._next_request_at = 0.0
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        try:
+            async with self._lock:
+                wait = self._next_request_at - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                self._next_request_at = time.monotonic() + self.delay
+        except BaseException:
+            self.semaphore.release()
+            raise
+
+    async def __aexit__(self, *exc):
+        self.semaphore.release()
+
+
+class WebsiteCrawler:
+    """
+    Async crawler that ingests a website page by page
+
+    Pages are fetched over one pooled httpx client by `max_concurrency`
+    workers. Starting from the start URL (and the site's sitemap.xml) it
+    follows same-site links until `max_pages` pages were visited. Requests
+    to one host are limited to `per_host_concurrency` at a time and spaced
+    `per_host_delay_ms` apart.
+
+    Every new or changed page is handed to `on_page` as soon as it is
+    parsed, so ingestion overlaps crawling. A crawl returns the per-page
+    state (ETag, Last-Modified, content hash) to pass back as `previous` on
+    the next crawl: unchanged pages are then answered with 304 by servers
+    that support conditional requests, and pages whose text did not change
+    are skipped either way. Pages with identical text are ingested once.
+    """
+
+    def __init__(
+        self,
+        max_pages: int = 50,
+        max_concurrency: int = 8,
+        per_host_concurrency: int = 2,
+        per_host_delay_ms: int = 250,
+        timeout_seconds: float = 20,
+        max_page_bytes: int = 5 * 1024 * 1024
+    ):
+        """
+        Initialize website crawler
+
+        Args:
+            max_pages: Default page budget of a crawl
+            max_concurrency: Concurrent fetches per crawl
+            per_host_concurrency: Concurrent requests to one host
+            per_host_delay_ms: Minimum gap between requests to one host
+            timeout_seconds: Timeout of a single request
+            max_page_bytes: Pages larger than this are skipped
+        """
+        self.max_pages = max_pages
+        self.max_concurrency = max_concurrency
+        self.per_host_concurrency = per_host_concurrency
+        self.per_host_delay_ms = per_host_delay_ms
+        self.timeout_seconds = timeout_seconds
+        self.max_page_bytes = max_page_bytes
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._hosts: Dict[str, _HostGate] = {}
+
+        self.crawls = 0
+        self.active_crawls = 0
+        self.pages_fetched = 0
+        self.pages_not_modified = 0
+        self.pages_ingested = 0
+        self.bytes_fetched = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Pooled HTTP client shared by all crawls"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers={"User-Agent": USER_AGENT},
+                timeout=self.timeout_seconds,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency * 4,
+                    max_keepalive_connections=self.max_concurrency
+                )
+            )
+        return self._client
+
+    def _gate(self, url: str) -> _HostGate:
+        host = _host(url)
+        gate = self._hosts.get(host)
+        if gate is None:
+            gate = self._hosts[host] = _HostGate(self.per_host_concurrency, self.per_host_delay_ms / 1000)
+        return gate
+
+    async def _fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> Tuple[httpx.Response, Optional[bytes]]:
+        """GET a URL politely; the body is None if it exceeds `max_page_bytes`"""
+        async with self._gate(url):
+            async with self.client.stream("GET", url, headers=headers) as response:
+                length = response.headers.get("content-length")
+                if length and length.isdigit() and int(length) > self.max_page_bytes:
+                    return response, None
+
+                body = bytearray()
+                async for data in response.aiter_bytes():
+                    body.extend(data)
+                    if len(body) > self.max_page_bytes:
+                        return response, None
+                self.bytes_fetched += len(body)
+                return response, bytes(body)
+
+    async def _sitemap_urls(self, start_url: str) -> List[str]:
+        """Page URLs listed in the site's sitemap.xml (one level of sitemap index)"""
+        parts = urlsplit(start_url)
+        pending = [f"{parts.scheme}://{parts.netloc}/sitemap.xml"]
+        urls: List[str] = []
+        fetched = 0
+        while pending and fetched <= MAX_CHILD_SITEMAPS:
+            sitemap_url = pending.pop(0)
+            fetched += 1
+            try:
+                response, body = await self._fetch(sitemap_url)
+                if response.status_code != 200 or body is None:
+                    continue
+                pages, children = await asyncio.to_thread(_parse_sitemap, body)
+            except (httpx.HTTPError, ElementTree.ParseError) as e:
+                logger.info(f"No usable sitemap at {sitemap_url}: {str(e)}")
+                continue
+            urls.extend(pages)
+            pending.extend(children)
+        return urls
+
+    async def crawl(
+        self,
+        start_url: str,
+        on_page: Callable[[Dict[str, Any]], Awaitable[None]],
+        previous: Optional[List[Dict[str, Any]]] = None,
+        max_pages: Optional[int] = None,
+        follow_links: bool = True,
+        use_sitemap: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Crawl a website and stream its pages to `on_page`
+
+        Args:
+            start_url: First page; only pages on the same site are crawled
+            on_page: Awaited with {"url", "text", "content_hash", "changed"}
+                for every new (changed=False) or modified (changed=True) page
+            previous: `pages` of the previous crawl of this site
+            max_pages: Page budget (default: the crawler's `max_pages`)
+            follow_links: Follow links found on crawled pages
+            use_sitemap: Seed the crawl with the site's sitemap.xml
+
+        Returns:
+            {"pages": state to pass as `previous` next time,
+             "removed": URLs of the previous crawl that are gone,
+             "stats": crawl counters}
+        """
+        budget = max_pages or self.max_pages
+        site = _host(start_url)
+        start_url = _normalize(start_url)
+        known = {page["url"]: page for page in (previous or [])}
+
+        queue: asyncio.Queue = asyncio.Queue()
+        seen: Set[str] = set()
+        state: Dict[str, Dict[str, Any]] = {}
+        hashes: Set[str] = set()
+        removed: List[str] = []
+        stats = {
+            "fetched": 0, "not_modified": 0, "unchanged": 0, "duplicates": 0,
+            "ingested": 0, "skipped": 0, "failed": 0
+        }
+
+        def enqueue(url: str):
+            if len(seen) >= budget or url in seen:
+                return
+            parts = urlsplit(url)
+            if parts.scheme not in ("http", "https") or _host(url) != site:
+                return
+            if parts.path.lower().endswith(SKIPPED_EXTENSIONS):
+                return
+            seen.add(url)
+            queue.put_nowait(url)
+
+        async def visit(url: str):
+            prior = known.get(url)
+            headers = {}
+            if prior and prior.get("etag"):
+                headers["If-None-Match"] = prior["etag"]
+            if prior and prior.get("last_modified"):
+                headers["If-Modified-Since"] = prior["last_modified"]
+
+            response, body = await self._fetch(url, headers)
+
+            if response.status_code == 304 and prior:
+                stats["not_modified"] += 1
+                self.pages_not_modified += 1
+                state[url] = prior
+                hashes.add(prior.get("content_hash"))
+                return
+            if response.status_code in (404, 410):
+                if prior:
+                    removed.append(url)
+                stats["skipped"] += 1
+                return
+            if response.status_code >= 400:
+                # Transient errors keep the page's previous content
+                if prior:
+                    state[url] = prior
+                stats["failed"] += 1
+                return
+
+            stats["fetched"] += 1
+            self.pages_fetched += 1
+            content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+            final_url = _normalize(str(response.url))
+            if body is None or content_type not in HTML_CONTENT_TYPES or _host(final_url) != site:
+                stats["skipped"] += 1
+                return
+
+            text, links = await asyncio.to_thread(_extract_page, body, final_url)
+            if follow_links:
+                for link in links:
+                    enqueue(link)
+
+            content_hash = _content_hash(text) if text else None
+            if content_hash is None or content_hash in hashes:
+                # Empty page, or the same text as another page (mirrors, tracking parameters)
+                stats["duplicates"] += 1
+                if prior:
+                    removed.append(url)
+                return
+            hashes.add(content_hash)
+
+            page_state = {
+                "url": url,
+                "etag": response.headers.get("etag"),
+                "last_modified": response.headers.get("last-modified"),
+                "content_hash": content_hash
+            }
+            if prior and prior.get("content_hash") == content_hash:
+                stats["unchanged"] += 1
+                state[url] = page_state
+                return
+
+            try:
+                await on_page({"url": url, "text": text, "content_hash": content_hash, "changed": prior is not None})
+            except Exception as e:
+                # Without validators or hash the next crawl re-fetches and replaces the page
+                state[url] = {"url": url, "etag": None, "last_modified": None, "content_hash": None}
+                stats["failed"] += 1
+                logger.error(f"Error ingesting {url}: {str(e)}")
+                return
+            state[url] = page_state
+            stats["ingested"] += 1
+            self.pages_ingested += 1
+
+        async def worker():
+            while True:
+                url = await queue.get()
+                try:
+                    await visit(url)
+                except Exception as e:
+                    stats["failed"] += 1
+                    if url in known:
+                        state[url] = known[url]
+                    logger.error(f"Error crawling {url}: {str(e)}")
+                finally:
+                    queue.task_done()
+
+        self.crawls += 1
+        self.active_crawls += 1
+        try:
+            enqueue(start_url)
+            if use_sitemap:
+                for url in await self._sitemap_urls(start_url):
+                    enqueue(_normalize(url))
+            # Re-visit every known page so changes and removals are detected
+            for url in known:
+                enqueue(url)
+
+            workers = [asyncio.create_task(worker()) for _ in range(min(self.max_concurrency, budget))]
+            try:
+                await queue.join()
+            finally:
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+        finally:
+            self.active_crawls -= 1
+            if not self.active_crawls:
+                self._hosts.clear()
+
+        # Known pages that fell outside this crawl's budget are kept as they are
+        for url, page in known.items():
+            if url not in seen and url not in state:
+                state[url] = page
+
+        stats["pages"] = len(state)
+        stats["removed"] = len(removed)
+        logger.info(f"Crawled {start_url}: {stats}")
+        return {"pages": list(state.values()), "removed": removed, "stats": stats}
+
+    async def close(self):
+        """Close the pooled HTTP client (application shutdown)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get crawler statistics"""
+        return {
+            "crawls": self.crawls,
+            "active_crawls": self.active_crawls,
+            "pages_fetched": self.pages_fetched,
+            "pages_not_modified": self.pages_not_modified,
+            "pages_ingested": self.pages_ingested,
+            "bytes_fetched": self.bytes_fetched
+        }
+
+
+# Global website crawler
+website_crawler = WebsiteCrawler(
+    max_pages=int(os.environ.get('CRAWLER_MAX_PAGES', '50')),
+    max_concurrency=int(os.environ.get('CRAWLER_MAX_CONCURRENCY', '8')),
+    per_host_concurrency=int(os.environ.get('CRAWLER_PER_HOST_CONCURRENCY', '2')),
+    per_host_delay_ms=int(os.environ.get('CRAWLER_PER_HOST_DELAY_MS', '250')),
+    timeout_seconds=float(os.environ.get('CRAWLER_TIMEOUT_SECONDS', '20'))
+)
@@ -0,0 +1,234 @@
+import asyncio
+
+import pytest
+
+from services import cache_service as cache_module
+from services.cache_service import CacheService, estimate_size
+
+
+def make_cache(**kwargs):
+    kwargs.setdefault("ttl_jitter", 0)
+    return CacheService(**kwargs)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_least_recently_used_entry_is_evicted_by_count():
+    cache = make_cache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_entries_are_evicted_to_stay_within_the_byte_budget():
+    value = "x" * 1000
+    size = estimate_size(value)
+    cache = make_cache(max_bytes=size * 2 + size // 2)
+    cache.set("a", value)
+    cache.set("b", value)
+
+    cache.set("c", value)
+
+    assert cache.get("a") is None
+    assert cache.bytes == size * 2
+    assert cache.get_stats()["size"] == 2
+
+
+def test_values_larger_than_the_budget_are_not_cached():
+    cache = make_cache(max_bytes=100)
+    cache.set("big", "x" * 1000)
+
+    assert cache.get("big") is None
+    assert cache.bytes == 0
+
+
+def test_entries_expire_on_the_monotonic_clock(clock):
+    cache = make_cache(default_ttl_seconds=60)
+    cache.set("default", 1)
+    cache.set("custom", 2, ttl_seconds=120)
+
+    clock[0] += 59
+    assert cache.get("default") == 1
+
+    clock[0] += 1
+    assert cache.get("default") is None
+    assert cache.get("custom") == 2
+    assert cache.get_stats()["expirations"] == 1
+
+    clock[0] += 60
+    cache.clear_expired()
+    assert cache.get_stats()["size"] == 0
+    assert cache.bytes == 0
+
+
+def test_jitter_only_shortens_ttls(clock):
+    cache = make_cache(default_ttl_seconds=100, ttl_jitter=0.5)
+    for i in range(50):
+        cache.set(f"key{i}", i)
+
+    expiries = [expires_at - clock[0] for _, expires_at, _ in cache._cache.values()]
+
+    assert all(50 <= ttl <= 100 for ttl in expiries)
+    assert len(set(expiries)) > 1
+
+
+def test_concurrent_misses_share_one_load():
+    cache = make_cache()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"name": "bot"}
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_load("chatbot:1", loader) for _ in range(5)))
+
+    results = asyncio.run(run())
+
+    assert len(calls) == 1
+    assert all(result == {"name": "bot"} for result in results)
+    assert cache.get("chatbot:1") == {"name": "bot"}
+    assert cache.get_stats()["coalesced"] == 4
+    assert cache.get_stats()["loads_in_flight"] == 0
+
+
+def test_load_errors_reach_every_caller_and_are_not_cached():
+    cache = make_cache()
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("database unavailable")
+
+    async def run():
+        return await asyncio.gather(
+            *(cache.get_or_load("chatbot:1", failing) for _ in range(3)),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert cache.get_stats()["load_errors"] == 1
+    assert cache.get_stats()["loads_in_flight"] == 0
+
+    async def loader():
+        return "loaded"
+
+    assert asyncio.run(cache.get_or_load("chatbot:1", loader)) == "loaded"
+
+
+def test_none_is_only_cached_when_asked():
+    cache = make_cache()
+    calls = []
+
+    async def missing():
+        calls.append(1)
+        return None
+
+    async def run():
+        await cache.get_or_load("chatbot:gone", missing)
+        await cache.get_or_load("chatbot:gone", missing)
+        await cache.get_or_load("chatbot:none", missing, cache_none=True)
+        await cache.get_or_load("chatbot:none", missing, cache_none=True)
+
+    asyncio.run(run())
+
+    assert len(calls) == 3
+
+
+def test_invalidation_during_a_load_is_not_overwritten():
+    cache = make_cache()
+    started = None
+    release = None
+
+    async def stale_loader():
+        started.set()
+        await release.wait()
+        return "stale"
+
+    async def fresh_loader():
+        return "fresh"
+
+    async def run():
+        nonlocal started, release
+        started, release = asyncio.Event(), asyncio.Event()
+        first = asyncio.ensure_future(cache.get_or_load("chatbot:1", stale_loader))
+        await started.wait()
+
+        cache.delete("chatbot:1")
+        # A caller after the delete starts its own load instead of joining the stale one
+        second = await cache.get_or_load("chatbot:1", fresh_loader)
+
+        release.set()
+        return await first, second
+
+    first, second = asyncio.run(run())
+
+    assert (first, second) == ("stale", "fresh")
+    assert cache.get("chatbot:1") == "fresh"
+
+
+def test_invalidate_prefix_drops_the_namespace_and_its_loads():
+    cache = make_cache()
+    cache.set("chatbot:1", 1)
+    cache.set("chatbot:2", 2)
+    cache.set("user:1", 3)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def loader():
+            await release.wait()
+            return "stale"
+
+        load = asyncio.ensure_future(cache.get_or_load("chatbot:3", loader))
+        await asyncio.sleep(0)
+        removed = cache.invalidate_prefix("chatbot:")
+        release.set()
+        await load
+        return removed
+
+    assert asyncio.run(run()) == 2
+    assert cache.get("chatbot:1") is None
+    assert cache.get("chatbot:3") is None
+    assert cache.get("user:1") == 3
+
+
+def test_cancelled_caller_does_not_cancel_the_load():
+    cache = make_cache()
+
+    async def run():
+        release = asyncio.Event()
+
+        async def loader():
+            await release.wait()
+            return "value"
+
+        first = asyncio.ensure_future(cache.get_or_load("chatbot:1", loader))
+        second = asyncio.ensure_future(cache.get_or_load("chatbot:1", loader))
+        await asyncio.sleep(0)
+
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return first, await second
+
+    first, second = asyncio.run(run())
+
+    assert first.cancelled()
+    assert second == "value"
+    assert cache.get("chatbot:1") == "value"
+    assert cache.get_stats()["loads"] == 1
@@ -0,0 +1,112 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("emergentintegrations")
+
+from services import chat_service as chat_module
+from services.chat_service import ChatService
+
+
+def delta(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            yield chunk
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    """Stand-in for AsyncOpenAI recording how it was built and called"""
+
+    instances = []
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.requests = []
+        self.stream = FakeStream([delta("Hel"), delta(None), delta("lo"), SimpleNamespace(choices=[]), delta("!")])
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        FakeClient.instances.append(self)
+
+    async def create(self, **kwargs):
+        self.requests.append(kwargs)
+        return self.stream
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setenv("EMERGENT_LLM_KEY", "sk-emergent-test")
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("OPENAI_BASE_URL", "http://proxy.local/v1")
+    FakeClient.instances = []
+    monkeypatch.setattr(chat_module, "AsyncOpenAI", FakeClient)
+    return ChatService()
+
+
+def collect(service, **kwargs):
+    async def run():
+        return [fragment async for fragment in service.stream_response(**kwargs)]
+
+    return asyncio.run(run())
+
+
+def test_openai_fragments_are_yielded_in_order(service):
+    fragments = collect(
+        service, message="Hi", session_id="s", system_message="Be brief", context="Docs"
+    )
+
+    assert fragments == ["Hel", "lo", "!"]
+    client = FakeClient.instances[0]
+    assert client.kwargs == {"api_key": "sk-test", "base_url": "http://proxy.local/v1"}
+    request = client.requests[0]
+    assert request["stream"] is True
+    assert request["messages"][0]["role"] == "system"
+    assert "Docs" in request["messages"][0]["content"]
+    assert request["messages"][1] == {"role": "user", "content": "Hi"}
+    assert client.stream.closed
+
+
+def test_stopping_early_closes_the_upstream_stream(service):
+    async def run():
+        stream = service.stream_response(message="Hi", session_id="s", system_message="")
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first
+
+    assert asyncio.run(run()) == "Hel"
+    assert FakeClient.instances[0].stream.closed
+
+
+def test_without_a_streaming_key_the_reply_is_generated_in_one_chunk(service, monkeypatch):
+    service.stream_api_key = None
+
+    async def generate_response(**kwargs):
+        return f"answer for {kwargs['session_id']}", None
+
+    monkeypatch.setattr(service, "generate_response", generate_response)
+
+    assert collect(service, message="Hi", session_id="s", system_message="") == ["answer for s"]
+    assert FakeClient.instances == []
+
+
+def test_other_providers_are_generated_in_one_chunk(service, monkeypatch):
+    async def generate_response(**kwargs):
+        return kwargs["provider"], None
+
+    monkeypatch.setattr(service, "generate_response", generate_response)
+
+    assert collect(service, message="Hi", session_id="s", system_message="", provider="anthropic") == ["anthropic"]
+    assert FakeClient.instances == []
@@ -0,0 +1,146 @@
+import pytest
+
+from services import chunking_service
+from services.chunking_service import ChunkingService, iter_sections
+
+WORDS = "alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu".split()
+
+
+def sample_text(words=2000, paragraph_every=0):
+    out = []
+    for i in range(words):
+        out.append(WORDS[i % len(WORDS)] + str(i % 7))
+        if paragraph_every and i % paragraph_every == paragraph_every - 1:
+            out.append("\n\n")
+    return " ".join(out)
+
+
+def make_chunker(chunk_size, chunk_overlap):
+    try:
+        return ChunkingService(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    except Exception as e:  # The encoding is downloaded on first use
+        pytest.skip(f"tiktoken encoding unavailable: {e}")
+
+
+def positions(text, chunks):
+    """Start offset of every chunk's text in `text`, searching left to right"""
+    found, start = [], 0
+    for chunk in chunks:
+        offset = text.find(chunk["text"], start)
+        assert offset != -1, chunk["text"][:80]
+        found.append(offset)
+        start = offset
+    return found
+
+
+def test_token_windows_match_encode_then_decode():
+    chunker = make_chunker(100, 20)
+    text = sample_text(1500)
+    tokens = chunker.tokenizer.encode_ordinary(text)
+
+    chunks = chunker.chunk_text(text)
+
+    expected = []
+    for start in range(0, len(tokens), 80):
+        expected.append(chunker.tokenizer.decode(tokens[start:start + 100]))
+        if start + 100 >= len(tokens):
+            break
+    assert [chunk["text"] for chunk in chunks] == expected
+    assert [chunk["start_token"] for chunk in chunks] == list(range(0, 80 * len(chunks), 80))
+    assert all(chunk["end_token"] - chunk["start_token"] == chunk["token_count"] for chunk in chunks)
+    assert chunks[-1]["end_token"] == len(tokens)
+
+
+def test_chunk_index_starts_at_start_index_and_metadata_is_attached():
+    chunker = make_chunker(50, 10)
+
+    chunks = chunker.chunk_text(sample_text(500), {"filename": "a.txt"}, start_index=7)
+
+    assert [chunk["chunk_index"] for chunk in chunks] == list(range(7, 7 + len(chunks)))
+    assert all(chunk["filename"] == "a.txt" for chunk in chunks)
+
+
+def test_windows_never_split_multibyte_characters():
+    chunker = make_chunker(7, 2)
+    text = "Grüße aus Köln 🌍🚀 東京タワー と 富士山 — naïve café 😀 " * 40
+
+    chunks = chunker.chunk_text(text)
+
+    assert chunks
+    positions(text, chunks)
+    assert all(chunk["token_count"] <= 7 for chunk in chunks)
+
+
+def test_segmented_input_covers_the_whole_text(monkeypatch):
+    # Force many encode segments and batches on a small input
+    monkeypatch.setattr(chunking_service, "SEGMENT_CHARS", 300)
+    monkeypatch.setattr(chunking_service, "ENCODE_BATCH_CHARS", 1000)
+    chunker = make_chunker(60, 15)
+    text = sample_text(3000)
+
+    chunks = chunker.chunk_text(text)
+    offsets = positions(text, chunks)
+
+    assert offsets[0] == 0
+    assert text.endswith(chunks[-1]["text"])
+    # Consecutive windows overlap (each starts before the previous one ends)
+    for (offset, chunk), next_offset in zip(zip(offsets, chunks), offsets[1:]):
+        assert offset < next_offset < offset + len(chunk["text"])
+    assert all(chunk["token_count"] <= 60 for chunk in chunks)
+
+
+def test_blank_text_yields_no_chunks():
+    chunker = make_chunker(50, 10)
+
+    assert chunker.chunk_text("") == []
+    assert chunker.chunk_text(" \n\n ") == []
+
+
+def test_paragraph_chunks_pack_whole_paragraphs():
+    chunker = make_chunker(120, 20)
+    text = sample_text(1200, paragraph_every=15)
+    paragraphs = [paragraph.strip() for paragraph in text.split("\n\n") if paragraph.strip()]
+
+    chunks = chunker.chunk_by_paragraphs(text)
+
+    assert [paragraph for chunk in chunks for paragraph in chunk["text"].split("\n\n")] == paragraphs
+    assert all(chunk["token_count"] <= 120 for chunk in chunks)
+    # Paragraphs are only cut when the next one would not fit
+    for chunk, following in zip(chunks, chunks[1:]):
+        first_paragraph = following["text"].split("\n\n")[0]
+        assert chunk["token_count"] + chunker.count_tokens(first_paragraph) > 120
+    assert [chunk["chunk_index"] for chunk in chunks] == list(range(len(chunks)))
+
+
+def test_long_paragraphs_are_split_into_windows():
+    chunker = make_chunker(50, 10)
+    long_paragraph = sample_text(400)
+    text = "Short intro.\n\n" + long_paragraph + "\n\nShort outro."
+
+    chunks = chunker.chunk_by_paragraphs(text, start_index=3)
+
+    assert chunks[0]["text"] == "Short intro."
+    assert chunks[-1]["text"] == "Short outro."
+    windows = chunks[1:-1]
+    assert len(windows) > 1
+    assert all(chunk["token_count"] <= 50 for chunk in windows)
+    assert windows[0]["start_token"] == 0
+    positions(long_paragraph, windows)
+    assert [chunk["chunk_index"] for chunk in chunks] == list(range(3, 3 + len(chunks)))
+
+
+def test_iter_sections_splits_at_paragraph_breaks():
+    text = "\n\n".join(f"Paragraph {i} " + "word " * 30 for i in range(50))
+
+    sections = list(iter_sections(text, 1000))
+
+    assert "".join(sections) == text
+    assert all(len(section) <= 1000 for section in sections)
+    assert all(section.endswith("\n\n") for section in sections[:-1])
+
+
+def test_iter_sections_falls_back_to_spaces_and_hard_cuts():
+    assert list(iter_sections("", 10)) == []
+    assert list(iter_sections("short", 10)) == ["short"]
+    assert list(iter_sections("aaaa bbbb cccc", 10)) == ["aaaa bbbb ", "cccc"]
+    assert list(iter_sections("x" * 25, 10)) == ["x" * 10, "x" * 10, "x" * 5]
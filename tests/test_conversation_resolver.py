@@ -0,0 +1,99 @@
+import asyncio
+
+from pymongo.errors import DuplicateKeyError
+
+from services import conversation_resolver as resolver_module
+from services.conversation_resolver import ConversationResolver
+
+
+class FakeConversations:
+    """In-memory stand-in for the conversations collection (upsert semantics only)"""
+
+    def __init__(self, duplicate_key_errors=0):
+        self.documents = {}
+        self.calls = 0
+        self.duplicate_key_errors = duplicate_key_errors
+
+    async def find_one_and_update(self, query, update, projection=None, upsert=False, return_document=None):
+        self.calls += 1
+        key = (query["chatbot_id"], query["session_id"])
+        if self.duplicate_key_errors:
+            # A concurrent request inserted the session between our read and write
+            self.duplicate_key_errors -= 1
+            self.documents.setdefault(key, {"id": "concurrent"})
+            raise DuplicateKeyError("E11000 duplicate key error")
+        if key not in self.documents:
+            self.documents[key] = dict(update["$setOnInsert"])
+        return {"id": self.documents[key]["id"]}
+
+
+def make_resolver(collection=None, **kwargs):
+    resolver = ConversationResolver(**kwargs)
+    resolver.collection = collection or FakeConversations()
+    return resolver
+
+
+def test_new_session_is_created_then_served_from_cache():
+    resolver = make_resolver()
+
+    first = asyncio.run(resolver.resolve("bot", "session", {"id": "conv-1"}))
+    second = asyncio.run(resolver.resolve("bot", "session", {"id": "conv-2"}))
+
+    assert first == ("conv-1", True)
+    assert second == ("conv-1", False)
+    assert resolver.collection.calls == 1
+    assert resolver.get_stats()["hits"] == 1
+    assert resolver.get_stats()["conversations_created"] == 1
+
+
+def test_existing_session_is_not_recreated():
+    collection = FakeConversations()
+    collection.documents[("bot", "session")] = {"id": "existing"}
+    resolver = make_resolver(collection)
+
+    assert asyncio.run(resolver.resolve("bot", "session", {"id": "new"})) == ("existing", False)
+
+
+def test_duplicate_key_race_returns_the_winning_conversation():
+    resolver = make_resolver(FakeConversations(duplicate_key_errors=1))
+
+    assert asyncio.run(resolver.resolve("bot", "session", {"id": "mine"})) == ("concurrent", False)
+    assert resolver.collection.calls == 2
+
+
+def test_recall_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resolver_module.time, "monotonic", lambda: now[0])
+    resolver = make_resolver(ttl_seconds=60)
+
+    resolver._remember(("bot", "session"), "conv")
+    now[0] += 59
+    assert resolver._recall(("bot", "session")) == "conv"
+
+    now[0] += 1
+    assert resolver._recall(("bot", "session")) is None
+    assert ("bot", "session") not in resolver._cache
+
+
+def test_recall_keeps_recently_used_entries():
+    resolver = make_resolver(max_entries=2)
+
+    resolver._remember(("bot", "a"), "conv-a")
+    resolver._remember(("bot", "b"), "conv-b")
+    assert resolver._recall(("bot", "a")) == "conv-a"
+    resolver._remember(("bot", "c"), "conv-c")
+
+    assert resolver._recall(("bot", "b")) is None
+    assert resolver._recall(("bot", "a")) == "conv-a"
+    assert resolver._recall(("bot", "c")) == "conv-c"
+
+
+def test_forget_chatbot_drops_only_its_sessions():
+    resolver = make_resolver()
+    resolver._remember(("bot", "a"), "conv-a")
+    resolver._remember(("other", "a"), "conv-other")
+
+    resolver.forget_chatbot("bot")
+
+    assert resolver._recall(("bot", "a")) is None
+    assert resolver._recall(("other", "a")) == "conv-other"
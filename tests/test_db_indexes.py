@@ -0,0 +1,126 @@
+import asyncio
+
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+import db_indexes
+from db_indexes import dedupe_conversation_sessions
+
+
+class FakeCollection:
+    """Index builds and conversation documents, enough for _apply_registry"""
+
+    def __init__(self, name, documents=(), batch_error=None):
+        self.name = name
+        self.documents = [dict(document) for document in documents]
+        self.batch_error = batch_error
+        self.created = []
+        self.unique_attempts = 0
+
+    async def create_indexes(self, models):
+        if self.batch_error:
+            raise self.batch_error
+        names = ["_".join(f"{field}_{direction}" for field, direction in model.document["key"].items())
+                 for model in models]
+        self.created.extend(names)
+        return names
+
+    async def create_index(self, keys, **options):
+        self.unique_attempts += 1
+        seen = set()
+        for document in self.documents:
+            value = tuple(document.get(field) for field, _ in keys)
+            if value in seen:
+                raise DuplicateKeyError("E11000 duplicate key error collection", 11000)
+            seen.add(value)
+        name = "_".join(f"{field}_{direction}" for field, direction in keys)
+        self.created.append(name)
+        return name
+
+    def aggregate(self, pipeline, allowDiskUse=False):
+        groups = {}
+        for document in sorted(self.documents, key=lambda document: document["created_at"]):
+            groups.setdefault((document["chatbot_id"], document["session_id"]), []).append(document)
+
+        async def iterate():
+            for (chatbot_id, session_id), documents in groups.items():
+                if len(documents) > 1:
+                    yield {
+                        "_id": {"chatbot_id": chatbot_id, "session_id": session_id},
+                        "ids": [document["_id"] for document in documents],
+                        "conversation_ids": [document["id"] for document in documents],
+                        "count": len(documents)
+                    }
+
+        return iterate()
+
+    async def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            for document in self.documents:
+                if document["_id"] == op._filter["_id"]:
+                    document.update(op._doc["$set"])
+
+
+class FakeDatabase:
+    name = "app"
+
+    def __init__(self, *collections):
+        self.collections = {collection.name: collection for collection in collections}
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, FakeCollection(name))
+
+
+def conversation(_id, session_id, created_at, chatbot_id="bot"):
+    return {"_id": _id, "id": f"conv-{_id}", "chatbot_id": chatbot_id, "session_id": session_id, "created_at": created_at}
+
+
+def test_duplicate_sessions_are_renamed_before_the_unique_index_is_built():
+    conversations = FakeCollection("conversations", [
+        conversation(1, "s1", 3),
+        conversation(2, "s1", 1),
+        conversation(3, "s1", 2),
+        conversation(4, "s2", 1),
+        conversation(5, "s1", 1, chatbot_id="other"),
+    ])
+    db = FakeDatabase(conversations)
+
+    result = asyncio.run(db_indexes._apply_registry(db, {"conversations": db_indexes.APP_INDEXES["conversations"]}))
+
+    assert "chatbot_id_1_session_id_1" in result["conversations"]
+    assert conversations.unique_attempts == 2
+    sessions = {document["_id"]: document["session_id"] for document in conversations.documents}
+    # The oldest conversation keeps the session
+    assert sessions == {1: "s1#dup-conv-1", 2: "s1", 3: "s1#dup-conv-3", 4: "s2", 5: "s1"}
+
+
+def test_a_failing_unique_index_does_not_block_the_other_indexes():
+    stats = FakeCollection("chunk_index_stats", [{"chatbot_id": "bot"}, {"chatbot_id": "bot"}])
+    conversations = FakeCollection("conversations")
+    db = FakeDatabase(stats, conversations)
+    registry = {
+        "chunk_index_stats": db_indexes.RAG_INDEXES["chunk_index_stats"],
+        "conversations": db_indexes.APP_INDEXES["conversations"],
+    }
+
+    result = asyncio.run(db_indexes._apply_registry(db, registry))
+
+    # No dedupe step for this collection: reported, not retried
+    assert "duplicate key" in result["chunk_index_stats"]["error"]
+    assert stats.unique_attempts == 1
+    assert len(result["conversations"]) == len(registry["conversations"])
+
+
+def test_batch_errors_do_not_skip_the_unique_indexes():
+    conversations = FakeCollection("conversations", batch_error=OperationFailure("index options conflict", 85))
+    db = FakeDatabase(conversations)
+
+    result = asyncio.run(db_indexes._apply_registry(db, {"conversations": db_indexes.APP_INDEXES["conversations"]}))
+
+    assert result["conversations"]["indexes"] == ["chatbot_id_1_session_id_1"]
+    assert "index options conflict" in result["conversations"]["error"]
+
+
+def test_dedupe_without_duplicates_writes_nothing():
+    conversations = FakeCollection("conversations", [conversation(1, "s1", 1), conversation(2, "s2", 1)])
+
+    assert asyncio.run(dedupe_conversation_sessions(conversations)) == 0
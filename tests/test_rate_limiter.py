@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+
+from services.rate_limiter import MemoryRateLimitBackend, RateLimitBackend, RateLimiter
+
+
+class Clock:
+    def __init__(self, now=6000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_limiter(now=6000.0):
+    clock = Clock(now)
+    return RateLimiter(MemoryRateLimitBackend(), clock=clock), clock
+
+
+def check(limiter, limits, key="client"):
+    return asyncio.run(limiter.check(key, limits))
+
+
+def test_hits_up_to_the_limit_are_allowed():
+    limiter, _ = make_limiter()
+
+    results = [check(limiter, ((3, 60),)) for _ in range(4)]
+
+    assert [result["allowed"] for result in results] == [True, True, True, False]
+    assert [result["remaining"] for result in results[:3]] == [2, 1, 0]
+    assert results[3]["retry_after"] == 60
+    assert results[3]["message"] == "Rate limit exceeded: 3 requests per minute"
+    assert limiter.get_stats()["rejected"] == 1
+
+
+def test_previous_bucket_is_weighted_by_the_elapsed_fraction():
+    limiter, clock = make_limiter()
+    for _ in range(4):
+        check(limiter, ((4, 60),))
+
+    # Half-way through the next bucket the previous 4 hits count as 2
+    clock.now += 90
+    assert check(limiter, ((4, 60),))["allowed"]
+    assert check(limiter, ((4, 60),))["allowed"]
+    rejected = check(limiter, ((4, 60),))
+    assert not rejected["allowed"]
+    # 4 * (1 - 45 / 60) + 3 == 4: one more hit fits after 15 seconds
+    assert rejected["retry_after"] == 15
+
+    clock.now += 15
+    assert check(limiter, ((4, 60),))["allowed"]
+
+
+def test_rejected_hits_are_taken_back():
+    limiter, clock = make_limiter()
+    for _ in range(2):
+        check(limiter, ((2, 60),))
+    for _ in range(5):
+        assert not check(limiter, ((2, 60),))["allowed"]
+
+    # Only the 2 allowed hits roll over into the previous bucket
+    clock.now += 60 + 30
+    assert check(limiter, ((2, 60),))["allowed"]
+
+
+def test_every_limit_is_enforced():
+    limiter, _ = make_limiter()
+    limits = ((10, 60), (2, 3600))
+
+    results = [check(limiter, limits) for _ in range(3)]
+
+    assert [result["allowed"] for result in results] == [True, True, False]
+    assert results[2]["message"] == "Rate limit exceeded: 2 requests per hour"
+    # The first limit is the one reported
+    assert results[2]["limit"] == 10
+    assert results[0]["remaining"] == 9
+
+
+def test_keys_are_counted_separately():
+    limiter, _ = make_limiter()
+
+    assert check(limiter, ((1, 60),), key="a")["allowed"]
+    assert check(limiter, ((1, 60),), key="b")["allowed"]
+    assert not check(limiter, ((1, 60),), key="a")["allowed"]
+
+
+def test_backend_errors_fail_open():
+    class BrokenBackend(MemoryRateLimitBackend):
+        async def increment(self, key, windows, now):
+            raise RuntimeError("database unavailable")
+
+    limiter = RateLimiter(BrokenBackend(), clock=Clock())
+
+    result = check(limiter, ((1, 60),))
+
+    assert result["allowed"]
+    assert result["remaining"] == 1
+    assert limiter.get_stats()["backend_errors"] == 1
+
+
+def test_memory_backend_evicts_idle_keys():
+    backend = MemoryRateLimitBackend()
+
+    asyncio.run(backend.increment("idle", [60], 0))
+    asyncio.run(backend.increment("active", [60], 100))
+    assert backend.get_stats()["keys"] == 2
+
+    # Both of the idle key's buckets are stale after two windows
+    asyncio.run(backend.increment("active", [60], 121))
+
+    assert backend.get_stats()["keys"] == 1
+    assert backend.evictions == 1
+    assert "idle" not in backend._counters
+
+
+def test_memory_backend_decrement_skips_rolled_over_buckets():
+    backend = MemoryRateLimitBackend()
+
+    asyncio.run(backend.increment("client", [60], 59))
+    asyncio.run(backend.decrement("client", [60], 61))
+
+    assert asyncio.run(backend.increment("client", [60], 61)) == [(1, 1)]
+
+
+def test_backends_must_implement_increment_and_decrement():
+    class IncrementOnly(RateLimitBackend):
+        async def increment(self, key, windows, now):
+            return []
+
+    with pytest.raises(TypeError):
+        RateLimitBackend()
+    with pytest.raises(TypeError):
+        IncrementOnly()
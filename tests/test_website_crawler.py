@@ -0,0 +1,314 @@
+"""
+WebsiteCrawler against a local HTTP stand-in site
+
+Each test serves a small site from a ThreadingHTTPServer on 127.0.0.1 and
+crawls it with a fresh crawler (no politeness delay).
+"""
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from services.website_crawler import WebsiteCrawler
+
+
+def html(text, links=()):
+    anchors = "".join(f'<a href="{href}">{href}</a>' for href in links)
+    return f"<html><body><p>{text}</p>{anchors}</body></html>"
+
+
+class LocalSite:
+    """Pages served by the local server (path -> response) and the requests it received"""
+
+    def __init__(self):
+        self.base = ""
+        self.pages = {}
+        self.requests = []
+
+    def page(self, path, body="", status=200, etag=None, last_modified=None,
+             content_type="text/html; charset=utf-8", before=None):
+        self.pages[path] = {
+            "body": body.encode("utf-8"),
+            "status": status,
+            "etag": etag,
+            "last_modified": last_modified,
+            "content_type": content_type,
+            # Called before responding (e.g. to hold the response)
+            "before": before
+        }
+
+    def remove(self, path, status=404):
+        self.page(path, status=status)
+
+    def url(self, path):
+        return self.base + path
+
+    def requested(self, path):
+        return [headers for requested_path, headers in self.requests if requested_path == path]
+
+
+def make_handler(site):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            site.requests.append((self.path, dict(self.headers)))
+            page = site.pages.get(self.path)
+            if page is None or page["status"] in (404, 410):
+                self.respond(page["status"] if page else 404)
+                return
+
+            if page["before"]:
+                page["before"]()
+
+            etag, last_modified = page["etag"], page["last_modified"]
+            if (etag and self.headers.get("If-None-Match") == etag) or (
+                last_modified and self.headers.get("If-Modified-Since") == last_modified
+            ):
+                self.respond(304)
+                return
+
+            headers = {"Content-Type": page["content_type"]}
+            if etag:
+                headers["ETag"] = etag
+            if last_modified:
+                headers["Last-Modified"] = last_modified
+            self.respond(page["status"], page["body"], headers)
+
+        def respond(self, status, body=b"", headers=None):
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+@pytest.fixture
+def site():
+    site = LocalSite()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(site))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    site.base = f"http://127.0.0.1:{server.server_address[1]}"
+    yield site
+    server.shutdown()
+    server.server_close()
+
+
+def crawl(site, previous=None, on_page=None, **kwargs):
+    """Crawl the site from "/" and return (result, pages passed to on_page)"""
+    crawler = WebsiteCrawler(per_host_delay_ms=0, timeout_seconds=5)
+    ingested = []
+
+    async def record(page):
+        ingested.append(page)
+        if on_page:
+            await on_page(page)
+
+    async def run():
+        try:
+            return await crawler.crawl(site.url("/"), record, previous=previous, **kwargs)
+        finally:
+            await crawler.close()
+
+    return asyncio.run(run()), ingested
+
+
+def paths(site, pages):
+    return sorted(page["url"][len(site.base):] for page in pages)
+
+
+def test_follows_same_site_links_only(site):
+    port = site.base.rsplit(":", 1)[1]
+    site.page("/", html("Home", ["/about", "/docs#intro", f"http://localhost:{port}/offsite", "/logo.png"]))
+    site.page("/about", html("About us", ["/"]))
+    site.page("/docs", html("Documentation"))
+
+    result, ingested = crawl(site, use_sitemap=False)
+
+    assert paths(site, ingested) == ["/", "/about", "/docs"]
+    assert result["stats"]["ingested"] == 3
+    # Other hosts and non-page assets are never requested; fragments are dropped
+    requested = [path for path, _ in site.requests]
+    assert "/offsite" not in requested
+    assert "/logo.png" not in requested
+    assert requested.count("/docs") == 1
+
+
+def test_page_budget_limits_the_crawl(site):
+    site.page("/", html("Home", [f"/page{i}" for i in range(10)]))
+    for i in range(10):
+        site.page(f"/page{i}", html(f"Page {i}"))
+
+    result, ingested = crawl(site, max_pages=4, use_sitemap=False)
+
+    assert len(ingested) == 4
+    assert len(result["pages"]) == 4
+    assert len([path for path, _ in site.requests if path.startswith("/page")]) == 3
+
+
+def test_sitemap_seeds_pages_without_links(site):
+    site.page("/", html("Home"))
+    site.page("/sitemap.xml", (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        f'<sitemap><loc>{site.url("/pages.xml")}</loc></sitemap>'
+        '</sitemapindex>'
+    ), content_type="application/xml")
+    site.page("/pages.xml", (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        f'<url><loc>{site.url("/hidden")}</loc></url>'
+        f'<url><loc>{site.url("/unlinked")}</loc></url>'
+        '</urlset>'
+    ), content_type="application/xml")
+    site.page("/hidden", html("Hidden page"))
+    site.page("/unlinked", html("Unlinked page"))
+
+    _, ingested = crawl(site)
+
+    assert paths(site, ingested) == ["/", "/hidden", "/unlinked"]
+
+
+def test_missing_sitemap_is_ignored(site):
+    site.page("/", html("Home"))
+
+    result, ingested = crawl(site)
+
+    assert paths(site, ingested) == ["/"]
+    assert result["stats"]["failed"] == 0
+
+
+def test_conditional_requests_use_etag_and_last_modified(site):
+    modified = "Wed, 21 Oct 2026 07:28:00 GMT"
+    site.page("/", html("Home", ["/etag", "/modified"]), etag='"home-v1"')
+    site.page("/etag", html("Tagged"), etag='"etag-v1"')
+    site.page("/modified", html("Dated"), last_modified=modified)
+
+    first, ingested = crawl(site, use_sitemap=False)
+    assert len(ingested) == 3
+
+    site.requests.clear()
+    second, ingested = crawl(site, previous=first["pages"], use_sitemap=False)
+
+    assert ingested == []
+    assert second["stats"]["not_modified"] == 3
+    assert site.requested("/etag")[0].get("If-None-Match") == '"etag-v1"'
+    assert site.requested("/modified")[0].get("If-Modified-Since") == modified
+    # 304 pages keep their state (and their links are known from the previous crawl)
+    assert sorted(page["content_hash"] for page in second["pages"]) == sorted(
+        page["content_hash"] for page in first["pages"]
+    )
+
+
+def test_changed_page_is_reingested(site):
+    site.page("/", html("Home", ["/news"]))
+    site.page("/news", html("Old news"), etag='"news-v1"')
+    first, _ = crawl(site, use_sitemap=False)
+
+    site.page("/news", html("Fresh news"), etag='"news-v2"')
+    second, ingested = crawl(site, previous=first["pages"], use_sitemap=False)
+
+    assert paths(site, ingested) == ["/news"]
+    assert ingested[0]["changed"] is True
+    assert "Fresh news" in ingested[0]["text"]
+    assert second["stats"]["unchanged"] == 1
+
+
+def test_unchanged_content_without_validators_is_skipped(site):
+    site.page("/", html("Home", ["/static"]))
+    site.page("/static", html("Same text every time"))
+    first, _ = crawl(site, use_sitemap=False)
+
+    second, ingested = crawl(site, previous=first["pages"], use_sitemap=False)
+
+    assert ingested == []
+    assert second["stats"]["unchanged"] == 2
+
+
+def test_pages_with_identical_text_are_ingested_once(site):
+    site.page("/", html("Home", ["/a", "/a?utm_source=mail"]))
+    site.page("/a", html("Mirrored article"))
+    site.page("/a?utm_source=mail", html("Mirrored article"))
+
+    result, ingested = crawl(site, use_sitemap=False)
+
+    # Either copy may be fetched first; only one of them is ingested
+    assert len(ingested) == 2
+    assert sum("Mirrored article" in page["text"] for page in ingested) == 1
+    assert result["stats"]["duplicates"] == 1
+
+
+def test_pages_gone_with_404_or_410_are_removed(site):
+    site.page("/", html("Home", ["/old", "/retired", "/kept"]))
+    site.page("/old", html("Old page"))
+    site.page("/retired", html("Retired page"))
+    site.page("/kept", html("Kept page"))
+    first, _ = crawl(site, use_sitemap=False)
+
+    site.page("/", html("Home", ["/kept"]))
+    site.remove("/old", status=404)
+    site.remove("/retired", status=410)
+    second, _ = crawl(site, previous=first["pages"], use_sitemap=False)
+
+    assert sorted(url[len(site.base):] for url in second["removed"]) == ["/old", "/retired"]
+    assert paths(site, second["pages"]) == ["/", "/kept"]
+
+
+def test_server_errors_keep_the_previous_page(site):
+    site.page("/", html("Home", ["/flaky"]))
+    site.page("/flaky", html("Flaky page"))
+    first, _ = crawl(site, use_sitemap=False)
+
+    site.page("/flaky", status=503)
+    second, _ = crawl(site, previous=first["pages"], use_sitemap=False)
+
+    assert second["removed"] == []
+    assert "/flaky" in paths(site, second["pages"])
+    assert second["stats"]["failed"] == 1
+
+
+def test_on_page_is_called_as_pages_arrive(site):
+    events = []
+    home_ingested = threading.Event()
+
+    def hold_slow_page():
+        # The slow page is only answered once the home page was handed to on_page
+        home_ingested.wait(timeout=5)
+        events.append("served /slow")
+
+    site.page("/", html("Home", ["/slow"]))
+    site.page("/slow", html("Slow page"), before=hold_slow_page)
+
+    async def on_page(page):
+        path = page["url"][len(site.base):]
+        events.append(f"ingested {path}")
+        if path == "/":
+            home_ingested.set()
+
+    _, ingested = crawl(site, on_page=on_page, use_sitemap=False)
+
+    assert events == ["ingested /", "served /slow", "ingested /slow"]
+    assert len(ingested) == 2
+
+
+def test_failed_ingestion_is_retried_next_crawl(site):
+    site.page("/", html("Home"), etag='"home-v1"')
+
+    async def failing(page):
+        raise RuntimeError("embedding provider down")
+
+    first, _ = crawl(site, on_page=failing, use_sitemap=False)
+    assert first["stats"]["failed"] == 1
+
+    second, ingested = crawl(site, previous=first["pages"], use_sitemap=False)
+
+    # No validators were kept, so the page is fetched in full and ingested again
+    assert site.requested("/")[-1].get("If-None-Match") is None
+    assert paths(site, ingested) == ["/"]
+    assert second["stats"]["ingested"] == 1